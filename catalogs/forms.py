@@ -1,4 +1,5 @@
 from django import forms
+from core import directorio
 from .models import Incidencia
 from orgs.models import Direccion, Departamento
 from surveys.models import Encuesta
@@ -28,5 +29,9 @@ class IncidenciaForm(forms.ModelForm):
         self.fields['direccion'].queryset = Direccion.objects.filter(estado=True).order_by('nombre')
         self.fields['departamento'].queryset = Departamento.objects.filter(estado=True).order_by('nombre')
         self.fields['encuesta'].queryset = Encuesta.objects.filter(estado=True).order_by('titulo')
+        # Las opciones salen del directorio en memoria; los querysets solo validan lo enviado.
+        registros = directorio.actual()
+        for campo in ('direccion', 'departamento', 'encuesta'):
+            directorio.usar_opciones(self.fields[campo], registros.choices(campo))
 
       
@@ -1,40 +1,56 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
 from registration.models import Profile
 from registration.utils import has_admin_role
-from orgs.models import Direccion, Departamento
+from core import directorio
 from core.decorators import role_required
+from core.pagination import paginate_request, query_string_without_cursor
 
-from surveys.models import Encuesta
 from .models import Incidencia
 from .forms import IncidenciaForm
 
 
-@role_required("Secpla","Territoriales","Direcciones","Departamentos","Cuadrillas")
-def incidencia_listar(request):
+def _departamento_en_direccion(registros, incidencia):
+    departamento = registros.get('departamento', incidencia.departamento_id)
+    return departamento is not None and departamento.direccion_id == incidencia.direccion_id
 
-    incidencias_list = Incidencia.objects.all().order_by('-incidencia_id')
-    paginator = Paginator(incidencias_list, 10)
-    page_number = request.GET.get('page')
-    incidencias = paginator.get_page(page_number)
 
-    return render(request, 'catalogs/incidencia_listar.html', {'incidencias': incidencias})
+@role_required("Secpla","Territoriales","Direcciones","Departamentos","Cuadrillas")
+def incidencia_listar(request):
+    registros = directorio.de_peticion(request)
+    q = request.GET.get('q', '').strip()
+    direccion_id = request.GET.get('direccion', '').strip()
+    departamento_id = request.GET.get('departamento', '').strip()
+
+    incidencias_list = Incidencia.objects.all()
+    if q:
+        incidencias_list = incidencias_list.filter(nombre__icontains=q)
+    if registros.get('direccion', direccion_id):
+        incidencias_list = incidencias_list.filter(direccion_id=direccion_id)
+    if registros.get('departamento', departamento_id):
+        incidencias_list = incidencias_list.filter(departamento_id=departamento_id)
+    incidencias = paginate_request(request, incidencias_list, ('-incidencia_id',))
+
+    return render(request, 'catalogs/incidencia_listar.html', {
+        'incidencias': incidencias,
+        'direcciones': registros.registros('direccion', activos=False),
+        'departamentos': registros.registros('departamento', activos=False),
+        'page_obj': incidencias,
+        'query_string': query_string_without_cursor(request),
+    })
 
 
 @role_required("Secpla","Territoriales","Direcciones")
 def incidencia_crear(request):
-    direcciones = Direccion.objects.filter(estado=True).order_by('nombre')
-    departamentos = Departamento.objects.filter(estado=True).order_by('nombre')
-    encuestas = Encuesta.objects.filter(estado=True).order_by('titulo')
+    registros = directorio.de_peticion(request)
 
     if request.method == 'POST':
         form = IncidenciaForm(request.POST)
         if form.is_valid():
             incidencia = form.save(commit=False)
             
-            if incidencia.departamento.direccion != incidencia.direccion:
+            if not _departamento_en_direccion(registros, incidencia):
                 messages.error(request, 'El departamento no pertenece a la dirección seleccionada.')
                 return redirect('incidencia_crear')
             incidencia.save()
@@ -47,9 +63,9 @@ def incidencia_crear(request):
 
     return render(request, 'catalogs/incidencia_crear.html', {
         'form': form,
-        'direcciones': direcciones,
-        'departamentos': departamentos,
-        'encuestas': encuestas
+        'direcciones': registros.registros('direccion'),
+        'departamentos': registros.registros('departamento'),
+        'encuestas': registros.registros('encuesta'),
     })
 
 
@@ -67,7 +83,7 @@ def incidencia_editar(request, incidencia_id):
         form = IncidenciaForm(request.POST, instance=incidencia)
         if form.is_valid():
             incidencia = form.save(commit=False)
-            if incidencia.departamento.direccion != incidencia.direccion:
+            if not _departamento_en_direccion(directorio.de_peticion(request), incidencia):
                 messages.error(request, 'El departamento no pertenece a la dirección seleccionada.')
                 return redirect('incidencia_editar', incidencia_id=incidencia_id)
             
@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "core"
+
+    def ready(self):
+        from django.conf import settings
+
+        from . import signals  # noqa: F401
+
+        if "core.instrumentation.InstrumentationMiddleware" in settings.MIDDLEWARE:
+            from .instrumentation import install_template_timer
+
+            install_template_timer()
@@ -0,0 +1,170 @@
+"""
+Benchmark de vistas por rol.
+
+Para cada rol se toma un usuario real de la base (el primero con ese
+`role_type` o el indicado), se autentica con `Client.force_login` y se
+piden sus dashboards y listados `repeticiones` veces, registrando la
+latencia y la cantidad de consultas de cada request. Los resultados se
+pueden guardar como línea base en JSON y comparar contra una corrida
+anterior: hay regresión si las consultas aumentan o si el p95 empeora más
+que la tolerancia.
+"""
+from __future__ import annotations
+
+import json
+import time
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+
+from registration.models import Profile
+
+# (rol, nombre de URL, query string)
+VISTAS: Tuple[Tuple[str, str, str], ...] = (
+    (Profile.Role.SECPLA, "dashboard_secpla", ""),
+    (Profile.Role.SECPLA, "dashboard_sla", ""),
+    (Profile.Role.SECPLA, "solicitud_listar", ""),
+    (Profile.Role.SECPLA, "solicitud_listar", "estado=Finalizada"),
+    (Profile.Role.SECPLA, "solicitud_listar", "q=luminaria"),
+    (Profile.Role.SECPLA, "user_list", ""),
+    (Profile.Role.SECPLA, "encuesta_listar", ""),
+    (Profile.Role.SECPLA, "direccion_listar", ""),
+    (Profile.Role.SECPLA, "departamento_listar", ""),
+    (Profile.Role.SECPLA, "cuadrilla_listar", ""),
+    (Profile.Role.SECPLA, "territorial_listar", ""),
+    (Profile.Role.SECPLA, "incidencia_listar", ""),
+    (Profile.Role.DIRECCION, "dashboard_direccion", ""),
+    (Profile.Role.DIRECCION, "dashboard_sla", ""),
+    (Profile.Role.DIRECCION, "solicitud_listar", ""),
+    (Profile.Role.DEPARTAMENTO, "dashboard_departamento", ""),
+    (Profile.Role.CUADRILLA, "dashboard_cuadrilla", ""),
+    (Profile.Role.CUADRILLA, "mis_incidencias_cuadrilla", ""),
+    (Profile.Role.TERRITORIAL, "dashboard_territorial", ""),
+)
+
+
+@dataclass
+class Medicion:
+    clave: str
+    usuario: str
+    url: str
+    status: int
+    p50_ms: float
+    p95_ms: float
+    max_ms: float
+    consultas: int
+
+
+def _percentil(valores: List[float], p: float) -> float:
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(p * len(ordenados)))]
+
+
+def usuario_para(rol: str, prefijo_usuario: str = ""):
+    perfiles = Profile.objects.select_related("user").filter(role_type=rol, user__is_active=True)
+    if prefijo_usuario:
+        perfiles = perfiles.filter(user__username__startswith=prefijo_usuario)
+    perfil = perfiles.order_by("pk").first()
+    return perfil.user if perfil else None
+
+
+def medir(client: Client, url: str, repeticiones: int, calentamiento: int = 1) -> Tuple[int, List[float], int]:
+    """Devuelve (status, latencias en segundos, consultas del último request)."""
+    for _ in range(calentamiento):
+        client.get(url)
+    latencias, status = [], 0
+    contador = [0]
+
+    def contar(execute, sql, params, many, context):
+        contador[0] += 1
+        return execute(sql, params, many, context)
+
+    for _ in range(repeticiones):
+        contador[0] = 0
+        with connection.execute_wrapper(contar):
+            inicio = time.perf_counter()
+            response = client.get(url)
+            latencias.append(time.perf_counter() - inicio)
+        status = response.status_code
+    return status, latencias, contador[0]
+
+
+def ejecutar(
+    repeticiones: int = 20,
+    calentamiento: int = 1,
+    roles: Optional[Iterable[str]] = None,
+    prefijo_usuario: str = "",
+    avisar: Optional[Callable[[str], None]] = None,
+) -> List[Medicion]:
+    avisar = avisar or (lambda mensaje: None)
+    roles = set(roles) if roles else None
+    mediciones: List[Medicion] = []
+    clientes: Dict[str, Tuple[Client, str]] = {}
+
+    for rol, nombre, query in VISTAS:
+        if roles and rol not in roles:
+            continue
+        if rol not in clientes:
+            usuario = usuario_para(rol, prefijo_usuario)
+            if usuario is None:
+                avisar(f"Sin usuario con rol '{rol}': se omiten sus vistas.")
+                clientes[rol] = None
+                continue
+            client = Client(HTTP_HOST="localhost")
+            client.force_login(usuario)
+            clientes[rol] = (client, usuario.username)
+        if clientes[rol] is None:
+            continue
+
+        client, username = clientes[rol]
+        url = reverse(nombre) + (f"?{query}" if query else "")
+        status, latencias, consultas = medir(client, url, repeticiones, calentamiento)
+        medicion = Medicion(
+            clave=f"{rol}:{nombre}" + (f"?{query}" if query else ""),
+            usuario=username,
+            url=url,
+            status=status,
+            p50_ms=round(_percentil(latencias, 0.5) * 1000, 1),
+            p95_ms=round(_percentil(latencias, 0.95) * 1000, 1),
+            max_ms=round(max(latencias) * 1000, 1),
+            consultas=consultas,
+        )
+        mediciones.append(medicion)
+        avisar(
+            f"{medicion.clave:<50} {status}  p50={medicion.p50_ms:>8.1f}ms  "
+            f"p95={medicion.p95_ms:>8.1f}ms  consultas={consultas}"
+        )
+    return mediciones
+
+
+def guardar(mediciones: List[Medicion], ruta: str) -> None:
+    with open(ruta, "w", encoding="utf-8") as archivo:
+        json.dump({medicion.clave: asdict(medicion) for medicion in mediciones}, archivo, indent=2, ensure_ascii=False)
+
+
+def cargar(ruta: str) -> Dict[str, dict]:
+    with open(ruta, encoding="utf-8") as archivo:
+        return json.load(archivo)
+
+
+def comparar(mediciones: List[Medicion], base: Dict[str, dict], tolerancia: float = 0.2) -> List[str]:
+    """Regresiones respecto de `base`: más consultas, o p95 peor que base * (1 + tolerancia)."""
+    regresiones = []
+    for medicion in mediciones:
+        anterior = base.get(medicion.clave)
+        if anterior is None:
+            continue
+        if medicion.consultas > anterior["consultas"]:
+            regresiones.append(
+                f"{medicion.clave}: {medicion.consultas} consultas (base {anterior['consultas']})"
+            )
+        if medicion.p95_ms > anterior["p95_ms"] * (1 + tolerancia):
+            regresiones.append(
+                f"{medicion.clave}: p95 {medicion.p95_ms}ms (base {anterior['p95_ms']}ms)"
+            )
+        if medicion.status != anterior["status"]:
+            regresiones.append(f"{medicion.clave}: status {medicion.status} (base {anterior['status']})")
+    return regresiones
@@ -0,0 +1,333 @@
+"""
+Caché en dos niveles y memoización por versión de modelo.
+
+`TwoTierCache` es un backend de caché de Django que antepone a otro
+backend compartido (`OPTIONS['SHARED']`, un alias de `CACHES`: archivos o
+base de datos en desarrollo, Redis en producción) un LRU en memoria del
+proceso, con límite de entradas, de bytes y un TTL corto. Las lecturas
+que aciertan en memoria no salen del proceso; las escrituras van a los dos
+niveles.
+
+Un `delete()` o `set()` en otro proceso no alcanza a los LRU locales: una
+copia local puede quedar vieja hasta `LOCAL_TTL` segundos. Por eso el
+nivel local está pensado para claves versionadas (las de `core.versions`,
+`core.fragmentos`, las teselas del mapa), cuyo valor no cambia mientras
+la clave exista.
+
+`memoize` cachea el resultado de una función según la versión de los
+modelos de los que depende: guardar o borrar una instancia de cualquiera
+de ellos (señales `post_save`/`post_delete`) incrementa su versión. Las
+escrituras en bloque no emiten señales y deben llamar a
+`invalidate_models`.
+
+Los contadores de aciertos, fallos y desalojos son por proceso y se
+exponen junto al resto de las métricas en `/metrics`.
+"""
+from __future__ import annotations
+
+import hashlib
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import wraps
+from typing import Dict, Iterable, List, Optional, Tuple, Type, Union
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.db import models
+from django.db.models.signals import post_delete, post_save
+
+from .versions import bump_versions, get_versions
+
+MEMO_PREFIX = 'memo:'
+MODEL_VERSION_PREFIX = 'modelo:'
+
+_MISSING = object()
+
+
+# ---------------------------------------------------------------------------
+# Nivel local
+# ---------------------------------------------------------------------------
+
+@dataclass
+class LocalStats:
+    local_hits: int = 0
+    shared_hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    oversized: int = 0
+
+
+class LocalLRU:
+    """LRU de valores serializados con límite de entradas y de bytes, y vencimiento por entrada."""
+
+    def __init__(self, max_entries: int, max_bytes: int, max_item_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_item_bytes = max_item_bytes
+        self.stats = LocalStats()
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, payload = entry
+            if expires <= time.monotonic():
+                self._remove(key)
+                self.stats.expirations += 1
+                return None
+            self._entries.move_to_end(key)
+            return payload
+
+    def set(self, key: str, payload: bytes, ttl: float) -> None:
+        with self._lock:
+            self._remove(key)
+            if ttl <= 0:
+                return
+            if len(payload) > self.max_item_bytes:
+                self.stats.oversized += 1
+                return
+            self._entries[key] = (time.monotonic() + ttl, payload)
+            self._bytes += len(payload)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.stats.evictions += 1
+
+    def count(self, field: str) -> None:
+        with self._lock:
+            setattr(self.stats, field, getattr(self.stats, field) + 1)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry[1])
+
+
+# Django crea una instancia de backend por hilo; el LRU es uno por proceso y alias.
+_tiers: Dict[str, LocalLRU] = {}
+_tiers_lock = threading.Lock()
+
+
+def _tier(name: str, options: dict) -> LocalLRU:
+    with _tiers_lock:
+        if name not in _tiers:
+            _tiers[name] = LocalLRU(
+                max_entries=int(options.get('LOCAL_MAX_ENTRIES', 1000)),
+                max_bytes=int(options.get('LOCAL_MAX_BYTES', 16 * 1024 * 1024)),
+                max_item_bytes=int(options.get('LOCAL_MAX_ITEM_BYTES', 512 * 1024)),
+            )
+        return _tiers[name]
+
+
+class TwoTierCache(BaseCache):
+    """
+    Backend de caché: LRU local (`LOCAL_*`) delante del alias `SHARED`.
+
+    ::
+
+        CACHES = {
+            'default': {
+                'BACKEND': 'core.caching.TwoTierCache',
+                'LOCATION': 'default',
+                'OPTIONS': {'SHARED': 'shared', 'LOCAL_TTL': 10, 'LOCAL_MAX_ENTRIES': 1000},
+            },
+            'shared': {...},
+        }
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.name = location or 'default'
+        self.shared_alias = options.get('SHARED', 'shared')
+        self.local_ttl = float(options.get('LOCAL_TTL', 10))
+        self.local = _tier(self.name, options)
+
+    @property
+    def shared(self) -> BaseCache:
+        return caches[self.shared_alias]
+
+    def _local_ttl(self, timeout) -> float:
+        timeout = self.get_backend_timeout(timeout)
+        if timeout is None:
+            return self.local_ttl
+        return min(self.local_ttl, timeout - time.time())
+
+    def _remember(self, key: str, value, timeout=DEFAULT_TIMEOUT) -> None:
+        self.local.set(key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), self._local_ttl(timeout))
+
+    def get(self, key, default=None, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        payload = self.local.get(local_key)
+        if payload is not None:
+            self.local.count('local_hits')
+            return pickle.loads(payload)
+        value = self.shared.get(key, _MISSING, version=version)
+        if value is _MISSING:
+            self.local.count('misses')
+            return default
+        self.local.count('shared_hits')
+        self._remember(local_key, value)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        self.shared.set(key, value, timeout=timeout, version=version)
+        self._remember(local_key, value, timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        if not self.shared.add(key, value, timeout=timeout, version=version):
+            return False
+        self._remember(local_key, value, timeout)
+        return True
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout=timeout, version=version)
+
+    def delete(self, key, version=None):
+        self.local.delete(self.make_and_validate_key(key, version=version))
+        return self.shared.delete(key, version=version)
+
+    def has_key(self, key, version=None):
+        if self.local.get(self.make_and_validate_key(key, version=version)) is not None:
+            return True
+        return self.shared.has_key(key, version=version)
+
+    def clear(self):
+        self.local.clear()
+        self.shared.clear()
+
+
+def stats() -> List[dict]:
+    """Contadores del LRU local de cada `TwoTierCache` de este proceso."""
+    with _tiers_lock:
+        tiers = sorted(_tiers.items())
+    return [
+        {
+            'cache': name,
+            'entradas': len(tier),
+            'bytes': tier.size_bytes,
+            **vars(tier.stats),
+        }
+        for name, tier in tiers
+    ]
+
+
+def prometheus() -> str:
+    lineas = []
+    contadores = (
+        ('django_cache_local_hits_total', 'Lecturas resueltas en el LRU del proceso.', 'local_hits'),
+        ('django_cache_shared_hits_total', 'Lecturas resueltas en el backend compartido.', 'shared_hits'),
+        ('django_cache_misses_total', 'Lecturas sin valor en ningún nivel.', 'misses'),
+        ('django_cache_local_evictions_total', 'Entradas desalojadas del LRU por tamaño.', 'evictions'),
+        ('django_cache_local_expirations_total', 'Entradas del LRU vencidas por TTL.', 'expirations'),
+        ('django_cache_local_oversized_total', 'Valores demasiado grandes para el LRU.', 'oversized'),
+    )
+    filas = stats()
+    for nombre, ayuda, campo in contadores:
+        lineas += [f'# HELP {nombre} {ayuda}', f'# TYPE {nombre} counter']
+        lineas += [f'{nombre}{{cache="{fila["cache"]}"}} {fila[campo]}' for fila in filas]
+    for nombre, ayuda, campo in (
+        ('django_cache_local_entries', 'Entradas en el LRU del proceso.', 'entradas'),
+        ('django_cache_local_bytes', 'Bytes serializados en el LRU del proceso.', 'bytes'),
+    ):
+        lineas += [f'# HELP {nombre} {ayuda}', f'# TYPE {nombre} gauge']
+        lineas += [f'{nombre}{{cache="{fila["cache"]}"}} {fila[campo]}' for fila in filas]
+    return '\n'.join(lineas) + '\n'
+
+
+# ---------------------------------------------------------------------------
+# Memoización por versión de modelo
+# ---------------------------------------------------------------------------
+
+Dependency = Union[Type[models.Model], str]
+
+
+def model_version_key(model: Type[models.Model]) -> str:
+    return MODEL_VERSION_PREFIX + model._meta.label_lower
+
+
+def _bump_model(sender, **kwargs):
+    if not kwargs.get('raw'):
+        bump_versions([model_version_key(sender)])
+
+
+def track_model(model: Type[models.Model]) -> None:
+    """Incrementa la versión de `model` en cada `post_save`/`post_delete` (idempotente)."""
+    uid = f'core.caching:{model._meta.label_lower}'
+    post_save.connect(_bump_model, sender=model, weak=False, dispatch_uid=uid)
+    post_delete.connect(_bump_model, sender=model, weak=False, dispatch_uid=uid)
+
+
+def invalidate_models(*models_: Type[models.Model]) -> None:
+    """Para escrituras en bloque (`update`, `bulk_create`) que no emiten señales."""
+    bump_versions([model_version_key(model) for model in models_])
+
+
+def _version_keys(dependencies: Iterable[Dependency]) -> List[str]:
+    claves = []
+    for dependency in dependencies:
+        if isinstance(dependency, str):
+            claves.append(dependency)
+        else:
+            track_model(dependency)
+            claves.append(model_version_key(dependency))
+    return claves
+
+
+def memoize(*dependencies: Dependency, timeout=DEFAULT_TIMEOUT, alias: str = 'default'):
+    """
+    Cachea el resultado de la función según sus argumentos y la versión de
+    `dependencies` (modelos o claves de `core.versions`). Cada llamada lee
+    esas versiones con una consulta; el cálculo solo se repite cuando cambian.
+    Los argumentos deben tener un `repr` estable (ids, cadenas, fechas).
+
+        @memoize(User, Ubicacion)
+        def totales():
+            ...
+    """
+    claves = _version_keys(dependencies)
+
+    def decorator(function):
+        nombre = f'{function.__module__}.{function.__qualname__}'
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            firma = repr((nombre, args, sorted(kwargs.items()), sorted(get_versions(claves).items())))
+            clave = MEMO_PREFIX + hashlib.sha1(firma.encode()).hexdigest()
+            backend = cache if alias == 'default' else caches[alias]
+            valor = backend.get(clave, _MISSING)
+            if valor is _MISSING:
+                valor = function(*args, **kwargs)
+                backend.set(clave, valor, timeout)
+            return valor
+
+        wrapper.version_keys = claves
+        return wrapper
+
+    return decorator
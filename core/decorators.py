@@ -3,13 +3,15 @@ from django.contrib.auth.decorators import login_required
 from django.core.exceptions import PermissionDenied
 from django.contrib.auth.mixins import LoginRequiredMixin
 
+from core.roles import get_role_context
+
 
 def role_required(*group_names):
     def decorator(view_func):
         @login_required
         @wraps(view_func)
         def _wrapped(request, *args, **kwargs):
-            if request.user.groups.filter(name__in=group_names).exists():
+            if get_role_context(request).in_groups(*group_names):
                 return view_func(request, *args, **kwargs)
             raise PermissionDenied("No tienes permisos para acceder.")
         return _wrapped
@@ -26,7 +28,7 @@ class RoleRequiredMixin(LoginRequiredMixin):
         if not user.is_authenticated:
             return self.handle_no_permission()
 
-        if user.groups.filter(name__in=self.allowed_roles).exists():
+        if get_role_context(request).in_groups(*self.allowed_roles):
             return super().dispatch(request, *args, **kwargs)
 
         raise PermissionDenied("No tienes permisos para acceder.")
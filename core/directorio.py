@@ -0,0 +1,296 @@
+"""
+Directorio en memoria de las tablas de referencia de la municipalidad.
+
+Direcciones, departamentos, cuadrillas, territoriales, tipos de incidencia
+y encuestas son tablas chicas que casi todas las páginas necesitan para
+mostrar nombres o armar listas de opciones. Se leen una sola vez por
+proceso (una consulta por tabla) como registros inmutables con
+`__slots__`, indexados por id, y quedan en memoria junto a la versión
+`VERSION_KEY`. En cada uso solo se consulta esa versión; si cambió (las
+señales de `core.signals` la incrementan al guardar o borrar cualquiera de
+esos modelos) se vuelve a cargar. Dentro de un request el directorio queda
+memorizado en `request` (ver `de_peticion`).
+
+Vistas, formularios y plantillas resuelven con el directorio los ids a
+nombres y a su jerarquía (cuadrilla → departamento → dirección) en lugar
+de hacer joins o `select_related`. En plantillas::
+
+    {% load directorio %}
+    {% nombre "cuadrilla" solicitud.cuadrilla_id %}
+    {% registro "encuesta" solicitud.encuesta_id as encuesta %}{{ encuesta.titulo }}
+"""
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from catalogs import models as catalogs_models
+from orgs import models as orgs_models
+from surveys import models as surveys_models
+
+from .versions import bump_version, get_version
+
+VERSION_KEY = 'directorio'
+REQUEST_ATTR = '_directorio'
+
+MODELOS = (
+    orgs_models.Direccion,
+    orgs_models.Departamento,
+    orgs_models.Cuadrilla,
+    orgs_models.Territorial,
+    catalogs_models.Incidencia,
+    surveys_models.Encuesta,
+)
+
+
+@dataclass(frozen=True, slots=True)
+class Direccion:
+    pk: int
+    nombre: str
+    estado: bool
+
+    def __str__(self):
+        return self.nombre
+
+
+@dataclass(frozen=True, slots=True)
+class Departamento:
+    pk: int
+    nombre: str
+    estado: bool
+    direccion_id: int
+
+    def __str__(self):
+        return self.nombre
+
+
+@dataclass(frozen=True, slots=True)
+class Cuadrilla:
+    pk: int
+    nombre: str
+    estado: bool
+    departamento_id: int
+    direccion_id: Optional[int]
+
+    def __str__(self):
+        return self.nombre
+
+
+@dataclass(frozen=True, slots=True)
+class Territorial:
+    pk: int
+    nombre: str
+    estado: bool = True
+
+    def __str__(self):
+        return self.nombre
+
+
+@dataclass(frozen=True, slots=True)
+class TipoIncidencia:
+    pk: int
+    nombre: str
+    estado: bool
+    direccion_id: int
+    departamento_id: int
+    encuesta_id: Optional[int]
+
+    def __str__(self):
+        return self.nombre
+
+
+@dataclass(frozen=True, slots=True)
+class Encuesta:
+    pk: int
+    titulo: str
+    estado: bool
+    prioridad: Optional[str]
+    tipo_incidencia: Optional[str]
+
+    @property
+    def nombre(self) -> str:
+        return self.titulo
+
+    def __str__(self):
+        return self.titulo
+
+
+Registro = Union[Direccion, Departamento, Cuadrilla, Territorial, TipoIncidencia, Encuesta]
+
+# Nombre que usan vistas y plantillas → atributo de `Directorio`.
+TABLAS = {
+    'direccion': 'direcciones',
+    'departamento': 'departamentos',
+    'cuadrilla': 'cuadrillas',
+    'territorial': 'territoriales',
+    'incidencia': 'incidencias',
+    'encuesta': 'encuestas',
+}
+
+
+def _id(pk) -> Optional[int]:
+    try:
+        return int(pk)
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass(frozen=True, slots=True)
+class Directorio:
+    """Cada tabla es un `dict` id → registro, en orden de nombre."""
+
+    version: int
+    direcciones: Dict[int, Direccion]
+    departamentos: Dict[int, Departamento]
+    cuadrillas: Dict[int, Cuadrilla]
+    territoriales: Dict[int, Territorial]
+    incidencias: Dict[int, TipoIncidencia]
+    encuestas: Dict[int, Encuesta]
+
+    def tabla(self, nombre: str) -> Dict[int, Registro]:
+        if nombre not in TABLAS:
+            raise KeyError(f'Tabla desconocida en el directorio: {nombre}.')
+        return getattr(self, TABLAS[nombre])
+
+    def get(self, tabla: str, pk) -> Optional[Registro]:
+        """Registro de `pk` (entero o cadena) en `tabla`; None si no existe."""
+        return self.tabla(tabla).get(_id(pk))
+
+    def nombre(self, tabla: str, pk, default: str = '') -> str:
+        registro = self.get(tabla, pk)
+        return str(registro) if registro is not None else default
+
+    def registros(self, tabla: str, activos: bool = True, ids: Optional[Iterable[int]] = None) -> List[Registro]:
+        """Registros de `tabla` en orden de nombre, solo activos y dentro de `ids` si se indican."""
+        ids = None if ids is None else set(ids)
+        return [
+            registro for registro in self.tabla(tabla).values()
+            if (not activos or registro.estado) and (ids is None or registro.pk in ids)
+        ]
+
+    def etiqueta(self, registro: Registro) -> str:
+        """Texto del registro en listas de opciones, como el `__str__` de su modelo."""
+        if isinstance(registro, Departamento):
+            return f'{registro.nombre} ({self.nombre("direccion", registro.direccion_id)})'
+        if isinstance(registro, Encuesta):
+            return f"{registro.titulo} ({'Activa' if registro.estado else 'Inactiva'})"
+        return str(registro)
+
+    def choices(self, tabla: str, activos: bool = True, ids: Optional[Iterable[int]] = None) -> List[Tuple[int, str]]:
+        return [(registro.pk, self.etiqueta(registro)) for registro in self.registros(tabla, activos, ids)]
+
+    def buscar(self, tabla: str, texto: str) -> List[int]:
+        """Ids cuyo nombre contiene `texto`, sin distinguir mayúsculas (como `icontains`)."""
+        texto = texto.strip().casefold()
+        return [pk for pk, registro in self.tabla(tabla).items() if texto in str(registro).casefold()]
+
+    def departamentos_de(self, direccion_id: int, activos: bool = True) -> List[Departamento]:
+        return [
+            departamento for departamento in self.registros('departamento', activos)
+            if departamento.direccion_id == direccion_id
+        ]
+
+    def cuadrillas_de(self, departamento_id: Optional[int] = None, direccion_id: Optional[int] = None,
+                      activas: bool = True) -> List[Cuadrilla]:
+        """Cuadrillas de un departamento o de todos los departamentos de una dirección."""
+        return [
+            cuadrilla for cuadrilla in self.registros('cuadrilla', activas)
+            if (departamento_id is None or cuadrilla.departamento_id == departamento_id)
+            and (direccion_id is None or cuadrilla.direccion_id == direccion_id)
+        ]
+
+    def incidencias_de(self, direccion_ids: Optional[Iterable[int]] = None,
+                       departamento_ids: Optional[Iterable[int]] = None,
+                       activas: bool = False) -> List[TipoIncidencia]:
+        """Tipos de incidencia de esas direcciones y departamentos (None: sin filtrar)."""
+        direccion_ids = None if direccion_ids is None else set(direccion_ids)
+        departamento_ids = None if departamento_ids is None else set(departamento_ids)
+        return [
+            incidencia for incidencia in self.registros('incidencia', activas)
+            if (direccion_ids is None or incidencia.direccion_id in direccion_ids)
+            and (departamento_ids is None or incidencia.departamento_id in departamento_ids)
+        ]
+
+
+_directorio: Optional[Directorio] = None
+_lock = threading.Lock()
+
+
+def _cargar(version: int) -> Directorio:
+    departamentos = {
+        pk: Departamento(pk, nombre, estado, direccion_id)
+        for pk, nombre, estado, direccion_id in orgs_models.Departamento.objects.order_by('nombre', 'pk')
+        .values_list('pk', 'nombre', 'estado', 'direccion_id')
+    }
+    cuadrillas = {}
+    for pk, nombre, estado, departamento_id in (
+        orgs_models.Cuadrilla.objects.order_by('nombre', 'pk').values_list('pk', 'nombre', 'estado', 'departamento_id')
+    ):
+        departamento = departamentos.get(departamento_id)
+        cuadrillas[pk] = Cuadrilla(
+            pk, nombre, estado, departamento_id, departamento.direccion_id if departamento else None
+        )
+    return Directorio(
+        version=version,
+        direcciones={
+            pk: Direccion(pk, nombre, estado)
+            for pk, nombre, estado in orgs_models.Direccion.objects.order_by('nombre', 'pk')
+            .values_list('pk', 'nombre', 'estado')
+        },
+        departamentos=departamentos,
+        cuadrillas=cuadrillas,
+        territoriales={
+            pk: Territorial(pk, nombre)
+            for pk, nombre in orgs_models.Territorial.objects.order_by('nombre', 'pk').values_list('pk', 'nombre')
+        },
+        incidencias={
+            fila[0]: TipoIncidencia(*fila)
+            for fila in catalogs_models.Incidencia.objects.order_by('nombre', 'pk').values_list(
+                'pk', 'nombre', 'estado', 'direccion_id', 'departamento_id', 'encuesta_id'
+            )
+        },
+        encuestas={
+            fila[0]: Encuesta(*fila)
+            for fila in surveys_models.Encuesta.objects.order_by('titulo', 'pk').values_list(
+                'pk', 'titulo', 'estado', 'prioridad', 'tipo_incidencia'
+            )
+        },
+    )
+
+
+def actual() -> Directorio:
+    """El directorio vigente; se recarga si cambió `VERSION_KEY`."""
+    global _directorio
+    version = get_version(VERSION_KEY)
+    directorio = _directorio
+    if directorio is not None and directorio.version == version:
+        return directorio
+    with _lock:
+        if _directorio is None or _directorio.version != version:
+            _directorio = _cargar(version)
+        return _directorio
+
+
+def de_peticion(request) -> Directorio:
+    """Como `actual`, pero consulta la versión una sola vez por request."""
+    directorio = getattr(request, REQUEST_ATTR, None)
+    if directorio is None:
+        directorio = actual()
+        setattr(request, REQUEST_ATTR, directorio)
+    return directorio
+
+
+def invalidar() -> None:
+    """Para escrituras en bloque (`update`, `bulk_create`) que no emiten señales."""
+    bump_version(VERSION_KEY)
+
+
+def usar_opciones(campo, choices: List[Tuple[int, str]]) -> None:
+    """
+    Reemplaza las opciones de un `ModelChoiceField` por `choices` del
+    directorio: el formulario se renderiza sin consultar su queryset, que
+    sigue validando lo enviado.
+    """
+    vacia = [('', campo.empty_label)] if campo.empty_label is not None else []
+    campo.choices = vacia + choices
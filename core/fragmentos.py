@@ -0,0 +1,56 @@
+"""
+Caché de fragmentos de plantilla que dependen de contadores de versión.
+
+Un `Dependencias` agrupa las claves de `core.versions` de las que depende
+lo que muestra una página (p. ej. la cola de solicitudes de un
+departamento). Sus versiones se leen una sola vez, en una consulta, y
+forman parte de la clave de cada fragmento: mientras nadie incremente esas
+versiones, el fragmento se sirve desde la caché sin evaluar los querysets
+que contiene ni renderizar su plantilla. Incrementar una versión deja
+huérfanas las entradas anteriores, que vencen solas con `TTL`.
+
+En plantillas::
+
+    {% load fragmentos %}
+    {% fragmento dependencias "pendientes" es_encargado %} ... {% endfragmento %}
+"""
+from __future__ import annotations
+
+import hashlib
+from typing import Callable, Dict, Iterable, Optional, TypeVar
+
+from django.core.cache import cache
+
+from .versions import get_versions
+
+PREFIJO = 'fragmento:'
+TTL = 60 * 60 * 24
+
+T = TypeVar('T')
+_FALTA = object()
+
+
+class Dependencias:
+    def __init__(self, claves: Iterable[str]):
+        self.claves = tuple(sorted(set(claves)))
+        self._versiones: Optional[Dict[str, int]] = None
+
+    @property
+    def versiones(self) -> Dict[str, int]:
+        if self._versiones is None:
+            self._versiones = get_versions(self.claves)
+        return self._versiones
+
+    def clave(self, nombre: str, *variantes) -> str:
+        """Clave de caché de `nombre` con estas versiones y `variantes` (valores que cambian el resultado)."""
+        firma = repr((nombre, variantes, sorted(self.versiones.items())))
+        return PREFIJO + hashlib.sha1(firma.encode()).hexdigest()
+
+    def memo(self, nombre: str, calcular: Callable[[], T], *variantes) -> T:
+        """Resultado cacheado de `calcular()`; se recalcula al cambiar alguna versión."""
+        clave = self.clave(nombre, *variantes)
+        valor = cache.get(clave, _FALTA)
+        if valor is _FALTA:
+            valor = calcular()
+            cache.set(clave, valor, TTL)
+        return valor
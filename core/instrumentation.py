@@ -0,0 +1,341 @@
+"""
+Instrumentación por vista: cantidad y tiempo de SQL, tiempo de render de
+plantillas y latencia total de cada request.
+
+`InstrumentationMiddleware` mide cada request y lo suma al registro en
+memoria del proceso (`registry`), que se expone en formato Prometheus
+(`/metrics`) y como resumen de las últimas muestras por vista
+(`/metrics/resumen`). Los valores son por proceso: con varios workers,
+Prometheus debe raspar cada uno o sumar las series.
+
+`settings.QUERY_BUDGETS` (`{nombre_de_url_o_ruta: máximo_de_consultas}`)
+define presupuestos de consultas por vista. Un request que los excede se
+registra como advertencia y, con `QUERY_BUDGET_STRICT = True` (pensado
+para la suite de tests), lanza `QueryBudgetExceeded`.
+"""
+from __future__ import annotations
+
+import bisect
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Deque, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import connections
+from django.urls import resolve
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+# Muestras recientes que se guardan por vista para el resumen.
+WINDOW = 500
+UNRESOLVED = "<sin_ruta>"
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@dataclass
+class RequestStats:
+    sql_count: int = 0
+    sql_time: float = 0.0
+    template_time: float = 0.0
+    total_time: float = 0.0
+    template_depth: int = 0
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("instrumentation_stats", default=None)
+
+
+def current_stats() -> Optional[RequestStats]:
+    return _current.get()
+
+
+# ---------------------------------------------------------------------------
+# Registro
+# ---------------------------------------------------------------------------
+
+def _percentile(valores: List[float], p: float) -> Optional[float]:
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(p * len(ordenados)))]
+
+
+@dataclass
+class ViewMetrics:
+    requests: int = 0
+    latency_sum: float = 0.0
+    sql_count_sum: int = 0
+    sql_time_sum: float = 0.0
+    template_time_sum: float = 0.0
+    statuses: Dict[Tuple[str, int], int] = field(default_factory=dict)
+    latency_buckets: List[int] = field(default_factory=lambda: [0] * len(LATENCY_BUCKETS))
+    query_buckets: List[int] = field(default_factory=lambda: [0] * len(QUERY_BUCKETS))
+    # (latencia, consultas, tiempo SQL, tiempo de plantillas)
+    recent: Deque[Tuple[float, int, float, float]] = field(default_factory=lambda: deque(maxlen=WINDOW))
+
+    def add(self, method: str, status: int, stats: RequestStats) -> None:
+        self.requests += 1
+        self.latency_sum += stats.total_time
+        self.sql_count_sum += stats.sql_count
+        self.sql_time_sum += stats.sql_time
+        self.template_time_sum += stats.template_time
+        self.statuses[(method, status)] = self.statuses.get((method, status), 0) + 1
+        indice = bisect.bisect_left(LATENCY_BUCKETS, stats.total_time)
+        if indice < len(LATENCY_BUCKETS):
+            self.latency_buckets[indice] += 1
+        indice = bisect.bisect_left(QUERY_BUCKETS, stats.sql_count)
+        if indice < len(QUERY_BUCKETS):
+            self.query_buckets[indice] += 1
+        self.recent.append((stats.total_time, stats.sql_count, stats.sql_time, stats.template_time))
+
+    def summary(self) -> dict:
+        muestras = list(self.recent)
+        latencias = [muestra[0] for muestra in muestras]
+        consultas = [muestra[1] for muestra in muestras]
+        cantidad = len(muestras) or 1
+        return {
+            "requests": self.requests,
+            "muestras": len(muestras),
+            "latencia_p50_ms": _ms(_percentile(latencias, 0.5)),
+            "latencia_p95_ms": _ms(_percentile(latencias, 0.95)),
+            "latencia_max_ms": _ms(max(latencias, default=None)),
+            "consultas_promedio": round(sum(consultas) / cantidad, 1),
+            "consultas_max": max(consultas, default=0),
+            "sql_promedio_ms": _ms(sum(muestra[2] for muestra in muestras) / cantidad),
+            "plantillas_promedio_ms": _ms(sum(muestra[3] for muestra in muestras) / cantidad),
+        }
+
+
+def _ms(segundos: Optional[float]) -> Optional[float]:
+    return None if segundos is None else round(segundos * 1000, 1)
+
+
+def _label(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _cumulative(buckets: List[int], limites, total: int, nombre: str, vista: str) -> List[str]:
+    lineas, acumulado = [], 0
+    for limite, valor in zip(limites, buckets):
+        acumulado += valor
+        lineas.append(f'{nombre}_bucket{{view="{vista}",le="{limite}"}} {acumulado}')
+    lineas.append(f'{nombre}_bucket{{view="{vista}",le="+Inf"}} {total}')
+    return lineas
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views: Dict[str, ViewMetrics] = {}
+
+    def record(self, view: str, method: str, status: int, stats: RequestStats) -> None:
+        with self._lock:
+            self._views.setdefault(view, ViewMetrics()).add(method, status, stats)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._views.clear()
+
+    def summary(self) -> List[dict]:
+        """Resumen de la ventana reciente por vista, las de más consultas primero."""
+        with self._lock:
+            filas = [{"vista": vista, **metricas.summary()} for vista, metricas in self._views.items()]
+        return sorted(filas, key=lambda fila: (-fila["consultas_promedio"], fila["vista"]))
+
+    def prometheus(self) -> str:
+        with self._lock:
+            vistas = sorted(self._views.items())
+            lineas = [
+                "# HELP django_view_requests_total Requests atendidos por vista, método y status.",
+                "# TYPE django_view_requests_total counter",
+            ]
+            for vista, metricas in vistas:
+                for (metodo, status), valor in sorted(metricas.statuses.items()):
+                    lineas.append(
+                        f'django_view_requests_total{{view="{_label(vista)}",method="{metodo}",status="{status}"}} {valor}'
+                    )
+
+            lineas += [
+                "# HELP django_view_latency_seconds Latencia total del request.",
+                "# TYPE django_view_latency_seconds histogram",
+            ]
+            for vista, metricas in vistas:
+                etiqueta = _label(vista)
+                lineas += _cumulative(metricas.latency_buckets, LATENCY_BUCKETS, metricas.requests,
+                                      "django_view_latency_seconds", etiqueta)
+                lineas.append(f'django_view_latency_seconds_sum{{view="{etiqueta}"}} {metricas.latency_sum:.6f}')
+                lineas.append(f'django_view_latency_seconds_count{{view="{etiqueta}"}} {metricas.requests}')
+
+            lineas += [
+                "# HELP django_view_sql_queries Consultas SQL por request.",
+                "# TYPE django_view_sql_queries histogram",
+            ]
+            for vista, metricas in vistas:
+                etiqueta = _label(vista)
+                lineas += _cumulative(metricas.query_buckets, QUERY_BUCKETS, metricas.requests,
+                                      "django_view_sql_queries", etiqueta)
+                lineas.append(f'django_view_sql_queries_sum{{view="{etiqueta}"}} {metricas.sql_count_sum}')
+                lineas.append(f'django_view_sql_queries_count{{view="{etiqueta}"}} {metricas.requests}')
+
+            for nombre, ayuda, atributo in (
+                ("django_view_sql_seconds_total", "Tiempo acumulado en SQL.", "sql_time_sum"),
+                ("django_view_template_seconds_total", "Tiempo acumulado renderizando plantillas.",
+                 "template_time_sum"),
+            ):
+                lineas += [f"# HELP {nombre} {ayuda}", f"# TYPE {nombre} counter"]
+                for vista, metricas in vistas:
+                    lineas.append(f'{nombre}{{view="{_label(vista)}"}} {getattr(metricas, atributo):.6f}')
+        return "\n".join(lineas) + "\n"
+
+
+registry = Registry()
+
+
+# ---------------------------------------------------------------------------
+# Medición
+# ---------------------------------------------------------------------------
+
+def _sql_timer(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.sql_count += 1
+        stats.sql_time += time.perf_counter() - inicio
+
+
+def install_template_timer() -> None:
+    """
+    Envuelve `Template.render` del backend de Django para medir el render.
+    Solo se cuenta el render más externo, así que los `render_to_string`
+    anidados (p. ej. desde un template tag) no se suman dos veces.
+    """
+    from django.template.backends.django import Template
+
+    if getattr(Template.render, "_instrumentado", False):
+        return
+    original = Template.render
+
+    def render(self, context=None, request=None):
+        stats = _current.get()
+        if stats is None:
+            return original(self, context, request)
+        stats.template_depth += 1
+        inicio = time.perf_counter()
+        try:
+            return original(self, context, request)
+        finally:
+            stats.template_depth -= 1
+            if not stats.template_depth:
+                stats.template_time += time.perf_counter() - inicio
+
+    render._instrumentado = True
+    Template.render = render
+
+
+def view_name(request) -> str:
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return UNRESOLVED
+    return match.view_name or match._func_path
+
+
+def query_budget(request) -> Optional[int]:
+    budgets = getattr(settings, "QUERY_BUDGETS", {})
+    if not budgets:
+        return None
+    match = getattr(request, "resolver_match", None)
+    if match is not None and match.view_name in budgets:
+        return budgets[match.view_name]
+    return budgets.get(request.path_info)
+
+
+class InstrumentationMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        inicio = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(_sql_timer))
+                response = self.get_response(request)
+        finally:
+            stats.total_time = time.perf_counter() - inicio
+            _current.reset(token)
+
+        vista = view_name(request)
+        registry.record(vista, request.method, response.status_code, stats)
+        if settings.DEBUG:
+            response["X-Query-Count"] = str(stats.sql_count)
+
+        presupuesto = query_budget(request)
+        if presupuesto is not None and stats.sql_count > presupuesto:
+            mensaje = (
+                f"{vista} ({request.path_info}) ejecutó {stats.sql_count} consultas; "
+                f"el presupuesto es {presupuesto}."
+            )
+            if getattr(settings, "QUERY_BUDGET_STRICT", False):
+                raise QueryBudgetExceeded(mensaje)
+            logger.warning(mensaje)
+        return response
+
+
+# ---------------------------------------------------------------------------
+# Tests
+# ---------------------------------------------------------------------------
+
+class QueryBudgetTestMixin:
+    """
+    Para `TestCase`: `query_budgets = {url: máximo}` declara presupuestos
+    que `assertQueryBudgets()` recorre con `self.client` (ya autenticado
+    por el test); `assertQueryBudget(url, máximo)` comprueba uno solo. Si no
+    se indica máximo se usa el de `settings.QUERY_BUDGETS` para esa URL.
+
+    Se mide un request en régimen, el que ve el middleware casi siempre:
+    con `calentar` (por omisión) se hace antes uno igual, que carga el
+    contexto de roles en la sesión, el directorio y los catálogos del
+    proceso y los valores memorizados. Para métodos con efectos usar
+    `calentar=False`.
+    """
+
+    query_budgets: Dict[str, int] = {}
+
+    def assertQueryBudget(self, url: str, max_queries: Optional[int] = None, method: str = "get",
+                          calentar: bool = True, **kwargs):
+        if max_queries is None:
+            budgets = getattr(settings, "QUERY_BUDGETS", {})
+            ruta = url.split("?", 1)[0]
+            max_queries = budgets.get(resolve(ruta).view_name, budgets.get(ruta))
+        if max_queries is None:
+            self.fail(f"No hay presupuesto de consultas para {url}.")
+        from django.test.utils import CaptureQueriesContext
+
+        if calentar:
+            getattr(self.client, method)(url, **kwargs)
+        with CaptureQueriesContext(connections["default"]) as consultas:
+            response = getattr(self.client, method)(url, **kwargs)
+        if len(consultas) > max_queries:
+            detalle = "\n".join(f"  {consulta['sql']}" for consulta in consultas.captured_queries)
+            self.fail(f"{url} ejecutó {len(consultas)} consultas (máximo {max_queries}):\n{detalle}")
+        return response
+
+    def assertQueryBudgets(self):
+        for url, max_queries in self.query_budgets.items():
+            with self.subTest(url=url):
+                self.assertQueryBudget(url, max_queries)
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import benchmark
+from registration.models import Profile
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide p50/p95 de latencia y consultas SQL de los dashboards y listados "
+        "como cada rol, y opcionalmente compara contra una línea base guardada."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeticiones", type=int, default=20)
+        parser.add_argument("--calentamiento", type=int, default=1)
+        parser.add_argument("--rol", action="append", choices=Profile.Role.values, dest="roles",
+                            help="Limita a uno o más roles.")
+        parser.add_argument("--prefijo-usuario", default="",
+                            help="Usa usuarios cuyo username empiece así (p. ej. los de generar_municipio).")
+        parser.add_argument("--guardar", metavar="ARCHIVO", help="Guarda los resultados como línea base JSON.")
+        parser.add_argument("--comparar", metavar="ARCHIVO", help="Compara contra una línea base JSON.")
+        parser.add_argument("--tolerancia", type=float, default=0.2,
+                            help="Empeoramiento de p95 tolerado (0.2 = 20%%).")
+
+    def handle(self, *args, **options):
+        if options["repeticiones"] < 1:
+            raise CommandError("--repeticiones debe ser al menos 1.")
+        base = None
+        if options["comparar"]:
+            try:
+                base = benchmark.cargar(options["comparar"])
+            except (OSError, ValueError) as error:
+                raise CommandError(f"No se pudo leer la línea base: {error}")
+
+        mediciones = benchmark.ejecutar(
+            repeticiones=options["repeticiones"],
+            calentamiento=options["calentamiento"],
+            roles=options["roles"],
+            prefijo_usuario=options["prefijo_usuario"],
+            avisar=self.stdout.write,
+        )
+        if not mediciones:
+            raise CommandError("No se midió ninguna vista (¿faltan usuarios con rol?).")
+
+        if options["guardar"]:
+            benchmark.guardar(mediciones, options["guardar"])
+            self.stdout.write(self.style.SUCCESS(f"Línea base guardada en {options['guardar']}."))
+
+        if base is not None:
+            regresiones = benchmark.comparar(mediciones, base, options["tolerancia"])
+            if regresiones:
+                for regresion in regresiones:
+                    self.stdout.write(self.style.ERROR(f"  {regresion}"))
+                raise CommandError(f"{len(regresiones)} regresiones respecto de {options['comparar']}.")
+            self.stdout.write(self.style.SUCCESS("Sin regresiones respecto de la línea base."))
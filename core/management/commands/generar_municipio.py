@@ -0,0 +1,51 @@
+import time
+from dataclasses import asdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import synthetic
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera una municipalidad sintética (direcciones, departamentos, cuadrillas, "
+        "territoriales, usuarios con rol, encuestas y solicitudes con respuestas y logs) "
+        "mediante inserciones masivas, para medir las vistas a escala de producción."
+    )
+
+    def add_arguments(self, parser):
+        escala = synthetic.Escala()
+        parser.add_argument("--direcciones", type=int, default=escala.direcciones)
+        parser.add_argument("--departamentos-por-direccion", type=int, default=escala.departamentos_por_direccion)
+        parser.add_argument("--cuadrillas-por-departamento", type=int, default=escala.cuadrillas_por_departamento)
+        parser.add_argument("--territoriales", type=int, default=escala.territoriales)
+        parser.add_argument("--preguntas-por-encuesta", type=int, default=escala.preguntas_por_encuesta)
+        parser.add_argument("--solicitudes", type=int, default=escala.solicitudes)
+        parser.add_argument("--dias", type=int, default=escala.dias, help="Antigüedad máxima de las solicitudes.")
+        parser.add_argument("--prefijo", default=escala.prefijo, help="Prefijo de nombres y usuarios generados.")
+        parser.add_argument("--password", default=escala.password)
+        parser.add_argument("--semilla", type=int, default=escala.semilla)
+        parser.add_argument(
+            "--sin-busqueda",
+            action="store_true",
+            help="No regenera el índice de búsqueda (usar luego reindexar_busqueda).",
+        )
+
+    def handle(self, *args, **options):
+        escala = synthetic.Escala(**{
+            campo: options[campo] for campo in asdict(synthetic.Escala()) if campo in options
+        })
+        if min(escala.direcciones, escala.departamentos_por_direccion,
+               escala.cuadrillas_por_departamento, escala.territoriales) < 1:
+            raise CommandError("Se necesita al menos una dirección, departamento, cuadrilla y territorial.")
+
+        generador = synthetic.Generador(escala, avisar=self.stdout.write)
+        if generador.existe():
+            raise CommandError(f"Ya hay datos con el prefijo '{escala.prefijo}'; usa otro --prefijo.")
+
+        inicio = time.monotonic()
+        resultado = generador.generar(indexar_busqueda=not options["sin_busqueda"])
+        resumen = ", ".join(f"{campo}={valor}" for campo, valor in asdict(resultado).items())
+        self.stdout.write(self.style.SUCCESS(
+            f"Municipalidad '{escala.prefijo}' generada en {time.monotonic() - inicio:.1f}s: {resumen}."
+        ))
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.4 on 2025-11-24 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Version',
+            fields=[
+                ('clave', models.CharField(db_column='Clave', max_length=150, primary_key=True, serialize=False)),
+                ('numero', models.PositiveBigIntegerField(db_column='Numero', default=0)),
+            ],
+            options={
+                'verbose_name': 'Versión',
+                'verbose_name_plural': 'Versiones',
+            },
+        ),
+    ]
@@ -1,3 +1,20 @@
 from django.db import models
 
-# Create your models here.
+
+class Version(models.Model):
+    """
+    Contador de versión por clave.
+
+    Se incrementa cada vez que cambia el dato que identifica la clave
+    (por ejemplo los roles de un usuario) para invalidar las copias
+    guardadas en sesión o en memoria.
+    """
+    clave = models.CharField(max_length=150, primary_key=True, db_column='Clave')
+    numero = models.PositiveBigIntegerField(default=0, db_column='Numero')
+
+    class Meta:
+        verbose_name = 'Versión'
+        verbose_name_plural = 'Versiones'
+
+    def __str__(self):
+        return f"{self.clave} v{self.numero}"
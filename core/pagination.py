@@ -0,0 +1,201 @@
+"""
+Paginación por cursor (keyset) para los listados.
+
+A diferencia de `django.core.paginator.Paginator`, no ejecuta `COUNT(*)` ni
+`OFFSET`: cada página filtra a partir de la última fila vista usando las
+columnas de orden, por lo que una página profunda cuesta lo mismo que la
+primera. Los cursores son tokens opacos (base64 de los valores de orden).
+"""
+from __future__ import annotations
+
+import base64
+import binascii
+import datetime
+import json
+from typing import List, Optional, Sequence
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+CURSOR_PARAM = "cursor"
+
+ADELANTE = "n"
+ATRAS = "p"
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class _CursorEncoder(DjangoJSONEncoder):
+    """Conserva los microsegundos (DjangoJSONEncoder los trunca a milisegundos)."""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class KeysetPage:
+    """Página de resultados; iterable como un `Page` de Django."""
+
+    def __init__(self, object_list, has_next, has_previous, next_token=None, previous_token=None):
+        self.object_list = object_list
+        self.has_next_page = has_next
+        self.has_previous_page = has_previous
+        self.next_token = next_token
+        self.previous_token = previous_token
+
+    def has_next(self) -> bool:
+        return self.has_next_page
+
+    def has_previous(self) -> bool:
+        return self.has_previous_page
+
+    def has_other_pages(self) -> bool:
+        return self.has_next_page or self.has_previous_page
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+
+class KeysetPaginator:
+    """
+    Pagina un queryset por cursor sobre `ordering`.
+
+    `ordering` debe identificar cada fila de forma única (terminar en la PK)
+    y sus columnas no deben ser nulas. Acepta campos relacionados con `__`
+    y anotaciones del queryset (p. ej. un ranking de búsqueda).
+    """
+
+    def __init__(self, queryset, ordering: Sequence[str], per_page: int = 10):
+        self.queryset = queryset
+        self.ordering = list(ordering)
+        self.per_page = per_page
+        self._fields = [name.lstrip("-") for name in self.ordering]
+        self._descending = [name.startswith("-") for name in self.ordering]
+
+    # ------------------------------------------------------------------ tokens
+
+    def _encode(self, direction: str, obj) -> str:
+        values = [self._value_of(obj, field) for field in self._fields]
+        raw = json.dumps({"d": direction, "v": values}, cls=_CursorEncoder, separators=(",", ":"))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+    def _decode(self, token: str):
+        try:
+            padded = token + "=" * (-len(token) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+            direction, values = payload["d"], payload["v"]
+        except (binascii.Error, UnicodeDecodeError, ValueError, KeyError, TypeError):
+            raise InvalidCursor(token)
+        if direction not in (ADELANTE, ATRAS) or len(values) != len(self._fields):
+            raise InvalidCursor(token)
+        try:
+            values = [self._model_field(field).to_python(value) for field, value in zip(self._fields, values)]
+        except (FieldDoesNotExist, ValidationError):
+            raise InvalidCursor(token)
+        return direction, values
+
+    def _model_field(self, path: str):
+        annotation = self.queryset.query.annotations.get(path)
+        if annotation is not None:
+            return annotation.output_field
+        model = self.queryset.model
+        parts = path.split("__")
+        for part in parts[:-1]:
+            model = model._meta.get_field(part).related_model
+        field = model._meta.pk if parts[-1] == "pk" else model._meta.get_field(parts[-1])
+        if field.is_relation and field.target_field is not None:
+            return field.target_field
+        return field
+
+    @staticmethod
+    def _value_of(obj, path: str):
+        if path == "pk":
+            return obj.pk
+        value = obj
+        for part in path.split("__"):
+            value = getattr(value, part)
+        if hasattr(value, "_meta"):
+            value = value.pk
+        return value
+
+    # ---------------------------------------------------------------- queries
+
+    def _after(self, values, reverse: bool) -> Q:
+        """Filtro 'filas posteriores a `values`' en el orden (o el inverso si `reverse`)."""
+        condition = Q()
+        for index, field in enumerate(self._fields):
+            descending = self._descending[index] != reverse
+            lookup = "lt" if descending else "gt"
+            step = Q(**{f"{field}__{lookup}": values[index]})
+            for previous_field, previous_value in zip(self._fields[:index], values[:index]):
+                step &= Q(**{previous_field: previous_value})
+            condition |= step
+        return condition
+
+    def _ordering(self, reverse: bool) -> List[str]:
+        if not reverse:
+            return self.ordering
+        return [name[1:] if name.startswith("-") else f"-{name}" for name in self.ordering]
+
+    def page(self, token: Optional[str] = None) -> KeysetPage:
+        direction, values = ADELANTE, None
+        if token:
+            direction, values = self._decode(token)
+
+        reverse = direction == ATRAS
+        queryset = self.queryset.order_by(*self._ordering(reverse))
+        if values is not None:
+            queryset = queryset.filter(self._after(values, reverse))
+
+        rows = list(queryset[: self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+        if reverse and not has_more:
+            # Se alcanzó el inicio: mostrar la primera página completa.
+            return self.page(None)
+        if reverse:
+            rows.reverse()
+            has_next, has_previous = values is not None, has_more
+        else:
+            has_next, has_previous = has_more, values is not None
+
+        return KeysetPage(
+            rows,
+            has_next=has_next,
+            has_previous=has_previous,
+            next_token=self._encode(ADELANTE, rows[-1]) if has_next and rows else None,
+            previous_token=self._encode(ATRAS, rows[0]) if has_previous and rows else None,
+        )
+
+    def get_page(self, token: Optional[str] = None) -> KeysetPage:
+        """Como `page`, pero un cursor inválido devuelve la primera página."""
+        try:
+            return self.page(token)
+        except InvalidCursor:
+            return self.page(None)
+
+
+def paginate_request(request, queryset, ordering: Sequence[str], per_page: int = 10) -> KeysetPage:
+    return KeysetPaginator(queryset, ordering, per_page).get_page(request.GET.get(CURSOR_PARAM))
+
+
+def query_string_without_cursor(request) -> str:
+    """Parámetros GET actuales sin el cursor (ni el antiguo `page`), para armar los enlaces."""
+    query_params = request.GET.copy()
+    for param in (CURSOR_PARAM, "page"):
+        if param in query_params:
+            del query_params[param]
+    return query_params.urlencode()
@@ -0,0 +1,151 @@
+"""
+Resolución de roles del usuario autenticado.
+
+Grupos, `Profile.role_type`/`role_object_id` y memberships se cargan una
+sola vez (tres consultas) y se guardan en la sesión junto a la versión de
+roles del usuario. En cada request solo se consulta esa versión; si cambió (ver
+`invalidate_role_context`) se vuelve a cargar todo. Dentro de un mismo
+request el resultado queda memorizado en `request`.
+"""
+from __future__ import annotations
+
+from dataclasses import asdict, dataclass, field
+from typing import FrozenSet, Iterable, Optional, Tuple
+
+from django.contrib.auth.models import Group
+from django.db.models import Value
+
+from orgs.models import CuadrillaMembership, DepartamentoMembership, DireccionMembership
+from registration.models import Profile
+
+from .versions import bump_version, bump_versions, get_version
+
+SESSION_KEY = "_role_context"
+REQUEST_ATTR = "_role_context"
+
+
+def _version_key(user_id: int) -> str:
+    return f"roles:user:{user_id}"
+
+
+@dataclass(frozen=True)
+class RoleContext:
+    profile_id: Optional[int] = None
+    role_type: Optional[str] = None
+    role_object_id: Optional[int] = None
+    groups: FrozenSet[str] = field(default_factory=frozenset)
+    direccion_ids: Tuple[int, ...] = ()
+    departamento_ids: Tuple[int, ...] = ()
+    departamento_encargado_ids: Tuple[int, ...] = ()
+    cuadrilla_ids: Tuple[int, ...] = ()
+
+    def in_groups(self, *group_names: str) -> bool:
+        return not self.groups.isdisjoint(group_names)
+
+    @property
+    def role_label(self) -> str:
+        return Profile.Role(self.role_type).label if self.role_type in Profile.Role.values else ""
+
+    @property
+    def es_cuadrilla(self) -> bool:
+        return self.role_type == Profile.Role.CUADRILLA or any(
+            name.lower() == "cuadrilla" for name in self.groups
+        )
+
+    def to_session(self) -> dict:
+        data = asdict(self)
+        data["groups"] = sorted(self.groups)
+        return data
+
+    @classmethod
+    def from_session(cls, data: dict) -> "RoleContext":
+        return cls(
+            profile_id=data.get("profile_id"),
+            role_type=data.get("role_type"),
+            role_object_id=data.get("role_object_id"),
+            groups=frozenset(data.get("groups", ())),
+            direccion_ids=tuple(data.get("direccion_ids", ())),
+            departamento_ids=tuple(data.get("departamento_ids", ())),
+            departamento_encargado_ids=tuple(data.get("departamento_encargado_ids", ())),
+            cuadrilla_ids=tuple(data.get("cuadrilla_ids", ())),
+        )
+
+
+ANONYMOUS = RoleContext()
+
+
+def load_role_context(user) -> RoleContext:
+    """Carga el contexto de roles desde la base de datos (sin cache)."""
+    groups = frozenset(
+        Group.objects.filter(user=user).values_list("name", flat=True)
+    )
+    profile = (
+        Profile.objects.filter(user_id=user.pk)
+        .values("pk", "role_type", "role_object_id")
+        .first()
+    )
+    if not profile:
+        return RoleContext(groups=groups)
+
+    # Las tres memberships en una sola consulta (UNION ALL), ordenadas por PK en Python.
+    memberships = DepartamentoMembership.objects.filter(usuario_id_id=profile["pk"]).values_list(
+        Value("departamento"), "pk", "departamento_id", "es_encargado",
+    ).union(
+        DireccionMembership.objects.filter(usuario_id_id=profile["pk"]).values_list(
+            Value("direccion"), "pk", "direccion_id", Value(False),
+        ),
+        CuadrillaMembership.objects.filter(usuario_id_id=profile["pk"]).values_list(
+            Value("cuadrilla"), "pk", "cuadrilla_id", Value(False),
+        ),
+        all=True,
+    )
+    por_tipo = {"departamento": [], "direccion": [], "cuadrilla": []}
+    for tipo, _, objeto_id, encargado in sorted(memberships, key=lambda fila: fila[1]):
+        por_tipo[tipo].append((objeto_id, encargado))
+    return RoleContext(
+        profile_id=profile["pk"],
+        role_type=profile["role_type"],
+        role_object_id=profile["role_object_id"],
+        groups=groups,
+        direccion_ids=tuple(pk for pk, _ in por_tipo["direccion"]),
+        departamento_ids=tuple(pk for pk, _ in por_tipo["departamento"]),
+        departamento_encargado_ids=tuple(pk for pk, encargado in por_tipo["departamento"] if encargado),
+        cuadrilla_ids=tuple(pk for pk, _ in por_tipo["cuadrilla"]),
+    )
+
+
+def get_role_context(request) -> RoleContext:
+    """Contexto de roles del usuario del request (memorizado por request y por sesión)."""
+    cached = getattr(request, REQUEST_ATTR, None)
+    if cached is not None:
+        return cached
+
+    user = request.user
+    if not user.is_authenticated:
+        context = ANONYMOUS
+    else:
+        version = get_version(_version_key(user.pk))
+        stored = request.session.get(SESSION_KEY)
+        if stored and stored.get("user_id") == user.pk and stored.get("version") == version:
+            context = RoleContext.from_session(stored["data"])
+        else:
+            context = load_role_context(user)
+            request.session[SESSION_KEY] = {
+                "user_id": user.pk,
+                "version": version,
+                "data": context.to_session(),
+            }
+
+    setattr(request, REQUEST_ATTR, context)
+    return context
+
+
+def invalidate_role_context(user_id: Optional[int]) -> None:
+    """Fuerza a recargar los roles de `user_id` en su próximo request."""
+    if user_id:
+        bump_version(_version_key(user_id))
+
+
+def invalidate_role_contexts(user_ids: Iterable[Optional[int]]) -> None:
+    """`invalidate_role_context` para varios usuarios a la vez."""
+    bump_versions(_version_key(user_id) for user_id in user_ids if user_id)
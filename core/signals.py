@@ -0,0 +1,81 @@
+"""
+Invalida el contexto de roles cuando cambian los grupos de un usuario
+por fuera de `registration.utils` (admin, shell, fixtures) o se borra una
+membership u organización que le daba acceso, y el directorio de tablas
+de referencia (`core.directorio`) cuando cambia alguna de ellas.
+"""
+from django.contrib.auth.models import User
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from orgs.models import (
+    Cuadrilla,
+    CuadrillaMembership,
+    Departamento,
+    DepartamentoMembership,
+    Direccion,
+    DireccionMembership,
+    Secpla,
+    Territorial,
+)
+from registration.models import Profile
+
+from . import directorio
+from .roles import invalidate_role_context, invalidate_role_contexts
+
+# Rol (`Profile.role_type`) que apunta a cada modelo de organización.
+ROLES_DE_ORGANIZACION = {
+    Secpla: Profile.Role.SECPLA,
+    Direccion: Profile.Role.DIRECCION,
+    Departamento: Profile.Role.DEPARTAMENTO,
+    Cuadrilla: Profile.Role.CUADRILLA,
+    Territorial: Profile.Role.TERRITORIAL,
+}
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidar_roles_por_grupos(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        invalidate_role_context(instance.pk)
+    else:
+        for user_id in pk_set or ():
+            invalidate_role_context(user_id)
+
+
+@receiver(post_delete, sender=DireccionMembership)
+@receiver(post_delete, sender=DepartamentoMembership)
+@receiver(post_delete, sender=CuadrillaMembership)
+def invalidar_roles_por_membership(sender, instance, **kwargs):
+    invalidate_role_context(
+        Profile.objects.filter(pk=instance.usuario_id_id).values_list("user_id", flat=True).first()
+    )
+
+
+def invalidar_roles_por_organizacion(sender, instance, **kwargs):
+    invalidate_role_contexts(
+        Profile.objects.filter(
+            role_type=ROLES_DE_ORGANIZACION[sender], role_object_id=instance.pk
+        ).values_list("user_id", flat=True)
+    )
+
+
+for _modelo in ROLES_DE_ORGANIZACION:
+    post_delete.connect(
+        invalidar_roles_por_organizacion,
+        sender=_modelo,
+        dispatch_uid=f"roles_delete_{_modelo._meta.label_lower}",
+    )
+
+
+def invalidar_directorio(sender, raw=False, **kwargs):
+    if raw:
+        return
+    directorio.invalidar()
+
+
+for _modelo in directorio.MODELOS:
+    _uid = _modelo._meta.label_lower
+    post_save.connect(invalidar_directorio, sender=_modelo, dispatch_uid=f"directorio_save_{_uid}")
+    post_delete.connect(invalidar_directorio, sender=_modelo, dispatch_uid=f"directorio_delete_{_uid}")
@@ -0,0 +1,61 @@
+// Autocompletado para <select data-autocomplete-url> (ver core/widgets.py).
+// Agrega un buscador sobre el select y reemplaza las opciones no
+// seleccionadas por los resultados del endpoint JSON.
+(function () {
+    "use strict";
+
+    var DEMORA_MS = 250;
+
+    function cargar(select, buscador) {
+        var url = new URL(select.dataset.autocompleteUrl, window.location.href);
+        url.searchParams.set("q", buscador.value.trim());
+        fetch(url, { credentials: "same-origin", headers: { "Accept": "application/json" } })
+            .then(function (respuesta) { return respuesta.ok ? respuesta.json() : { results: [] }; })
+            .then(function (datos) {
+                var presentes = {};
+                Array.prototype.slice.call(select.options).forEach(function (opcion) {
+                    if (opcion.dataset.aviso || (opcion.value !== "" && !opcion.selected)) {
+                        opcion.remove();
+                    } else {
+                        presentes[opcion.value] = true;
+                    }
+                });
+                datos.results.forEach(function (item) {
+                    var id = String(item.id);
+                    if (!presentes[id]) {
+                        select.add(new Option(item.text, id));
+                    }
+                });
+                if (datos.more) {
+                    var aviso = new Option("… refina la búsqueda para ver más", "");
+                    aviso.disabled = true;
+                    aviso.dataset.aviso = "1";
+                    select.add(aviso);
+                }
+            });
+    }
+
+    function iniciar(select) {
+        if (select.dataset.autocompleteListo) {
+            return;
+        }
+        select.dataset.autocompleteListo = "1";
+        var buscador = document.createElement("input");
+        buscador.type = "search";
+        buscador.className = "form-control form-control-sm mb-1";
+        buscador.placeholder = "Buscar…";
+        buscador.autocomplete = "off";
+        select.parentNode.insertBefore(buscador, select);
+
+        var temporizador = null;
+        buscador.addEventListener("input", function () {
+            clearTimeout(temporizador);
+            temporizador = setTimeout(function () { cargar(select, buscador); }, DEMORA_MS);
+        });
+        cargar(select, buscador);
+    }
+
+    document.addEventListener("DOMContentLoaded", function () {
+        document.querySelectorAll("select[data-autocomplete-url]").forEach(iniciar);
+    });
+})();
@@ -0,0 +1,457 @@
+"""
+Generador de una municipalidad sintética para pruebas de carga.
+
+Todo se inserta con `bulk_create` por lotes, así que no se emiten señales:
+al terminar se reconstruyen explícitamente los contadores, las métricas SLA
+y (opcionalmente) el índice de búsqueda. Los nombres llevan el prefijo de
+la corrida para poder generar varias sobre la misma base sin chocar con
+restricciones de unicidad.
+
+Los usuarios generados comparten la contraseña indicada y se llaman
+`<prefijo>_<rol>_<n>` (en minúsculas), de modo que el benchmark (ver
+`core.benchmark`) puede entrar con cualquiera de ellos.
+"""
+from __future__ import annotations
+
+import random
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from catalogs.models import Incidencia
+from locations.espacial import METROS_POR_GRADO, geohash_de
+from locations.models import Ubicacion
+from orgs.models import (
+    Cuadrilla,
+    CuadrillaMembership,
+    Departamento,
+    DepartamentoMembership,
+    Direccion,
+    DireccionMembership,
+    Secpla,
+    Territorial,
+)
+from registration.models import Profile
+from surveys import respuestas as respuestas_encuesta
+from surveys.models import Encuesta, HojaRespuestas, Pregunta, Respuesta, VersionEncuesta
+from tickets.models import IncidenciaLog, SolicitudIncidencia
+
+from . import directorio
+from .caching import invalidate_models
+
+LOTE = 5000
+
+# Grupos que revisan `role_required` y `RoleContext`.
+GRUPOS = {
+    Profile.Role.SECPLA: "Secpla",
+    Profile.Role.DIRECCION: "Direcciones",
+    Profile.Role.DEPARTAMENTO: "Departamentos",
+    Profile.Role.CUADRILLA: "Cuadrillas",
+    Profile.Role.TERRITORIAL: "Territoriales",
+}
+
+# Estado final de cada solicitud y su peso relativo.
+DISTRIBUCION_ESTADOS = (
+    ("Pendiente", 12),
+    ("Derivada", 10),
+    ("En Proceso", 13),
+    ("Finalizada", 15),
+    ("Aprobada", 40),
+    ("Rechazada", 10),
+)
+# Camino de estados que lleva a cada estado final.
+CAMINOS = {
+    "Pendiente": ["Pendiente"],
+    "Derivada": ["Pendiente", "Derivada"],
+    "En Proceso": ["Pendiente", "Derivada", "En Proceso"],
+    "Finalizada": ["Pendiente", "Derivada", "En Proceso", "Finalizada"],
+    "Aprobada": ["Pendiente", "Derivada", "En Proceso", "Finalizada", "Aprobada"],
+    "Rechazada": ["Pendiente", "Derivada", "En Proceso", "Finalizada", "Rechazada"],
+}
+# Horas típicas de cada transición (media de una distribución exponencial).
+HORAS_TRANSICION = {"Derivada": 6, "En Proceso": 18, "Finalizada": 48, "Aprobada": 24, "Rechazada": 24}
+
+CALLES = (
+    "Av. Libertador", "Los Aromos", "Pedro de Valdivia", "Arturo Prat", "O'Higgins",
+    "Los Carrera", "Baquedano", "San Martín", "Manuel Rodríguez", "Bulnes",
+)
+PROBLEMAS = (
+    "bache en la calzada", "luminaria apagada", "microbasural", "árbol con riesgo de caída",
+    "semáforo intermitente", "vereda en mal estado", "filtración de agua", "señalética dañada",
+    "grafiti en muro municipal", "sumidero tapado",
+)
+TIPOS_POR_DEPARTAMENTO = 2
+
+# Las solicitudes y las bases de cuadrilla caen en un cuadrado de
+# 2 * RADIO_METROS de lado alrededor de CENTRO (lat, lon).
+CENTRO = (-33.45, -70.65)
+RADIO_METROS = 10_000
+
+
+@dataclass
+class Escala:
+    direcciones: int = 5
+    departamentos_por_direccion: int = 4
+    cuadrillas_por_departamento: int = 3
+    territoriales: int = 20
+    preguntas_por_encuesta: int = 4
+    solicitudes: int = 100_000
+    dias: int = 365
+    prefijo: str = "Sintética"
+    password: str = "pass1234"
+    semilla: int = 1
+
+
+@dataclass
+class Resultado:
+    direcciones: int = 0
+    departamentos: int = 0
+    cuadrillas: int = 0
+    territoriales: int = 0
+    usuarios: int = 0
+    encuestas: int = 0
+    preguntas: int = 0
+    solicitudes: int = 0
+    respuestas: int = 0
+    logs: int = 0
+
+
+class Generador:
+    def __init__(self, escala: Escala, avisar: Optional[Callable[[str], None]] = None):
+        self.escala = escala
+        self.azar = random.Random(escala.semilla)
+        self.avisar = avisar or (lambda mensaje: None)
+        self.resultado = Resultado()
+        self.slug = slugify(escala.prefijo).replace("-", "_") or "sintetica"
+
+    # ------------------------------------------------------------ utilidades
+
+    def _nombre(self, texto: str) -> str:
+        return f"{self.escala.prefijo} {texto}"
+
+    def _ubicacion(self, calle: str, numero: str) -> Ubicacion:
+        """Punto al azar en la zona; `bulk_create` no pasa por `save()`, así que el geohash va explícito."""
+        grados = RADIO_METROS / METROS_POR_GRADO
+        latitud = CENTRO[0] + self.azar.uniform(-grados, grados)
+        longitud = CENTRO[1] + self.azar.uniform(-grados, grados)
+        return Ubicacion(
+            calle=calle, numero_casa=numero, latitud=latitud, longitud=longitud,
+            geohash=geohash_de(latitud, longitud),
+        )
+
+    def existe(self) -> bool:
+        return Direccion.objects.filter(nombre__startswith=f"{self.escala.prefijo} ").exists()
+
+    # ------------------------------------------------------------ estructura
+
+    @transaction.atomic
+    def estructura(self) -> None:
+        escala = self.escala
+        direcciones = Direccion.objects.bulk_create(
+            Direccion(nombre=self._nombre(f"Dirección {i + 1}")) for i in range(escala.direcciones)
+        )
+        departamentos = Departamento.objects.bulk_create(
+            Departamento(nombre=self._nombre(f"Departamento {d + 1}.{i + 1}"), direccion=direccion)
+            for d, direccion in enumerate(direcciones)
+            for i in range(escala.departamentos_por_direccion)
+        )
+        nombres_cuadrillas = [
+            (self._nombre(f"Cuadrilla {d + 1}.{i + 1}"), departamento)
+            for d, departamento in enumerate(departamentos)
+            for i in range(escala.cuadrillas_por_departamento)
+        ]
+        bases = Ubicacion.objects.bulk_create(
+            self._ubicacion(f"Base {nombre}", "s/n") for nombre, _ in nombres_cuadrillas
+        )
+        cuadrillas = Cuadrilla.objects.bulk_create(
+            Cuadrilla(nombre=nombre, departamento=departamento, base=base)
+            for (nombre, departamento), base in zip(nombres_cuadrillas, bases)
+        )
+
+        encuestas, tipos = [], []
+        for departamento in departamentos:
+            for i in range(TIPOS_POR_DEPARTAMENTO):
+                problema = PROBLEMAS[(len(encuestas)) % len(PROBLEMAS)]
+                encuestas.append(Encuesta(
+                    titulo=self._nombre(f"{problema.capitalize()} ({departamento.pk}-{i + 1})"),
+                    descripcion=f"Encuesta generada para reportar {problema}.",
+                    prioridad=self.azar.choice(("Alta", "Media", "Baja")),
+                    tipo_incidencia=problema,
+                ))
+        encuestas = Encuesta.objects.bulk_create(encuestas)
+        for indice, encuesta in enumerate(encuestas):
+            departamento = departamentos[indice // TIPOS_POR_DEPARTAMENTO]
+            tipos.append(Incidencia(
+                nombre=encuesta.tipo_incidencia.capitalize(),
+                descripcion=encuesta.descripcion,
+                direccion_id=departamento.direccion_id,
+                departamento=departamento,
+                encuesta=encuesta,
+            ))
+        tipos = Incidencia.objects.bulk_create(tipos)
+        preguntas = Pregunta.objects.bulk_create(
+            Pregunta(nombre=f"Pregunta {i + 1} de {encuesta.titulo}"[:200], encuesta=encuesta)
+            for encuesta in encuestas
+            for i in range(escala.preguntas_por_encuesta)
+        )
+
+        territoriales = Territorial.objects.bulk_create(
+            Territorial(nombre=self._nombre(f"Territorial {i + 1}")) for i in range(escala.territoriales)
+        )
+
+        self.direcciones, self.departamentos, self.cuadrillas = direcciones, departamentos, cuadrillas
+        self.territoriales, self.tipos = territoriales, tipos
+        self.preguntas_por_encuesta: Dict[int, List[int]] = {}
+        for pregunta in preguntas:
+            self.preguntas_por_encuesta.setdefault(pregunta.encuesta_id, []).append(pregunta.pk)
+        # Las hojas de respuestas quedan fijadas a la primera versión de cada encuesta.
+        nombres = {pregunta.pk: pregunta.nombre for pregunta in preguntas}
+        versiones = VersionEncuesta.objects.bulk_create(
+            VersionEncuesta(
+                encuesta_id=encuesta_id,
+                numero=1,
+                preguntas=[[pregunta_id, nombres[pregunta_id]] for pregunta_id in sorted(ids)],
+            )
+            for encuesta_id, ids in self.preguntas_por_encuesta.items()
+        )
+        self.version_por_encuesta = {version.encuesta_id: version.pk for version in versiones}
+        self.cuadrillas_por_departamento: Dict[int, List[Cuadrilla]] = {}
+        for cuadrilla in cuadrillas:
+            self.cuadrillas_por_departamento.setdefault(cuadrilla.departamento_id, []).append(cuadrilla)
+
+        resultado = self.resultado
+        resultado.direcciones, resultado.departamentos = len(direcciones), len(departamentos)
+        resultado.cuadrillas, resultado.territoriales = len(cuadrillas), len(territoriales)
+        resultado.encuestas, resultado.preguntas = len(encuestas), len(preguntas)
+        self.avisar(
+            f"Estructura: {len(direcciones)} direcciones, {len(departamentos)} departamentos, "
+            f"{len(cuadrillas)} cuadrillas, {len(territoriales)} territoriales, {len(encuestas)} encuestas."
+        )
+
+    # -------------------------------------------------------------- usuarios
+
+    @transaction.atomic
+    def usuarios(self) -> None:
+        """Un usuario por dirección, departamento (encargado), cuadrilla y territorial, más uno de Secpla."""
+        grupos = {
+            rol: Group.objects.get_or_create(name=nombre)[0] for rol, nombre in GRUPOS.items()
+        }
+        secpla = Secpla.objects.create(nombre=self._nombre("Secpla"))
+
+        asignaciones: List[Tuple[str, object]] = [(Profile.Role.SECPLA, secpla)]
+        asignaciones += [(Profile.Role.DIRECCION, objeto) for objeto in self.direcciones]
+        asignaciones += [(Profile.Role.DEPARTAMENTO, objeto) for objeto in self.departamentos]
+        asignaciones += [(Profile.Role.CUADRILLA, objeto) for objeto in self.cuadrillas]
+        asignaciones += [(Profile.Role.TERRITORIAL, objeto) for objeto in self.territoriales]
+
+        password = make_password(self.escala.password)
+        contadores: Dict[str, int] = {}
+        usuarios = []
+        for rol, _ in asignaciones:
+            contadores[rol] = contadores.get(rol, 0) + 1
+            usuarios.append(User(
+                username=f"{self.slug}_{rol}_{contadores[rol]}",
+                password=password,
+                first_name=self.escala.prefijo,
+                last_name=f"{rol.label} {contadores[rol]}",
+                email=f"{self.slug}_{rol}_{contadores[rol]}@example.com",
+            ))
+        usuarios = User.objects.bulk_create(usuarios, batch_size=LOTE)
+        if any(usuario.pk is None for usuario in usuarios):
+            # Backends sin RETURNING: se recuperan los ids por username.
+            ids = dict(User.objects.filter(username__startswith=f"{self.slug}_").values_list("username", "pk"))
+            for usuario in usuarios:
+                usuario.pk = usuario.id = ids[usuario.username]
+
+        perfiles = Profile.objects.bulk_create(
+            (
+                Profile(user=usuario, group=grupos[rol], role_type=rol, role_object_id=objeto.pk)
+                for usuario, (rol, objeto) in zip(usuarios, asignaciones)
+            ),
+            batch_size=LOTE,
+        )
+        User.groups.through.objects.bulk_create(
+            (
+                User.groups.through(user_id=usuario.pk, group_id=grupos[rol].pk)
+                for usuario, (rol, _) in zip(usuarios, asignaciones)
+            ),
+            batch_size=LOTE,
+        )
+
+        direccion_memberships, departamento_memberships, cuadrilla_memberships = [], [], []
+        territoriales = []
+        for perfil, (rol, objeto) in zip(perfiles, asignaciones):
+            if rol == Profile.Role.SECPLA:
+                objeto.profile = perfil
+                objeto.save(update_fields=["profile"])
+            elif rol == Profile.Role.DIRECCION:
+                direccion_memberships.append(DireccionMembership(direccion=objeto, usuario_id=perfil, es_encargado=True))
+            elif rol == Profile.Role.DEPARTAMENTO:
+                departamento_memberships.append(
+                    DepartamentoMembership(departamento=objeto, usuario_id=perfil, es_encargado=True)
+                )
+            elif rol == Profile.Role.CUADRILLA:
+                cuadrilla_memberships.append(CuadrillaMembership(cuadrilla=objeto, usuario_id=perfil))
+            else:
+                objeto.profile = perfil
+                territoriales.append(objeto)
+        DireccionMembership.objects.bulk_create(direccion_memberships, batch_size=LOTE)
+        DepartamentoMembership.objects.bulk_create(departamento_memberships, batch_size=LOTE)
+        CuadrillaMembership.objects.bulk_create(cuadrilla_memberships, batch_size=LOTE)
+        Territorial.objects.bulk_update(territoriales, ["profile"], batch_size=LOTE)
+
+        self.perfiles_por_rol: Dict[str, List[int]] = {}
+        for perfil, (rol, _) in zip(perfiles, asignaciones):
+            self.perfiles_por_rol.setdefault(rol, []).append(perfil.pk)
+        self.perfil_de_cuadrilla = {
+            membership.cuadrilla_id: membership.usuario_id_id for membership in cuadrilla_memberships
+        }
+        self.perfil_de_departamento = {
+            membership.departamento_id: membership.usuario_id_id for membership in departamento_memberships
+        }
+        self.perfil_de_territorial = {objeto.pk: objeto.profile_id for objeto in territoriales}
+        self.resultado.usuarios = len(usuarios)
+        self.avisar(f"Usuarios: {len(usuarios)} (contraseña '{self.escala.password}').")
+
+    # ----------------------------------------------------------- solicitudes
+
+    def _fechas(self, estados: Sequence[str], inicio) -> List:
+        fechas, momento = [inicio], inicio
+        for estado in estados[1:]:
+            momento = momento + timedelta(hours=self.azar.expovariate(1 / HORAS_TRANSICION[estado]))
+            fechas.append(momento)
+        return fechas
+
+    def _perfil_para(self, estado: str, solicitud) -> int:
+        """Perfil que plausiblemente hizo la transición: cuadrilla, encargado o territorial."""
+        if estado == "Finalizada":
+            return self.perfil_de_cuadrilla[solicitud.cuadrilla_id]
+        if estado in ("Derivada", "En Proceso"):
+            return self.perfil_de_departamento[solicitud.cuadrilla.departamento_id]
+        return self.perfil_de_territorial[solicitud.territorial_id]
+
+    def _lote_solicitudes(self, cantidad: int, ahora) -> None:
+        estados_finales = self.azar.choices(
+            [estado for estado, _ in DISTRIBUCION_ESTADOS],
+            weights=[peso for _, peso in DISTRIBUCION_ESTADOS],
+            k=cantidad,
+        )
+        puntos = Ubicacion.objects.bulk_create(
+            self._ubicacion(self.azar.choice(CALLES), str(self.azar.randint(1, 3000)))
+            for _ in estados_finales
+        )
+        solicitudes, caminos = [], []
+        for estado, punto in zip(estados_finales, puntos):
+            tipo = self.azar.choice(self.tipos)
+            cuadrilla = None
+            if estado != "Pendiente":
+                cuadrilla = self.azar.choice(self.cuadrillas_por_departamento[tipo.departamento_id])
+            camino = CAMINOS[estado]
+            inicio = ahora - timedelta(seconds=self.azar.uniform(0, self.escala.dias * 86400))
+            fechas = [min(fecha, ahora) for fecha in self._fechas(camino, inicio)]
+            problema = tipo.encuesta.tipo_incidencia
+            solicitudes.append(SolicitudIncidencia(
+                encuesta_id=tipo.encuesta_id,
+                incidencia=tipo,
+                territorial=self.azar.choice(self.territoriales),
+                cuadrilla=cuadrilla,
+                vecino=f"Vecino {self.azar.randint(1, 999999)}",
+                ubicacion=str(punto),
+                punto=punto,
+                estado=estado,
+                descripcion=f"Se reporta {problema} en el sector.",
+                fecha=fechas[0],
+                fecha_inicio=fechas[2] if len(fechas) > 2 else None,
+                motivo="Insuficiente" if estado == "Rechazada" else "",
+                otro="",
+            ))
+            caminos.append((camino, fechas))
+
+        solicitudes = SolicitudIncidencia.objects.bulk_create(solicitudes)
+
+        en_filas = respuestas_encuesta.modo() == respuestas_encuesta.FILAS
+        respuestas, hojas, logs = [], [], []
+        for solicitud, (camino, fechas) in zip(solicitudes, caminos):
+            textos, valores = {}, {}
+            for pregunta_id in self.preguntas_por_encuesta.get(solicitud.encuesta_id, ()):
+                textos[pregunta_id] = self.azar.choice(("Sí", "No", "Parcialmente", "No sabe"))
+                valores[pregunta_id] = self.azar.randint(1, 5)
+            if en_filas:
+                respuestas.extend(
+                    Respuesta(
+                        pregunta_id=pregunta_id,
+                        solicitud_incidencia=solicitud,
+                        respuesta_texto=texto,
+                        valor=valores[pregunta_id],
+                    )
+                    for pregunta_id, texto in textos.items()
+                )
+            elif textos:
+                hojas.append(HojaRespuestas(
+                    solicitud_incidencia=solicitud,
+                    version_id=self.version_por_encuesta[solicitud.encuesta_id],
+                    respuestas=respuestas_encuesta.documento(textos, valores),
+                ))
+                self.resultado.respuestas += len(textos)
+            for anterior, estado, fecha in zip(camino, camino[1:], fechas[1:]):
+                logs.append(IncidenciaLog(
+                    solicitud=solicitud,
+                    profile_id=self._perfil_para(estado, solicitud),
+                    from_estado=anterior,
+                    to_estado=estado,
+                    fecha=fecha,
+                    nota=f"El estado cambió de {anterior} a {estado}.",
+                ))
+        Respuesta.objects.bulk_create(respuestas, batch_size=LOTE)
+        HojaRespuestas.objects.bulk_create(hojas, batch_size=LOTE)
+        IncidenciaLog.objects.bulk_create(logs, batch_size=LOTE)
+
+        self.resultado.solicitudes += len(solicitudes)
+        self.resultado.respuestas += len(respuestas)
+        self.resultado.logs += len(logs)
+
+    def solicitudes(self) -> None:
+        ahora = timezone.now()
+        restantes = self.escala.solicitudes
+        while restantes > 0:
+            cantidad = min(LOTE, restantes)
+            with transaction.atomic():
+                self._lote_solicitudes(cantidad, ahora)
+            restantes -= cantidad
+            self.avisar(
+                f"Solicitudes: {self.resultado.solicitudes}/{self.escala.solicitudes} "
+                f"({self.resultado.respuestas} respuestas, {self.resultado.logs} logs)."
+            )
+
+    # --------------------------------------------------------- reconstrucción
+
+    def reconstruir(self, indexar_busqueda: bool = True) -> None:
+        """bulk_create no emite señales: se recalculan los datos derivados."""
+        from dashboards import colas, contadores, mapa, sla
+        from registration import catalog
+        from surveys import formularios
+        from tickets import busqueda
+
+        catalog.invalidate()
+        directorio.invalidar()
+        formularios.invalidar(Encuesta.objects.values_list('pk', flat=True))
+        colas.invalidar_todas()
+        invalidate_models(User, Ubicacion)
+        self.avisar(f"Contadores: {contadores.reconstruir()} filas.")
+        self.avisar(f"Métricas SLA: {sla.reconstruir()} buckets.")
+        self.avisar(f"Mapa: {mapa.reconstruir()} celdas.")
+        if indexar_busqueda:
+            self.avisar(f"Búsqueda: {busqueda.indexar_todo()} documentos.")
+
+    def generar(self, indexar_busqueda: bool = True) -> Resultado:
+        self.estructura()
+        self.usuarios()
+        self.solicitudes()
+        self.reconstruir(indexar_busqueda)
+        return self.resultado
@@ -0,0 +1,32 @@
+from django import template
+
+from core import directorio
+
+register = template.Library()
+
+
+def _directorio(context):
+    request = context.get("request")
+    return directorio.de_peticion(request) if request is not None else directorio.actual()
+
+
+@register.simple_tag(takes_context=True)
+def nombre(context, tabla, pk, default=""):
+    """
+    {% nombre "cuadrilla" solicitud.cuadrilla_id [default] %}
+
+    Nombre del registro `pk` de `tabla` en `core.directorio` (título para
+    encuestas), o `default` si no existe.
+    """
+    return _directorio(context).nombre(tabla, pk, default)
+
+
+@register.simple_tag(takes_context=True)
+def registro(context, tabla, pk):
+    """
+    {% registro "encuesta" solicitud.encuesta_id as encuesta %}
+
+    Registro completo del directorio, para usar varios de sus campos; None
+    si no existe.
+    """
+    return _directorio(context).get(tabla, pk)
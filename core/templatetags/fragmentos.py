@@ -0,0 +1,57 @@
+from django import template
+from django.core.cache import cache
+from django.utils.safestring import mark_safe
+
+from core.fragmentos import TTL
+
+register = template.Library()
+
+# El HTML cacheado se comparte entre usuarios: el token CSRF de cada uno se
+# inserta al servir el fragmento en lugar de quedar guardado.
+MARCA_CSRF = "csrf-fragmento-pendiente"
+
+
+class FragmentoNode(template.Node):
+    def __init__(self, nodelist, dependencias, nombre, variantes):
+        self.nodelist = nodelist
+        self.dependencias = dependencias
+        self.nombre = nombre
+        self.variantes = variantes
+
+    def render(self, context):
+        dependencias = self.dependencias.resolve(context)
+        if not dependencias:
+            return self.nodelist.render(context)
+        clave = dependencias.clave(
+            self.nombre.resolve(context), *(variante.resolve(context) for variante in self.variantes)
+        )
+        html = cache.get(clave)
+        if html is None:
+            with context.push(csrf_token=MARCA_CSRF):
+                html = self.nodelist.render(context)
+            cache.set(clave, str(html), TTL)
+        return mark_safe(html.replace(MARCA_CSRF, str(context.get("csrf_token") or "")))
+
+
+@register.tag
+def fragmento(parser, token):
+    """
+    {% fragmento dependencias "nombre" [variante ...] %} ... {% endfragmento %}
+
+    Cachea el contenido según las versiones de `dependencias`
+    (`core.fragmentos.Dependencias`) y las variantes. Sin dependencias
+    (None) se renderiza sin caché.
+    """
+    partes = token.split_contents()
+    if len(partes) < 3:
+        raise template.TemplateSyntaxError(
+            f"'{partes[0]}' requiere las dependencias y el nombre del fragmento."
+        )
+    nodelist = parser.parse(("endfragmento",))
+    parser.delete_first_token()
+    return FragmentoNode(
+        nodelist,
+        parser.compile_filter(partes[1]),
+        parser.compile_filter(partes[2]),
+        [parser.compile_filter(parte) for parte in partes[3:]],
+    )
@@ -0,0 +1,19 @@
+from django import template
+
+from core.roles import get_role_context
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def rol_usuario(context, default=""):
+    """
+    {% rol_usuario "Sin rol" as rol %}
+
+    Etiqueta del rol del usuario del request, leída de su contexto de roles
+    (ya cargado por `role_required`) en vez de `user.profile`.
+    """
+    request = context.get("request")
+    if request is None:
+        return default
+    return get_role_context(request).role_label or default
@@ -1,3 +1,366 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import Group, User
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.cache import cache, caches
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase, override_settings
+
+from orgs.forms import DireccionForm
+from dashboards import contadores
+from dashboards.models import MetricaSLA
+from orgs.models import Cuadrilla, Departamento, DepartamentoMembership, Direccion, DireccionMembership, Territorial
+from registration import catalog
+from registration.models import Profile
+from surveys import formularios
+from tickets.models import IncidenciaLog, SolicitudIncidencia
+
+from . import benchmark, caching, directorio, roles, synthetic
+from .pagination import InvalidCursor, KeysetPaginator, query_string_without_cursor
+from .fragmentos import Dependencias
+from .versions import bump_version, get_version
+
+
+class RoleContextTests(TestCase):
+    """El contexto de roles se guarda en la sesión y se recarga cuando cambia su versión."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Group.objects.create(name='Usuarios')
+        cls.usuario = User.objects.create_user('miembro')
+        cls.obras = Direccion.objects.create(nombre='Obras')
+
+    def setUp(self):
+        directorio._directorio = None
+        self.session = SessionStore()
+
+    def contexto(self):
+        request = RequestFactory().get('/')
+        request.user = self.usuario
+        request.session = self.session
+        return roles.get_role_context(request)
+
+    def version(self):
+        return get_version(roles._version_key(self.usuario.pk))
+
+    def test_sesion_evita_recargar(self):
+        self.contexto()
+        with self.assertNumQueries(1):
+            self.contexto()
+
+    def test_carga_en_tres_consultas(self):
+        profile = self.usuario.profile
+        obras_vialidad = Departamento.objects.create(nombre='Vialidad', direccion=self.obras)
+        DireccionMembership.objects.create(direccion=self.obras, usuario_id=profile)
+        DepartamentoMembership.objects.create(departamento=obras_vialidad, usuario_id=profile, es_encargado=True)
+
+        with self.assertNumQueries(3):
+            contexto = roles.load_role_context(self.usuario)
+
+        self.assertEqual(contexto.direccion_ids, (self.obras.pk,))
+        self.assertEqual(contexto.departamento_encargado_ids, (obras_vialidad.pk,))
+        self.assertEqual(contexto.cuadrilla_ids, ())
+
+    def test_quitar_miembro_sin_el_rol_invalida_su_contexto(self):
+        # El perfil es miembro de la dirección pero su rol vigente es otro.
+        Profile.objects.filter(user=self.usuario).update(role_type=Profile.Role.CUADRILLA, role_object_id=99)
+        DireccionMembership.objects.create(direccion=self.obras, usuario_id=self.usuario.profile)
+        self.assertEqual(self.contexto().direccion_ids, (self.obras.pk,))
+
+        form = DireccionForm(data={'nombre': 'Obras', 'estado': 'on'}, instance=self.obras)
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+
+        self.assertEqual(self.contexto().direccion_ids, ())
+
+    def test_borrar_membership_invalida_su_contexto(self):
+        membership = DireccionMembership.objects.create(direccion=self.obras, usuario_id=self.usuario.profile)
+        self.assertEqual(self.contexto().direccion_ids, (self.obras.pk,))
+
+        membership.delete()
+
+        self.assertEqual(self.contexto().direccion_ids, ())
+
+    def test_borrar_organizacion_invalida_a_quien_tiene_ese_rol(self):
+        territorial = Territorial.objects.create(nombre='Norte')
+        Profile.objects.filter(user=self.usuario).update(
+            role_type=Profile.Role.TERRITORIAL, role_object_id=territorial.pk,
+        )
+        antes = self.version()
+
+        territorial.delete()
+
+        self.assertGreater(self.version(), antes)
+
+
+class KeysetPaginatorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Nombres repetidos: el desempate lo da la PK.
+        direcciones = [Direccion.objects.create(nombre=f'Dirección {numero}') for numero in range(4)]
+        Departamento.objects.bulk_create(
+            Departamento(nombre=f'Departamento {numero % 3}', direccion=direcciones[numero % 4])
+            for numero in range(12)
+        )
+        cls.esperado = list(Departamento.objects.order_by('-nombre', 'pk'))
+
+    def paginador(self):
+        return KeysetPaginator(Departamento.objects.all(), ('-nombre', 'pk'), per_page=5)
+
+    def test_recorre_adelante_y_atras_sin_saltos_ni_repeticiones(self):
+        paginas = [self.paginador().page()]
+        while paginas[-1].has_next():
+            paginas.append(self.paginador().page(paginas[-1].next_token))
+
+        self.assertEqual([len(pagina) for pagina in paginas], [5, 5, 2])
+        self.assertEqual([fila for pagina in paginas for fila in pagina], self.esperado)
+        self.assertFalse(paginas[0].has_previous())
+
+        anterior = self.paginador().page(paginas[2].previous_token)
+        self.assertEqual(list(anterior), self.esperado[5:10])
+        self.assertTrue(anterior.has_next())
+
+    def test_cursor_invalido(self):
+        with self.assertRaises(InvalidCursor):
+            self.paginador().page('no-es-un-cursor')
+        self.assertEqual(list(self.paginador().get_page('no-es-un-cursor')), self.esperado[:5])
+
+    def test_query_string_sin_cursor(self):
+        request = RequestFactory().get('/', {'q': 'luz', 'cursor': 'abc', 'page': '2'})
+        self.assertEqual(query_string_without_cursor(request), 'q=luz')
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class GeneradorSinteticoTests(TestCase):
+    ESCALA = dict(
+        direcciones=2, departamentos_por_direccion=2, cuadrillas_por_departamento=2,
+        territoriales=3, solicitudes=150, dias=20,
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        Group.objects.create(name='Usuarios')
+        cls.generador = synthetic.Generador(synthetic.Escala(**cls.ESCALA))
+        cls.resultado = cls.generador.generar(indexar_busqueda=False)
+
+    def setUp(self):
+        directorio._directorio = None
+        catalog._snapshot = None
+        formularios._compilados.clear()
+
+    def test_genera_la_escala_pedida(self):
+        self.assertEqual(
+            (self.resultado.direcciones, self.resultado.departamentos, self.resultado.cuadrillas),
+            (2, 4, 8),
+        )
+        self.assertEqual(Cuadrilla.objects.count(), 8)
+        self.assertEqual(SolicitudIncidencia.objects.count(), self.resultado.solicitudes)
+        self.assertEqual(IncidenciaLog.objects.count(), self.resultado.logs)
+        # Secpla, 2 direcciones, 4 departamentos, 8 cuadrillas y 3 territoriales.
+        self.assertEqual(Profile.objects.count(), 18)
+        self.assertEqual(
+            Profile.objects.get(user__username=f'{self.generador.slug}_cuadrilla_1').group.name, 'Cuadrillas',
+        )
+
+    def test_reconstruye_los_datos_derivados(self):
+        self.assertEqual(contadores.diferencias(), {})
+        self.assertTrue(MetricaSLA.objects.exists())
+
+    def test_otra_corrida_con_otro_prefijo_no_choca(self):
+        otro = synthetic.Generador(synthetic.Escala(prefijo='Otra', **self.ESCALA))
+        self.assertFalse(otro.existe())
+
+        otro.generar(indexar_busqueda=False)
+
+        self.assertTrue(otro.existe())
+        self.assertEqual(Direccion.objects.count(), 4)
+        self.assertEqual(contadores.diferencias(), {})
+
+    def test_benchmark_recorre_las_vistas_de_cada_rol(self):
+        mediciones = benchmark.ejecutar(repeticiones=1, prefijo_usuario=self.generador.slug)
+
+        self.assertEqual(len(mediciones), len(benchmark.VISTAS))
+        self.assertEqual({medicion.status for medicion in mediciones}, {200})
+        base = {medicion.clave: {'consultas': medicion.consultas - 1, 'p95_ms': 1e9, 'status': 200}
+                for medicion in mediciones}
+        self.assertEqual(len(benchmark.comparar(mediciones, base)), len(mediciones))
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class FragmentosTests(TestCase):
+    PLANTILLA = Template(
+        '{% load fragmentos %}{% fragmento dependencias "cola" variante %}'
+        '{{ contar }}|{{ csrf_token }}{% endfragmento %}'
+    )
+
+    def setUp(self):
+        cache.clear()
+        self.llamadas = 0
+
+    def contar(self):
+        self.llamadas += 1
+        return self.llamadas
+
+    def render(self, variante='a', token='uno', dependencias=None):
+        dependencias = dependencias if dependencias is not None else Dependencias(['cola:cuadrilla:1'])
+        return self.PLANTILLA.render(Context({
+            'dependencias': dependencias, 'variante': variante, 'contar': self.contar, 'csrf_token': token,
+        }))
+
+    def test_cachea_hasta_que_cambia_la_version(self):
+        self.assertEqual(self.render(), '1|uno')
+        self.assertEqual(self.render(), '1|uno')
+        self.assertEqual(self.render(variante='b'), '2|uno')
+
+        bump_version('cola:cuadrilla:1')
+
+        self.assertEqual(self.render(), '3|uno')
+
+    def test_el_token_csrf_no_queda_en_la_cache(self):
+        self.render(token='uno')
+        self.assertEqual(self.render(token='dos'), '1|dos')
+
+    def test_sin_dependencias_no_cachea(self):
+        self.assertEqual(self.render(dependencias=''), '1|uno')
+        self.assertEqual(self.render(dependencias=''), '2|uno')
+
+    def test_versiones_en_una_consulta(self):
+        dependencias = Dependencias(['cola:cuadrilla:1', 'cola:todas', 'cola:cuadrilla:1'])
+        with self.assertNumQueries(1):
+            dependencias.clave('a')
+            dependencias.memo('b', lambda: 1)
+        self.assertEqual(dependencias.memo('b', lambda: 2), 1)
+
+
+class LocalLRUTests(TestCase):
+    def test_desaloja_por_entradas_y_por_bytes(self):
+        lru = caching.LocalLRU(max_entries=2, max_bytes=6, max_item_bytes=6)
+        lru.set('a', b'1', 60)
+        lru.set('b', b'2', 60)
+        lru.get('a')
+        lru.set('c', b'3', 60)
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(lru.get('a'), b'1')
+
+        lru.set('d', b'123456', 60)
+        self.assertEqual((len(lru), lru.size_bytes), (1, 6))
+        lru.set('e', b'1234567', 60)
+        self.assertIsNone(lru.get('e'))
+        self.assertEqual((lru.stats.evictions, lru.stats.oversized), (3, 1))
+
+    def test_vence_por_ttl(self):
+        lru = caching.LocalLRU(max_entries=10, max_bytes=100, max_item_bytes=100)
+        with mock.patch.object(caching.time, 'monotonic', return_value=100.0):
+            lru.set('a', b'1', 5)
+        with mock.patch.object(caching.time, 'monotonic', return_value=105.0):
+            self.assertIsNone(lru.get('a'))
+        self.assertEqual((lru.stats.expirations, len(lru), lru.size_bytes), (1, 0, 0))
+
+
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'core.caching.TwoTierCache',
+        'LOCATION': 'pruebas',
+        'OPTIONS': {'SHARED': 'shared', 'LOCAL_TTL': 30},
+    },
+    'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'pruebas-compartida'},
+})
+class TwoTierCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        caching._tiers['pruebas'].stats = caching.LocalStats()
+
+    def test_lee_primero_del_proceso(self):
+        cache.set('clave', {'valor': 1})
+        caches['shared'].set('clave', {'valor': 2})
+
+        self.assertEqual(cache.get('clave'), {'valor': 1})
+        cache.local.clear()
+        self.assertEqual(cache.get('clave'), {'valor': 2})
+        self.assertEqual(cache.get('otra', 'nada'), 'nada')
+
+        stats = next(fila for fila in caching.stats() if fila['cache'] == 'pruebas')
+        self.assertEqual((stats['local_hits'], stats['shared_hits'], stats['misses']), (1, 1, 1))
+        self.assertIn('django_cache_local_hits_total{cache="pruebas"} 1', caching.prometheus())
+
+    def test_delete_y_add_alcanzan_los_dos_niveles(self):
+        cache.set('clave', 1)
+        cache.delete('clave')
+        self.assertIsNone(caches['shared'].get('clave'))
+        self.assertFalse(cache.has_key('clave'))
+
+        self.assertTrue(cache.add('clave', 2))
+        self.assertFalse(cache.add('clave', 3))
+        self.assertEqual(cache.get('clave'), 2)
+
+    def test_memoize_recalcula_al_cambiar_el_modelo(self):
+        llamadas = []
+
+        @caching.memoize(Direccion)
+        def nombres(prefijo):
+            llamadas.append(prefijo)
+            return sorted(Direccion.objects.filter(nombre__startswith=prefijo).values_list('nombre', flat=True))
+
+        Direccion.objects.create(nombre='Obras')
+        self.assertEqual(nombres('O'), ['Obras'])
+        with self.assertNumQueries(1):
+            self.assertEqual(nombres('O'), ['Obras'])
+
+        Direccion.objects.create(nombre='Ornato')
+        self.assertEqual(nombres('O'), ['Obras', 'Ornato'])
+
+        Direccion.objects.filter(nombre='Ornato').update(nombre='Aseo')
+        self.assertEqual(nombres('O'), ['Obras', 'Ornato'])
+        caching.invalidate_models(Direccion)
+        self.assertEqual(nombres('O'), ['Obras'])
+        self.assertEqual(llamadas, ['O'] * 3)
+
+
+class DirectorioTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.obras = Direccion.objects.create(nombre='Obras')
+        cls.aseo = Direccion.objects.create(nombre='Aseo', estado=False)
+        cls.vialidad = Departamento.objects.create(nombre='Vialidad', direccion=cls.obras)
+
+    def setUp(self):
+        directorio._directorio = None
+
+    def test_solo_consulta_la_version_si_no_cambio(self):
+        directorio.actual()
+        with self.assertNumQueries(1):
+            actual = directorio.actual()
+
+        self.assertEqual(actual.nombre('direccion', str(self.obras.pk)), 'Obras')
+        self.assertEqual(actual.nombre('direccion', 999, 'Sin dirección'), 'Sin dirección')
+        self.assertEqual(actual.choices('direccion'), [(self.obras.pk, 'Obras')])
+        self.assertEqual(actual.choices('departamento'), [(self.vialidad.pk, 'Vialidad (Obras)')])
+        self.assertEqual(actual.buscar('direccion', 'ASE'), [self.aseo.pk])
+
+    def test_guardar_recarga_y_sigue_la_jerarquia(self):
+        cuadrilla = Cuadrilla.objects.create(nombre='Cuadrilla 1', departamento=self.vialidad)
+        self.assertEqual(directorio.actual().get('cuadrilla', cuadrilla.pk).direccion_id, self.obras.pk)
+
+        self.vialidad.direccion = self.aseo
+        self.vialidad.save()
+
+        self.assertEqual(directorio.actual().get('cuadrilla', cuadrilla.pk).direccion_id, self.aseo.pk)
+
+    def test_escritura_en_bloque_requiere_invalidar(self):
+        directorio.actual()
+        Direccion.objects.filter(pk=self.obras.pk).update(nombre='Obras Municipales')
+        self.assertEqual(directorio.actual().nombre('direccion', self.obras.pk), 'Obras')
+
+        directorio.invalidar()
+
+        self.assertEqual(directorio.actual().nombre('direccion', self.obras.pk), 'Obras Municipales')
+
+    def test_una_version_por_request(self):
+        request = RequestFactory().get('/')
+        directorio.de_peticion(request)
+        plantilla = Template('{% load directorio %}{% nombre "departamento" pk %}')
+
+        with self.assertNumQueries(0):
+            html = plantilla.render(Context({'request': request, 'pk': self.vialidad.pk}))
+
+        self.assertEqual(html, 'Vialidad')
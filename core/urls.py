@@ -9,5 +9,7 @@ usaremos para la url consultada, esta debe existir, el tercer parametro el nombr
 '''
 core_urlpatterns = [
     path('', views.home, name='home'),    
-    path('check_profile', views.check_profile, name='check_profile')
+    path('check_profile', views.check_profile, name='check_profile'),
+    path('metrics', views.metrics, name='metrics'),
+    path('metrics/resumen', views.metrics_resumen, name='metrics_resumen'),
 ]
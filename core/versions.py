@@ -0,0 +1,43 @@
+"""
+Contadores de versión usados para invalidar datos cacheados.
+"""
+from __future__ import annotations
+
+from typing import Dict, Iterable
+
+from django.db.models import F
+
+from .models import Version
+
+
+def get_version(clave: str) -> int:
+    numero = Version.objects.filter(clave=clave).values_list('numero', flat=True).first()
+    return numero or 0
+
+
+def get_versions(claves: Iterable[str]) -> Dict[str, int]:
+    claves = list(claves)
+    versiones = dict.fromkeys(claves, 0)
+    versiones.update(Version.objects.filter(clave__in=claves).values_list('clave', 'numero'))
+    return versiones
+
+
+def bump_version(clave: str) -> None:
+    if Version.objects.filter(clave=clave).update(numero=F('numero') + 1):
+        return
+    _, created = Version.objects.get_or_create(clave=clave, defaults={'numero': 1})
+    if not created:
+        Version.objects.filter(clave=clave).update(numero=F('numero') + 1)
+
+
+def bump_versions(claves: Iterable[str]) -> None:
+    """Como `bump_version` para muchas claves, con un UPDATE y un INSERT en total."""
+    claves = list(dict.fromkeys(claves))
+    if not claves:
+        return
+    Version.objects.filter(clave__in=claves).update(numero=F('numero') + 1)
+    existentes = set(Version.objects.filter(clave__in=claves).values_list('clave', flat=True))
+    Version.objects.bulk_create(
+        [Version(clave=clave, numero=1) for clave in claves if clave not in existentes],
+        ignore_conflicts=True,
+    )
@@ -6,7 +6,7 @@ from django.contrib.auth.models import User # importa los models de usuarios
 from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator #permite la paqinación
 from django.db.models import Avg, Count, Q #agrega funcionalidades de agregación a nuestros QuerySets
 from django.http import (HttpResponse, HttpResponseBadRequest,
-                         HttpResponseNotFound, HttpResponseRedirect) #Salidas alternativas al flujo de la aplicación se explicará mas adelante
+                         HttpResponseNotFound, HttpResponseRedirect, JsonResponse) #Salidas alternativas al flujo de la aplicación se explicará mas adelante
 from django.shortcuts import redirect, render #permite renderizar vistas basadas en funciones o redireccionar a otras funciones
 from django.template import RequestContext # contexto del sistema
 from django.views.decorators.csrf import csrf_exempt #decorador que nos permitira realizar conexiones csrf
@@ -14,6 +14,8 @@ from django.views.decorators.csrf import csrf_exempt #decorador que nos permitir
 from registration.models import Profile #importa el modelo profile, el que usaremos para los perfiles de usuarios
 from registration.utils import has_admin_role
 
+from . import caching, instrumentation
+
 # Create your views here.
 def home(request):
     return redirect('login')
@@ -44,3 +46,27 @@ def check_profile(request):
     else:
         messages.add_message(request, messages.INFO, 'Su perfil no está asociado a ningún rol, por favor contactese con los administradores')              
         return redirect('login')
+
+
+def _puede_ver_metricas(request):
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token and request.headers.get('Authorization') == f'Bearer {token}':
+        return True
+    return request.user.is_authenticated and request.user.is_superuser
+
+
+def metrics(request):
+    """Métricas por vista en formato de texto de Prometheus."""
+    if not _puede_ver_metricas(request):
+        return HttpResponse(status=403)
+    return HttpResponse(
+        instrumentation.registry.prometheus() + caching.prometheus(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
+
+
+def metrics_resumen(request):
+    """Resumen de las últimas muestras por vista (latencias en ms) y contadores de caché."""
+    if not _puede_ver_metricas(request):
+        return HttpResponse(status=403)
+    return JsonResponse({'vistas': instrumentation.registry.summary(), 'cache': caching.stats()})
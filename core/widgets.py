@@ -0,0 +1,57 @@
+"""
+Selects con autocompletado.
+
+Solo se renderizan las opciones ya seleccionadas; el resto se pide a
+`data-autocomplete-url` (JSON `{"results": [{"id", "text"}], "more"}`)
+a medida que el usuario escribe, con `core/js/autocomplete.js`. Así un
+campo con miles de perfiles o roles posibles no los materializa en cada
+render, y la validación sigue siendo la del campo (queryset o choices).
+"""
+from __future__ import annotations
+
+from django import forms
+
+
+class AutocompleteMixin:
+    def __init__(self, url="", attrs=None, choices=()):
+        super().__init__(attrs=attrs, choices=choices)
+        self.url = url
+
+    class Media:
+        js = ("core/js/autocomplete.js",)
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context["widget"]["attrs"]["data-autocomplete-url"] = str(self.url)
+        return context
+
+    def _selected_choices(self, selected):
+        queryset = getattr(self.choices, "queryset", None)
+        if queryset is None:
+            return [(value, label) for value, label in self.choices if value == "" or str(value) in selected]
+
+        field = self.choices.field
+        choices = []
+        if field.empty_label is not None and not self.allow_multiple_selected:
+            choices.append(("", field.empty_label))
+        if selected:
+            choices.extend(self.choices.choice(obj) for obj in queryset.filter(pk__in=selected))
+        return choices
+
+    def optgroups(self, name, value, attrs=None):
+        selected = {str(v) for v in value if v not in (None, "")}
+        groups = []
+        for index, (option_value, option_label) in enumerate(self._selected_choices(selected)):
+            is_selected = str(option_value) in selected
+            groups.append((None, [
+                self.create_option(name, option_value, option_label, is_selected, index, attrs=attrs)
+            ], index))
+        return groups
+
+
+class AutocompleteSelect(AutocompleteMixin, forms.Select):
+    pass
+
+
+class AutocompleteSelectMultiple(AutocompleteMixin, forms.SelectMultiple):
+    pass
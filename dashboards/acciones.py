@@ -0,0 +1,221 @@
+"""
+Acciones masivas sobre solicitudes (tomar, asignar, iniciar, aprobar, rechazar).
+
+Cada acción aplica una transición a un conjunto de ids: bloquea las filas
+que cumplen la condición de la acción (estado y ámbito del usuario), las
+actualiza con un único UPDATE condicional y registra sus `IncidenciaLog`
+con un único `bulk_create`. Como ni el UPDATE ni el `bulk_create` emiten
+señales, los contadores y las métricas SLA se actualizan aquí mismo. El
+resultado informa, por id, si se aplicó o por qué no.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+
+from django.db import transaction
+from django.db.models import Q, QuerySet
+from django.utils import timezone
+
+from orgs.models import Cuadrilla
+from registration.models import Profile
+from tickets import transiciones
+from tickets.models import IncidenciaLog, SolicitudIncidencia
+
+from . import colas, contadores, despacho, mapa, sla
+
+MAXIMO_IDS = 500
+
+ESTADOS_CERRADOS = ['Finalizada', 'Aprobada']
+
+
+class AccionInvalida(Exception):
+    """La acción no puede ejecutarse (permiso, parámetros o configuración)."""
+
+
+@dataclass
+class Resultado:
+    accion: str
+    aplicadas: List[int] = field(default_factory=list)
+    fallidas: Dict[int, str] = field(default_factory=dict)
+
+    def as_dict(self) -> dict:
+        return {
+            'accion': self.accion,
+            'aplicadas': self.aplicadas,
+            'fallidas': {str(pk): motivo for pk, motivo in self.fallidas.items()},
+        }
+
+
+def _nota(from_estado: Optional[str], to_estado: str, comentario: Optional[str] = None) -> str:
+    nota = f"El estado cambió de {from_estado} a {to_estado}."
+    if comentario:
+        nota += f"\n{comentario}"
+    return nota
+
+
+def normalizar_ids(valores: Iterable) -> List[int]:
+    ids = []
+    for valor in valores:
+        try:
+            pk = int(valor)
+        except (TypeError, ValueError):
+            raise AccionInvalida(f"Id de solicitud inválido: {valor!r}.")
+        if pk not in ids:
+            ids.append(pk)
+    if not ids:
+        raise AccionInvalida("No seleccionaste ninguna solicitud.")
+    if len(ids) > MAXIMO_IDS:
+        raise AccionInvalida(f"Se pueden procesar hasta {MAXIMO_IDS} solicitudes por vez.")
+    return ids
+
+
+def _aplicar(
+    accion: str,
+    ids: List[int],
+    elegibles: QuerySet,
+    cambios: dict,
+    profile: Profile,
+    comentario: Optional[str] = None,
+) -> Resultado:
+    resultado = Resultado(accion)
+    seguidos = contadores.CAMPOS_SEGUIDOS
+    if 'estado' in cambios:
+        # Además de la condición propia de la acción, solo se aplican
+        # transiciones que la máquina de estados permite.
+        elegibles = elegibles.filter(estado__in=transiciones.origenes(cambios['estado']))
+    with transaction.atomic():
+        filas = list(
+            elegibles.filter(pk__in=ids)
+            .select_for_update()
+            .order_by('pk')
+            .values('pk', *seguidos)
+        )
+        pks = [fila['pk'] for fila in filas]
+        if pks:
+            elegibles.filter(pk__in=pks).update(**cambios)
+
+            cambios_contador = []
+            for fila in filas:
+                anterior = {campo: fila[campo] for campo in seguidos}
+                actual = {campo: cambios.get(campo, anterior[campo]) for campo in seguidos}
+                cambios_contador.append((anterior, actual))
+            contadores.registrar_cambios(cambios_contador)
+            mapa.registrar_cambios(cambios_contador)
+            colas.invalidar(fila for par in cambios_contador for fila in par)
+
+            nuevo_estado = cambios.get('estado')
+            if nuevo_estado:
+                ahora = timezone.now()
+                logs = IncidenciaLog.objects.bulk_create([
+                    IncidenciaLog(
+                        solicitud_id=fila['pk'],
+                        profile=profile,
+                        from_estado=fila['estado'],
+                        to_estado=nuevo_estado,
+                        fecha=ahora,
+                        nota=_nota(fila['estado'], nuevo_estado, comentario),
+                    )
+                    for fila in filas
+                ])
+                sla.registrar_logs(logs)
+
+    resultado.aplicadas = pks
+    aplicadas = set(pks)
+    resultado.fallidas = _motivos_fallo([pk for pk in ids if pk not in aplicadas])
+    return resultado
+
+
+def _motivos_fallo(pendientes: List[int]) -> Dict[int, str]:
+    if not pendientes:
+        return {}
+    existentes = set(
+        SolicitudIncidencia.objects.filter(pk__in=pendientes).values_list('pk', flat=True)
+    )
+    return {
+        pk: (
+            "Su estado o ámbito no permite esta acción." if pk in existentes
+            else "La solicitud no existe."
+        )
+        for pk in pendientes
+    }
+
+
+# ---------------------------------------------------------------------------
+# Acciones de departamento (encargado)
+# ---------------------------------------------------------------------------
+
+def tomar(ids: List[int], profile: Profile, departamento_id: int) -> Resultado:
+    """
+    Reparte las solicitudes entre las cuadrillas del departamento según
+    `despacho`. Todos los grupos se aplican en una sola transacción: si uno
+    falla, no queda ninguno a medias.
+    """
+    elegibles = SolicitudIncidencia.objects.filter(cuadrilla__isnull=True).exclude(estado='Rechazada')
+    plan = despacho.planificar(elegibles.filter(pk__in=ids).values_list('pk', flat=True), departamento_id)
+    if not plan and not Cuadrilla.objects.filter(departamento_id=departamento_id, estado=True).exists():
+        raise AccionInvalida("Tu departamento no tiene cuadrillas activas.")
+
+    por_cuadrilla: Dict[int, List[int]] = {}
+    for pk, cuadrilla in plan.items():
+        por_cuadrilla.setdefault(cuadrilla.cuadrilla_id, []).append(pk)
+
+    resultado = Resultado('tomar')
+    with transaction.atomic():
+        for cuadrilla_id, grupo in por_cuadrilla.items():
+            parcial = _aplicar('tomar', grupo, elegibles, {'cuadrilla_id': cuadrilla_id, 'estado': 'Derivada'}, profile)
+            resultado.aplicadas.extend(parcial.aplicadas)
+            resultado.fallidas.update(parcial.fallidas)
+    resultado.fallidas.update(_motivos_fallo([pk for pk in ids if pk not in plan]))
+    return resultado
+
+
+def asignar(ids: List[int], profile: Profile, departamento_id: int, cuadrilla_id) -> Resultado:
+    cuadrilla = None
+    if str(cuadrilla_id or '').isdigit():
+        cuadrilla = Cuadrilla.objects.filter(pk=cuadrilla_id, departamento_id=departamento_id).first()
+    if not cuadrilla:
+        raise AccionInvalida("Cuadrilla no válida.")
+    elegibles = SolicitudIncidencia.objects.filter(
+        Q(cuadrilla__isnull=True) | Q(cuadrilla__departamento_id=departamento_id)
+    )
+    return _aplicar('asignar', ids, elegibles, {'cuadrilla_id': cuadrilla.pk}, profile)
+
+
+def iniciar(ids: List[int], profile: Profile, departamento_id: int) -> Resultado:
+    elegibles = SolicitudIncidencia.objects.filter(
+        cuadrilla__departamento_id=departamento_id
+    ).exclude(estado__in=['En Proceso'] + ESTADOS_CERRADOS)
+    return _aplicar('iniciar', ids, elegibles, {'estado': 'En Proceso'}, profile)
+
+
+# ---------------------------------------------------------------------------
+# Acciones territoriales
+# ---------------------------------------------------------------------------
+
+def aprobar(ids: List[int], profile: Profile, territorial_id: int) -> Resultado:
+    elegibles = SolicitudIncidencia.objects.filter(territorial_id=territorial_id, estado='Finalizada')
+    return _aplicar(
+        'aprobar', ids, elegibles, {'estado': 'Aprobada'}, profile,
+        comentario="Aprobada por el territorial.",
+    )
+
+
+def rechazar(ids: List[int], profile: Profile, territorial_id: int, motivo: str, otro: str = '') -> Resultado:
+    elegibles = SolicitudIncidencia.objects.filter(territorial_id=territorial_id).exclude(
+        estado__in=['Rechazada', 'Aprobada']
+    )
+    return _aplicar(
+        'rechazar', ids, elegibles, {'estado': 'Rechazada', 'motivo': motivo, 'otro': otro}, profile,
+    )
+
+
+ETIQUETAS = {
+    'tomar': "Tomar",
+    'asignar': "Asignar cuadrilla",
+    'iniciar': "Iniciar",
+    'aprobar': "Aprobar",
+    'rechazar': "Rechazar",
+}
+ACCIONES_DEPARTAMENTO = ('tomar', 'asignar', 'iniciar')
+ACCIONES_TERRITORIALES = ('aprobar', 'rechazar')
@@ -0,0 +1,87 @@
+"""
+Versiones de las colas de solicitudes que muestran los dashboards.
+
+Cada ámbito (territorial, cuadrilla, departamento, dirección y la cola de
+solicitudes sin cuadrilla) tiene una clave en `core.versions` que se
+incrementa con cualquier escritura de `SolicitudIncidencia` o
+`IncidenciaLog` que lo toque, antes y después del cambio. Los dashboards
+cachean sus tablas con `core.fragmentos` dependiendo de esas claves, más
+la de `core.directorio` (nombres de cuadrillas, encuestas y demás) y una
+global que se incrementa al reconstruir los datos derivados.
+"""
+from __future__ import annotations
+
+from typing import Iterable, List, Optional
+
+from core import directorio
+from core.fragmentos import Dependencias
+from core.versions import bump_version, bump_versions
+from tickets.models import SolicitudIncidencia
+
+CLAVE = 'cola:{}:{}'
+CLAVE_SIN_CUADRILLA = 'cola:sin_cuadrilla'
+CLAVE_TODAS = 'cola:todas'
+
+
+def claves(territorial_id: Optional[int] = None, cuadrilla_id: Optional[int] = None,
+           departamento_id: Optional[int] = None, direccion_id: Optional[int] = None,
+           sin_cuadrilla: bool = False) -> List[str]:
+    ambitos = (
+        ('territorial', territorial_id),
+        ('cuadrilla', cuadrilla_id),
+        ('departamento', departamento_id),
+        ('direccion', direccion_id),
+    )
+    resultado = [CLAVE.format(ambito, ambito_id) for ambito, ambito_id in ambitos if ambito_id]
+    if sin_cuadrilla:
+        resultado.append(CLAVE_SIN_CUADRILLA)
+    return resultado
+
+
+def dependencias(**ambitos) -> Dependencias:
+    """Dependencias para cachear lo que un dashboard muestra de esos ámbitos (ver `claves`)."""
+    return Dependencias([*claves(**ambitos), CLAVE_TODAS, directorio.VERSION_KEY])
+
+
+def invalidar(filas: Iterable[Optional[dict]]) -> None:
+    """
+    Incrementa las colas de las solicitudes descritas por `filas`
+    (diccionarios con `territorial_id` y `cuadrilla_id`; `None` se ignora).
+    Para un cambio, conviene pasar la fila anterior y la actual.
+    """
+    filas = [fila for fila in filas if fila]
+    if not filas:
+        return
+    cuadrillas = directorio.actual().cuadrillas
+    afectadas = set()
+    for fila in filas:
+        cuadrilla_id = fila['cuadrilla_id']
+        cuadrilla = cuadrillas.get(cuadrilla_id)
+        afectadas.update(claves(
+            territorial_id=fila['territorial_id'],
+            cuadrilla_id=cuadrilla_id,
+            departamento_id=cuadrilla.departamento_id if cuadrilla else None,
+            direccion_id=cuadrilla.direccion_id if cuadrilla else None,
+            sin_cuadrilla=not cuadrilla_id,
+        ))
+    bump_versions(sorted(afectadas))
+
+
+def invalidar_ambitos(*ambitos: dict) -> None:
+    """
+    Incrementa las colas de cada ámbito (argumentos de `claves`); para
+    cambios de jerarquía, como una cuadrilla que pasa a otro departamento.
+    """
+    bump_versions(sorted({clave for ambito in ambitos for clave in claves(**ambito)}))
+
+
+def invalidar_solicitudes(solicitud_ids: Iterable[int]) -> None:
+    """`invalidar` para solicitudes de las que solo se conoce el id (p. ej. al registrar un log)."""
+    invalidar(
+        SolicitudIncidencia.objects.filter(pk__in=set(solicitud_ids)).values('territorial_id', 'cuadrilla_id')
+    )
+
+
+def invalidar_todas() -> None:
+    """Para escrituras en bloque sin señales (carga de datos, reconstrucciones)."""
+    bump_version(CLAVE_TODAS)
@@ -0,0 +1,224 @@
+"""
+Contadores materializados de solicitudes por estado.
+
+Cada cambio de `estado`, `cuadrilla` o `territorial` de una
+`SolicitudIncidencia` mueve una unidad desde las filas del estado anterior
+a las del estado nuevo en los ámbitos global, territorial, cuadrilla y
+dirección. Los dashboards leen esas filas (una consulta por ámbito) en vez
+de contar sobre la tabla de solicitudes.
+
+El ámbito dirección se deduce de la cuadrilla; cuando una cuadrilla cambia
+de departamento o un departamento de dirección, `mover_cuadrillas` traspasa
+sus totales (ver `dashboards.signals`).
+"""
+from __future__ import annotations
+
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import Count, F
+
+from core import directorio
+from tickets.models import SolicitudIncidencia
+
+from .models import ContadorSolicitud
+
+Ambito = ContadorSolicitud.Ambito
+
+# (ambito, ambito_id, estado) -> total
+ClaveContador = Tuple[str, int, str]
+
+CAMPOS_CONTADOR = ('estado', 'territorial_id', 'cuadrilla_id')
+# Campos cuyo valor anterior guardan las señales: los de los contadores y
+# los que ubican la solicitud en el mapa (`dashboards.mapa`).
+CAMPOS_SEGUIDOS = CAMPOS_CONTADOR + ('incidencia_id', 'punto_id')
+
+
+def _contables(fila: Optional[dict]) -> Optional[tuple]:
+    return None if fila is None else tuple(fila[campo] for campo in CAMPOS_CONTADOR)
+
+
+def direccion_de_cuadrilla(cuadrilla_id: Optional[int]) -> Optional[int]:
+    cuadrilla = directorio.actual().get('cuadrilla', cuadrilla_id) if cuadrilla_id else None
+    return cuadrilla.direccion_id if cuadrilla else None
+
+
+def _ambitos(territorial_id: Optional[int], cuadrilla_id: Optional[int],
+             direccion_id: Optional[int]) -> List[Tuple[str, int]]:
+    ambitos = [(Ambito.GLOBAL, 0)]
+    if territorial_id:
+        ambitos.append((Ambito.TERRITORIAL, territorial_id))
+    if cuadrilla_id:
+        ambitos.append((Ambito.CUADRILLA, cuadrilla_id))
+        if direccion_id:
+            ambitos.append((Ambito.DIRECCION, direccion_id))
+    return ambitos
+
+
+def ambitos_de(territorial_id: Optional[int], cuadrilla_id: Optional[int]) -> List[Tuple[str, int]]:
+    """Ámbitos a los que aporta una solicitud con esa territorial/cuadrilla."""
+    return _ambitos(territorial_id, cuadrilla_id, direccion_de_cuadrilla(cuadrilla_id))
+
+
+def ajustar(ambitos: Iterable[Tuple[str, int]], estado: Optional[str], delta: int) -> None:
+    """Suma `delta` al contador de `estado` en cada ámbito, creando la fila si falta."""
+    if not estado or not delta:
+        return
+    with transaction.atomic():
+        for ambito, ambito_id in ambitos:
+            filtros = {'ambito': ambito, 'ambito_id': ambito_id, 'estado': estado}
+            actualizados = ContadorSolicitud.objects.filter(**filtros).update(total=F('total') + delta)
+            if not actualizados:
+                ContadorSolicitud.objects.get_or_create(**filtros)
+                ContadorSolicitud.objects.filter(**filtros).update(total=F('total') + delta)
+
+
+def registrar_cambio(anterior: Optional[dict], actual: Optional[dict]) -> None:
+    """
+    Mueve la solicitud entre contadores.
+
+    `anterior`/`actual` son diccionarios con `CAMPOS_SEGUIDOS`; `None`
+    significa que la solicitud no existía (alta) o dejó de existir (baja).
+    """
+    if _contables(anterior) == _contables(actual):
+        return
+    with transaction.atomic():
+        if anterior:
+            ajustar(
+                ambitos_de(anterior['territorial_id'], anterior['cuadrilla_id']),
+                anterior['estado'], -1,
+            )
+        if actual:
+            ajustar(
+                ambitos_de(actual['territorial_id'], actual['cuadrilla_id']),
+                actual['estado'], 1,
+            )
+
+
+def registrar_cambios(cambios: Iterable[Tuple[Optional[dict], Optional[dict]]]) -> None:
+    """
+    `registrar_cambio` para muchas solicitudes (acciones masivas, que no
+    emiten señales): netea los movimientos en memoria y ajusta cada
+    contador afectado una sola vez.
+    """
+    cambios = [
+        (anterior, actual) for anterior, actual in cambios
+        if _contables(anterior) != _contables(actual)
+    ]
+    if not cambios:
+        return
+    cuadrillas = directorio.actual().cuadrillas
+
+    deltas: Counter = Counter()
+    for anterior, actual in cambios:
+        for fila, delta in ((anterior, -1), (actual, 1)):
+            if not fila or not fila['estado']:
+                continue
+            cuadrilla = cuadrillas.get(fila['cuadrilla_id'])
+            ambitos = _ambitos(
+                fila['territorial_id'], fila['cuadrilla_id'], cuadrilla.direccion_id if cuadrilla else None
+            )
+            for ambito, ambito_id in ambitos:
+                deltas[(ambito, ambito_id, fila['estado'])] += delta
+
+    with transaction.atomic():
+        for (ambito, ambito_id, estado), delta in deltas.items():
+            ajustar([(ambito, ambito_id)], estado, delta)
+
+
+def mover_cuadrillas(cuadrilla_ids: Iterable[int], desde_direccion_id: Optional[int],
+                     hacia_direccion_id: Optional[int]) -> None:
+    """
+    Traspasa los totales de esas cuadrillas del ámbito dirección
+    `desde_direccion_id` al `hacia_direccion_id`.
+    """
+    cuadrilla_ids = list(cuadrilla_ids)
+    if desde_direccion_id == hacia_direccion_id or not cuadrilla_ids:
+        return
+    with transaction.atomic():
+        # Bloquea los contadores de las cuadrillas: una solicitud que cambie
+        # entretanto espera a que termine el traspaso.
+        totales: Counter = Counter()
+        for estado, total in ContadorSolicitud.objects.select_for_update().filter(
+            ambito=Ambito.CUADRILLA, ambito_id__in=cuadrilla_ids
+        ).values_list('estado', 'total'):
+            totales[estado] += total
+        for estado, total in totales.items():
+            if desde_direccion_id:
+                ajustar([(Ambito.DIRECCION, desde_direccion_id)], estado, -total)
+            if hacia_direccion_id:
+                ajustar([(Ambito.DIRECCION, hacia_direccion_id)], estado, total)
+
+
+def totales_por_estado(ambito: str, ambito_id: int = 0) -> Dict[str, int]:
+    """Totales por estado de un ámbito, con todos los estados presentes (en 0 si no hay)."""
+    totales = {estado: 0 for estado, _ in SolicitudIncidencia.Estados}
+    if ambito != Ambito.GLOBAL and not ambito_id:
+        return totales
+    filas = ContadorSolicitud.objects.filter(
+        ambito=ambito, ambito_id=ambito_id
+    ).values_list('estado', 'total')
+    for estado, total in filas:
+        totales[estado] = total
+    return totales
+
+
+# ---------------------------------------------------------------------------
+# Reconstrucción y verificación
+# ---------------------------------------------------------------------------
+
+def calcular_en_vivo() -> Dict[ClaveContador, int]:
+    """Agrega la tabla de solicitudes y devuelve los totales que deberían existir."""
+    totales: Counter = Counter()
+    solicitudes = SolicitudIncidencia.objects.order_by()
+
+    for fila in solicitudes.values('estado').annotate(total=Count('pk')):
+        totales[(Ambito.GLOBAL, 0, fila['estado'])] += fila['total']
+
+    agrupaciones = (
+        (Ambito.TERRITORIAL, 'territorial_id'),
+        (Ambito.CUADRILLA, 'cuadrilla_id'),
+        (Ambito.DIRECCION, 'cuadrilla__departamento__direccion_id'),
+    )
+    for ambito, campo in agrupaciones:
+        filas = (
+            solicitudes.filter(**{f'{campo}__isnull': False})
+            .values(campo, 'estado')
+            .annotate(total=Count('pk'))
+        )
+        for fila in filas:
+            totales[(ambito, fila[campo], fila['estado'])] += fila['total']
+
+    return {clave: total for clave, total in totales.items() if total}
+
+
+def leer_almacenados() -> Dict[ClaveContador, int]:
+    return {
+        (ambito, ambito_id, estado): total
+        for ambito, ambito_id, estado, total in ContadorSolicitud.objects.exclude(total=0)
+        .values_list('ambito', 'ambito_id', 'estado', 'total')
+    }
+
+
+def diferencias() -> Dict[ClaveContador, Tuple[int, int]]:
+    """Claves cuyo valor almacenado difiere del agregado en vivo: clave -> (almacenado, vivo)."""
+    vivos = calcular_en_vivo()
+    almacenados = leer_almacenados()
+    return {
+        clave: (almacenados.get(clave, 0), vivos.get(clave, 0))
+        for clave in set(vivos) | set(almacenados)
+        if almacenados.get(clave, 0) != vivos.get(clave, 0)
+    }
+
+
+@transaction.atomic
+def reconstruir() -> int:
+    """Reemplaza todos los contadores por los agregados en vivo. Devuelve las filas creadas."""
+    vivos = calcular_en_vivo()
+    ContadorSolicitud.objects.all().delete()
+    ContadorSolicitud.objects.bulk_create(
+        ContadorSolicitud(ambito=ambito, ambito_id=ambito_id, estado=estado, total=total)
+        for (ambito, ambito_id, estado), total in vivos.items()
+    )
+    return len(vivos)
@@ -0,0 +1,365 @@
+"""
+Despacho automático de solicitudes a cuadrillas.
+
+Al tomar una solicitud, el departamento ya no la asigna a su primera
+cuadrilla: una `Politica` elige entre sus cuadrillas activas
+(`estado=True`) a partir de la carga de cada una, la prioridad de la
+encuesta y, si se conoce, la distancia desde la base de la cuadrilla
+(`Cuadrilla.base`) hasta el punto de la incidencia (`SolicitudIncidencia.punto`).
+
+La carga (solicitudes abiertas por cuadrilla) sale de `ContadorSolicitud`
+en el ámbito cuadrilla, que `dashboards.contadores` mantiene al día en cada
+cambio; decidir cuesta unas pocas consultas y O(cuadrillas) en memoria, sin
+recorrer `SolicitudIncidencia`. Al despachar varias solicitudes de una vez
+`Despachador` va sumando la carga en memoria.
+
+`simular()` reproduce el historial de `IncidenciaLog` con una o más
+políticas y con las asignaciones reales, para compararlas antes de cambiar
+`DESPACHO_POLITICA`.
+"""
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.db.models import Sum
+
+from locations.espacial import distancia_m
+from orgs.models import Cuadrilla
+from tickets.models import ESTADOS_ABIERTOS, IncidenciaLog, SolicitudIncidencia
+
+from .models import ContadorSolicitud
+
+POLITICA_POR_DEFECTO = 'menor_carga'
+
+# Cuánto pesa la distancia según la prioridad de la encuesta: lo urgente va a
+# la cuadrilla más cercana aunque esté algo más cargada.
+PESO_DISTANCIA = {'Alta': 2.0, 'Media': 1.0, 'Baja': 0.5}
+ORDEN_PRIORIDAD = {'Alta': 0, 'Media': 1, 'Baja': 2}
+
+# Estados del historial en que la solicitud pasa a ocupar / deja de ocupar una cuadrilla.
+ESTADOS_ASIGNACION = ('Derivada', 'En Proceso')
+ESTADOS_LIBERACION = ('Pendiente', 'Finalizada', 'Aprobada', 'Rechazada')
+
+# solicitud_id -> {cuadrilla_id: km}
+Distancias = Callable[[int], Mapping[int, float]]
+
+
+@dataclass(frozen=True)
+class Pedido:
+    solicitud_id: int
+    prioridad: Optional[str] = None
+    # Solo en simulación: la cuadrilla que tuvo realmente.
+    cuadrilla_real_id: Optional[int] = None
+
+
+@dataclass(frozen=True)
+class Candidata:
+    cuadrilla_id: int
+    nombre: str
+    carga: int
+    distancia_km: Optional[float] = None
+
+
+class Politica(ABC):
+    nombre = ''
+
+    @abstractmethod
+    def elegir(self, pedido: Pedido, candidatas: Sequence[Candidata]) -> Optional[Candidata]:
+        """La candidata a la que se asigna el pedido; None si ninguna sirve."""
+
+
+class PrimeraCuadrilla(Politica):
+    """La de menor id: el comportamiento anterior, para comparar."""
+    nombre = 'primera'
+
+    def elegir(self, pedido, candidatas):
+        return min(candidatas, key=lambda c: c.cuadrilla_id, default=None)
+
+
+class MenorCarga(Politica):
+    """
+    La de menor costo: solicitudes abiertas más la distancia, convertida a
+    solicitudes con `km_por_solicitud` y ponderada por la prioridad.
+    """
+    nombre = 'menor_carga'
+
+    def __init__(self, km_por_solicitud: float = 1.0):
+        self.km_por_solicitud = km_por_solicitud
+
+    def costo(self, pedido: Pedido, candidata: Candidata) -> float:
+        costo = float(candidata.carga)
+        if candidata.distancia_km is not None:
+            peso = PESO_DISTANCIA.get(pedido.prioridad, 1.0)
+            costo += peso * candidata.distancia_km / self.km_por_solicitud
+        return costo
+
+    def elegir(self, pedido, candidatas):
+        return min(
+            candidatas,
+            key=lambda c: (self.costo(pedido, c), c.carga, c.cuadrilla_id),
+            default=None,
+        )
+
+
+class Historica(Politica):
+    """La cuadrilla que la solicitud tuvo de verdad; línea base de la simulación."""
+    nombre = 'historica'
+
+    def elegir(self, pedido, candidatas):
+        return next((c for c in candidatas if c.cuadrilla_id == pedido.cuadrilla_real_id), None)
+
+
+POLITICAS: Dict[str, type] = {cls.nombre: cls for cls in (PrimeraCuadrilla, MenorCarga)}
+
+
+def get_politica(nombre: Optional[str] = None) -> Politica:
+    nombre = nombre or getattr(settings, 'DESPACHO_POLITICA', POLITICA_POR_DEFECTO)
+    try:
+        return POLITICAS[nombre]()
+    except KeyError:
+        raise ValueError(f"Política de despacho desconocida: {nombre!r}.")
+
+
+class Despachador:
+    """Cuadrillas candidatas de un departamento con su carga, actualizada en memoria al asignar."""
+
+    def __init__(
+        self,
+        cuadrillas: Mapping[int, str],
+        cargas: Optional[Mapping[int, int]] = None,
+        politica: Optional[Politica] = None,
+        distancias: Optional[Distancias] = None,
+    ):
+        self.nombres = dict(cuadrillas)
+        self.cargas = {pk: (cargas or {}).get(pk, 0) for pk in self.nombres}
+        self.politica = politica or get_politica()
+        self.distancias = distancias
+
+    @classmethod
+    def para_departamento(cls, departamento_id: int, **kwargs) -> 'Despachador':
+        cuadrillas = dict(
+            Cuadrilla.objects.filter(departamento_id=departamento_id, estado=True)
+            .order_by('pk')
+            .values_list('pk', 'nombre')
+        )
+        return cls(cuadrillas, cargas_abiertas(cuadrillas), **kwargs)
+
+    def agregar(self, cuadrilla_id: int, nombre: str = '') -> None:
+        self.nombres.setdefault(cuadrilla_id, nombre)
+        self.cargas.setdefault(cuadrilla_id, 0)
+
+    def candidatas(self, pedido: Pedido) -> List[Candidata]:
+        distancias = self.distancias(pedido.solicitud_id) if self.distancias else {}
+        return [
+            Candidata(pk, self.nombres[pk], self.cargas[pk], distancias.get(pk))
+            for pk in self.nombres
+        ]
+
+    def elegir(self, pedido: Pedido) -> Optional[Candidata]:
+        elegida = self.politica.elegir(pedido, self.candidatas(pedido))
+        if elegida is not None:
+            self.cargas[elegida.cuadrilla_id] += 1
+        return elegida
+
+    def liberar(self, cuadrilla_id: int) -> None:
+        if self.cargas.get(cuadrilla_id):
+            self.cargas[cuadrilla_id] -= 1
+
+
+def cargas_abiertas(cuadrilla_ids: Iterable[int]) -> Dict[int, int]:
+    """Solicitudes abiertas por cuadrilla, leídas de los contadores materializados."""
+    filas = (
+        ContadorSolicitud.objects.filter(
+            ambito=ContadorSolicitud.Ambito.CUADRILLA,
+            ambito_id__in=list(cuadrilla_ids),
+            estado__in=ESTADOS_ABIERTOS,
+        )
+        .values('ambito_id')
+        .annotate(carga=Sum('total'))
+        .values_list('ambito_id', 'carga')
+    )
+    return dict(filas)
+
+
+def distancias_a_bases(cuadrilla_ids: Iterable[int], solicitud_ids: Iterable[int]) -> Optional[Distancias]:
+    """
+    Km desde el punto de cada solicitud hasta la base de cada cuadrilla, o
+    `None` si ninguna cuadrilla tiene base geocodificada.
+    """
+    bases = {
+        pk: (latitud, longitud)
+        for pk, latitud, longitud in Cuadrilla.objects.filter(
+            pk__in=list(cuadrilla_ids), base__latitud__isnull=False, base__longitud__isnull=False,
+        ).values_list('pk', 'base__latitud', 'base__longitud')
+    }
+    if not bases:
+        return None
+    puntos = {
+        pk: (latitud, longitud)
+        for pk, latitud, longitud in SolicitudIncidencia.objects.filter(
+            pk__in=list(solicitud_ids), punto__latitud__isnull=False, punto__longitud__isnull=False,
+        ).values_list('pk', 'punto__latitud', 'punto__longitud')
+    }
+
+    def distancias(solicitud_id: int) -> Dict[int, float]:
+        punto = puntos.get(solicitud_id)
+        if punto is None:
+            return {}
+        return {pk: distancia_m(*punto, *base) / 1000 for pk, base in bases.items()}
+
+    return distancias
+
+
+def elegir_cuadrilla(
+    solicitud: SolicitudIncidencia,
+    departamento_id: int,
+    politica: Optional[Politica] = None,
+    distancias: Optional[Distancias] = None,
+) -> Optional[Candidata]:
+    """
+    Cuadrilla del departamento a la que despachar `solicitud`, o `None` si no
+    tiene activas. Sin `distancias`, se usan las bases de las cuadrillas.
+    """
+    despachador = Despachador.para_departamento(departamento_id, politica=politica, distancias=distancias)
+    if distancias is None:
+        despachador.distancias = distancias_a_bases(despachador.nombres, [solicitud.pk])
+    return despachador.elegir(Pedido(solicitud.pk, solicitud.encuesta.prioridad))
+
+
+def planificar(
+    ids: Iterable[int],
+    departamento_id: int,
+    politica: Optional[Politica] = None,
+    distancias: Optional[Distancias] = None,
+) -> Dict[int, Candidata]:
+    """
+    Reparte varias solicitudes a la vez. Se despachan primero las de mayor
+    prioridad y, dentro de cada una, las más antiguas. Sin `distancias`, se
+    usan las bases de las cuadrillas.
+    """
+    ids = list(ids)
+    despachador = Despachador.para_departamento(departamento_id, politica=politica, distancias=distancias)
+    if distancias is None:
+        despachador.distancias = distancias_a_bases(despachador.nombres, ids)
+    filas = (
+        SolicitudIncidencia.objects.filter(pk__in=ids)
+        .values_list('pk', 'encuesta__prioridad', 'fecha')
+    )
+    plan = {}
+    for pk, prioridad, _ in sorted(filas, key=lambda f: (ORDEN_PRIORIDAD.get(f[1], 1), f[2], f[0])):
+        elegida = despachador.elegir(Pedido(pk, prioridad))
+        if elegida is None:
+            break
+        plan[pk] = elegida
+    return plan
+
+
+# ---------------------------------------------------------------------------
+# Simulación sobre el historial
+# ---------------------------------------------------------------------------
+
+@dataclass
+class ResultadoSimulacion:
+    politica: str
+    asignaciones: int = 0
+    sin_cuadrilla: int = 0
+    # Mayor cantidad de solicitudes abiertas que tuvo una cuadrilla en algún momento.
+    carga_maxima: int = 0
+    # Suma, en cada asignación, de la diferencia entre la cuadrilla más y la menos cargada.
+    desbalance_acumulado: int = 0
+    por_cuadrilla: Counter = field(default_factory=Counter)
+
+    @property
+    def desbalance_promedio(self) -> float:
+        return self.desbalance_acumulado / self.asignaciones if self.asignaciones else 0.0
+
+    @property
+    def participacion_maxima(self) -> float:
+        """Fracción de las asignaciones que se llevó la cuadrilla más usada."""
+        if not self.asignaciones:
+            return 0.0
+        return max(self.por_cuadrilla.values()) / self.asignaciones
+
+
+def simular(
+    politicas: Sequence[Politica],
+    departamento_id: Optional[int] = None,
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    distancias: Optional[Distancias] = None,
+) -> List[ResultadoSimulacion]:
+    """
+    Reproduce en orden los `IncidenciaLog` de las solicitudes que terminaron
+    con cuadrilla y despacha cada una con cada política, partiendo de todas
+    las cuadrillas activas sin carga. Cada política lleva su propia carga:
+    una asignación ocupa a la cuadrilla elegida hasta que la solicitud vuelve
+    a Pendiente, se finaliza o se rechaza. `Historica` se agrega siempre como
+    referencia. No escribe nada en la base.
+    """
+    politicas = [Historica()] + [p for p in politicas if not isinstance(p, Historica)]
+
+    cuadrillas = Cuadrilla.objects.filter(estado=True)
+    if departamento_id:
+        cuadrillas = cuadrillas.filter(departamento_id=departamento_id)
+    por_departamento: Dict[int, Dict[int, str]] = defaultdict(dict)
+    for pk, nombre, depto in cuadrillas.order_by('pk').values_list('pk', 'nombre', 'departamento_id'):
+        por_departamento[depto][pk] = nombre
+
+    despachadores = [
+        {
+            depto: Despachador(nombres, politica=politica, distancias=distancias)
+            for depto, nombres in por_departamento.items()
+        }
+        for politica in politicas
+    ]
+    resultados = [ResultadoSimulacion(politica.nombre) for politica in politicas]
+    # solicitud_id -> (cuadrilla_id, departamento_id), por política
+    asignadas: List[Dict[int, Tuple[int, int]]] = [{} for _ in politicas]
+
+    logs = IncidenciaLog.objects.filter(solicitud__cuadrilla__isnull=False)
+    if departamento_id:
+        logs = logs.filter(solicitud__cuadrilla__departamento_id=departamento_id)
+    if desde:
+        logs = logs.filter(fecha__gte=desde)
+    if hasta:
+        logs = logs.filter(fecha__lt=hasta)
+    filas = logs.order_by('fecha', 'pk').values_list(
+        'solicitud_id', 'to_estado', 'solicitud__encuesta__prioridad',
+        'solicitud__cuadrilla_id', 'solicitud__cuadrilla__departamento_id',
+    )
+
+    for solicitud_id, to_estado, prioridad, cuadrilla_real_id, depto in filas.iterator(chunk_size=2000):
+        for indice, politica in enumerate(politicas):
+            actual = asignadas[indice].get(solicitud_id)
+            despachador = despachadores[indice].get(depto)
+            if to_estado in ESTADOS_LIBERACION:
+                if actual is not None:
+                    despachadores[indice][actual[1]].liberar(actual[0])
+                    del asignadas[indice][solicitud_id]
+                continue
+            if to_estado not in ESTADOS_ASIGNACION or actual is not None:
+                continue
+
+            resultado = resultados[indice]
+            if despachador is None:
+                despachador = despachadores[indice][depto] = Despachador({}, politica=politica, distancias=distancias)
+            if isinstance(politica, Historica):
+                despachador.agregar(cuadrilla_real_id)
+            elegida = despachador.elegir(Pedido(solicitud_id, prioridad, cuadrilla_real_id))
+            if elegida is None:
+                resultado.sin_cuadrilla += 1
+                continue
+
+            asignadas[indice][solicitud_id] = (elegida.cuadrilla_id, depto)
+            cargas = despachador.cargas.values()
+            resultado.asignaciones += 1
+            resultado.por_cuadrilla[elegida.cuadrilla_id] += 1
+            resultado.carga_maxima = max(resultado.carga_maxima, max(cargas))
+            resultado.desbalance_acumulado += max(cargas) - min(cargas)
+
+    return resultados
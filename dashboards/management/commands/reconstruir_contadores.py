@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboards import contadores
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruye los contadores de solicitudes por estado desde cero y "
+        "los verifica contra los agregados en vivo de SolicitudIncidencia."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--solo-verificar",
+            action="store_true",
+            help="No reconstruye; solo informa las diferencias y falla si existen.",
+        )
+
+    def handle(self, *args, **options):
+        if not options["solo_verificar"]:
+            filas = contadores.reconstruir()
+            self.stdout.write(f"Contadores reconstruidos: {filas} filas.")
+
+        diferencias = contadores.diferencias()
+        if not diferencias:
+            self.stdout.write(self.style.SUCCESS("Los contadores coinciden con los agregados en vivo."))
+            return
+
+        for (ambito, ambito_id, estado), (almacenado, vivo) in sorted(diferencias.items()):
+            self.stdout.write(
+                f"  {ambito}:{ambito_id} [{estado}] almacenado={almacenado} en_vivo={vivo}"
+            )
+        raise CommandError(f"{len(diferencias)} contadores no coinciden con los agregados en vivo.")
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboards import mapa
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruye las celdas del mapa de solicitudes abiertas desde cero, invalida "
+        "todas las teselas cacheadas y verifica los totales contra SolicitudIncidencia."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--solo-verificar",
+            action="store_true",
+            help="No reconstruye; solo informa las diferencias y falla si existen.",
+        )
+
+    def handle(self, *args, **options):
+        if not options["solo_verificar"]:
+            filas = mapa.reconstruir()
+            self.stdout.write(f"Celdas del mapa reconstruidas: {filas} filas.")
+
+        diferencias = mapa.diferencias()
+        if not diferencias:
+            self.stdout.write(self.style.SUCCESS("Las celdas coinciden con los agregados en vivo."))
+            return
+
+        for (precision, celda, estado, incidencia_id), (almacenado, vivo) in sorted(diferencias.items()):
+            self.stdout.write(
+                f"  {precision}:{celda} [{estado}, incidencia {incidencia_id}] "
+                f"almacenado={almacenado} en_vivo={vivo}"
+            )
+        raise CommandError(f"{len(diferencias)} celdas no coinciden con los agregados en vivo.")
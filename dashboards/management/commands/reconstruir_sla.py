@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from dashboards import sla
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula desde cero los buckets horarios y diarios de MetricaSLA "
+        "a partir del historial de IncidenciaLog."
+    )
+
+    def handle(self, *args, **options):
+        filas = sla.reconstruir()
+        self.stdout.write(self.style.SUCCESS(f"Métricas SLA reconstruidas: {filas} buckets."))
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from dashboards import despacho
+
+
+class Command(BaseCommand):
+    help = (
+        "Reproduce el historial de IncidenciaLog despachando cada solicitud con las "
+        "políticas indicadas y compara su reparto con el de las asignaciones reales."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--politica",
+            action="append",
+            choices=sorted(despacho.POLITICAS),
+            help="Política a simular; se puede repetir. Por defecto, todas.",
+        )
+        parser.add_argument("--departamento", type=int, help="Solo las cuadrillas de este departamento.")
+        parser.add_argument("--desde", help="Fecha inicial (AAAA-MM-DD).")
+        parser.add_argument("--hasta", help="Fecha final, exclusiva (AAAA-MM-DD).")
+
+    def _fecha(self, valor):
+        if not valor:
+            return None
+        fecha = parse_date(valor)
+        if fecha is None:
+            raise CommandError(f"Fecha inválida: {valor!r}.")
+        return timezone.make_aware(timezone.datetime.combine(fecha, timezone.datetime.min.time()))
+
+    def handle(self, *args, **options):
+        nombres = options["politica"] or sorted(despacho.POLITICAS)
+        resultados = despacho.simular(
+            [despacho.get_politica(nombre) for nombre in nombres],
+            departamento_id=options["departamento"],
+            desde=self._fecha(options["desde"]),
+            hasta=self._fecha(options["hasta"]),
+        )
+
+        self.stdout.write(
+            f"{'política':<14}{'asignadas':>11}{'sin cuadrilla':>15}{'carga máx.':>12}"
+            f"{'desbalance prom.':>18}{'% cuadrilla más usada':>23}"
+        )
+        for resultado in resultados:
+            self.stdout.write(
+                f"{resultado.politica:<14}{resultado.asignaciones:>11}{resultado.sin_cuadrilla:>15}"
+                f"{resultado.carga_maxima:>12}{resultado.desbalance_promedio:>18.2f}"
+                f"{resultado.participacion_maxima * 100:>22.1f}%"
+            )
@@ -0,0 +1,384 @@
+"""
+Mapa de solicitudes abiertas servido como teselas GeoJSON agrupadas.
+
+Cada solicitud abierta con punto aporta una unidad a su celda de geohash
+en cada precisión de `PRECISIONES` (ver `CeldaMapa`). Como los geohash
+anidan por prefijo, esas filas forman una jerarquía de rejillas: una
+tesela del mapa (esquema z/x/y de Web Mercator) se arma leyendo las celdas
+de la precisión que corresponde a su zoom, sumando estados y tipos de
+incidencia filtrados y devolviendo un punto por celda en su centroide. Con
+el zoom suficiente se devuelven las solicitudes una a una.
+
+Las teselas se guardan en la caché de Django bajo una clave que incluye la
+versión (`core.versions`) de las celdas que cubren la tesela. Un cambio de
+solicitud incrementa solo las versiones de las celdas de su punto, así que
+el resto de las teselas se sigue sirviendo desde la caché.
+"""
+from __future__ import annotations
+
+import hashlib
+import math
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, QuerySet, Sum
+from django.db.models.functions import Substr
+
+from core.versions import bump_version, bump_versions, get_versions
+from locations import espacial
+from locations.espacial import Caja
+from locations.models import Ubicacion
+from tickets.models import ESTADOS_ABIERTOS, SolicitudIncidencia
+
+from .models import CeldaMapa
+
+ESTADOS_MAPA = tuple(ESTADOS_ABIERTOS)
+
+# Precisiones de geohash materializadas en `CeldaMapa` (de ~156 km a ~150 m).
+PRECISIONES = (3, 4, 5, 6, 7)
+# Precisiones cuyas celdas llevan versión propia para invalidar teselas.
+PRECISIONES_VERSION = (3, 4, 5)
+# Una tesela con más celdas que esto depende de la versión global.
+MAX_VERSIONES = 64
+
+# Grupos por lado de tesela que se buscan al elegir la precisión.
+GRILLA = 8
+# Desde este zoom se devuelven las solicitudes individuales.
+ZOOM_PUNTOS = 17
+ZOOM_MAXIMO = 20
+MAX_PUNTOS = 500
+DECIMALES = 5
+
+CLAVE_CELDA = 'mapa:celda:'
+CLAVE_TODAS = 'mapa:todas'  # cambia con cualquier solicitud
+CLAVE_GENERACION = 'mapa:generacion'  # cambia al reconstruir
+TTL = 60 * 60 * 24
+# Vista inicial cuando todavía no hay solicitudes en el mapa.
+CENTRO_POR_DEFECTO = (-33.45, -70.65)
+
+# (precision, celda, estado, incidencia_id)
+ClaveCelda = Tuple[int, str, str, int]
+
+
+# ---------------------------------------------------------------------------
+# Mantenimiento
+# ---------------------------------------------------------------------------
+
+def _en_mapa(fila: Optional[dict]) -> Optional[Tuple[str, int, int]]:
+    """(estado, incidencia_id, punto_id) si la solicitud aparece en el mapa."""
+    if not fila or fila['estado'] not in ESTADOS_MAPA or not fila.get('punto_id'):
+        return None
+    return fila['estado'], fila.get('incidencia_id') or 0, fila['punto_id']
+
+
+def registrar_cambio(anterior: Optional[dict], actual: Optional[dict]) -> None:
+    """
+    Mueve la solicitud entre celdas. Mismo contrato que
+    `contadores.registrar_cambio`.
+    """
+    registrar_cambios([(anterior, actual)])
+
+
+def registrar_cambios(cambios: Iterable[Tuple[Optional[dict], Optional[dict]]]) -> None:
+    """
+    Netea en memoria los movimientos de muchas solicitudes, escribe cada
+    celda afectada una sola vez e invalida las teselas que las contienen.
+    """
+    pares = [
+        (anterior, actual)
+        for anterior, actual in ((_en_mapa(a), _en_mapa(b)) for a, b in cambios)
+        if anterior != actual
+    ]
+    if not pares:
+        return
+    punto_ids = {fila[2] for par in pares for fila in par if fila}
+    puntos = {
+        pk: (geohash, latitud, longitud)
+        for pk, geohash, latitud, longitud in Ubicacion.objects.filter(pk__in=punto_ids)
+        .exclude(geohash='').values_list('pk', 'geohash', 'latitud', 'longitud')
+    }
+
+    deltas: Dict[ClaveCelda, List[float]] = defaultdict(lambda: [0, 0.0, 0.0])
+    geohashes = set()
+    for par in pares:
+        for fila, signo in zip(par, (-1, 1)):
+            if not fila or fila[2] not in puntos:
+                continue
+            estado, incidencia_id, punto_id = fila
+            geohash, latitud, longitud = puntos[punto_id]
+            geohashes.add(geohash)
+            for precision in PRECISIONES:
+                delta = deltas[(precision, geohash[:precision], estado, incidencia_id)]
+                delta[0] += signo
+                delta[1] += signo * latitud
+                delta[2] += signo * longitud
+
+    deltas = {clave: delta for clave, delta in deltas.items() if any(delta)}
+    if deltas:
+        with transaction.atomic():
+            _sumar_en_bloque(deltas)
+            invalidar(geohashes)
+
+
+def _sumar_en_bloque(deltas: Dict[ClaveCelda, List[float]]) -> None:
+    """Crea las celdas que falten, suma `deltas` y borra las que quedan vacías."""
+    CeldaMapa.objects.bulk_create(
+        [
+            CeldaMapa(precision=precision, celda=celda, estado=estado, incidencia_id=incidencia_id)
+            for precision, celda, estado, incidencia_id in deltas
+        ],
+        ignore_conflicts=True,
+    )
+    candidatas = CeldaMapa.objects.select_for_update().filter(
+        precision__in={clave[0] for clave in deltas},
+        celda__in={clave[1] for clave in deltas},
+        estado__in={clave[2] for clave in deltas},
+    )
+    celdas, vacias = [], []
+    for celda in candidatas:
+        delta = deltas.get((celda.precision, celda.celda, celda.estado, celda.incidencia_id))
+        if delta is None:
+            continue
+        celda.total += delta[0]
+        celda.suma_latitud += delta[1]
+        celda.suma_longitud += delta[2]
+        if celda.total > 0:
+            celdas.append(celda)
+        else:
+            vacias.append(celda.pk)
+    CeldaMapa.objects.bulk_update(celdas, ['total', 'suma_latitud', 'suma_longitud'], batch_size=500)
+    CeldaMapa.objects.filter(pk__in=vacias).delete()
+
+
+def invalidar(geohashes: Iterable[str]) -> None:
+    """Cambia la versión de las celdas que contienen esos puntos."""
+    claves = {CLAVE_TODAS}
+    for geohash in geohashes:
+        claves.update(CLAVE_CELDA + geohash[:precision] for precision in PRECISIONES_VERSION)
+    bump_versions(sorted(claves))
+
+
+def calcular_en_vivo() -> Dict[ClaveCelda, Tuple[int, float, float]]:
+    """Agrega la tabla de solicitudes con una consulta por precisión."""
+    solicitudes = (
+        SolicitudIncidencia.objects.order_by()
+        .filter(estado__in=ESTADOS_MAPA, punto__isnull=False)
+        .exclude(punto__geohash='')
+    )
+    celdas = {}
+    for precision in PRECISIONES:
+        filas = (
+            solicitudes.annotate(celda=Substr('punto__geohash', 1, precision))
+            .values('celda', 'estado', 'incidencia_id')
+            .annotate(
+                total=Count('pk'),
+                suma_latitud=Sum('punto__latitud'),
+                suma_longitud=Sum('punto__longitud'),
+            )
+        )
+        for fila in filas:
+            clave = (precision, fila['celda'], fila['estado'], fila['incidencia_id'] or 0)
+            celdas[clave] = (fila['total'], fila['suma_latitud'], fila['suma_longitud'])
+    return celdas
+
+
+def diferencias() -> Dict[ClaveCelda, Tuple[int, int]]:
+    """Celdas cuyo total almacenado difiere del agregado en vivo: clave -> (almacenado, vivo)."""
+    vivos = {clave: total for clave, (total, _, _) in calcular_en_vivo().items()}
+    almacenados = {
+        (precision, celda, estado, incidencia_id): total
+        for precision, celda, estado, incidencia_id, total in CeldaMapa.objects.exclude(total=0)
+        .values_list('precision', 'celda', 'estado', 'incidencia_id', 'total')
+    }
+    return {
+        clave: (almacenados.get(clave, 0), vivos.get(clave, 0))
+        for clave in set(vivos) | set(almacenados)
+        if almacenados.get(clave, 0) != vivos.get(clave, 0)
+    }
+
+
+@transaction.atomic
+def reconstruir() -> int:
+    """Reemplaza todas las celdas por los agregados en vivo e invalida todas las teselas."""
+    vivas = calcular_en_vivo()
+    CeldaMapa.objects.all().delete()
+    CeldaMapa.objects.bulk_create(
+        (
+            CeldaMapa(
+                precision=precision, celda=celda, estado=estado, incidencia_id=incidencia_id,
+                total=total, suma_latitud=suma_latitud, suma_longitud=suma_longitud,
+            )
+            for (precision, celda, estado, incidencia_id), (total, suma_latitud, suma_longitud)
+            in vivas.items()
+        ),
+        batch_size=1000,
+    )
+    bump_version(CLAVE_GENERACION)
+    return len(vivas)
+
+
+# ---------------------------------------------------------------------------
+# Teselas
+# ---------------------------------------------------------------------------
+
+def _latitud_mercator(y: float, z: int) -> float:
+    return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / 2 ** z))))
+
+
+def caja_tesela(z: int, x: int, y: int) -> Caja:
+    """Caja en grados de la tesela z/x/y (y crece hacia el sur)."""
+    lados = 2 ** z
+    return Caja(
+        _latitud_mercator(y + 1, z), _latitud_mercator(y, z),
+        x / lados * 360.0 - 180.0, (x + 1) / lados * 360.0 - 180.0,
+    )
+
+
+def precision_agrupacion(z: int) -> Optional[int]:
+    """
+    Precisión cuyas celdas dejan unos `GRILLA` grupos por lado de la
+    tesela; `None` si con ese zoom van las solicitudes individuales.
+    """
+    if z >= ZOOM_PUNTOS:
+        return None
+    ancho = 360.0 / 2 ** z / GRILLA
+    for precision in reversed(PRECISIONES):
+        if espacial.tamano_celda(precision)[1] >= ancho:
+            return precision
+    return PRECISIONES[0]
+
+
+def claves_version(caja: Caja, precision: Optional[int]) -> List[str]:
+    """
+    Versiones de las que depende una tesela: las de las celdas más finas
+    (hasta `precision`) que la cubren sin pasar de `MAX_VERSIONES`, o la
+    global si ni las más gruesas alcanzan.
+    """
+    claves = [CLAVE_GENERACION]
+    for version in reversed(PRECISIONES_VERSION):
+        if precision is not None and version > precision:
+            continue
+        if espacial.cantidad_celdas(caja, version) <= MAX_VERSIONES:
+            return claves + [CLAVE_CELDA + celda for celda in espacial.celdas_de(caja, version)]
+    return claves + [CLAVE_TODAS]
+
+
+def _dentro(caja: Caja, latitud: float, longitud: float) -> bool:
+    # Intervalo semiabierto: un punto en el borde pertenece a una sola tesela.
+    return caja.lat_min <= latitud < caja.lat_max and caja.lon_min <= longitud < caja.lon_max
+
+
+def _punto(latitud: float, longitud: float, propiedades: dict) -> dict:
+    return {
+        'type': 'Feature',
+        'geometry': {
+            'type': 'Point',
+            'coordinates': [round(longitud, DECIMALES), round(latitud, DECIMALES)],
+        },
+        'properties': propiedades,
+    }
+
+
+def celdas_en(caja: Caja, precision: int, estados: Sequence[str] = ESTADOS_MAPA,
+              incidencia_ids: Optional[Sequence[int]] = None) -> QuerySet:
+    """Filas de `CeldaMapa` de esa precisión cuyas celdas tocan `caja`."""
+    prefijos = sorted({celda[:precision] for celda in espacial.celdas(caja)})
+    celdas = CeldaMapa.objects.filter(
+        espacial.filtro_prefijos(prefijos, 'celda'), precision=precision, estado__in=estados,
+    )
+    if incidencia_ids is not None:
+        celdas = celdas.filter(incidencia_id__in=incidencia_ids)
+    return celdas
+
+
+def _grupos(caja: Caja, precision: int, estados: Sequence[str],
+            incidencia_ids: Optional[Sequence[int]]) -> List[dict]:
+    filas = (
+        celdas_en(caja, precision, estados, incidencia_ids).values('celda')
+        .annotate(
+            cantidad=Sum('total'),
+            latitud=Sum('suma_latitud'),
+            longitud=Sum('suma_longitud'),
+        )
+        .filter(cantidad__gt=0)
+        .order_by('celda')
+    )
+    grupos = []
+    for fila in filas:
+        latitud = fila['latitud'] / fila['cantidad']
+        longitud = fila['longitud'] / fila['cantidad']
+        # Cada grupo va en la tesela que contiene su centroide.
+        if _dentro(caja, latitud, longitud):
+            grupos.append(_punto(latitud, longitud, {'total': fila['cantidad']}))
+    return grupos
+
+
+def _solicitudes(caja: Caja, estados: Sequence[str],
+                 incidencia_ids: Optional[Sequence[int]]) -> List[dict]:
+    solicitudes = SolicitudIncidencia.objects.filter(estado__in=estados)
+    if incidencia_ids is not None:
+        solicitudes = solicitudes.filter(incidencia_id__in=incidencia_ids)
+    filas = (
+        espacial.en_caja(solicitudes, caja, 'punto__')
+        .values('pk', 'estado', 'incidencia__nombre', 'punto__latitud', 'punto__longitud')
+        .order_by('pk')[:MAX_PUNTOS]
+    )
+    return [
+        _punto(fila['punto__latitud'], fila['punto__longitud'], {
+            'total': 1,
+            'id': fila['pk'],
+            'estado': fila['estado'],
+            'incidencia': fila['incidencia__nombre'],
+        })
+        for fila in filas
+        if _dentro(caja, fila['punto__latitud'], fila['punto__longitud'])
+    ]
+
+
+def tesela(z: int, x: int, y: int, estados: Optional[Iterable[str]] = None,
+           incidencia_ids: Optional[Iterable[int]] = None) -> dict:
+    """
+    FeatureCollection de la tesela z/x/y con las solicitudes abiertas en
+    `estados` (todas las abiertas si no se indica) y, si se indica, solo de
+    esos tipos de incidencia. Lanza `ValueError` si la tesela no existe.
+    """
+    if not 0 <= z <= ZOOM_MAXIMO or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise ValueError(f"Tesela inválida: {z}/{x}/{y}.")
+    estados = sorted(set(estados or ESTADOS_MAPA) & set(ESTADOS_MAPA))
+    if incidencia_ids is not None:
+        incidencia_ids = sorted(set(incidencia_ids))
+
+    caja = caja_tesela(z, x, y)
+    precision = precision_agrupacion(z)
+    # Las versiones se leen antes que los datos: si cambian entremedio, lo
+    # guardado es más nuevo que su clave y el próximo cambio lo reemplaza.
+    versiones = get_versions(claves_version(caja, precision))
+    firma = hashlib.sha1(
+        repr((z, x, y, estados, incidencia_ids, sorted(versiones.items()))).encode()
+    ).hexdigest()
+    clave = f'mapa:tesela:{firma}'
+    coleccion = cache.get(clave)
+    if coleccion is not None:
+        return coleccion
+
+    if not estados or incidencia_ids == []:
+        features = []
+    elif precision is None:
+        features = _solicitudes(caja, estados, incidencia_ids)
+    else:
+        features = _grupos(caja, precision, estados, incidencia_ids)
+    coleccion = {'type': 'FeatureCollection', 'features': features}
+    cache.set(clave, coleccion, TTL)
+    return coleccion
+
+
+def centro() -> Tuple[float, float]:
+    """Centroide de todas las solicitudes del mapa, para encuadrar la vista inicial."""
+    totales = CeldaMapa.objects.filter(precision=PRECISIONES[0]).aggregate(
+        total=Sum('total'), latitud=Sum('suma_latitud'), longitud=Sum('suma_longitud'),
+    )
+    if not totales['total']:
+        return CENTRO_POR_DEFECTO
+    return totales['latitud'] / totales['total'], totales['longitud'] / totales['total']
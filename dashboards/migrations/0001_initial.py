@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2025-11-24 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContadorSolicitud',
+            fields=[
+                ('contador_id', models.BigAutoField(db_column='Contador_ID', primary_key=True, serialize=False)),
+                ('ambito', models.CharField(choices=[('global', 'Global'), ('territorial', 'Territorial'), ('cuadrilla', 'Cuadrilla'), ('direccion', 'Dirección')], db_column='Ambito', max_length=20)),
+                ('ambito_id', models.PositiveBigIntegerField(db_column='Ambito_id', default=0)),
+                ('estado', models.CharField(db_column='Estado', max_length=50)),
+                ('total', models.IntegerField(db_column='Total', default=0)),
+            ],
+            options={
+                'verbose_name': 'Contador de Solicitudes',
+                'verbose_name_plural': 'Contadores de Solicitudes',
+                'constraints': [models.UniqueConstraint(fields=('ambito', 'ambito_id', 'estado'), name='unique_contador_por_ambito_estado')],
+            },
+        ),
+    ]
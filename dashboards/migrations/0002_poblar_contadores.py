@@ -0,0 +1,48 @@
+from collections import Counter
+
+from django.db import migrations
+from django.db.models import Count
+
+
+def poblar_contadores(apps, schema_editor):
+    SolicitudIncidencia = apps.get_model('tickets', 'SolicitudIncidencia')
+    ContadorSolicitud = apps.get_model('dashboards', 'ContadorSolicitud')
+
+    totales = Counter()
+    solicitudes = SolicitudIncidencia.objects.order_by()
+    for fila in solicitudes.values('estado').annotate(total=Count('pk')):
+        totales[('global', 0, fila['estado'])] += fila['total']
+
+    agrupaciones = (
+        ('territorial', 'territorial_id'),
+        ('cuadrilla', 'cuadrilla_id'),
+        ('direccion', 'cuadrilla__departamento__direccion_id'),
+    )
+    for ambito, campo in agrupaciones:
+        filas = (
+            solicitudes.filter(**{f'{campo}__isnull': False})
+            .values(campo, 'estado')
+            .annotate(total=Count('pk'))
+        )
+        for fila in filas:
+            totales[(ambito, fila[campo], fila['estado'])] += fila['total']
+
+    ContadorSolicitud.objects.all().delete()
+    ContadorSolicitud.objects.bulk_create(
+        ContadorSolicitud(ambito=ambito, ambito_id=ambito_id, estado=estado, total=total)
+        for (ambito, ambito_id, estado), total in totales.items()
+        if total
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboards', '0001_initial'),
+        ('orgs', '0011_remove_cuadrilla_profile_remove_departamento_profile_and_more'),
+        ('tickets', '0015_merge_20251123_0030'),
+    ]
+
+    operations = [
+        migrations.RunPython(poblar_contadores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.4 on 2025-11-24 18:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboards', '0002_poblar_contadores'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetricaSLA',
+            fields=[
+                ('metrica_id', models.BigAutoField(db_column='Metrica_ID', primary_key=True, serialize=False)),
+                ('metrica', models.CharField(choices=[('derivar', 'Tiempo hasta derivar'), ('finalizar', 'Tiempo hasta finalizar'), ('aprobar', 'Tiempo hasta aprobar')], db_column='Metrica', max_length=20)),
+                ('granularidad', models.CharField(choices=[('hora', 'Hora'), ('dia', 'Día')], db_column='Granularidad', max_length=10)),
+                ('inicio', models.DateTimeField(db_column='Inicio')),
+                ('direccion_id', models.PositiveBigIntegerField(db_column='Direccion_id', default=0)),
+                ('departamento_id', models.PositiveBigIntegerField(db_column='Departamento_id', default=0)),
+                ('cuadrilla_id', models.PositiveBigIntegerField(db_column='Cuadrilla_id', default=0)),
+                ('territorial_id', models.PositiveBigIntegerField(db_column='Territorial_id', default=0)),
+                ('incidencia_id', models.PositiveBigIntegerField(db_column='Incidencia_id', default=0)),
+                ('cantidad', models.PositiveIntegerField(db_column='Cantidad', default=0)),
+                ('suma_segundos', models.BigIntegerField(db_column='Suma_segundos', default=0)),
+                ('minimo_segundos', models.BigIntegerField(db_column='Minimo_segundos', default=0)),
+                ('maximo_segundos', models.BigIntegerField(db_column='Maximo_segundos', default=0)),
+                ('histograma', models.JSONField(db_column='Histograma', default=list)),
+            ],
+            options={
+                'verbose_name': 'Métrica SLA',
+                'verbose_name_plural': 'Métricas SLA',
+                'indexes': [models.Index(fields=['granularidad', 'metrica', 'inicio'], name='metrica_sla_rango_idx')],
+                'constraints': [models.UniqueConstraint(fields=('metrica', 'granularidad', 'inicio', 'direccion_id', 'departamento_id', 'cuadrilla_id', 'territorial_id', 'incidencia_id'), name='unique_metrica_sla_por_bucket')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.4 on 2026-10-18 20:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboards', '0003_metricasla'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CeldaMapa',
+            fields=[
+                ('celda_mapa_id', models.BigAutoField(db_column='Celda_Mapa_ID', primary_key=True, serialize=False)),
+                ('precision', models.PositiveSmallIntegerField(db_column='Precision')),
+                ('celda', models.CharField(db_column='Celda', max_length=12)),
+                ('estado', models.CharField(db_column='Estado', max_length=50)),
+                ('incidencia_id', models.PositiveBigIntegerField(db_column='Incidencia_id', default=0)),
+                ('total', models.IntegerField(db_column='Total', default=0)),
+                ('suma_latitud', models.FloatField(db_column='Suma_latitud', default=0)),
+                ('suma_longitud', models.FloatField(db_column='Suma_longitud', default=0)),
+            ],
+            options={
+                'verbose_name': 'Celda del Mapa',
+                'verbose_name_plural': 'Celdas del Mapa',
+                'constraints': [models.UniqueConstraint(fields=('precision', 'celda', 'estado', 'incidencia_id'), name='unique_celda_mapa')],
+            },
+        ),
+    ]
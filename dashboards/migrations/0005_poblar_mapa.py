@@ -0,0 +1,52 @@
+from django.db import migrations
+from django.db.models import Count, Sum
+from django.db.models.functions import Substr
+
+ESTADOS_MAPA = ['Pendiente', 'Derivada', 'En Proceso']
+PRECISIONES = (3, 4, 5, 6, 7)
+
+
+def poblar_mapa(apps, schema_editor):
+    SolicitudIncidencia = apps.get_model('tickets', 'SolicitudIncidencia')
+    CeldaMapa = apps.get_model('dashboards', 'CeldaMapa')
+
+    solicitudes = (
+        SolicitudIncidencia.objects.order_by()
+        .filter(estado__in=ESTADOS_MAPA, punto__isnull=False)
+        .exclude(punto__geohash='')
+    )
+    celdas = []
+    for precision in PRECISIONES:
+        filas = (
+            solicitudes.annotate(celda=Substr('punto__geohash', 1, precision))
+            .values('celda', 'estado', 'incidencia_id')
+            .annotate(
+                total=Count('pk'),
+                suma_latitud=Sum('punto__latitud'),
+                suma_longitud=Sum('punto__longitud'),
+            )
+        )
+        celdas.extend(
+            CeldaMapa(
+                precision=precision, celda=fila['celda'], estado=fila['estado'],
+                incidencia_id=fila['incidencia_id'] or 0, total=fila['total'],
+                suma_latitud=fila['suma_latitud'], suma_longitud=fila['suma_longitud'],
+            )
+            for fila in filas
+        )
+
+    CeldaMapa.objects.all().delete()
+    CeldaMapa.objects.bulk_create(celdas, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboards', '0004_celdamapa'),
+        ('locations', '0003_ubicacion_geohash'),
+        ('tickets', '0021_solicitudincidencia_punto'),
+    ]
+
+    operations = [
+        migrations.RunPython(poblar_mapa, migrations.RunPython.noop),
+    ]
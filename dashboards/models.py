@@ -1,3 +1,124 @@
 from django.db import models
 
-# Create your models here.
+
+class ContadorSolicitud(models.Model):
+    """
+    Total materializado de solicitudes en un estado para un ámbito dado.
+
+    Las filas se mantienen desde las señales de `SolicitudIncidencia`
+    (ver `dashboards.contadores`) para que los dashboards no tengan que
+    contar sobre la tabla de solicitudes en cada visita.
+    """
+
+    class Ambito(models.TextChoices):
+        GLOBAL = 'global', 'Global'
+        TERRITORIAL = 'territorial', 'Territorial'
+        CUADRILLA = 'cuadrilla', 'Cuadrilla'
+        DIRECCION = 'direccion', 'Dirección'
+
+    contador_id = models.BigAutoField(primary_key=True, db_column='Contador_ID')
+    ambito = models.CharField(max_length=20, choices=Ambito.choices, db_column='Ambito')
+    # 0 para el ámbito global; PK del objeto orgs correspondiente en el resto.
+    ambito_id = models.PositiveBigIntegerField(default=0, db_column='Ambito_id')
+    estado = models.CharField(max_length=50, db_column='Estado')
+    total = models.IntegerField(default=0, db_column='Total')
+
+    class Meta:
+        verbose_name = 'Contador de Solicitudes'
+        verbose_name_plural = 'Contadores de Solicitudes'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['ambito', 'ambito_id', 'estado'],
+                name='unique_contador_por_ambito_estado'
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.ambito}:{self.ambito_id} | {self.estado} = {self.total}"
+
+
+class MetricaSLA(models.Model):
+    """
+    Bucket pre-agregado (hora o día) de duraciones de una métrica de SLA
+    para una combinación de dirección, departamento, cuadrilla, territorial
+    y tipo de incidencia. Se alimenta desde `IncidenciaLog` (ver
+    `dashboards.sla`); los identificadores valen 0 cuando no aplican.
+    """
+
+    class Metrica(models.TextChoices):
+        DERIVAR = 'derivar', 'Tiempo hasta derivar'
+        FINALIZAR = 'finalizar', 'Tiempo hasta finalizar'
+        APROBAR = 'aprobar', 'Tiempo hasta aprobar'
+
+    class Granularidad(models.TextChoices):
+        HORA = 'hora', 'Hora'
+        DIA = 'dia', 'Día'
+
+    metrica_id = models.BigAutoField(primary_key=True, db_column='Metrica_ID')
+    metrica = models.CharField(max_length=20, choices=Metrica.choices, db_column='Metrica')
+    granularidad = models.CharField(max_length=10, choices=Granularidad.choices, db_column='Granularidad')
+    inicio = models.DateTimeField(db_column='Inicio')
+
+    direccion_id = models.PositiveBigIntegerField(default=0, db_column='Direccion_id')
+    departamento_id = models.PositiveBigIntegerField(default=0, db_column='Departamento_id')
+    cuadrilla_id = models.PositiveBigIntegerField(default=0, db_column='Cuadrilla_id')
+    territorial_id = models.PositiveBigIntegerField(default=0, db_column='Territorial_id')
+    incidencia_id = models.PositiveBigIntegerField(default=0, db_column='Incidencia_id')
+
+    cantidad = models.PositiveIntegerField(default=0, db_column='Cantidad')
+    suma_segundos = models.BigIntegerField(default=0, db_column='Suma_segundos')
+    minimo_segundos = models.BigIntegerField(default=0, db_column='Minimo_segundos')
+    maximo_segundos = models.BigIntegerField(default=0, db_column='Maximo_segundos')
+    # Conteos por tramo de duración (límites en `dashboards.sla.LIMITES`).
+    histograma = models.JSONField(default=list, db_column='Histograma')
+
+    class Meta:
+        verbose_name = 'Métrica SLA'
+        verbose_name_plural = 'Métricas SLA'
+        constraints = [
+            models.UniqueConstraint(
+                fields=[
+                    'metrica', 'granularidad', 'inicio', 'direccion_id', 'departamento_id',
+                    'cuadrilla_id', 'territorial_id', 'incidencia_id',
+                ],
+                name='unique_metrica_sla_por_bucket'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['granularidad', 'metrica', 'inicio'], name='metrica_sla_rango_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.metrica} {self.granularidad} {self.inicio:%Y-%m-%d %H:%M} = {self.cantidad}"
+
+
+class CeldaMapa(models.Model):
+    """
+    Solicitudes abiertas con punto agrupadas por celda de geohash, para cada
+    precisión de `dashboards.mapa.PRECISIONES`, estado y tipo de incidencia
+    (0 si no tiene). Las sumas de coordenadas dan el centroide del grupo.
+    Se mantiene junto con `ContadorSolicitud` (ver `dashboards.mapa`).
+    """
+
+    celda_mapa_id = models.BigAutoField(primary_key=True, db_column='Celda_Mapa_ID')
+    precision = models.PositiveSmallIntegerField(db_column='Precision')
+    celda = models.CharField(max_length=12, db_column='Celda')
+    estado = models.CharField(max_length=50, db_column='Estado')
+    incidencia_id = models.PositiveBigIntegerField(default=0, db_column='Incidencia_id')
+
+    total = models.IntegerField(default=0, db_column='Total')
+    suma_latitud = models.FloatField(default=0, db_column='Suma_latitud')
+    suma_longitud = models.FloatField(default=0, db_column='Suma_longitud')
+
+    class Meta:
+        verbose_name = 'Celda del Mapa'
+        verbose_name_plural = 'Celdas del Mapa'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['precision', 'celda', 'estado', 'incidencia_id'],
+                name='unique_celda_mapa'
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.precision}:{self.celda} | {self.estado} = {self.total}"
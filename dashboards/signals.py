@@ -0,0 +1,147 @@
+"""
+Señales que mantienen `ContadorSolicitud` y `CeldaMapa` al día con
+`SolicitudIncidencia` (también en las transiciones de
+`tickets.transiciones`, que no emiten `post_save`) y con los cambios de
+jerarquía de `Cuadrilla` y `Departamento`, y `MetricaSLA` al día con
+`IncidenciaLog`, e invalidan las colas cacheadas de los dashboards
+(`dashboards.colas`).
+"""
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+
+from orgs.models import Cuadrilla, Departamento
+from tickets.models import IncidenciaLog, SolicitudIncidencia
+from tickets.transiciones import transicion_aplicada
+
+from . import colas, contadores, mapa, sla
+
+
+def _snapshot(instance):
+    """Valores seguidos tal como están cargados, o None si alguno está diferido."""
+    valores = instance.__dict__
+    if not all(campo in valores for campo in contadores.CAMPOS_SEGUIDOS):
+        return None
+    return {campo: valores[campo] for campo in contadores.CAMPOS_SEGUIDOS}
+
+
+@receiver(post_init, sender=SolicitudIncidencia)
+def recordar_estado_original(sender, instance, **kwargs):
+    instance._contador_original = _snapshot(instance) if instance.pk else None
+
+
+@receiver(pre_save, sender=SolicitudIncidencia)
+def completar_estado_original(sender, instance, raw=False, **kwargs):
+    if raw or not instance.pk or instance._state.adding:
+        return
+    if getattr(instance, '_contador_original', None) is None:
+        instance._contador_original = (
+            SolicitudIncidencia.objects.filter(pk=instance.pk)
+            .values(*contadores.CAMPOS_SEGUIDOS)
+            .first()
+        )
+
+
+@receiver(post_save, sender=SolicitudIncidencia)
+def actualizar_contadores(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    anterior = None if created else getattr(instance, '_contador_original', None)
+    actual = {campo: getattr(instance, campo) for campo in contadores.CAMPOS_SEGUIDOS}
+    if anterior and update_fields is not None:
+        # Los campos no incluidos en update_fields no se escribieron en la BD.
+        escritos = set(update_fields) | {f"{campo}_id" for campo in update_fields}
+        actual = {
+            campo: actual[campo] if campo in escritos else anterior[campo]
+            for campo in contadores.CAMPOS_SEGUIDOS
+        }
+    contadores.registrar_cambio(anterior, actual)
+    mapa.registrar_cambio(anterior, actual)
+    colas.invalidar([anterior, actual])
+    instance._contador_original = actual
+
+
+@receiver(transicion_aplicada, sender=SolicitudIncidencia)
+def contar_transicion(sender, solicitud, anterior, actual, **kwargs):
+    anterior = {campo: anterior[campo] for campo in contadores.CAMPOS_SEGUIDOS}
+    actual = {campo: actual[campo] for campo in contadores.CAMPOS_SEGUIDOS}
+    contadores.registrar_cambio(anterior, actual)
+    mapa.registrar_cambio(anterior, actual)
+    colas.invalidar([anterior, actual])
+    solicitud._contador_original = actual
+
+
+@receiver(post_delete, sender=SolicitudIncidencia)
+def descontar_solicitud(sender, instance, **kwargs):
+    anterior = getattr(instance, '_contador_original', None)
+    contadores.registrar_cambio(anterior, None)
+    mapa.registrar_cambio(anterior, None)
+    colas.invalidar([anterior])
+
+
+@receiver(post_save, sender=IncidenciaLog)
+def acumular_metrica_sla(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        sla.registrar_log(instance)
+
+
+@receiver(post_save, sender=IncidenciaLog)
+def invalidar_cola_de_log(sender, instance, raw=False, **kwargs):
+    if not raw:
+        colas.invalidar_solicitudes([instance.solicitud_id])
+
+
+def _direccion_de(departamento_id):
+    return Departamento.objects.filter(pk=departamento_id).values_list('direccion_id', flat=True).first()
+
+
+@receiver(post_init, sender=Cuadrilla)
+def recordar_departamento(sender, instance, **kwargs):
+    instance._departamento_original = instance.__dict__.get('departamento_id')
+
+
+@receiver(pre_save, sender=Cuadrilla)
+def completar_departamento_original(sender, instance, raw=False, **kwargs):
+    if not raw and not instance._state.adding and instance._departamento_original is None:
+        instance._departamento_original = (
+            Cuadrilla.objects.filter(pk=instance.pk).values_list('departamento_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Cuadrilla)
+def mover_cuadrilla(sender, instance, created, raw=False, **kwargs):
+    anterior = getattr(instance, '_departamento_original', None)
+    instance._departamento_original = instance.departamento_id
+    if raw or created or anterior == instance.departamento_id:
+        return
+    desde, hacia = _direccion_de(anterior), _direccion_de(instance.departamento_id)
+    contadores.mover_cuadrillas([instance.pk], desde, hacia)
+    colas.invalidar_ambitos(
+        {'departamento_id': anterior, 'direccion_id': desde},
+        {'departamento_id': instance.departamento_id, 'direccion_id': hacia},
+    )
+
+
+@receiver(post_init, sender=Departamento)
+def recordar_direccion(sender, instance, **kwargs):
+    instance._direccion_original = instance.__dict__.get('direccion_id')
+
+
+@receiver(pre_save, sender=Departamento)
+def completar_direccion_original(sender, instance, raw=False, **kwargs):
+    if not raw and not instance._state.adding and instance._direccion_original is None:
+        instance._direccion_original = (
+            Departamento.objects.filter(pk=instance.pk).values_list('direccion_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Departamento)
+def mover_departamento(sender, instance, created, raw=False, **kwargs):
+    anterior = getattr(instance, '_direccion_original', None)
+    instance._direccion_original = instance.direccion_id
+    if raw or created or anterior == instance.direccion_id:
+        return
+    contadores.mover_cuadrillas(
+        Cuadrilla.objects.filter(departamento=instance).values_list('pk', flat=True),
+        anterior, instance.direccion_id,
+    )
+    colas.invalidar_ambitos({'direccion_id': anterior}, {'direccion_id': instance.direccion_id})
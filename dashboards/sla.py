@@ -0,0 +1,337 @@
+"""
+Métricas de SLA pre-agregadas a partir de `IncidenciaLog`.
+
+Cada transición relevante genera una duración:
+
+* derivar: desde que la solicitud quedó Pendiente (creación o redirección)
+  hasta que pasa a Derivada;
+* finalizar: desde que quedó Pendiente hasta Finalizada;
+* aprobar: desde la última Finalizada hasta Aprobada.
+
+La duración se suma al bucket horario y al diario de su combinación de
+dirección, departamento, cuadrilla, territorial y tipo de incidencia
+(`MetricaSLA`). Cada bucket guarda cantidad, suma, mínimo, máximo y un
+histograma por tramos, de modo que el dashboard solo lee los buckets del
+rango pedido: los percentiles son aproximados (interpolados dentro del
+tramo) y no dependen del tamaño del historial.
+"""
+from __future__ import annotations
+
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db import transaction
+from django.utils import timezone
+
+from tickets.models import IncidenciaLog, SolicitudIncidencia
+
+from .models import MetricaSLA
+
+Metrica = MetricaSLA.Metrica
+Granularidad = MetricaSLA.Granularidad
+
+# Límite superior (segundos) de cada tramo del histograma; el último tramo no tiene límite.
+LIMITES = [
+    5 * 60, 15 * 60, 30 * 60, 3600, 2 * 3600, 4 * 3600, 8 * 3600, 12 * 3600,
+    86400, 2 * 86400, 3 * 86400, 5 * 86400, 7 * 86400, 14 * 86400, 30 * 86400,
+]
+TRAMOS = len(LIMITES) + 1
+
+METRICA_POR_ESTADO = {
+    'Derivada': Metrica.DERIVAR,
+    'Finalizada': Metrica.FINALIZAR,
+    'Aprobada': Metrica.APROBAR,
+}
+# Estado cuya última entrada marca el inicio de la medición de cada métrica.
+ESTADO_INICIAL = {
+    Metrica.DERIVAR: 'Pendiente',
+    Metrica.FINALIZAR: 'Pendiente',
+    Metrica.APROBAR: 'Finalizada',
+}
+
+DIMENSIONES = ('direccion_id', 'departamento_id', 'cuadrilla_id', 'territorial_id', 'incidencia_id')
+
+CAMPOS_SOLICITUD = {
+    'fecha': 'fecha',
+    'direccion_id': 'cuadrilla__departamento__direccion_id',
+    'departamento_id': 'cuadrilla__departamento_id',
+    'cuadrilla_id': 'cuadrilla_id',
+    'territorial_id': 'territorial_id',
+    'incidencia_id': 'incidencia_id',
+}
+
+# (metrica, granularidad, inicio, *dimensiones)
+ClaveBucket = Tuple
+
+
+def tramo(segundos: int) -> int:
+    for indice, limite in enumerate(LIMITES):
+        if segundos <= limite:
+            return indice
+    return len(LIMITES)
+
+
+def inicio_bucket(momento: datetime, granularidad: str) -> datetime:
+    """
+    Inicio (en UTC) de la hora o del día local que contiene `momento`.
+
+    Se normaliza a UTC porque en los días de cambio de horario la hora
+    local puede no existir (la medianoche que se salta en septiembre) o
+    repetirse (abril), y esas horas no son iguales, según PEP 495, al mismo
+    instante leído de la base: la clave del bucket no se encontraría.
+    """
+    local = timezone.localtime(momento)
+    if granularidad == Granularidad.HORA:
+        # `replace` conserva `fold`: las dos 23:00 de abril son buckets distintos.
+        inicio = local.replace(minute=0, second=0, microsecond=0)
+    else:
+        inicio = timezone.make_aware(datetime.combine(local.date(), datetime.min.time()))
+    return inicio.astimezone(dt_timezone.utc)
+
+
+@dataclass
+class Acumulado:
+    cantidad: int = 0
+    suma: int = 0
+    minimo: int = 0
+    maximo: int = 0
+    histograma: List[int] = field(default_factory=lambda: [0] * TRAMOS)
+
+    def agregar(self, segundos: int) -> None:
+        self.minimo = segundos if not self.cantidad else min(self.minimo, segundos)
+        self.maximo = max(self.maximo, segundos)
+        self.cantidad += 1
+        self.suma += segundos
+        self.histograma[tramo(segundos)] += 1
+
+    def combinar(self, cantidad, suma, minimo, maximo, histograma) -> None:
+        if not cantidad:
+            return
+        self.minimo = minimo if not self.cantidad else min(self.minimo, minimo)
+        self.maximo = max(self.maximo, maximo)
+        self.cantidad += cantidad
+        self.suma += suma
+        for indice, valor in enumerate(histograma[:TRAMOS]):
+            self.histograma[indice] += valor
+
+    @property
+    def promedio(self) -> Optional[float]:
+        return self.suma / self.cantidad if self.cantidad else None
+
+    def percentil(self, p: float) -> Optional[float]:
+        """Percentil `p` (0-1) interpolado linealmente dentro del tramo que lo contiene."""
+        if not self.cantidad:
+            return None
+        objetivo = p * self.cantidad
+        acumulado = 0
+        for indice, valor in enumerate(self.histograma):
+            if valor and acumulado + valor >= objetivo:
+                inferior = max(LIMITES[indice - 1] if indice else 0, self.minimo)
+                superior = min(LIMITES[indice] if indice < len(LIMITES) else self.maximo, self.maximo)
+                superior = max(superior, inferior)
+                return inferior + (superior - inferior) * (objetivo - acumulado) / valor
+            acumulado += valor
+        return float(self.maximo)
+
+
+# ---------------------------------------------------------------------------
+# Ingesta
+# ---------------------------------------------------------------------------
+
+def _claves(metrica: str, momento: datetime, dimensiones: Dict[str, Optional[int]]) -> List[ClaveBucket]:
+    valores = tuple(dimensiones.get(nombre) or 0 for nombre in DIMENSIONES)
+    return [
+        (metrica, granularidad, inicio_bucket(momento, granularidad)) + valores
+        for granularidad in (Granularidad.HORA, Granularidad.DIA)
+    ]
+
+
+def _filtros(clave: ClaveBucket) -> dict:
+    metrica, granularidad, inicio, *valores = clave
+    return {'metrica': metrica, 'granularidad': granularidad, 'inicio': inicio, **dict(zip(DIMENSIONES, valores))}
+
+
+def registrar_log(log: IncidenciaLog) -> None:
+    """Suma la duración que aporta `log` (si aporta alguna) a sus buckets."""
+    registrar_logs([log])
+
+
+def registrar_logs(logs: Iterable[IncidenciaLog]) -> None:
+    """
+    Suma las duraciones que aportan `logs` a sus buckets. Las solicitudes y
+    los inicios de cada medición se leen en una consulta cada uno, y cada
+    bucket afectado se escribe una sola vez (sirve para `bulk_create`, que
+    no emite `post_save`).
+    """
+    logs = [log for log in logs if log.to_estado in METRICA_POR_ESTADO]
+    if not logs:
+        return
+    solicitud_ids = {log.solicitud_id for log in logs}
+    solicitudes = {
+        fila['pk']: fila
+        for fila in SolicitudIncidencia.objects.filter(pk__in=solicitud_ids)
+        .values('pk', *CAMPOS_SOLICITUD.values())
+    }
+    inicios = defaultdict(list)
+    filas_inicio = IncidenciaLog.objects.filter(
+        solicitud_id__in=solicitud_ids,
+        to_estado__in=set(ESTADO_INICIAL.values()),
+    ).values_list('solicitud_id', 'to_estado', 'fecha', 'pk')
+    for solicitud_id, estado, fecha, pk in filas_inicio:
+        inicios[(solicitud_id, estado)].append((fecha, pk))
+
+    deltas: Dict[ClaveBucket, Acumulado] = defaultdict(Acumulado)
+    for log in logs:
+        solicitud = solicitudes.get(log.solicitud_id)
+        if solicitud is None:
+            continue
+        metrica = METRICA_POR_ESTADO[log.to_estado]
+        dimensiones = {alias: solicitud[campo] for alias, campo in CAMPOS_SOLICITUD.items()}
+
+        anteriores = [
+            (fecha, pk) for fecha, pk in inicios[(log.solicitud_id, ESTADO_INICIAL[metrica])]
+            if fecha <= log.fecha and pk != log.pk
+        ]
+        desde = max(anteriores)[0] if anteriores else None
+        if desde is None:
+            if metrica == Metrica.APROBAR:
+                continue
+            desde = dimensiones['fecha']
+
+        segundos = max(0, int((log.fecha - desde).total_seconds()))
+        for clave in _claves(metrica, log.fecha, dimensiones):
+            deltas[clave].agregar(segundos)
+
+    if deltas:
+        _sumar_en_bloque(deltas)
+
+
+def _clave_de(bucket: MetricaSLA) -> ClaveBucket:
+    return (bucket.metrica, bucket.granularidad, bucket.inicio.astimezone(dt_timezone.utc)) + tuple(
+        getattr(bucket, nombre) for nombre in DIMENSIONES
+    )
+
+
+def _sumar(bucket: MetricaSLA, delta: Acumulado) -> None:
+    acumulado = Acumulado()
+    acumulado.combinar(
+        bucket.cantidad, bucket.suma_segundos, bucket.minimo_segundos,
+        bucket.maximo_segundos, bucket.histograma or [0] * TRAMOS,
+    )
+    acumulado.combinar(delta.cantidad, delta.suma, delta.minimo, delta.maximo, delta.histograma)
+    _volcar(bucket, acumulado)
+
+
+@transaction.atomic
+def _sumar_en_bloque(deltas: Dict[ClaveBucket, Acumulado]) -> None:
+    """Crea los buckets que falten y suma `deltas` con un INSERT, un SELECT y un UPDATE."""
+    MetricaSLA.objects.bulk_create(
+        [MetricaSLA(**_filtros(clave)) for clave in deltas],
+        ignore_conflicts=True,
+    )
+    candidatos = MetricaSLA.objects.select_for_update().filter(
+        metrica__in={clave[0] for clave in deltas},
+        granularidad__in={clave[1] for clave in deltas},
+        inicio__in={clave[2] for clave in deltas},
+    )
+    buckets = []
+    for bucket in candidatos:
+        delta = deltas.get(_clave_de(bucket))
+        if delta is not None:
+            _sumar(bucket, delta)
+            buckets.append(bucket)
+    MetricaSLA.objects.bulk_update(
+        buckets,
+        ['cantidad', 'suma_segundos', 'minimo_segundos', 'maximo_segundos', 'histograma'],
+        batch_size=500,
+    )
+
+
+def _volcar(bucket: MetricaSLA, acumulado: Acumulado) -> None:
+    bucket.cantidad = acumulado.cantidad
+    bucket.suma_segundos = acumulado.suma
+    bucket.minimo_segundos = acumulado.minimo
+    bucket.maximo_segundos = acumulado.maximo
+    bucket.histograma = acumulado.histograma
+
+
+# ---------------------------------------------------------------------------
+# Reconstrucción
+# ---------------------------------------------------------------------------
+
+def calcular_buckets() -> Dict[ClaveBucket, Acumulado]:
+    """Recorre todo `IncidenciaLog` una vez (por solicitud y fecha) y arma los buckets."""
+    buckets: Dict[ClaveBucket, Acumulado] = defaultdict(Acumulado)
+    campos = {f'solicitud__{campo}' for campo in CAMPOS_SOLICITUD.values()}
+    logs = (
+        IncidenciaLog.objects.order_by('solicitud_id', 'fecha', 'pk')
+        .values('solicitud_id', 'to_estado', 'fecha', *campos)
+        .iterator(chunk_size=2000)
+    )
+    solicitud_actual, ultimos = None, {}
+    for log in logs:
+        if log['solicitud_id'] != solicitud_actual:
+            solicitud_actual, ultimos = log['solicitud_id'], {}
+        dimensiones = {alias: log[f'solicitud__{campo}'] for alias, campo in CAMPOS_SOLICITUD.items()}
+
+        metrica = METRICA_POR_ESTADO.get(log['to_estado'])
+        if metrica is not None:
+            desde = ultimos.get(ESTADO_INICIAL[metrica])
+            if desde is None and metrica != Metrica.APROBAR:
+                desde = dimensiones['fecha']
+            if desde is not None:
+                segundos = max(0, int((log['fecha'] - desde).total_seconds()))
+                for clave in _claves(metrica, log['fecha'], dimensiones):
+                    buckets[clave].agregar(segundos)
+        ultimos[log['to_estado']] = log['fecha']
+    return buckets
+
+
+@transaction.atomic
+def reconstruir() -> int:
+    """Reemplaza todos los buckets por los calculados desde el historial. Devuelve las filas creadas."""
+    buckets = calcular_buckets()
+    MetricaSLA.objects.all().delete()
+    filas = []
+    for clave, acumulado in buckets.items():
+        bucket = MetricaSLA(**_filtros(clave))
+        _volcar(bucket, acumulado)
+        filas.append(bucket)
+    MetricaSLA.objects.bulk_create(filas, batch_size=1000)
+    return len(filas)
+
+
+# ---------------------------------------------------------------------------
+# Consultas
+# ---------------------------------------------------------------------------
+
+def granularidad_para(desde: datetime, hasta: datetime) -> str:
+    return Granularidad.HORA if hasta - desde <= timedelta(days=2) else Granularidad.DIA
+
+
+def resumen(metrica: str, desde: datetime, hasta: datetime, agrupar_por: Optional[str] = None,
+            filtros: Optional[dict] = None, granularidad: Optional[str] = None) -> Dict[object, Acumulado]:
+    """
+    Combina los buckets de `metrica` en [desde, hasta) agrupados por una
+    dimensión (`agrupar_por`), por `inicio` del bucket ('inicio') o en un
+    único total (clave None).
+    """
+    granularidad = granularidad or granularidad_para(desde, hasta)
+    columnas = ['cantidad', 'suma_segundos', 'minimo_segundos', 'maximo_segundos', 'histograma']
+    filas = MetricaSLA.objects.filter(
+        metrica=metrica,
+        granularidad=granularidad,
+        inicio__gte=inicio_bucket(desde, granularidad),
+        inicio__lt=hasta,
+        **(filtros or {}),
+    )
+    resultado: Dict[object, Acumulado] = defaultdict(Acumulado)
+    if agrupar_por:
+        for clave, *valores in filas.values_list(agrupar_por, *columnas):
+            resultado[clave].combinar(*valores)
+    else:
+        for valores in filas.values_list(*columnas):
+            resultado[None].combinar(*valores)
+    return dict(resultado)
@@ -1,3 +1,578 @@
-from django.test import TestCase
+import math
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
+from zoneinfo import ZoneInfo
 
-# Create your tests here.
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core import directorio, synthetic
+from core.versions import get_versions
+from core.instrumentation import QueryBudgetTestMixin
+from orgs.models import Cuadrilla, Departamento, Direccion, DireccionMembership, Territorial
+from registration import catalog
+from surveys import formularios
+from locations.models import Ubicacion
+from surveys.models import Encuesta
+from tickets import transiciones
+from tickets.models import IncidenciaLog, RespuestaCuadrilla, SolicitudIncidencia
+
+from . import acciones, colas, contadores, despacho, mapa, sla
+from .models import CeldaMapa, ContadorSolicitud, MetricaSLA
+
+Ambito = ContadorSolicitud.Ambito
+SANTIAGO = ZoneInfo('Chile/Continental')
+
+
+@override_settings(TIME_ZONE='Chile/Continental')
+class BucketsSLACambioHorarioTests(TestCase):
+    """
+    En Chile el 2026-09-06 no tiene medianoche (00:00 → 01:00) y el
+    2026-04-04 repite las 23:00. Las duraciones de esos días deben sumarse
+    a sus buckets como las de cualquier otro.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        encuesta = Encuesta.objects.create(titulo='Encuesta', descripcion='')
+        cls.solicitud = SolicitudIncidencia.objects.create(
+            encuesta=encuesta,
+            vecino='Vecino',
+            otro='',
+            fecha=datetime(2026, 3, 1, 9, 0, tzinfo=SANTIAGO),
+        )
+
+    def derivar(self, fecha):
+        log = IncidenciaLog(solicitud=self.solicitud, from_estado='Pendiente', to_estado='Derivada', fecha=fecha)
+        sla.registrar_logs([log])
+
+    def cantidades(self, granularidad):
+        return list(
+            MetricaSLA.objects.filter(metrica=MetricaSLA.Metrica.DERIVAR, granularidad=granularidad)
+            .order_by('inicio')
+            .values_list('inicio', 'cantidad')
+        )
+
+    def test_dia_sin_medianoche(self):
+        self.derivar(datetime(2026, 9, 6, 10, 0, tzinfo=SANTIAGO))
+        self.derivar(datetime(2026, 9, 6, 18, 0, tzinfo=SANTIAGO))
+
+        dias = self.cantidades(MetricaSLA.Granularidad.DIA)
+        self.assertEqual(len(dias), 1)
+        self.assertEqual(dias[0][1], 2)
+        # El día empieza en el primer instante que existe: 01:00 -03.
+        self.assertEqual(dias[0][0], datetime(2026, 9, 6, 1, 0, tzinfo=SANTIAGO))
+        self.assertEqual([cantidad for _, cantidad in self.cantidades(MetricaSLA.Granularidad.HORA)], [1, 1])
+
+    def test_hora_repetida(self):
+        self.derivar(datetime(2026, 4, 4, 23, 30, tzinfo=SANTIAGO))
+        self.derivar(datetime(2026, 4, 4, 23, 30, fold=1, tzinfo=SANTIAGO))
+
+        horas = self.cantidades(MetricaSLA.Granularidad.HORA)
+        self.assertEqual([cantidad for _, cantidad in horas], [1, 1])
+        self.assertEqual((horas[1][0] - horas[0][0]).total_seconds(), 3600)
+        self.assertEqual([cantidad for _, cantidad in self.cantidades(MetricaSLA.Granularidad.DIA)], [2])
+
+    def test_total_incluye_dia_de_cambio(self):
+        self.derivar(datetime(2026, 9, 6, 10, 0, tzinfo=SANTIAGO))
+        self.derivar(datetime(2026, 9, 10, 10, 0, tzinfo=SANTIAGO))
+
+        total = sla.resumen(
+            MetricaSLA.Metrica.DERIVAR,
+            datetime(2026, 9, 1, tzinfo=SANTIAGO),
+            datetime(2026, 9, 30, tzinfo=SANTIAGO),
+        )
+        self.assertEqual(total[None].cantidad, 2)
+
+
+class MetricasSLATests(TestCase):
+    """Los buckets acumulados en vivo deben coincidir con los reconstruidos desde el historial."""
+
+    INICIO = datetime(2026, 5, 4, 9, 0, tzinfo=dt_timezone.utc)
+
+    @classmethod
+    def setUpTestData(cls):
+        Group.objects.create(name='Usuarios')
+        cls.profile = User.objects.create_user('encargado').profile
+        departamento = Departamento.objects.create(
+            nombre='Vialidad', direccion=Direccion.objects.create(nombre='Obras'),
+        )
+        cls.cuadrilla = Cuadrilla.objects.create(nombre='Cuadrilla 1', departamento=departamento)
+        cls.encuesta = Encuesta.objects.create(titulo='Encuesta', descripcion='')
+
+    def registrar(self, solicitud, desde, hacia, horas):
+        IncidenciaLog.objects.create(
+            solicitud=solicitud, profile=self.profile, from_estado=desde, to_estado=hacia,
+            fecha=self.INICIO + timedelta(hours=horas),
+        )
+
+    def buckets(self):
+        columnas = ('metrica', 'granularidad', 'inicio', *sla.DIMENSIONES,
+                    'cantidad', 'suma_segundos', 'minimo_segundos', 'maximo_segundos', 'histograma')
+        return sorted(MetricaSLA.objects.values_list(*columnas), key=repr)
+
+    def test_ingesta_en_vivo_equivale_a_reconstruir(self):
+        for numero in range(3):
+            solicitud = SolicitudIncidencia.objects.create(
+                encuesta=self.encuesta, cuadrilla=self.cuadrilla, vecino='Vecino', otro='', fecha=self.INICIO,
+            )
+            self.registrar(solicitud, 'Pendiente', 'Derivada', numero + 1)
+            self.registrar(solicitud, 'Derivada', 'Finalizada', 24 * (numero + 1))
+            self.registrar(solicitud, 'Finalizada', 'Aprobada', 24 * (numero + 1) + 2)
+        en_vivo = self.buckets()
+
+        sla.reconstruir()
+
+        self.assertEqual(self.buckets(), en_vivo)
+        derivar = sla.resumen(
+            MetricaSLA.Metrica.DERIVAR, self.INICIO, self.INICIO + timedelta(days=1),
+            agrupar_por='cuadrilla_id',
+        )
+        self.assertEqual(derivar[self.cuadrilla.pk].cantidad, 3)
+        self.assertEqual(derivar[self.cuadrilla.pk].promedio, 2 * 3600)
+
+    def test_aprobar_sin_finalizar_no_se_mide(self):
+        solicitud = SolicitudIncidencia.objects.create(
+            encuesta=self.encuesta, vecino='Vecino', otro='', fecha=self.INICIO,
+        )
+        self.registrar(solicitud, 'Pendiente', 'Aprobada', 5)
+
+        self.assertFalse(MetricaSLA.objects.filter(metrica=MetricaSLA.Metrica.APROBAR).exists())
+
+    def test_percentil_interpola_dentro_del_tramo(self):
+        acumulado = sla.Acumulado()
+        for segundos in (60, 120, 240, 600):
+            acumulado.agregar(segundos)
+
+        self.assertEqual(acumulado.histograma[:2], [3, 1])
+        self.assertEqual(acumulado.percentil(0.5), 60 + (300 - 60) * 2 / 3)
+        self.assertEqual(acumulado.percentil(1), 600)
+        self.assertIsNone(sla.Acumulado().percentil(0.5))
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class PresupuestoConsultasTests(QueryBudgetTestMixin, TestCase):
+    """Presupuestos de `settings.QUERY_BUDGETS` de los dashboards, sobre un municipio sintético."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Group.objects.create(name='Usuarios')
+        cls.generador = synthetic.Generador(synthetic.Escala(
+            direcciones=2, departamentos_por_direccion=2, cuadrillas_por_departamento=2,
+            territoriales=3, solicitudes=200, dias=30,
+        ))
+        cls.generador.generar(indexar_busqueda=False)
+
+    def setUp(self):
+        cache.clear()
+        directorio._directorio = None
+        catalog._snapshot = None
+        formularios._compilados.clear()
+        self.client.force_login(User.objects.get(username=f'{self.generador.slug}_secpla_1'))
+
+    def test_dashboard_secpla(self):
+        self.assertEqual(self.assertQueryBudget(reverse('dashboard_secpla')).status_code, 200)
+
+    def test_dashboard_sla(self):
+        self.assertEqual(self.assertQueryBudget(reverse('dashboard_sla')).status_code, 200)
+
+
+class ResponderIncidenciaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Group.objects.create(name='Usuarios')
+        cls.usuario = User.objects.create_user('cuadrilla')
+        cls.usuario.groups.add(Group.objects.create(name='Cuadrillas'))
+        departamento = Departamento.objects.create(
+            nombre='Vialidad', direccion=Direccion.objects.create(nombre='Obras'),
+        )
+        cls.cuadrilla = Cuadrilla.objects.create(nombre='Cuadrilla 1', departamento=departamento)
+        cls.encuesta = Encuesta.objects.create(titulo='Encuesta', descripcion='')
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def responder(self, estado):
+        solicitud = SolicitudIncidencia.objects.create(
+            encuesta=self.encuesta, cuadrilla=self.cuadrilla, vecino='Vecino', otro='', estado=estado,
+        )
+        self.client.post(reverse('responder_incidencia', args=[solicitud.pk]), {'respuesta': 'Listo'})
+        solicitud.refresh_from_db()
+        return solicitud
+
+    def test_finaliza_y_guarda_la_respuesta(self):
+        solicitud = self.responder('En Proceso')
+
+        self.assertEqual(solicitud.estado, 'Finalizada')
+        self.assertTrue(RespuestaCuadrilla.objects.filter(solicitud=solicitud).exists())
+
+    def test_transicion_fallida_no_deja_respuesta(self):
+        solicitud = self.responder('Pendiente')
+
+        self.assertEqual(solicitud.estado, 'Pendiente')
+        self.assertFalse(RespuestaCuadrilla.objects.filter(solicitud=solicitud).exists())
+
+
+class ContadoresTests(TestCase):
+    """Los contadores materializados deben coincidir siempre con los agregados en vivo."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Group.objects.create(name='Usuarios')
+        cls.profile = User.objects.create_user('encargado').profile
+        cls.obras = Direccion.objects.create(nombre='Obras')
+        cls.aseo = Direccion.objects.create(nombre='Aseo')
+        cls.vialidad = Departamento.objects.create(nombre='Vialidad', direccion=cls.obras)
+        cls.ornato = Departamento.objects.create(nombre='Ornato', direccion=cls.aseo)
+        cls.cuadrilla = Cuadrilla.objects.create(nombre='Cuadrilla 1', departamento=cls.vialidad)
+        cls.territorial = Territorial.objects.create(nombre='Norte')
+        cls.encuesta = Encuesta.objects.create(titulo='Encuesta', descripcion='')
+
+    def setUp(self):
+        directorio._directorio = None
+        self.solicitudes = [
+            SolicitudIncidencia.objects.create(
+                encuesta=self.encuesta, territorial=self.territorial, cuadrilla=cuadrilla,
+                vecino='Vecino', otro='', estado=estado,
+            )
+            for cuadrilla, estado in ((None, 'Pendiente'), (self.cuadrilla, 'Derivada'), (self.cuadrilla, 'En Proceso'))
+        ]
+
+    def assertCuadran(self):
+        self.assertEqual(contadores.diferencias(), {})
+
+    def test_alta_suma_en_cada_ambito(self):
+        self.assertCuadran()
+        self.assertEqual(contadores.totales_por_estado(Ambito.GLOBAL)['Pendiente'], 1)
+        self.assertEqual(contadores.totales_por_estado(Ambito.TERRITORIAL, self.territorial.pk)['Derivada'], 1)
+        self.assertEqual(contadores.totales_por_estado(Ambito.DIRECCION, self.obras.pk)['En Proceso'], 1)
+
+    def test_transicion_mueve_los_contadores(self):
+        transiciones.transicionar(self.solicitudes[1], transiciones.FINALIZADA, self.profile)
+
+        self.assertCuadran()
+        totales = contadores.totales_por_estado(Ambito.CUADRILLA, self.cuadrilla.pk)
+        self.assertEqual((totales['Derivada'], totales['Finalizada']), (0, 1))
+
+    def test_cambio_de_departamento_traspasa_la_direccion(self):
+        self.cuadrilla.departamento = self.ornato
+        self.cuadrilla.save()
+
+        self.assertCuadran()
+        self.assertEqual(sum(contadores.totales_por_estado(Ambito.DIRECCION, self.obras.pk).values()), 0)
+        self.assertEqual(sum(contadores.totales_por_estado(Ambito.DIRECCION, self.aseo.pk).values()), 2)
+
+        # La próxima transición descuenta de la dirección nueva, no de la anterior.
+        transiciones.transicionar(self.solicitudes[2], transiciones.FINALIZADA, self.profile)
+        self.assertCuadran()
+
+    def test_cambio_de_direccion_del_departamento(self):
+        departamento = Departamento.objects.only('pk', 'nombre').get(pk=self.vialidad.pk)
+        departamento.direccion = self.aseo
+        departamento.save()
+
+        self.assertCuadran()
+        self.assertEqual(sum(contadores.totales_por_estado(Ambito.DIRECCION, self.aseo.pk).values()), 2)
+
+    def test_reconstruir_equivale_a_los_agregados(self):
+        ContadorSolicitud.objects.update(total=7)
+
+        contadores.reconstruir()
+
+        self.assertEqual(contadores.leer_almacenados(), contadores.calcular_en_vivo())
+
+
+class DashboardDireccionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Group.objects.create(name='Usuarios')
+        cls.usuario = User.objects.create_user('direccion')
+        cls.usuario.groups.add(Group.objects.create(name='Direcciones'))
+        direccion = Direccion.objects.create(nombre='Obras')
+        DireccionMembership.objects.create(direccion=direccion, usuario_id=cls.usuario.profile)
+        cuadrilla = Cuadrilla.objects.create(
+            nombre='Cuadrilla 1', departamento=Departamento.objects.create(nombre='Vialidad', direccion=direccion),
+        )
+        encuesta = Encuesta.objects.create(titulo='Encuesta', descripcion='')
+        SolicitudIncidencia.objects.bulk_create(
+            SolicitudIncidencia(encuesta=encuesta, cuadrilla=cuadrilla, vecino='Vecino', otro='', estado='Derivada')
+            for _ in range(30)
+        )
+
+    def setUp(self):
+        cache.clear()
+        directorio._directorio = None
+        self.client.force_login(self.usuario)
+
+    def test_pagina_la_tabla(self):
+        primera = self.client.get(reverse('dashboard_direccion')).context['incidencias_filtradas']
+        self.assertEqual(len(primera), 25)
+        self.assertTrue(primera.has_next())
+
+        segunda = self.client.get(reverse('dashboard_direccion'), {'cursor': primera.next_token})
+        self.assertEqual(len(segunda.context['incidencias_filtradas']), 5)
+
+
+class AccionesMasivasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Group.objects.create(name='Usuarios')
+        cls.profile = User.objects.create_user('encargado').profile
+        cls.departamento = Departamento.objects.create(
+            nombre='Vialidad', direccion=Direccion.objects.create(nombre='Obras'),
+        )
+        cls.cuadrillas = [
+            Cuadrilla.objects.create(nombre=f'Cuadrilla {numero}', departamento=cls.departamento)
+            for numero in (1, 2)
+        ]
+        cls.encuesta = Encuesta.objects.create(titulo='Encuesta', descripcion='')
+
+    def setUp(self):
+        directorio._directorio = None
+        self.solicitudes = [
+            SolicitudIncidencia.objects.create(encuesta=self.encuesta, vecino='Vecino', otro='')
+            for _ in range(4)
+        ]
+        self.ids = [solicitud.pk for solicitud in self.solicitudes]
+
+    def test_informa_el_motivo_de_cada_id_fallido(self):
+        rechazada = self.solicitudes[0]
+        SolicitudIncidencia.objects.filter(pk=rechazada.pk).update(estado='Rechazada')
+
+        resultado = acciones.iniciar([rechazada.pk, self.ids[1], 999999], self.profile, self.departamento.pk)
+
+        self.assertEqual(resultado.aplicadas, [])
+        self.assertEqual(resultado.fallidas, {
+            rechazada.pk: "Su estado o ámbito no permite esta acción.",
+            self.ids[1]: "Su estado o ámbito no permite esta acción.",
+            999999: "La solicitud no existe.",
+        })
+
+    def test_tomar_reparte_y_registra(self):
+        resultado = acciones.tomar(self.ids, self.profile, self.departamento.pk)
+
+        self.assertEqual(sorted(resultado.aplicadas), self.ids)
+        self.assertEqual(resultado.fallidas, {})
+        tomadas = SolicitudIncidencia.objects.filter(pk__in=self.ids)
+        self.assertEqual(set(tomadas.values_list('estado', flat=True)), {'Derivada'})
+        self.assertEqual(set(tomadas.values_list('cuadrilla_id', flat=True)), {c.pk for c in self.cuadrillas})
+        self.assertEqual(IncidenciaLog.objects.filter(solicitud_id__in=self.ids).count(), 4)
+        self.assertEqual(contadores.diferencias(), {})
+
+    def test_tomar_es_atomica_entre_cuadrillas(self):
+        registrar = contadores.registrar_cambios
+        llamadas = []
+
+        def fallar_en_la_segunda(cambios):
+            llamadas.append(cambios)
+            if len(llamadas) == 2:
+                raise RuntimeError('falla')
+            registrar(cambios)
+
+        with mock.patch.object(contadores, 'registrar_cambios', fallar_en_la_segunda):
+            with self.assertRaises(RuntimeError):
+                acciones.tomar(self.ids, self.profile, self.departamento.pk)
+
+        self.assertFalse(SolicitudIncidencia.objects.filter(pk__in=self.ids, cuadrilla__isnull=False).exists())
+        self.assertFalse(IncidenciaLog.objects.exists())
+        self.assertEqual(contadores.diferencias(), {})
+
+
+class DespachoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Group.objects.create(name='Usuarios')
+        cls.profile = User.objects.create_user('encargado').profile
+        cls.departamento = Departamento.objects.create(
+            nombre='Vialidad', direccion=Direccion.objects.create(nombre='Obras'),
+        )
+        cls.cuadrillas = [
+            Cuadrilla.objects.create(nombre=f'Cuadrilla {numero}', departamento=cls.departamento)
+            for numero in (1, 2, 3)
+        ]
+        cls.cuadrillas[2].estado = False
+        cls.cuadrillas[2].save()
+        cls.encuesta = Encuesta.objects.create(titulo='Encuesta', descripcion='', prioridad='Alta')
+
+    def setUp(self):
+        directorio._directorio = None
+
+    def solicitud(self, **campos):
+        return SolicitudIncidencia.objects.create(encuesta=self.encuesta, vecino='Vecino', otro='', **campos)
+
+    def test_menor_carga_reparte_en_memoria(self):
+        despachador = despacho.Despachador({1: 'A', 2: 'B', 3: 'C'}, {1: 3, 2: 1, 3: 1}, despacho.MenorCarga())
+
+        elegidas = [despachador.elegir(despacho.Pedido(numero)).cuadrilla_id for numero in range(4)]
+
+        self.assertEqual(elegidas, [2, 3, 2, 3])
+        self.assertEqual(despachador.cargas, {1: 3, 2: 3, 3: 3})
+
+    def test_prioridad_pondera_la_distancia(self):
+        politica = despacho.MenorCarga()
+        candidatas = [despacho.Candidata(1, 'Cerca', carga=3, distancia_km=0.5),
+                      despacho.Candidata(2, 'Lejos', carga=1, distancia_km=2.0)]
+
+        self.assertEqual(politica.elegir(despacho.Pedido(1, 'Alta'), candidatas).cuadrilla_id, 1)
+        self.assertEqual(politica.elegir(despacho.Pedido(1, 'Baja'), candidatas).cuadrilla_id, 2)
+
+    def test_elige_la_activa_menos_cargada(self):
+        primera, segunda, _ = self.cuadrillas
+        self.solicitud(cuadrilla=primera, estado='Derivada')
+        nueva = self.solicitud()
+
+        # Cuadrillas activas y su carga, sin recorrer las solicitudes.
+        with self.assertNumQueries(2):
+            elegida = despacho.elegir_cuadrilla(nueva, self.departamento.pk, despacho.MenorCarga(), lambda pk: {})
+
+        self.assertEqual(elegida.cuadrilla_id, segunda.pk)
+        self.assertEqual(despacho.cargas_abiertas([primera.pk, segunda.pk]), {primera.pk: 1})
+
+    def test_politica_desconocida(self):
+        with self.assertRaises(ValueError):
+            despacho.get_politica('al_azar')
+
+    def test_simular_compara_con_el_historial(self):
+        primera = self.cuadrillas[0]
+        for hora in range(4):
+            solicitud = self.solicitud(cuadrilla=primera, estado='Derivada')
+            IncidenciaLog.objects.create(
+                solicitud=solicitud, profile=self.profile, from_estado='Pendiente', to_estado='Derivada',
+                fecha=datetime(2026, 5, 4, 9 + hora, tzinfo=dt_timezone.utc),
+            )
+
+        historica, menor_carga = despacho.simular([despacho.MenorCarga()], self.departamento.pk)
+
+        self.assertEqual((historica.politica, historica.asignaciones, historica.carga_maxima), ('historica', 4, 4))
+        self.assertEqual((menor_carga.asignaciones, menor_carga.carga_maxima), (4, 2))
+        self.assertEqual(menor_carga.participacion_maxima, 0.5)
+
+
+def _tesela_de(latitud, longitud, z):
+    lados = 2 ** z
+    y = (1 - math.asinh(math.tan(math.radians(latitud))) / math.pi) / 2
+    return z, int((longitud + 180) / 360 * lados), int(y * lados)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class MapaTeselasTests(TestCase):
+    CENTRO = (-33.45, -70.65)
+
+    @classmethod
+    def setUpTestData(cls):
+        Group.objects.create(name='Usuarios')
+        cls.profile = User.objects.create_user('encargado').profile
+        cls.encuesta = Encuesta.objects.create(titulo='Encuesta', descripcion='')
+
+    def setUp(self):
+        cache.clear()
+        directorio._directorio = None
+        self.solicitudes = [
+            self.solicitud(self.CENTRO[0] + numero * 0.001, self.CENTRO[1] + numero * 0.001)
+            for numero in range(5)
+        ]
+
+    def solicitud(self, latitud, longitud):
+        punto = Ubicacion.objects.create(calle='Calle', numero_casa='1', latitud=latitud, longitud=longitud)
+        return SolicitudIncidencia.objects.create(encuesta=self.encuesta, vecino='Vecino', otro='', punto=punto)
+
+    def total(self, coleccion):
+        return sum(feature['properties']['total'] for feature in coleccion['features'])
+
+    def test_celdas_cuadran_con_las_solicitudes(self):
+        self.assertEqual(mapa.diferencias(), {})
+
+        transiciones.transicionar(self.solicitudes[0], transiciones.RECHAZADA, self.profile)
+
+        self.assertEqual(mapa.diferencias(), {})
+        CeldaMapa.objects.update(total=0)
+        mapa.reconstruir()
+        self.assertEqual(mapa.diferencias(), {})
+
+    def test_agrupa_y_sirve_desde_la_cache(self):
+        z, x, y = _tesela_de(*self.CENTRO, 8)
+
+        self.assertEqual(self.total(mapa.tesela(z, x, y)), 5)
+        # Solo se leen las versiones de la tesela.
+        with self.assertNumQueries(1):
+            mapa.tesela(z, x, y)
+
+    def test_un_cambio_solo_invalida_sus_teselas(self):
+        cerca = _tesela_de(*self.CENTRO, 8)
+        lejos = _tesela_de(-41.47, -72.94, 8)
+        mapa.tesela(*cerca)
+        mapa.tesela(*lejos)
+
+        self.solicitud(-41.47, -72.94)
+
+        with self.assertNumQueries(1):
+            mapa.tesela(*cerca)
+        self.assertEqual(self.total(mapa.tesela(*lejos)), 1)
+
+    def test_con_zoom_alto_devuelve_cada_solicitud(self):
+        coleccion = mapa.tesela(*_tesela_de(*self.CENTRO, mapa.ZOOM_PUNTOS))
+
+        self.assertEqual([feature['properties']['id'] for feature in coleccion['features']], [self.solicitudes[0].pk])
+
+    def test_filtra_por_estado(self):
+        transiciones.transicionar(self.solicitudes[0], transiciones.DERIVADA, self.profile)
+        z, x, y = _tesela_de(*self.CENTRO, 8)
+
+        self.assertEqual(self.total(mapa.tesela(z, x, y, ['Derivada'])), 1)
+        self.assertEqual(self.total(mapa.tesela(z, x, y, ['Pendiente'])), 4)
+
+    def test_tesela_invalida(self):
+        with self.assertRaises(ValueError):
+            mapa.tesela(3, 8, 0)
+
+
+class ColasTests(TestCase):
+    """Cada escritura de una solicitud incrementa solo las colas de los ámbitos que toca."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Group.objects.create(name='Usuarios')
+        cls.obras = Direccion.objects.create(nombre='Obras')
+        cls.vialidad = Departamento.objects.create(nombre='Vialidad', direccion=cls.obras)
+        cls.ornato = Departamento.objects.create(nombre='Ornato', direccion=Direccion.objects.create(nombre='Aseo'))
+        cls.primera = Cuadrilla.objects.create(nombre='Cuadrilla 1', departamento=cls.vialidad)
+        cls.segunda = Cuadrilla.objects.create(nombre='Cuadrilla 2', departamento=cls.ornato)
+        cls.territorial = Territorial.objects.create(nombre='Norte')
+        cls.encuesta = Encuesta.objects.create(titulo='Encuesta', descripcion='')
+
+    def setUp(self):
+        directorio._directorio = None
+
+    def versiones(self):
+        return get_versions([
+            *colas.claves(territorial_id=self.territorial.pk, cuadrilla_id=self.primera.pk,
+                          departamento_id=self.vialidad.pk, direccion_id=self.obras.pk, sin_cuadrilla=True),
+            *colas.claves(cuadrilla_id=self.segunda.pk, departamento_id=self.ornato.pk),
+        ])
+
+    def cambiadas(self, antes):
+        return sorted(clave for clave, numero in self.versiones().items() if numero != antes[clave])
+
+    def test_alta_y_cambio_de_cuadrilla(self):
+        antes = self.versiones()
+        solicitud = SolicitudIncidencia.objects.create(
+            encuesta=self.encuesta, territorial=self.territorial, cuadrilla=self.primera, vecino='Vecino', otro='',
+        )
+        self.assertEqual(self.cambiadas(antes), [
+            f'cola:cuadrilla:{self.primera.pk}', f'cola:departamento:{self.vialidad.pk}',
+            f'cola:direccion:{self.obras.pk}', f'cola:territorial:{self.territorial.pk}',
+        ])
+
+        antes = self.versiones()
+        solicitud.cuadrilla = self.segunda
+        solicitud.save()
+        self.assertEqual(len(self.cambiadas(antes)), 6)
+        self.assertNotIn(colas.CLAVE_SIN_CUADRILLA, self.cambiadas(antes))
+
+    def test_sin_cuadrilla(self):
+        antes = self.versiones()
+        SolicitudIncidencia.objects.create(encuesta=self.encuesta, vecino='Vecino', otro='')
+
+        self.assertEqual(self.cambiadas(antes), [colas.CLAVE_SIN_CUADRILLA])
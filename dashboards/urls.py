@@ -8,13 +8,18 @@ urlpatterns = [
     path('territorial/', views.territorial_dashboard, name='dashboard_territorial'),
     path('direccion/', views.dashboard_direccion, name='dashboard_direccion'),
     path('departamento/', views.dashboard_departamento, name='dashboard_departamento'),
+    path('sla/', views.dashboard_sla, name='dashboard_sla'),
+    path('mapa/<int:z>/<int:x>/<int:y>.geojson', views.mapa_teselas, name='mapa_teselas'),
     path('asignar-cuadrilla/<int:incidencia_id>/', views.asignar_cuadrilla, name='asignar_cuadrilla'),
     
     path('tomar/<int:incidencia_id>/', views.tomar_solicitud, name='tomar_solicitud'),
     path('poner-en-proceso/<int:incidencia_id>/', views.poner_en_proceso, name='poner_en_proceso'),
+    path('acciones/', views.acciones_masivas, name='acciones_masivas'),
     
     path('cuadrilla/', views.dashboard_cuadrilla, name='dashboard_cuadrilla'),
     path('cuadrilla/responder/<int:incidencia_id>/', views.responder_incidencia, name='responder_incidencia'),
+    path('cuadrilla/responder/<int:incidencia_id>/subidas/', views.subida_crear, name='subida_crear'),
+    path('cuadrilla/subidas/<uuid:subida_id>/', views.subida_fragmento, name='subida_fragmento'),
     path('aprobar-incidencia/<int:incidencia_id>/', views.aprobar_incidencia, name='aprobar_incidencia'),
     path('rechazar_incidencia/<int:incidencia_id>/', views.rechazar_incidencia, name='rechazar_incidencia'),
     path('redirigir-incidencia/<int:incidencia_id>/', views.redirigir_incidencia, name='redirigir_incidencia'),
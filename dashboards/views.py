@@ -1,55 +1,153 @@
 from pyexpat.errors import messages
-from django.db.models import Count, Q
 from django.shortcuts import render, get_object_or_404, redirect
+from core import directorio
+from core.caching import memoize
 from core.decorators import role_required
+from core.pagination import paginate_request, query_string_without_cursor
 from django.contrib.auth.models import User
-from tickets.models import Multimedia, SolicitudIncidencia, RespuestaCuadrilla, MultimediaCuadrilla
-from orgs.models import Cuadrilla, Departamento, Direccion, Territorial
+from tickets.models import Multimedia, SolicitudIncidencia, RespuestaCuadrilla, MultimediaCuadrilla, SubidaFragmentada
+from tickets import subidas, transiciones
+from orgs.models import Cuadrilla
+from locations import geocodificar
 from locations.models import Ubicacion
 from registration.models import Profile
 from django.utils import timezone
 from django.contrib import messages
+from django.core.exceptions import PermissionDenied
+from django.db import transaction
+from django.http import HttpResponse, JsonResponse
+from django.urls import reverse
+from django.views.decorators.http import require_http_methods, require_POST
 from tickets.forms  import RechazaIncidenciaForm, SolicitudIncidenciaForm
+from core.roles import get_role_context
+from datetime import datetime, time, timedelta
+from . import acciones, colas, contadores, despacho, mapa, sla
+from .models import ContadorSolicitud, MetricaSLA
+
+@memoize(User, Ubicacion)
+def _totales_secpla():
+    return User.objects.filter(is_active=True).count(), Ubicacion.objects.count()
+
 
 @role_required("Secpla")
 def dashboard_secpla(request):
     
-    total_usuarios = User.objects.filter(is_active=True).count()
-    incidencias_creadas = SolicitudIncidencia.objects.filter(estado="Creada").count()
-    incidencias_derivadas = SolicitudIncidencia.objects.filter(estado="Derivada").count()
-    incidencias_rechazadas = SolicitudIncidencia.objects.filter(estado="Rechazada").count()
-    incidencias_finalizadas = SolicitudIncidencia.objects.filter(estado="Finalizada").count()
-    total_ubicaciones = Ubicacion.objects.count()
-
-    
-    incidencias = SolicitudIncidencia.objects.all().select_related(
-        "incidencia", "territorial", "cuadrilla", "encuesta"
-    ).order_by("-fecha")
+    total_usuarios, total_ubicaciones = _totales_secpla()
+    estado_totales = contadores.totales_por_estado(ContadorSolicitud.Ambito.GLOBAL)
 
     context = {
+        "mapa": _contexto_mapa(request, get_role_context(request)),
         "total_usuarios": total_usuarios,
-        "incidencias_creadas": incidencias_creadas,
-        "incidencias_derivadas": incidencias_derivadas,
-        "incidencias_rechazadas": incidencias_rechazadas,
-        "incidencias_finalizadas": incidencias_finalizadas,
-        "incidencias": incidencias, 
+        "incidencias_creadas": estado_totales["Pendiente"],
+        "incidencias_derivadas": estado_totales["Derivada"],
+        "incidencias_rechazadas": estado_totales["Rechazada"],
+        "incidencias_finalizadas": estado_totales["Finalizada"],
         "total_ubicaciones": total_ubicaciones,
     }
 
     return render(request, "dashboards/dashboard_secpla.html", context)
 
 
-from django.contrib.auth.models import User
-from django.core.paginator import Paginator
+# Campo de agrupación → (título, tabla de `core.directorio` con los nombres).
+SLA_AGRUPACIONES = {
+    "direccion_id": ("Dirección", "direccion"),
+    "departamento_id": ("Departamento", "departamento"),
+    "cuadrilla_id": ("Cuadrilla", "cuadrilla"),
+    "territorial_id": ("Territorial", "territorial"),
+    "incidencia_id": ("Tipo de incidencia", "incidencia"),
+}
+SLA_PERCENTILES = (0.5, 0.9, 0.95)
+
+
+def _fecha_param(valor, por_defecto):
+    try:
+        return datetime.strptime(valor, "%Y-%m-%d").date() if valor else por_defecto
+    except ValueError:
+        return por_defecto
+
+
+def _horas(segundos):
+    return None if segundos is None else round(segundos / 3600, 1)
+
+
+def _fila_sla(etiqueta, acumulado):
+    return {
+        "etiqueta": etiqueta,
+        "cantidad": acumulado.cantidad,
+        "promedio": _horas(acumulado.promedio),
+        "percentiles": [(int(p * 100), _horas(acumulado.percentil(p))) for p in SLA_PERCENTILES],
+        "maximo": _horas(acumulado.maximo),
+    }
+
+
+@role_required("Secpla", "Direcciones")
+def dashboard_sla(request):
+    """Tiempos de derivación, resolución y aprobación leídos desde MetricaSLA."""
+    roles = get_role_context(request)
+    hoy = timezone.localdate()
+
+    metrica = request.GET.get("metrica")
+    if metrica not in MetricaSLA.Metrica.values:
+        metrica = MetricaSLA.Metrica.FINALIZAR
+    agrupar = request.GET.get("agrupar")
+    if agrupar not in SLA_AGRUPACIONES:
+        agrupar = "direccion_id"
+    hasta = _fecha_param(request.GET.get("hasta"), hoy)
+    desde = _fecha_param(request.GET.get("desde"), hasta - timedelta(days=29))
+    if desde > hasta:
+        desde, hasta = hasta, desde
+
+    filtros = {}
+    if not roles.in_groups("Secpla"):
+        filtros["direccion_id__in"] = roles.direccion_ids
+
+    inicio = timezone.make_aware(datetime.combine(desde, time.min))
+    fin = timezone.make_aware(datetime.combine(hasta + timedelta(days=1), time.min))
+    granularidad = sla.granularidad_para(inicio, fin)
+
+    total = sla.resumen(metrica, inicio, fin, filtros=filtros, granularidad=granularidad).get(None)
+    grupos = sla.resumen(metrica, inicio, fin, agrupar_por=agrupar, filtros=filtros, granularidad=granularidad)
+    serie = sla.resumen(metrica, inicio, fin, agrupar_por="inicio", filtros=filtros, granularidad=granularidad)
+
+    titulo_grupo, tabla_grupo = SLA_AGRUPACIONES[agrupar]
+    registros = directorio.de_peticion(request)
+    filas = sorted(
+        (
+            _fila_sla(registros.nombre(tabla_grupo, pk, "Sin asignar"), acumulado)
+            for pk, acumulado in grupos.items()
+        ),
+        key=lambda fila: -fila["cantidad"],
+    )
+    formato = "%d-%m %H:%M" if granularidad == MetricaSLA.Granularidad.HORA else "%d-%m-%Y"
+    serie_filas = [
+        _fila_sla(timezone.localtime(momento).strftime(formato), serie[momento]) for momento in sorted(serie)
+    ]
+
+    context = {
+        "metricas": MetricaSLA.Metrica.choices,
+        "metrica": metrica,
+        "agrupaciones": [(clave, titulo) for clave, (titulo, _) in SLA_AGRUPACIONES.items()],
+        "agrupar": agrupar,
+        "titulo_grupo": titulo_grupo,
+        "desde": desde,
+        "hasta": hasta,
+        "granularidad": granularidad,
+        "total": _fila_sla("Total", total) if total else None,
+        "filas": filas,
+        "serie": serie_filas,
+        "percentiles": [int(p * 100) for p in SLA_PERCENTILES],
+    }
+    return render(request, "dashboards/dashboard_sla.html", context)
+
 
 @role_required("Secpla")
 def listar_usuarios(request):
     """Lista todos los usuarios registrados"""
-    usuarios = User.objects.all().order_by("username")
-    paginator = Paginator(usuarios, 10)  
-    page = request.GET.get("page")
-    usuarios_pag = paginator.get_page(page)
-    return render(request, "dashboards/listar_usuarios.html", {"usuarios": usuarios_pag})
+    usuarios_pag = paginate_request(request, User.objects.all(), ("username", "id"), per_page=10)
+    return render(request, "dashboards/listar_usuarios.html", {
+        "usuarios": usuarios_pag,
+        "query_string": query_string_without_cursor(request),
+    })
 
 
 @role_required("Secpla")
@@ -92,33 +190,18 @@ def territorial_dashboard(request):
     """
     Dashboard para usuarios territoriales con métricas, listados y filtros básicos.
     """
-    territorial = Territorial.objects.filter(pk=request.user.profile.role_object_id).first()
+    territorial = directorio.de_peticion(request).get("territorial", get_role_context(request).role_object_id)
 
     incidencias_base = (
-        SolicitudIncidencia.objects.select_related(
-            "incidencia",
-            "encuesta",
-            "territorial",
-            "cuadrilla"
-        )
+        SolicitudIncidencia.objects
         .order_by("-fecha")
-        .filter(territorial=territorial)
+        .filter(territorial_id=territorial.pk if territorial else None)
     )
 
-    raw_counts = (
-    SolicitudIncidencia.objects
-        .filter(territorial=territorial)
-        .values("estado")
-        .annotate(total=Count("pk"))
-        .order_by("estado")
+    estado_totales = contadores.totales_por_estado(
+        ContadorSolicitud.Ambito.TERRITORIAL, territorial.pk if territorial else 0
     )
-    estado_totales = {estado: 0 for estado, _ in SolicitudIncidencia.Estados}
-    for registro in raw_counts:
-        estado_totales[registro["estado"]] = registro["total"]
-
-    for e, i in estado_totales.items():
-        print(e, i)
-    total_solicitudes = incidencias_base.count()
+    total_solicitudes = sum(estado_totales.values())
 
     incidencias_abiertas = incidencias_base.filter(estado__in=["Pendiente", "En Proceso"])
     incidencias_derivadas = incidencias_base.filter(estado="Derivada")
@@ -139,6 +222,7 @@ def territorial_dashboard(request):
         "dashboards/territorial_dashboard.html",
         {
             "territorial": territorial,
+            "fragmentos": colas.dependencias(territorial_id=territorial.pk) if territorial else None,
             "estados_totales": estado_totales,
             "total_solicitudes": total_solicitudes,
             "incidencias_abiertas": incidencias_abiertas,
@@ -149,17 +233,18 @@ def territorial_dashboard(request):
             "incidencias_aprobadas": incidencias_aprobadas,
             "estado_filtro": estado_filtro,
             "estados_para_filtrar": estados_para_filtrar,
+            "motivos_rechazo": SolicitudIncidencia.Motivos,
         },
     )
 
 @role_required('Secpla','Direcciones')
 def dashboard_direccion(request):
-    profile = request.user.profile
+    roles = get_role_context(request)
     direccion = None
 
-    membership = profile.direccion_memberships.first()
-    if membership:
-        direccion = membership.direccion
+    registros = directorio.de_peticion(request)
+    if roles.direccion_ids:
+        direccion = registros.get("direccion", roles.direccion_ids[0])
 
     if not direccion:
         return render(request, "dashboards/dashboard_direccion.html", {
@@ -167,18 +252,10 @@ def dashboard_direccion(request):
         })
 
 
-    cuadrillas = Cuadrilla.objects.filter(departamento__direccion=direccion).values_list("pk", flat=True)
+    cuadrillas = [cuadrilla.pk for cuadrilla in registros.cuadrillas_de(direccion_id=direccion.pk, activas=False)]
 
     # Solicitudes asociadas a cuadrillas
-    incidencias = SolicitudIncidencia.objects.filter(cuadrilla_id__in=cuadrillas
-    ).select_related(
-        'incidencia',
-        'encuesta',
-        'cuadrilla',
-        'cuadrilla__departamento',
-    ).order_by("-fecha")
-
-    total = incidencias.count()
+    incidencias = SolicitudIncidencia.objects.filter(cuadrilla_id__in=cuadrillas)
 
     # Filtro por estado
     estado_filtro = request.GET.get("estado", "todo")
@@ -186,10 +263,9 @@ def dashboard_direccion(request):
     if estado_filtro != "todo":
         incidencias_filtradas = incidencias.filter(estado__iexact=estado_filtro)
     
-    raw_counts = incidencias.values("estado").annotate(total=Count("estado"))
-    estado_totales = {estado: 0 for estado, _ in SolicitudIncidencia.Estados if estado != "Pendiente"}
-    for raw in raw_counts:
-        estado_totales[raw["estado"]] = raw["total"]
+    totales = contadores.totales_por_estado(ContadorSolicitud.Ambito.DIRECCION, direccion.pk)
+    total = sum(totales.values())
+    estado_totales = {estado: cantidad for estado, cantidad in totales.items() if estado != "Pendiente"}
 
 
     context = {
@@ -197,11 +273,69 @@ def dashboard_direccion(request):
         "total": total,
         "estado_totales": estado_totales,
         "estado_filtro": estado_filtro,
-        "incidencias_filtradas": incidencias_filtradas,
+        "incidencias_filtradas": paginate_request(
+            request, incidencias_filtradas, ("-fecha", "-solicitud_incidencia_id"), per_page=25
+        ),
+        "query_string": query_string_without_cursor(request),
+        "mapa": _contexto_mapa(request, roles),
     }
 
     return render(request, "dashboards/dashboard_direccion.html", context)
 
+def _incidencias_visibles(registros, roles):
+    """Tipos de incidencia que el usuario puede ver en el mapa (Secpla ve todos)."""
+    return registros.incidencias_de(None if roles.in_groups("Secpla") else roles.direccion_ids)
+
+
+def _contexto_mapa(request, roles):
+    registros = directorio.de_peticion(request)
+    incidencias = _incidencias_visibles(registros, roles)
+    departamento_ids = {incidencia.departamento_id for incidencia in incidencias}
+    return {
+        "centro": mapa.centro(),
+        "estados": mapa.ESTADOS_MAPA,
+        "incidencias": [(incidencia.pk, incidencia.nombre) for incidencia in incidencias],
+        "departamentos": [
+            (departamento.pk, departamento.nombre)
+            for departamento in registros.registros("departamento", activos=False, ids=departamento_ids)
+        ],
+        "zoom_puntos": mapa.ZOOM_PUNTOS,
+    }
+
+
+def _ids_param(request, nombre):
+    try:
+        return [int(valor) for valor in request.GET.getlist(nombre) if valor]
+    except ValueError:
+        raise ValueError(f"Parámetro inválido: {nombre}.")
+
+
+@role_required("Secpla", "Direcciones")
+def mapa_teselas(request, z, x, y):
+    """Tesela GeoJSON del mapa de solicitudes abiertas (ver dashboards.mapa)."""
+    roles = get_role_context(request)
+    try:
+        incidencia_ids = _ids_param(request, "incidencia") or None
+        departamento_ids = _ids_param(request, "departamento")
+    except ValueError as error:
+        return JsonResponse({"error": str(error)}, status=400)
+
+    if departamento_ids or not roles.in_groups("Secpla"):
+        permitidas = {
+            incidencia.pk for incidencia in _incidencias_visibles(directorio.de_peticion(request), roles)
+            if not departamento_ids or incidencia.departamento_id in departamento_ids
+        }
+        incidencia_ids = permitidas if incidencia_ids is None else permitidas & set(incidencia_ids)
+
+    try:
+        coleccion = mapa.tesela(z, x, y, request.GET.getlist("estado"), incidencia_ids)
+    except ValueError as error:
+        return JsonResponse({"error": str(error)}, status=400)
+    response = JsonResponse(coleccion)
+    response["Cache-Control"] = "private, max-age=30"
+    return response
+
+
 ESTADOS_PENDIENTES = ['Pendiente', '', None]
 ESTADOS_TOMADAS = ['Derivada']
 ESTADOS_ASIGNADAS = ['En Proceso']
@@ -211,47 +345,55 @@ ESTADOS_EN_PROCESO = ['En Proceso']
 
 @role_required('Secpla', 'Departamentos')
 def dashboard_departamento(request):
-    profile = request.user.profile
-    membership = profile.departamento_memberships.select_related('departamento').first()
+    roles = get_role_context(request)
+    departamento = None
+    registros = directorio.de_peticion(request)
+    if roles.departamento_ids:
+        departamento = registros.get("departamento", roles.departamento_ids[0])
 
-    if not membership:
+    if not departamento:
         return render(request, "dashboards/dashboard_departamento.html", {
             "departamento": None
         })
 
-    departamento = membership.departamento
-    es_encargado = membership.es_encargado
+    es_encargado = departamento.pk in roles.departamento_encargado_ids
+
+    cuadrillas = [cuadrilla.pk for cuadrilla in registros.cuadrillas_de(departamento.pk, activas=False)]
 
     pendientes = SolicitudIncidencia.objects.filter(
         cuadrilla__isnull=True
     ).exclude(
         estado__in=ESTADOS_RECHAZADAS
-    ).select_related('incidencia').order_by('-fecha')
+    ).order_by('-fecha')
 
     tomadas = SolicitudIncidencia.objects.filter(
-        cuadrilla__departamento=departamento
+        cuadrilla_id__in=cuadrillas
     ).exclude(
         estado__in=ESTADOS_EN_PROCESO + ESTADOS_COMPLETADAS
-    ).select_related('incidencia', 'cuadrilla').order_by('-fecha')
+    ).order_by('-fecha')
 
     asignadas = SolicitudIncidencia.objects.filter(
-        cuadrilla__departamento=departamento,
+        cuadrilla_id__in=cuadrillas,
         estado__in=ESTADOS_EN_PROCESO
-    ).select_related('incidencia', 'cuadrilla').order_by('-fecha')
+    ).order_by('-fecha')
 
     completadas = SolicitudIncidencia.objects.filter(
-        cuadrilla__departamento=departamento,
+        cuadrilla_id__in=cuadrillas,
         estado__in=ESTADOS_COMPLETADAS
-    ).select_related('incidencia', 'cuadrilla').order_by('-fecha')
+    ).order_by('-fecha')
 
-    counts = {
+    # Las tablas y los conteos se cachean hasta que cambie la cola del
+    # departamento o la de solicitudes sin cuadrilla (dashboards.colas).
+    fragmentos = colas.dependencias(departamento_id=departamento.pk, sin_cuadrilla=True)
+    counts = fragmentos.memo('departamento:conteos', lambda: {
         'pendientes': pendientes.count(),
         'tomadas': tomadas.count(),
         'asignadas': asignadas.count(),
         'completadas': completadas.count(),
-    }
+    })
 
     context = {
+        'fragmentos': fragmentos,
         'departamento': departamento,
         'es_encargado': es_encargado,
         'total_general': sum(counts.values()),
@@ -260,7 +402,7 @@ def dashboard_departamento(request):
         'tomadas': tomadas,
         'asignadas': asignadas,
         'completadas': completadas,
-        'cuadrillas_disponibles': departamento.Cuadrilla.filter(estado=True).order_by('nombre'),
+        'cuadrillas_disponibles': registros.cuadrillas_de(departamento.pk),
     }
 
     return render(request, "dashboards/dashboard_departamento.html", context)
@@ -268,13 +410,12 @@ def dashboard_departamento(request):
 @role_required('Secpla', 'Cuadrillas')
 def dashboard_cuadrilla(request):
     """Dashboard para cuadrillas: ver incidencias asignadas y subir evidencia de solución."""
-    profile = request.user.profile
+    roles = get_role_context(request)
     cuadrilla = None
 
     # Obtener la cuadrilla asociada al usuario
-    membership = getattr(profile, "cuadrilla_memberships", None)
-    if membership:
-        cuadrilla = profile.cuadrilla_memberships.first().cuadrilla
+    if roles.cuadrilla_ids:
+        cuadrilla = directorio.de_peticion(request).get("cuadrilla", roles.cuadrilla_ids[0])
 
     if not cuadrilla:
         messages.warning(request, "No tienes una cuadrilla asignada.")
@@ -282,8 +423,7 @@ def dashboard_cuadrilla(request):
 
     # Filtrar incidencias asignadas a esa cuadrilla
     incidencias = (
-        SolicitudIncidencia.objects.filter(cuadrilla=cuadrilla)
-        .select_related("incidencia", "territorial", "cuadrilla")
+        SolicitudIncidencia.objects.filter(cuadrilla_id=cuadrilla.pk)
         .order_by("-fecha")
     )
 
@@ -306,15 +446,8 @@ def responder_incidencia(request, incidencia_id):
 
         
         archivo_invalido = False
+        adjuntos = []
 
-        
-        Respuesta = RespuestaCuadrilla.objects.create(
-            solicitud=incidencia,
-            cuadrilla=cuadrilla,
-            respuesta=respuesta_texto
-        )
-
-        
         for archivo in archivos:
             if archivo.content_type.startswith("image"):
                 tipo = "imagen"
@@ -324,38 +457,153 @@ def responder_incidencia(request, incidencia_id):
                 messages.error(request, f"El archivo '{archivo.name}' no es válido. Solo imágenes o videos.")
                 archivo_invalido = True 
                 continue
+            adjuntos.append((archivo, tipo))
 
-            MultimediaCuadrilla.objects.create(
-                respuesta=Respuesta,
-                archivo=archivo,
-                tipo=tipo,
-            )
-
-       
         if archivo_invalido:
             return render(request, "dashboards/respuesta_incidencia.html", {
                 "incidencia": incidencia,
                 "respuesta_texto": respuesta_texto  
             })
 
-      
-        incidencia.estado = "Finalizada"
-        incidencia.save()
+        # La respuesta, sus archivos y el paso a Finalizada van en una sola
+        # transacción: si algo falla no queda la solicitud finalizada sin respuesta.
+        try:
+            with transaction.atomic():
+                Respuesta = RespuestaCuadrilla.objects.create(
+                    solicitud=incidencia,
+                    cuadrilla=cuadrilla,
+                    respuesta=respuesta_texto
+                )
+                for archivo, tipo in adjuntos:
+                    MultimediaCuadrilla.objects.create(
+                        respuesta=Respuesta,
+                        archivo=archivo,
+                        tipo=tipo,
+                    )
+                # Videos subidos por fragmentos (ver subida_crear / subida_fragmento).
+                subidas.adjuntar_completas(Respuesta, request.POST.getlist("subidas"), get_role_context(request).profile_id)
+                transiciones.transicionar(
+                    incidencia, transiciones.FINALIZADA, request.user.profile, comentario=respuesta_texto or None
+                )
+        except subidas.ErrorSubida as error:
+            messages.error(request, error.mensaje)
+            return render(request, "dashboards/respuesta_incidencia.html", {
+                "incidencia": incidencia,
+                "respuesta_texto": respuesta_texto
+            })
+        except (transiciones.TransicionInvalida, transiciones.ConflictoTransicion) as error:
+            messages.error(request, str(error))
+            return redirect("dashboard_cuadrilla")
 
         messages.success(request, "Respuesta registrada correctamente. La incidencia ha sido finalizada.")
         return redirect("dashboard_cuadrilla")
 
     return render(request, "dashboards/respuesta_incidencia.html", {"incidencia": incidencia})
+
+
+def _estado_subida(subida, status=200):
+    response = JsonResponse({
+        "id": str(subida.pk),
+        "offset": subida.recibido,
+        "length": subida.tamano_total,
+        "estado": subida.estado,
+        "url": reverse("subida_fragmento", args=[subida.pk]),
+    }, status=status)
+    response["Upload-Offset"] = str(subida.recibido)
+    response["Upload-Length"] = str(subida.tamano_total)
+    response["Cache-Control"] = "no-store"
+    return response
+
+def _error_subida(error):
+    return JsonResponse({"error": error.mensaje}, status=error.status)
+
+@role_required('Cuadrillas')
+@require_POST
+def subida_crear(request, incidencia_id):
+    """Inicia una subida reanudable de evidencia para la incidencia (tickets.subidas)."""
+    incidencia = get_object_or_404(SolicitudIncidencia, pk=incidencia_id)
+    roles = get_role_context(request)
+    if incidencia.cuadrilla_id not in roles.cuadrilla_ids:
+        raise PermissionDenied("No estás asignado a la cuadrilla de esta incidencia.")
+
+    respuesta = None
+    if request.POST.get("respuesta_id"):
+        respuesta = get_object_or_404(RespuestaCuadrilla, pk=request.POST["respuesta_id"], solicitud=incidencia)
+    try:
+        tamano = int(request.POST.get("tamano", ""))
+    except ValueError:
+        return JsonResponse({"error": "Tamaño inválido."}, status=400)
+    try:
+        subida = subidas.crear(
+            incidencia,
+            roles.profile_id,
+            nombre=request.POST.get("nombre", ""),
+            tamano_total=tamano,
+            checksum=request.POST.get("checksum", ""),
+            respuesta=respuesta,
+        )
+    except subidas.ErrorSubida as error:
+        return _error_subida(error)
+
+    response = _estado_subida(subida, status=201)
+    response["Location"] = reverse("subida_fragmento", args=[subida.pk])
+    return response
+
+@role_required('Cuadrillas')
+@require_http_methods(["GET", "HEAD", "PATCH", "DELETE"])
+def subida_fragmento(request, subida_id):
+    """
+    GET/HEAD: offset actual para reanudar. PATCH: agrega un fragmento en
+    `Upload-Offset` (cuerpo application/offset+octet-stream, checksum
+    opcional en `Upload-Checksum`). DELETE: cancela la subida.
+    """
+    profile_id = get_role_context(request).profile_id
+    if request.method == "DELETE":
+        if not subidas.cancelar(subida_id, profile_id):
+            return JsonResponse({"error": "Subida no encontrada."}, status=404)
+        return HttpResponse(status=204)
+
+    if request.method in ("GET", "HEAD"):
+        subida = get_object_or_404(SubidaFragmentada, pk=subida_id, profile_id=profile_id)
+        return _estado_subida(subida)
+
+    if request.content_type != "application/offset+octet-stream":
+        return JsonResponse({"error": "Content-Type debe ser application/offset+octet-stream."}, status=415)
+    try:
+        offset = int(request.headers.get("Upload-Offset", ""))
+        longitud = int(request.headers.get("Content-Length", ""))
+    except ValueError:
+        return JsonResponse({"error": "Faltan Upload-Offset o Content-Length."}, status=400)
+    try:
+        subida = subidas.agregar_fragmento(
+            subida_id,
+            profile_id,
+            offset,
+            request,
+            longitud,
+            subidas.leer_checksum(request.headers.get("Upload-Checksum")),
+        )
+    except subidas.ErrorSubida as error:
+        return _error_subida(error)
+    return _estado_subida(subida)
+
+def _departamento_encargado_id(request):
+    """Departamento del usuario si es su encargado; None en caso contrario."""
+    roles = get_role_context(request)
+    if roles.departamento_ids and roles.departamento_ids[0] in roles.departamento_encargado_ids:
+        return roles.departamento_ids[0]
+    return None
+
 def asignar_cuadrilla(request, incidencia_id):
     incidencia = get_object_or_404(SolicitudIncidencia, pk=incidencia_id)
-    profile = request.user.profile
 
-    membership = profile.departamento_memberships.first()
-    if not membership or not membership.es_encargado:
+    departamento_id = _departamento_encargado_id(request)
+    if not departamento_id:
         messages.error(request, "No tienes permiso para asignar cuadrillas.")
         return redirect('dashboard_departamento')
 
-    if incidencia.cuadrilla and incidencia.cuadrilla.departamento != membership.departamento:
+    cuadrilla_actual = directorio.de_peticion(request).get("cuadrilla", incidencia.cuadrilla_id)
+    if cuadrilla_actual and cuadrilla_actual.departamento_id != departamento_id:
         messages.error(request, "Esta incidencia no pertenece a tu departamento.")
         return redirect('dashboard_departamento')
 
@@ -368,10 +616,10 @@ def asignar_cuadrilla(request, incidencia_id):
         try:
             nueva_cuadrilla = Cuadrilla.objects.get(
                 pk=cuadrilla_id,
-                departamento=membership.departamento
+                departamento_id=departamento_id
             )
             incidencia.cuadrilla = nueva_cuadrilla
-            incidencia.save()
+            incidencia.save(update_fields=['cuadrilla'])
             messages.success(request, f"Cuadrilla '{nueva_cuadrilla.nombre}' asignada.")
         except Cuadrilla.DoesNotExist:
             messages.error(request, "Cuadrilla no válida.")
@@ -379,51 +627,59 @@ def asignar_cuadrilla(request, incidencia_id):
     return redirect('dashboard_departamento')
 
 def tomar_solicitud(request, incidencia_id):
-    membership = request.user.profile.departamento_memberships.select_related('departamento').first()
-    if not membership or not membership.es_encargado:
+    departamento_id = _departamento_encargado_id(request)
+    if not departamento_id:
         messages.error(request, "No tienes permiso para tomar solicitudes.")
         return redirect('dashboard_departamento')
 
     incidencia = get_object_or_404(
-        SolicitudIncidencia,
+        SolicitudIncidencia.objects.select_related('encuesta'),
         pk=incidencia_id,
         cuadrilla__isnull=True,
     )
 
-    cuadrilla_default = membership.departamento.Cuadrilla.first()
+    cuadrilla = despacho.elegir_cuadrilla(incidencia, departamento_id)
 
-    if not cuadrilla_default:
-        messages.error(request, "Tu departamento no tiene cuadrillas configuradas.")
+    if not cuadrilla:
+        messages.error(request, "Tu departamento no tiene cuadrillas activas.")
         return redirect('dashboard_departamento')
 
-    incidencia.cuadrilla = cuadrilla_default
-    incidencia.estado = 'Derivada'
-    incidencia.save(update_fields=['cuadrilla', 'estado'])
+    try:
+        transiciones.transicionar(
+            incidencia, transiciones.DERIVADA, request.user.profile,
+            campos={'cuadrilla_id': cuadrilla.cuadrilla_id},
+            condiciones={'cuadrilla__isnull': True},
+        )
+    except (transiciones.TransicionInvalida, transiciones.ConflictoTransicion) as error:
+        messages.error(request, str(error))
+        return redirect('dashboard_departamento')
 
     messages.success(
         request,
-        f"Solicitud #{incidencia_id} tomada y asignada a la cuadrilla '{cuadrilla_default.nombre}'."
+        f"Solicitud #{incidencia_id} tomada y asignada a la cuadrilla '{cuadrilla.nombre}'."
     )
     return redirect('dashboard_departamento')
 
 def poner_en_proceso(request, incidencia_id):
-    membership = request.user.profile.departamento_memberships.select_related('departamento').first()
-    if not membership or not membership.es_encargado:
+    departamento_id = _departamento_encargado_id(request)
+    if not departamento_id:
         messages.error(request, "No tienes permiso.")
         return redirect('dashboard_departamento')
 
     incidencia = get_object_or_404(
         SolicitudIncidencia,
         pk=incidencia_id,
-        cuadrilla__departamento=membership.departamento
+        cuadrilla__departamento_id=departamento_id
     )
 
     if incidencia.estado in ['En Proceso', 'Finalizada', 'Aprobada']:
         messages.warning(request, f"La solicitud #{incidencia_id} ya está en proceso o completada.")
     else:
-        incidencia.estado = 'En Proceso'
-        incidencia.save(update_fields=['estado'])
-        messages.success(request, f"Solicitud #{incidencia_id} pasada a 'En Proceso'.")
+        try:
+            transiciones.transicionar(incidencia, transiciones.EN_PROCESO, request.user.profile)
+            messages.success(request, f"Solicitud #{incidencia_id} pasada a 'En Proceso'.")
+        except (transiciones.TransicionInvalida, transiciones.ConflictoTransicion) as error:
+            messages.error(request, str(error))
 
     return redirect('dashboard_departamento')
 
@@ -436,17 +692,14 @@ def aprobar_incidencia(request, incidencia_id):
     evidencias = MultimediaCuadrilla.objects.filter(respuesta=respuesta) if respuesta else None
 
     if request.method == "POST":
-        incidencia.estado = "Aprobada"
-        incidencia.save()
-
-
-        incidencia.registrar_log(
-            profile=request.user.profile,
-            from_estado="Finalizada",
-            to_estado="Aprobada",
-            fecha=timezone.now(),
-            comentario="Aprobada por el territorial."
-        )
+        try:
+            transiciones.transicionar(
+                incidencia, transiciones.APROBADA, request.user.profile,
+                comentario="Aprobada por el territorial.",
+            )
+        except (transiciones.TransicionInvalida, transiciones.ConflictoTransicion) as error:
+            messages.error(request, str(error))
+            return redirect("dashboard_territorial")
 
         messages.success(request, "La incidencia fue aprobada correctamente.")
         return redirect("dashboard_territorial")
@@ -465,10 +718,13 @@ def rechazar_incidencia(request, incidencia_id):
     if request.method == 'POST':
         form = RechazaIncidenciaForm(request.POST,instance=obj)
         if form.is_valid():
-            form.save(commit=False)
-            obj.estado = 'Rechazada'
-            form.save()
-            obj.save()
+            try:
+                transiciones.transicionar(
+                    obj, transiciones.RECHAZADA, request.user.profile,
+                    campos={'motivo': form.cleaned_data['motivo'], 'otro': form.cleaned_data.get('otro') or ''},
+                )
+            except (transiciones.TransicionInvalida, transiciones.ConflictoTransicion) as error:
+                messages.error(request, str(error))
             return redirect('/dashboards/territorial/')
     context = {
         'form':form
@@ -488,19 +744,20 @@ def redirigir_incidencia(request, incidencia_id):
     if request.method == "POST":
         comentario = request.POST.get("comentario", "").strip()
         if form.is_valid():
-            solicitud_actualizada = form.save(commit=False)
-            estado_anterior = incidencia.estado
-            solicitud_actualizada.estado = "Pendiente"
-            solicitud_actualizada.cuadrilla = None
-            solicitud_actualizada.save()
-
-            solicitud_actualizada.registrar_log(
-                profile=request.user.profile,
-                from_estado=estado_anterior,
-                to_estado=solicitud_actualizada.estado,
-                fecha=timezone.now(),
-                comentario=comentario or "Incidencia redirigida por el territorial."
-            )
+            try:
+                with transaction.atomic():
+                    solicitud_actualizada = form.save(commit=False)
+                    if 'ubicacion' in form.changed_data:
+                        solicitud_actualizada.punto = geocodificar.buscar(solicitud_actualizada.ubicacion)
+                    solicitud_actualizada.save(update_fields=[*form._meta.fields, 'punto'])
+                    transiciones.transicionar(
+                        solicitud_actualizada, transiciones.PENDIENTE, request.user.profile,
+                        comentario=comentario or "Incidencia redirigida por el territorial.",
+                        campos={'cuadrilla': None},
+                    )
+            except (transiciones.TransicionInvalida, transiciones.ConflictoTransicion) as error:
+                messages.error(request, str(error))
+                return redirect("dashboard_territorial")
 
             messages.success(request, f"La solicitud #{incidencia.solicitud_incidencia_id} se redirigió correctamente.")
             return redirect("dashboard_territorial")
@@ -526,3 +783,71 @@ def redirigir_incidencia(request, incidencia_id):
 
     return render(request, "dashboards/redirigir_incidencia.html", context)
     
+
+
+def _reportar_acciones(request, resultado, destino):
+    if request.headers.get("Accept", "").startswith("application/json"):
+        return JsonResponse(resultado.as_dict())
+
+    etiqueta = acciones.ETIQUETAS[resultado.accion]
+    if resultado.aplicadas:
+        messages.success(request, f"{etiqueta}: {len(resultado.aplicadas)} solicitud(es) procesada(s).")
+    if resultado.fallidas:
+        detalle = ", ".join(
+            f"#{pk} ({motivo})" for pk, motivo in list(resultado.fallidas.items())[:10]
+        )
+        resto = len(resultado.fallidas) - 10
+        messages.warning(
+            request,
+            f"{etiqueta}: {len(resultado.fallidas)} no se procesaron: {detalle}" + (f" y {resto} más." if resto > 0 else "."),
+        )
+    return redirect(destino)
+
+
+@role_required("Departamentos", "Territoriales")
+@require_POST
+def acciones_masivas(request):
+    """Aplica una acción (tomar, asignar, iniciar, aprobar, rechazar) a varias solicitudes a la vez."""
+    accion = request.POST.get("accion", "")
+    profile = request.user.profile
+    roles = get_role_context(request)
+
+    if accion in acciones.ACCIONES_DEPARTAMENTO:
+        destino = "dashboard_departamento"
+    elif accion in acciones.ACCIONES_TERRITORIALES:
+        destino = "dashboard_territorial"
+    else:
+        return JsonResponse({"error": "Acción desconocida."}, status=400)
+
+    try:
+        ids = acciones.normalizar_ids(request.POST.getlist("ids"))
+        if accion in acciones.ACCIONES_DEPARTAMENTO:
+            departamento_id = _departamento_encargado_id(request)
+            if not departamento_id:
+                raise acciones.AccionInvalida("No tienes permiso para gestionar solicitudes del departamento.")
+            if accion == "tomar":
+                resultado = acciones.tomar(ids, profile, departamento_id)
+            elif accion == "asignar":
+                resultado = acciones.asignar(ids, profile, departamento_id, request.POST.get("cuadrilla_id"))
+            else:
+                resultado = acciones.iniciar(ids, profile, departamento_id)
+        else:
+            if roles.role_type != Profile.Role.TERRITORIAL or not roles.role_object_id:
+                raise acciones.AccionInvalida("No tienes una territorial asignada.")
+            if accion == "aprobar":
+                resultado = acciones.aprobar(ids, profile, roles.role_object_id)
+            else:
+                form = RechazaIncidenciaForm(request.POST)
+                if not form.is_valid():
+                    raise acciones.AccionInvalida("Indica un motivo de rechazo válido.")
+                resultado = acciones.rechazar(
+                    ids, profile, roles.role_object_id,
+                    form.cleaned_data["motivo"], form.cleaned_data.get("otro") or "",
+                )
+    except acciones.AccionInvalida as error:
+        if request.headers.get("Accept", "").startswith("application/json"):
+            return JsonResponse({"error": str(error)}, status=400)
+        messages.error(request, str(error))
+        return redirect(destino)
+
+    return _reportar_acciones(request, resultado, destino)
@@ -0,0 +1,218 @@
+"""
+Índice espacial por geohash.
+
+Cada `Ubicacion` con coordenadas guarda su geohash (`PRECISION`
+caracteres, celdas de ~5 m). Los puntos de una misma celda comparten
+prefijo, así que "los puntos dentro de esta caja" se traduce en unos pocos
+rangos `geohash >= celda AND geohash < siguiente_celda(celda)` que un
+índice B-tree resuelve en cualquier base (SQLite o PostgreSQL), más un
+filtro exacto por latitud/longitud sobre los candidatos. El límite superior
+usa solo caracteres de `ALFABETO` (dígitos y minúsculas), que ordenan igual
+con cualquier collation; un centinela como `'~'` no: con `en_US.UTF-8`
+la puntuación se ignora en la primera comparación y los rangos quedan vacíos.
+
+Sobre eso se arman las consultas por caja, por radio y de los k más
+cercanos. Todas reciben un queryset y el `prefijo` de la relación que
+lleva a la `Ubicacion` (`''` para `Ubicacion`, `'punto__'` para
+solicitudes, `'base__'` para cuadrillas).
+"""
+from __future__ import annotations
+
+import math
+from typing import List, NamedTuple, Optional, Tuple
+
+from django.db.models import F, Q, QuerySet
+
+ALFABETO = '0123456789bcdefghjkmnpqrstuvwxyz'
+PRECISION = 9
+MAX_CELDAS = 32
+
+RADIO_TIERRA_M = 6_371_008.8
+METROS_POR_GRADO = 111_320.0
+
+
+class Caja(NamedTuple):
+    lat_min: float
+    lat_max: float
+    lon_min: float
+    lon_max: float
+
+
+def codificar(latitud: float, longitud: float, precision: int = PRECISION) -> str:
+    lat_rango, lon_rango = [-90.0, 90.0], [-180.0, 180.0]
+    hash_, bits, valor, par = [], 0, 0, True
+    while len(hash_) < precision:
+        rango, coordenada = (lon_rango, longitud) if par else (lat_rango, latitud)
+        medio = (rango[0] + rango[1]) / 2
+        valor <<= 1
+        if coordenada >= medio:
+            valor |= 1
+            rango[0] = medio
+        else:
+            rango[1] = medio
+        par = not par
+        bits += 1
+        if bits == 5:
+            hash_.append(ALFABETO[valor])
+            bits, valor = 0, 0
+    return ''.join(hash_)
+
+
+def geohash_de(latitud: Optional[float], longitud: Optional[float]) -> str:
+    """Geohash a guardar en `Ubicacion.geohash`; vacío si faltan coordenadas."""
+    if latitud is None or longitud is None:
+        return ''
+    return codificar(latitud, longitud)
+
+
+def tamano_celda(precision: int) -> Tuple[float, float]:
+    """(alto, ancho) en grados de una celda de `precision` caracteres."""
+    bits = 5 * precision
+    return 180.0 / 2 ** (bits // 2), 360.0 / 2 ** ((bits + 1) // 2)
+
+
+def distancia_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Distancia de círculo máximo (haversine) en metros."""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * RADIO_TIERRA_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def caja_de_radio(latitud: float, longitud: float, metros: float) -> Caja:
+    dlat = metros / METROS_POR_GRADO
+    dlon = metros / (METROS_POR_GRADO * max(math.cos(math.radians(latitud)), 1e-6))
+    return Caja(
+        max(latitud - dlat, -90.0), min(latitud + dlat, 90.0),
+        max(longitud - dlon, -180.0), min(longitud + dlon, 180.0),
+    )
+
+
+def _rejilla(caja: Caja, precision: int) -> Tuple[range, range]:
+    alto, ancho = tamano_celda(precision)
+    filas = range(int((caja.lat_min + 90) // alto), int(min(caja.lat_max + 90, 180 - 1e-9) // alto) + 1)
+    columnas = range(int((caja.lon_min + 180) // ancho), int(min(caja.lon_max + 180, 360 - 1e-9) // ancho) + 1)
+    return filas, columnas
+
+
+def cantidad_celdas(caja: Caja, precision: int) -> int:
+    filas, columnas = _rejilla(caja, precision)
+    return len(filas) * len(columnas)
+
+
+def celdas_de(caja: Caja, precision: int) -> List[str]:
+    """Celdas de `precision` caracteres que cubren `caja`."""
+    alto, ancho = tamano_celda(precision)
+    filas, columnas = _rejilla(caja, precision)
+    return sorted({
+        codificar(-90 + (fila + 0.5) * alto, -180 + (columna + 0.5) * ancho, precision)
+        for fila in filas
+        for columna in columnas
+    })
+
+
+def celdas(caja: Caja, max_celdas: int = MAX_CELDAS) -> List[str]:
+    """
+    Celdas de la mayor precisión posible que cubren `caja` sin pasar de
+    `max_celdas`. Cuantas más celdas, menos candidatos sobran fuera de la caja.
+    """
+    for precision in range(PRECISION, 1, -1):
+        if cantidad_celdas(caja, precision) <= max_celdas:
+            return celdas_de(caja, precision)
+    return celdas_de(caja, 1)
+
+
+def siguiente_celda(celda: str) -> Optional[str]:
+    """
+    Menor cadena de `ALFABETO` mayor que todas las que empiezan por `celda`
+    (`'u4pz'` → `'u4q'`); None si no hay ninguna (`'zz'`).
+    """
+    celda = celda.rstrip(ALFABETO[-1])
+    if not celda:
+        return None
+    return celda[:-1] + ALFABETO[ALFABETO.index(celda[-1]) + 1]
+
+
+def filtro_prefijos(celdas_: List[str], campo: str = 'geohash') -> Q:
+    """Valores de `campo` que empiezan por alguna de las celdas, como rangos indexables."""
+    rangos = Q()
+    for celda in celdas_:
+        rango = Q(**{f'{campo}__gte': celda})
+        fin = siguiente_celda(celda)
+        if fin is not None:
+            rango &= Q(**{f'{campo}__lt': fin})
+        rangos |= rango
+    return rangos
+
+
+def filtro_caja(caja: Caja, prefijo: str = '', max_celdas: int = MAX_CELDAS) -> Q:
+    rangos = filtro_prefijos(celdas(caja, max_celdas), f'{prefijo}geohash')
+    return rangos & Q(**{
+        f'{prefijo}latitud__range': (caja.lat_min, caja.lat_max),
+        f'{prefijo}longitud__range': (caja.lon_min, caja.lon_max),
+    })
+
+
+def en_caja(queryset: QuerySet, caja: Caja, prefijo: str = '', usar_indice: bool = True) -> QuerySet:
+    """
+    A través de una relación, con `usar_indice` se parte de las ubicaciones
+    de la caja (subconsulta por geohash), lo que conviene cuando la tabla
+    principal es grande (solicitudes). Con `usar_indice=False` se filtra con
+    un join y la búsqueda parte de la tabla principal: mejor cuando tiene
+    pocas filas (cuadrillas) y la caja muchas ubicaciones.
+    """
+    if not prefijo or not usar_indice:
+        return queryset.filter(filtro_caja(caja, prefijo))
+    from .models import Ubicacion
+
+    ubicaciones = Ubicacion.objects.filter(filtro_caja(caja)).values('pk')
+    return queryset.filter(**{f'{prefijo}pk__in': ubicaciones})
+
+
+def en_radio(
+    queryset: QuerySet,
+    latitud: float,
+    longitud: float,
+    metros: float,
+    prefijo: str = '',
+    usar_indice: bool = True,
+) -> list:
+    """
+    Objetos a no más de `metros`, del más cercano al más lejano, cada uno con
+    el atributo `distancia_m`.
+    """
+    caja = caja_de_radio(latitud, longitud, metros)
+    candidatos = en_caja(queryset, caja, prefijo, usar_indice).annotate(
+        geo_latitud=F(f'{prefijo}latitud'), geo_longitud=F(f'{prefijo}longitud'),
+    )
+    resultado = []
+    for objeto in candidatos:
+        objeto.distancia_m = distancia_m(latitud, longitud, objeto.geo_latitud, objeto.geo_longitud)
+        if objeto.distancia_m <= metros:
+            resultado.append(objeto)
+    resultado.sort(key=lambda objeto: objeto.distancia_m)
+    return resultado
+
+
+def mas_cercanos(
+    queryset: QuerySet,
+    latitud: float,
+    longitud: float,
+    k: int = 1,
+    prefijo: str = '',
+    radio_inicial: float = 250.0,
+    radio_maximo: float = 50_000.0,
+    usar_indice: bool = True,
+) -> list:
+    """
+    Los `k` objetos más cercanos (con `distancia_m`), buscando en radios que
+    se duplican desde `radio_inicial`. Si dentro de un radio hay al menos
+    `k`, ninguno de fuera puede estar más cerca. Más allá de `radio_maximo`
+    devuelve los que haya encontrado.
+    """
+    radio = radio_inicial
+    while True:
+        encontrados = en_radio(queryset, latitud, longitud, radio, prefijo, usar_indice)
+        if len(encontrados) >= k or radio >= radio_maximo:
+            return encontrados[:k]
+        radio = min(radio * 2, radio_maximo)
@@ -0,0 +1,77 @@
+"""
+Vínculo entre el texto libre `SolicitudIncidencia.ubicacion` y las
+`Ubicacion` geocodificadas.
+
+Una solicitud queda ligada a la `Ubicacion` cuya "calle número" coincide
+con su texto (sin distinguir espacios sobrantes). Las que no coinciden
+conservan solo el texto y no aparecen en las consultas espaciales.
+"""
+from __future__ import annotations
+
+from typing import Optional, Tuple
+
+from .espacial import geohash_de
+from .models import Ubicacion
+
+LOTE = 5000
+
+
+def separar(texto: Optional[str]) -> Optional[Tuple[str, str]]:
+    """'Los Aromos 123' -> ('Los Aromos', '123'); `None` si no hay número."""
+    partes = ' '.join((texto or '').split()).rsplit(' ', 1)
+    if len(partes) != 2:
+        return None
+    return partes[0], partes[1]
+
+
+def buscar(texto: Optional[str]) -> Optional[Ubicacion]:
+    clave = separar(texto)
+    if clave is None:
+        return None
+    calle, numero = clave
+    return Ubicacion.objects.filter(calle=calle, numero_casa=numero).order_by('pk').first()
+
+
+def indexar_ubicaciones() -> int:
+    """Recalcula el geohash de las ubicaciones cargadas por fuera de `save()`. Devuelve las corregidas."""
+    corregidas, ultimo = 0, 0
+    while True:
+        filas = list(
+            Ubicacion.objects.filter(pk__gt=ultimo).order_by('pk')
+            .values_list('pk', 'latitud', 'longitud', 'geohash')[:LOTE]
+        )
+        if not filas:
+            return corregidas
+        ultimo = filas[-1][0]
+        lote = [
+            Ubicacion(pk=pk, geohash=geohash_de(latitud, longitud))
+            for pk, latitud, longitud, geohash in filas
+            if geohash_de(latitud, longitud) != geohash
+        ]
+        Ubicacion.objects.bulk_update(lote, ['geohash'])
+        corregidas += len(lote)
+
+
+def vincular_solicitudes() -> int:
+    """Liga las solicitudes sin punto cuyo texto coincide con una ubicación. Devuelve las vinculadas."""
+    from tickets.models import SolicitudIncidencia
+
+    puntos = {}
+    for pk, calle, numero in Ubicacion.objects.order_by('-pk').values_list('pk', 'calle', 'numero_casa'):
+        puntos[(calle, numero)] = pk  # la de menor pk gana, como en `buscar`
+
+    vinculadas, ultimo = 0, 0
+    pendientes = SolicitudIncidencia.objects.filter(punto__isnull=True).exclude(ubicacion__isnull=True)
+    while True:
+        # Por tramos de pk: no se itera un cursor abierto sobre la tabla que se actualiza.
+        filas = list(pendientes.filter(pk__gt=ultimo).order_by('pk').values_list('pk', 'ubicacion')[:LOTE])
+        if not filas:
+            return vinculadas
+        ultimo = filas[-1][0]
+        lote = [
+            SolicitudIncidencia(pk=pk, punto_id=puntos[clave])
+            for pk, texto in filas
+            if (clave := separar(texto)) in puntos
+        ]
+        SolicitudIncidencia.objects.bulk_update(lote, ['punto'])
+        vinculadas += len(lote)
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from dashboards import mapa
+from locations import geocodificar
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula el geohash de las ubicaciones cargadas por fuera del ORM y liga "
+        "a su Ubicacion las solicitudes cuyo texto de ubicación coincide."
+    )
+
+    def handle(self, *args, **options):
+        corregidas = geocodificar.indexar_ubicaciones()
+        self.stdout.write(f"Geohash recalculado en {corregidas} ubicaciones.")
+        vinculadas = geocodificar.vincular_solicitudes()
+        self.stdout.write(self.style.SUCCESS(f"Solicitudes vinculadas a un punto: {vinculadas}."))
+        if corregidas or vinculadas:
+            # Los cambios se escribieron en bloque, sin las señales que mantienen el mapa.
+            self.stdout.write(f"Celdas del mapa reconstruidas: {mapa.reconstruir()} filas.")
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.4 on 2026-10-18 20:05
+
+from django.db import migrations, models
+
+ALFABETO = '0123456789bcdefghjkmnpqrstuvwxyz'
+PRECISION = 9
+LOTE = 1000
+
+
+def _codificar(latitud, longitud):
+    # Copia de locations.espacial.codificar: la migración no depende del código de la app.
+    lat_rango, lon_rango = [-90.0, 90.0], [-180.0, 180.0]
+    hash_, bits, valor, par = [], 0, 0, True
+    while len(hash_) < PRECISION:
+        rango, coordenada = (lon_rango, longitud) if par else (lat_rango, latitud)
+        medio = (rango[0] + rango[1]) / 2
+        valor <<= 1
+        if coordenada >= medio:
+            valor |= 1
+            rango[0] = medio
+        else:
+            rango[1] = medio
+        par = not par
+        bits += 1
+        if bits == 5:
+            hash_.append(ALFABETO[valor])
+            bits, valor = 0, 0
+    return ''.join(hash_)
+
+
+def poblar_geohash(apps, schema_editor):
+    Ubicacion = apps.get_model('locations', 'Ubicacion')
+    pendientes = (
+        Ubicacion.objects.filter(latitud__isnull=False, longitud__isnull=False)
+        .only('pk', 'latitud', 'longitud')
+        .order_by('pk')
+        .iterator(chunk_size=LOTE)
+    )
+    lote = []
+    for ubicacion in pendientes:
+        ubicacion.geohash = _codificar(ubicacion.latitud, ubicacion.longitud)
+        lote.append(ubicacion)
+        if len(lote) == LOTE:
+            Ubicacion.objects.bulk_update(lote, ['geohash'])
+            lote = []
+    if lote:
+        Ubicacion.objects.bulk_update(lote, ['geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0002_delete_vecino'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ubicacion',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=12),
+        ),
+        migrations.AddIndex(
+            model_name='ubicacion',
+            index=models.Index(fields=['calle', 'numero_casa'], name='ubicacion_calle_numero_idx'),
+        ),
+        migrations.RunPython(poblar_geohash, migrations.RunPython.noop),
+    ]
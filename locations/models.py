@@ -4,6 +4,8 @@ from django.core.validators import RegexValidator, EmailValidator
 # Create your models here.
 from django.core.exceptions import ValidationError
 
+from .espacial import geohash_de
+
 
 def validar_latitud(valor):
     if valor is not None and (valor < -90 or valor > 90):
@@ -20,7 +22,20 @@ class Ubicacion(models.Model):
     numero_casa = models.CharField(max_length=20)
     latitud = models.FloatField(null=True, blank=True, validators=[validar_latitud])
     longitud = models.FloatField(null=True, blank=True, validators=[validar_longitud])
+    # Derivado de latitud/longitud (locations/espacial.py); vacío si faltan.
+    geohash = models.CharField(max_length=12, blank=True, default='', editable=False, db_index=True)
+
+    class Meta:
+        # `geocodificar.buscar` liga solicitudes por "calle número".
+        indexes = [models.Index(fields=['calle', 'numero_casa'], name='ubicacion_calle_numero_idx')]
 
     def __str__(self):
         return f"{self.calle} {self.numero_casa}"
 
+    def save(self, *args, **kwargs):
+        self.geohash = geohash_de(self.latitud, self.longitud)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitud', 'longitud'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'geohash'}
+        super().save(*args, **kwargs)
+
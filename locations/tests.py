@@ -1,3 +1,92 @@
+import random
+
 from django.test import TestCase
 
-# Create your tests here.
+from orgs.models import Cuadrilla, Departamento, Direccion
+
+from . import espacial
+from .models import Ubicacion
+
+CENTRO = (-33.45, -70.65)
+
+
+class GeohashTests(TestCase):
+    def test_codificar(self):
+        self.assertEqual(espacial.codificar(57.64911, 10.40744), 'u4pruydqq')
+        self.assertEqual(espacial.codificar(57.64911, 10.40744, precision=4), 'u4pr')
+        self.assertEqual(espacial.geohash_de(None, 10.4), '')
+
+    def test_siguiente_celda(self):
+        self.assertEqual(espacial.siguiente_celda('u4pz'), 'u4q')
+        self.assertEqual(espacial.siguiente_celda('u4'), 'u5')
+        self.assertIsNone(espacial.siguiente_celda('zz'))
+
+    def test_celdas_cubren_la_caja_sin_pasar_del_maximo(self):
+        caja = espacial.caja_de_radio(*CENTRO, 500)
+
+        celdas = espacial.celdas(caja)
+
+        self.assertLessEqual(len(celdas), espacial.MAX_CELDAS)
+        for latitud in (caja.lat_min, CENTRO[0], caja.lat_max):
+            for longitud in (caja.lon_min, CENTRO[1], caja.lon_max):
+                self.assertTrue(espacial.codificar(latitud, longitud).startswith(tuple(celdas)))
+
+    def test_guardar_actualiza_el_geohash(self):
+        ubicacion = Ubicacion.objects.create(calle='Alameda', numero_casa='1', latitud=CENTRO[0], longitud=CENTRO[1])
+        self.assertEqual(ubicacion.geohash, espacial.codificar(*CENTRO))
+
+        ubicacion.latitud = -33.5
+        ubicacion.save(update_fields=['latitud'])
+
+        self.assertEqual(Ubicacion.objects.get().geohash, espacial.codificar(-33.5, CENTRO[1]))
+
+
+class ConsultasEspacialesTests(TestCase):
+    """Las consultas por geohash deben dar lo mismo que medir contra todos los puntos."""
+
+    @classmethod
+    def setUpTestData(cls):
+        azar = random.Random(7)
+        cls.ubicaciones = [
+            Ubicacion.objects.create(
+                calle='Calle', numero_casa=str(numero),
+                latitud=CENTRO[0] + azar.uniform(-0.03, 0.03),
+                longitud=CENTRO[1] + azar.uniform(-0.03, 0.03),
+            )
+            for numero in range(300)
+        ]
+        departamento = Departamento.objects.create(
+            nombre='Vialidad', direccion=Direccion.objects.create(nombre='Obras'),
+        )
+        for numero, ubicacion in enumerate(cls.ubicaciones[:40]):
+            Cuadrilla.objects.create(nombre=f'Cuadrilla {numero}', departamento=departamento, base=ubicacion)
+
+    def por_fuerza_bruta(self, metros):
+        distancias = {
+            ubicacion.pk: espacial.distancia_m(*CENTRO, ubicacion.latitud, ubicacion.longitud)
+            for ubicacion in self.ubicaciones
+        }
+        return sorted((pk for pk, distancia in distancias.items() if distancia <= metros), key=distancias.get)
+
+    def test_en_radio(self):
+        for metros in (100, 800, 2500):
+            with self.subTest(metros=metros):
+                encontrados = espacial.en_radio(Ubicacion.objects.all(), *CENTRO, metros)
+                self.assertEqual([ubicacion.pk for ubicacion in encontrados], self.por_fuerza_bruta(metros))
+
+    def test_mas_cercanos(self):
+        cercanos = espacial.mas_cercanos(Ubicacion.objects.all(), *CENTRO, k=5)
+
+        self.assertEqual([ubicacion.pk for ubicacion in cercanos], self.por_fuerza_bruta(10_000)[:5])
+        self.assertEqual(cercanos, sorted(cercanos, key=lambda ubicacion: ubicacion.distancia_m))
+
+    def test_a_traves_de_una_relacion(self):
+        bases = {cuadrilla.base_id for cuadrilla in Cuadrilla.objects.all()}
+        esperadas = [pk for pk in self.por_fuerza_bruta(2000) if pk in bases]
+
+        for usar_indice in (True, False):
+            with self.subTest(usar_indice=usar_indice):
+                cuadrillas = espacial.en_radio(
+                    Cuadrilla.objects.all(), *CENTRO, 2000, prefijo='base__', usar_indice=usar_indice,
+                )
+                self.assertEqual([cuadrilla.base_id for cuadrilla in cuadrillas], esperadas)
@@ -3,10 +3,14 @@ from __future__ import annotations
 from typing import Iterable, Optional, Set
 
 from django import forms
-from django.contrib.auth.models import Group
+from django.contrib.auth.models import Group, User
 from django.db import transaction
 from django.db.models import Q
+from django.urls import reverse
+from core import directorio
 from core.forms import BaseBootstrapForm
+from core.roles import invalidate_role_context, invalidate_role_contexts
+from core.widgets import AutocompleteSelect, AutocompleteSelectMultiple
 
 from registration.models import Profile
 from registration.utils import DEFAULT_GROUP_NAME, ROLE_GROUP_NAMES
@@ -34,6 +38,19 @@ def _ordered_profiles_queryset():
     )
 
 
+def available_profiles_queryset(role_key: str, instance_pk: Optional[int] = None):
+    """Perfiles sin rol, más los que ya tienen el rol `role_key` de `instance_pk`."""
+    filters = Q(role_type__isnull=True)
+    if instance_pk:
+        filters |= Q(role_type=role_key, role_object_id=instance_pk)
+    return _ordered_profiles_queryset().filter(filters).distinct()
+
+
+def profile_autocomplete_url(role_key: str, instance_pk: Optional[int] = None) -> str:
+    url = f"{reverse('perfil_autocomplete')}?rol={role_key}"
+    return f"{url}&objeto={instance_pk}" if instance_pk else url
+
+
 def _role_group(role_key: str) -> Group:
     group_name = ROLE_GROUP_NAMES.get(role_key, DEFAULT_GROUP_NAME)
     group, _ = Group.objects.get_or_create(name=group_name)
@@ -47,6 +64,7 @@ def _assign_role(profile: Profile, role_key: str, object_id: int) -> None:
     profile.group = group
     profile.save(update_fields=["role_type", "role_object_id", "group"])
     profile.user.groups.set([group])
+    invalidate_role_context(profile.user_id)
 
 
 def _clear_role(profile: Profile) -> None:
@@ -56,6 +74,43 @@ def _clear_role(profile: Profile) -> None:
     profile.group = default_group
     profile.save(update_fields=["role_type", "role_object_id", "group"])
     profile.user.groups.set([default_group])
+    invalidate_role_context(profile.user_id)
+
+
+def _bulk_set_role(
+    profiles: Iterable[Profile],
+    role_key: Optional[str],
+    object_id: Optional[int],
+    group: Group,
+) -> None:
+    """
+    `_assign_role`/`_clear_role` para muchos perfiles: un UPDATE de perfiles,
+    los grupos reescritos con un DELETE y un INSERT, y una sola invalidación.
+    No emite `post_save` ni `m2m_changed`, por eso invalida aquí mismo.
+    """
+    profiles = list(profiles)
+    if not profiles:
+        return
+    Profile.objects.filter(pk__in=[profile.pk for profile in profiles]).update(
+        role_type=role_key,
+        role_object_id=object_id,
+        group=group,
+    )
+    for profile in profiles:
+        profile.role_type = role_key
+        profile.role_object_id = object_id
+        profile.group = group
+
+    user_ids = [profile.user_id for profile in profiles]
+    user_groups = User.groups.through.objects.filter(user_id__in=user_ids)
+    user_groups.exclude(group=group).delete()
+    with_group = set(user_groups.filter(group=group).values_list("user_id", flat=True))
+    User.groups.through.objects.bulk_create([
+        User.groups.through(user_id=user_id, group=group)
+        for user_id in user_ids
+        if user_id not in with_group
+    ])
+    invalidate_role_contexts(user_ids)
 
 
 def _format_profiles(profiles: Iterable[Profile]) -> str:
@@ -88,20 +143,23 @@ class BaseRoleMembershipForm(forms.ModelForm):
         queryset=Profile.objects.none(),
         required=False,
         label="Miembros",
-        widget=forms.SelectMultiple(attrs={"class": "form-select", "size": 10}),
+        widget=AutocompleteSelectMultiple(attrs={"class": "form-select", "size": 10}),
     )
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         queryset = self._available_profiles_queryset()
+        autocomplete_url = profile_autocomplete_url(self.role_key, getattr(self.instance, "pk", None))
 
         self.fields["miembros"].queryset = queryset
+        self.fields["miembros"].widget.url = autocomplete_url
         self._current_member_ids = self._load_current_member_ids()
         if self._current_member_ids:
             self.fields["miembros"].initial = list(self._current_member_ids)
 
         if "encargados" in self.fields:
             self.fields["encargados"].queryset = queryset
+            self.fields["encargados"].widget.url = autocomplete_url
             self.fields["encargados"].initial = self._load_encargados_ids()
 
     # ------------------------------------------------------------------ utils
@@ -129,13 +187,7 @@ class BaseRoleMembershipForm(forms.ModelForm):
         )
 
     def _available_profiles_queryset(self):
-        filters = Q(role_type__isnull=True)
-        if getattr(self.instance, "pk", None):
-            filters |= Q(
-                role_type=self.role_key,
-                role_object_id=self.instance.pk,
-            )
-        return _ordered_profiles_queryset().filter(filters).distinct()
+        return available_profiles_queryset(self.role_key, getattr(self.instance, "pk", None))
 
     # ----------------------------------------------------------------- clean
 
@@ -165,47 +217,61 @@ class BaseRoleMembershipForm(forms.ModelForm):
         miembros: Iterable[Profile],
         encargados_ids: Optional[Set[int]] = None,
     ) -> None:
-        selected_profiles = list(miembros)
-        selected_ids = {profile.pk for profile in selected_profiles}
-
-        existing_qs = self.membership_model.objects.filter(
-            **{self.membership_fk_name: instance}
+        """
+        Calcula la diferencia con las memberships actuales y la aplica por
+        conjuntos: un DELETE para las que sobran, `bulk_create` para las
+        nuevas, `bulk_update` para los cambios de encargado y la
+        actualización masiva de roles y grupos de los perfiles.
+        """
+        selected = {profile.pk: profile for profile in miembros}
+        tracks_encargado = (
+            hasattr(self.membership_model, "es_encargado") and encargados_ids is not None
         )
+
         existing = {
             membership.usuario_id_id: membership
-            for membership in existing_qs
+            for membership in self.membership_model.objects.filter(
+                **{self.membership_fk_name: instance}
+            ).select_related("usuario_id")
         }
 
         # Remove non-selected members
-        for pk, membership in list(existing.items()):
-            if pk in selected_ids:
-                continue
-            profile = membership.usuario_id
-            membership.delete()
-            if _holds_current_role(profile, self.role_key, instance.pk):
-                _clear_role(profile)
+        removed = [membership for pk, membership in existing.items() if pk not in selected]
+        if removed:
+            self.membership_model.objects.filter(
+                pk__in=[membership.pk for membership in removed]
+            ).delete()
+            # Todos los removidos pierden el acceso a esta organización,
+            # conserven o no el rol.
+            invalidate_role_contexts(membership.usuario_id.user_id for membership in removed)
+            cleared = [
+                membership.usuario_id for membership in removed
+                if _holds_current_role(membership.usuario_id, self.role_key, instance.pk)
+            ]
+            if cleared:
+                default_group, _ = Group.objects.get_or_create(name=DEFAULT_GROUP_NAME)
+                _bulk_set_role(cleared, None, None, default_group)
 
         # Add or update selected members
-        for profile in selected_profiles:
-            membership = existing.get(profile.pk)
-            es_encargado = (
-                profile.pk in encargados_ids if encargados_ids is not None else None
-            )
-
+        created = []
+        updated = []
+        for pk, profile in selected.items():
+            membership = existing.get(pk)
+            es_encargado = pk in encargados_ids if tracks_encargado else None
             if membership is None:
                 fields = {self.membership_fk_name: instance, "usuario_id": profile}
-                if hasattr(self.membership_model, "es_encargado") and es_encargado is not None:
+                if tracks_encargado:
                     fields["es_encargado"] = es_encargado
-                membership = self.membership_model.objects.create(**fields)
-            elif (
-                hasattr(membership, "es_encargado")
-                and es_encargado is not None
-                and membership.es_encargado != es_encargado
-            ):
+                created.append(self.membership_model(**fields))
+            elif tracks_encargado and membership.es_encargado != es_encargado:
                 membership.es_encargado = es_encargado
-                membership.save(update_fields=["es_encargado"])
+                updated.append(membership)
+        self.membership_model.objects.bulk_create(created)
+        if updated:
+            self.membership_model.objects.bulk_update(updated, ["es_encargado"])
 
-            _assign_role(profile, self.role_key, instance.pk)
+        if selected:
+            _bulk_set_role(selected.values(), self.role_key, instance.pk, _role_group(self.role_key))
 
     @transaction.atomic
     def save(self, commit: bool = True):
@@ -235,7 +301,7 @@ class DireccionForm(BaseRoleMembershipForm):
         queryset=Profile.objects.none(),
         required=False,
         label="Encargados",
-        widget=forms.SelectMultiple(attrs={"class": "form-select", "size": 6}),
+        widget=AutocompleteSelectMultiple(attrs={"class": "form-select", "size": 6}),
         help_text="Selecciona cuáles de los miembros son encargados.",
     )
 
@@ -275,7 +341,7 @@ class DepartamentoForm(BaseRoleMembershipForm):
         queryset=Profile.objects.none(),
         required=False,
         label="Encargados",
-        widget=forms.SelectMultiple(attrs={"class": "form-select", "size": 6}),
+        widget=AutocompleteSelectMultiple(attrs={"class": "form-select", "size": 6}),
         help_text="Encargados dentro de los miembros seleccionados.",
     )
 
@@ -299,6 +365,7 @@ class DepartamentoForm(BaseRoleMembershipForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.fields["direccion"].queryset = Direccion.objects.filter(estado=True)
+        directorio.usar_opciones(self.fields["direccion"], directorio.actual().choices("direccion"))
 
     def clean(self):
         cleaned_data = super().clean()
@@ -337,6 +404,7 @@ class CuadrillaForm(BaseRoleMembershipForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.fields["departamento"].queryset = Departamento.objects.filter(estado=True)
+        directorio.usar_opciones(self.fields["departamento"], directorio.actual().choices("departamento"))
 
 
 class TerritorialForm(forms.ModelForm):
@@ -344,7 +412,7 @@ class TerritorialForm(forms.ModelForm):
         queryset=Profile.objects.none(),
         required=False,
         label="Responsable",
-        widget=forms.Select(attrs={"class": "form-select"}),
+        widget=AutocompleteSelect(attrs={"class": "form-select"}),
     )
 
     class Meta:
@@ -364,17 +432,12 @@ class TerritorialForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.fields["profile"].queryset = self._available_profiles_queryset()
+        self.fields["profile"].widget.url = profile_autocomplete_url("territorial", getattr(self.instance, "pk", None))
         if getattr(self.instance, "profile_id", None):
             self.fields["profile"].initial = self.instance.profile_id
 
     def _available_profiles_queryset(self):
-        filters = Q(role_type__isnull=True)
-        if getattr(self.instance, "pk", None):
-            filters |= Q(
-                role_type="territorial",
-                role_object_id=self.instance.pk,
-            )
-        return _ordered_profiles_queryset().filter(filters).distinct()
+        return available_profiles_queryset("territorial", getattr(self.instance, "pk", None))
 
     def clean_profile(self):
         profile = self.cleaned_data.get("profile")
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.4 on 2026-10-18 20:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0003_ubicacion_geohash'),
+        ('orgs', '0011_remove_cuadrilla_profile_remove_departamento_profile_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cuadrilla',
+            name='base',
+            field=models.ForeignKey(blank=True, db_column='Base_id', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='cuadrillas', to='locations.ubicacion'),
+        ),
+    ]
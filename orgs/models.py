@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from registration.models import Profile
 from django.utils import timezone
 
@@ -54,6 +54,11 @@ class Departamento(models.Model):
             models.UniqueConstraint(fields=["direccion", "nombre"], name="unique_departamento_por_direccion")
         ]
 
+    def save(self, *args, **kwargs):
+        # Cambiar de dirección mueve los contadores de sus cuadrillas (post_save).
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.nombre} ({self.direccion})"
     
@@ -68,10 +73,24 @@ class Cuadrilla(models.Model):
         db_column='Departamento_id',
         related_name='Cuadrilla'
     )
+    # Desde dónde sale la cuadrilla; se usa para despachar por distancia.
+    base = models.ForeignKey(
+        'locations.Ubicacion',
+        on_delete=models.SET_NULL,
+        db_column='Base_id',
+        related_name='cuadrillas',
+        null=True,
+        blank=True
+    )
 
     def __str__(self):
         return self.nombre
 
+    def save(self, *args, **kwargs):
+        # Cambiar de departamento mueve sus contadores de dirección (post_save).
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     class Meta:
         verbose_name = 'Cuadrilla'
         verbose_name_plural = 'Cuadrillas'
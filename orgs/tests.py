@@ -1,3 +1,93 @@
-from django.test import TestCase
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
-# Create your tests here.
+from core import directorio, synthetic
+from core.instrumentation import QueryBudgetTestMixin
+from registration.models import Profile
+
+from .forms import DireccionForm
+from .models import Direccion, DireccionMembership
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class PresupuestoConsultasTests(QueryBudgetTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Group.objects.create(name='Usuarios')
+        cls.generador = synthetic.Generador(synthetic.Escala(
+            direcciones=3, departamentos_por_direccion=3, cuadrillas_por_departamento=3,
+            territoriales=10, solicitudes=300, dias=30,
+        ))
+        cls.generador.generar(indexar_busqueda=False)
+
+    def setUp(self):
+        cache.clear()
+        directorio._directorio = None
+
+    def ingresar(self, rol):
+        self.client.force_login(User.objects.get(username=f'{self.generador.slug}_{rol}_1'))
+
+    def test_listados_secpla(self):
+        self.ingresar('secpla')
+        for nombre in ('direccion_listar', 'departamento_listar', 'cuadrilla_listar', 'territorial_listar',
+                       'mis_incidencias_cuadrilla'):
+            with self.subTest(vista=nombre):
+                self.assertEqual(self.assertQueryBudget(reverse(nombre)).status_code, 200)
+
+    def test_mis_incidencias_cuadrilla(self):
+        self.ingresar('cuadrilla')
+        respuesta = self.assertQueryBudget(reverse('mis_incidencias_cuadrilla'))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertLessEqual(len(respuesta.context['incidencias']), 25)
+
+
+class SincronizarMiembrosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Group.objects.create(name='Usuarios')
+        cls.perfiles = [User.objects.create_user(f'funcionario{numero:02}').profile for numero in range(30)]
+
+    def setUp(self):
+        directorio._directorio = None
+
+    def guardar(self, miembros, encargados=(), instance=None, nombre='Obras'):
+        form = DireccionForm(
+            data={
+                'nombre': nombre, 'estado': 'on',
+                'miembros': [perfil.pk for perfil in miembros],
+                'encargados': [perfil.pk for perfil in encargados],
+            },
+            instance=instance,
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        return form.save()
+
+    def test_agrega_quita_y_cambia_encargados(self):
+        primero, segundo, tercero = self.perfiles[:3]
+        direccion = self.guardar([primero, segundo], encargados=[primero])
+
+        self.guardar([segundo, tercero], encargados=[segundo], instance=direccion)
+
+        self.assertEqual(
+            set(DireccionMembership.objects.filter(direccion=direccion).values_list('usuario_id', 'es_encargado')),
+            {(segundo.pk, True), (tercero.pk, False)},
+        )
+        primero.refresh_from_db()
+        tercero.refresh_from_db()
+        self.assertEqual((primero.role_type, primero.group.name), (None, 'Usuarios'))
+        self.assertEqual((tercero.role_type, tercero.role_object_id), ('direccion', direccion.pk))
+        self.assertEqual(list(tercero.user.groups.values_list('name', flat=True)), ['Direcciones'])
+
+    def test_consultas_no_crecen_con_los_miembros(self):
+        def consultas(nombre, miembros):
+            with CaptureQueriesContext(connection) as capturadas:
+                self.guardar(miembros, nombre=nombre)
+            return len(capturadas)
+
+        consultas('Aseo', self.perfiles[:1])
+        self.assertEqual(consultas('Obras', self.perfiles[1:6]), consultas('Tránsito', self.perfiles[6:30]))
+        self.assertEqual(Profile.objects.filter(role_type='direccion').count(), 30)
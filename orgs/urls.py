@@ -30,4 +30,6 @@ urlpatterns = [
     path('territoriales/editar/<int:territorial_id>/', views.territorial_editar, name='territorial_editar'),
     path('territoriales/ver/<int:territorial_id>/', views.territorial_ver, name='territorial_ver'),
     path('territoriales/eliminar/<int:territorial_id>/', views.territorial_eliminar, name='territorial_eliminar'),
+
+    path('perfiles/autocomplete/', views.perfil_autocomplete, name='perfil_autocomplete'),
 ]
@@ -4,20 +4,22 @@ from django.contrib.auth.decorators import login_required
 from registration.models import Profile
 from registration.utils import has_admin_role, clear_profile_role
 from .models import Direccion, Departamento, Territorial
-from .forms import DireccionForm, DepartamentoForm, CuadrillaForm, TerritorialForm
+from .forms import DireccionForm, DepartamentoForm, CuadrillaForm, TerritorialForm, available_profiles_queryset
 from django.utils.timezone import now
 from tickets.models import SolicitudIncidencia
+from tickets import transiciones
 from orgs.models import Cuadrilla
 from django.db.models import Q
-from django.core.paginator import Paginator
+from django.http import JsonResponse
 
+from core import directorio
 from core.decorators import role_required
+from core.roles import get_role_context
+from core.pagination import paginate_request, query_string_without_cursor
 
 @role_required("Secpla")
 def direccion_listar(request):
-    try:
-        profile = Profile.objects.get(user_id=request.user.id)
-    except Profile.DoesNotExist:
+    if not get_role_context(request).profile_id:
         messages.info(request, 'Hubo un error con tu perfil.')
         return redirect('login')
 
@@ -45,17 +47,13 @@ def direccion_listar(request):
         filtros &= Q(memberships__es_encargado=True) & responsable_filters
 
     direcciones = direcciones.filter(filtros).distinct()
-    paginator = Paginator(direcciones, 10)
-    page_number = request.GET.get('page')
-    direcciones_page = paginator.get_page(page_number)
-    sin_resultados = not direcciones.exists()
-    query_params = request.GET.copy()
-    if 'page' in query_params:
-        del query_params['page']
-    query_string = query_params.urlencode()
+    direcciones_page = paginate_request(request, direcciones, ('direccion_id',))
+    sin_resultados = not direcciones_page and not direcciones_page.has_previous()
+    query_string = query_string_without_cursor(request)
 
     return render(request, 'orgs/direccion_listar.html', {
         'direcciones': direcciones_page,
+        'page_obj': direcciones_page,
         'sin_resultados': sin_resultados,
         'query_string': query_string,
         'request': request,
@@ -63,9 +61,7 @@ def direccion_listar(request):
 
 @role_required("Secpla")
 def direccion_crear(request):
-    try:
-        profile = Profile.objects.get(user_id=request.user.id)
-    except Profile.DoesNotExist:
+    if not get_role_context(request).profile_id:
         messages.info(request, 'Hubo un error con tu perfil.')
         return redirect('login')
 
@@ -85,9 +81,7 @@ def direccion_crear(request):
 
 @role_required("Secpla")
 def direccion_editar(request, direccion_id):
-    try:
-        profile = Profile.objects.get(user_id=request.user.id)
-    except Profile.DoesNotExist:
+    if not get_role_context(request).profile_id:
         messages.info(request, 'Hubo un error con tu perfil.')
         return redirect('login')
     
@@ -153,12 +147,12 @@ def territorial_listar(request):
             | Q(profile__user__username__icontains=q)
         )
 
-    paginator = Paginator(territoriales, 10)
-    page_number = request.GET.get('page')
-    territoriales_page = paginator.get_page(page_number)
+    territoriales_page = paginate_request(request, territoriales, ('nombre', 'territorial_id'))
 
     return render(request, 'orgs/territorial_listar.html', {
         'territoriales': territoriales_page,
+        'page_obj': territoriales_page,
+        'query_string': query_string_without_cursor(request),
         'query': q,
         'request': request,
     })
@@ -205,19 +199,17 @@ def territorial_eliminar(request, territorial_id):
 
 @role_required("Secpla","Direcciones")
 def departamento_listar(request):
-    try:
-        profile = Profile.objects.get(user_id=request.user.id)
-    except Profile.DoesNotExist:
+    if not get_role_context(request).profile_id:
         messages.info(request, 'Hubo un error con tu perfil.')
         return redirect('login')
 
     q = request.GET.get('q', '').strip()
     estado = request.GET.get('estado', '').strip()
     direccion_id = request.GET.get('direccion', '').strip()
-    departamentos = Departamento.objects.select_related('direccion').prefetch_related(
+    departamentos = Departamento.objects.prefetch_related(
         'memberships__usuario_id__user'
     ).all().order_by('departamento_id')
-    direcciones = Direccion.objects.all().order_by('nombre')  
+    direcciones = directorio.de_peticion(request).registros('direccion', activos=False)
 
     filtros = Q()
     if q:
@@ -231,17 +223,13 @@ def departamento_listar(request):
         filtros &= Q(direccion__direccion_id=direccion_id)
 
     departamentos = departamentos.filter(filtros).distinct()
-    paginator = Paginator(departamentos, 10)
-    page_number = request.GET.get('page')
-    departamentos_page = paginator.get_page(page_number)
-    sin_resultados = not departamentos.exists()
-    query_params = request.GET.copy()
-    if 'page' in query_params:
-        del query_params['page']
-    query_string = query_params.urlencode()
+    departamentos_page = paginate_request(request, departamentos, ('departamento_id',))
+    sin_resultados = not departamentos_page and not departamentos_page.has_previous()
+    query_string = query_string_without_cursor(request)
 
     return render(request, 'orgs/departamento_listar.html', {
         'departamentos': departamentos_page,
+        'page_obj': departamentos_page,
         'direcciones': direcciones,
         'sin_resultados': sin_resultados,
         'query_string': query_string,
@@ -252,9 +240,7 @@ def departamento_listar(request):
 
 @role_required("Secpla")
 def departamento_crear(request):
-    try:
-        profile = Profile.objects.get(user_id=request.user.id)
-    except Profile.DoesNotExist:
+    if not get_role_context(request).profile_id:
         messages.info(request, 'Hubo un error con tu perfil.')
         return redirect('login')
     
@@ -275,9 +261,7 @@ def departamento_crear(request):
 
 @role_required("Secpla")
 def departamento_editar(request, departamento_id):
-    try:
-        profile = Profile.objects.get(user_id=request.user.id)
-    except Profile.DoesNotExist:
+    if not get_role_context(request).profile_id:
         messages.info(request, 'Hubo un error con tu perfil.')
         return redirect('login')
     
@@ -335,28 +319,37 @@ def departamento_eliminar(request, departamento_id):
 
 @role_required("Secpla","Cuadrillas")
 def mis_incidencias_cuadrilla(request):
-    if request.user.profile.role_type not in ['cuadrilla', 'secpla']:
+    roles = get_role_context(request)
+    if roles.role_type not in ['cuadrilla', 'secpla']:
         messages.error(request, "No tienes permiso para acceder a este panel.")
         return redirect('home')
 
     # Si es cuadrilla, obtenemos solo incidencias de su cuadrilla
-    if request.user.profile.role_type == 'cuadrilla':
-        try:
-            cuadrilla = Cuadrilla.objects.get(pk=request.user.profile.role_object_id)
-        except Cuadrilla.DoesNotExist:
+    if roles.role_type == 'cuadrilla':
+        cuadrilla = directorio.de_peticion(request).get('cuadrilla', roles.role_object_id)
+        if cuadrilla is None:
             messages.error(request, "No tienes una cuadrilla asignada.")
             return redirect('home')
-        incidencias = SolicitudIncidencia.objects.filter(cuadrilla=cuadrilla)
+        incidencias = SolicitudIncidencia.objects.filter(cuadrilla_id=cuadrilla.pk)
         es_supervisor = False  
 
     # Si es secpla temporalmente vera todas las incidencias y tendra permiso para actuar
-    elif request.user.profile.role_type == 'secpla':
+    elif roles.role_type == 'secpla':
         incidencias = SolicitudIncidencia.objects.all()
         cuadrilla = None 
         es_supervisor = True  # Esto indica que puede ver todo y actuar por ahora
 
+    # Nombres de incidencia y cuadrilla desde el directorio, sin joins por fila.
+    incidencias_page = paginate_request(
+        request,
+        incidencias.only('pk', 'incidencia_id', 'cuadrilla_id', 'estado', 'fecha', 'fecha_inicio'),
+        ('-fecha', '-solicitud_incidencia_id'),
+        per_page=25,
+    )
     context = {
-        'incidencias': incidencias,
+        'incidencias': incidencias_page,
+        'page_obj': incidencias_page,
+        'query_string': query_string_without_cursor(request),
         'cuadrilla': cuadrilla,
         'es_supervisor': es_supervisor  
     }
@@ -364,46 +357,42 @@ def mis_incidencias_cuadrilla(request):
 
 @role_required("Secpla","Cuadrillas")
 def marcar_en_proceso(request, pk):
-    if request.user.profile.role_type not in ['cuadrilla', 'secpla']:
+    roles = get_role_context(request)
+    if roles.role_type not in ['cuadrilla', 'secpla']:
         messages.error(request, "No tienes permiso para realizar esta acción.")
         return redirect('mis_incidencias_cuadrilla')
 
     incidencia = get_object_or_404(SolicitudIncidencia, pk=pk)
 
     # Si es cuadrilla solo puede modificar incidencias de su propia cuadrilla
-    if request.user.profile.role_type == 'cuadrilla':
-        cuadrilla = Cuadrilla.objects.get(pk=request.user.profile.role_object_id)
+    if roles.role_type == 'cuadrilla':
+        cuadrilla = Cuadrilla.objects.get(pk=roles.role_object_id)
         if incidencia.cuadrilla != cuadrilla:
             messages.error(request, "No puedes modificar incidencias de otra cuadrilla.")
             return redirect('mis_incidencias_cuadrilla')
-    estado_anterior = incidencia.estado
-    incidencia.estado = "En Proceso"
-    incidencia.fecha_inicio = now()
-    incidencia.save()
-
-    incidencia.registrar_log(
-        profile= request.user.profile,
-        from_estado = estado_anterior, 
-        to_estado = incidencia.estado,
-        fecha = now()
-    )
+    try:
+        transiciones.transicionar(
+            incidencia, transiciones.EN_PROCESO, request.user.profile,
+            campos={'fecha_inicio': now()},
+        )
+    except (transiciones.TransicionInvalida, transiciones.ConflictoTransicion) as error:
+        messages.error(request, str(error))
+        return redirect('mis_incidencias_cuadrilla')
 
     messages.success(request, "La incidencia fue marcada como 'En Proceso'.")
     return redirect('mis_incidencias_cuadrilla')    
 
 @role_required("Secpla","Departamentos")
 def cuadrilla_listar(request):
-    try:
-        profile = Profile.objects.get(user_id=request.user.id)
-    except Profile.DoesNotExist:
+    if not get_role_context(request).profile_id:
         messages.error(request, 'Hubo un error con tu perfil.')
         return redirect('login')
 
     q = request.GET.get('q', '').strip()
     estado = request.GET.get('estado', '').strip().lower()
     departamento_id = request.GET.get('departamento', '').strip()
-    cuadrillas = Cuadrilla.objects.select_related('departamento').prefetch_related('memberships__usuario_id__user').all().order_by('nombre')
-    departamentos = Departamento.objects.filter(estado=True).order_by('nombre')
+    cuadrillas = Cuadrilla.objects.prefetch_related('memberships__usuario_id__user').all().order_by('nombre')
+    departamentos = directorio.de_peticion(request).registros('departamento')
 
     filtros = Q()
     if q:
@@ -414,16 +403,12 @@ def cuadrilla_listar(request):
         filtros &= Q(departamento__departamento_id=departamento_id)
 
     cuadrillas = cuadrillas.filter(filtros).distinct()
-    paginator = Paginator(cuadrillas, 10)
-    page_number = request.GET.get('page')
-    cuadrillas_page = paginator.get_page(page_number)
-    query_params = request.GET.copy()
-    if 'page' in query_params:
-        del query_params['page']
-    query_string = query_params.urlencode()
+    cuadrillas_page = paginate_request(request, cuadrillas, ('nombre', 'cuadrilla_id'))
+    query_string = query_string_without_cursor(request)
 
     return render(request, 'orgs/cuadrilla_listar.html', {
         'cuadrillas': cuadrillas_page,
+        'page_obj': cuadrillas_page,
         'departamentos': departamentos,
         'query_string': query_string,
         'request': request,
@@ -431,9 +416,7 @@ def cuadrilla_listar(request):
 
 @role_required("Secpla")
 def cuadrilla_crear(request):
-    try:
-        profile = Profile.objects.get(user_id=request.user.id)
-    except Profile.DoesNotExist:
+    if not get_role_context(request).profile_id:
         messages.error(request, 'Permiso denegado.')
         return redirect('login')
 
@@ -452,9 +435,7 @@ def cuadrilla_crear(request):
 
 @role_required("Secpla")
 def cuadrilla_editar(request, cuadrilla_id):
-    try:
-        profile = Profile.objects.get(user_id=request.user.id)
-    except Profile.DoesNotExist:
+    if not get_role_context(request).profile_id:
         messages.error(request, 'Permiso denegado.')
         return redirect('login')
 
@@ -500,3 +481,31 @@ def cuadrilla_bloquear(request, cuadrilla_id):
     cuadrilla.save(update_fields=['estado'])
     messages.success(request, f'Cuadrilla "{cuadrilla.nombre}" {estado_str} correctamente.')
     return redirect('cuadrilla_listar')
+
+
+PERFIL_AUTOCOMPLETE_ROLES = ("direccion", "departamento", "cuadrilla", "territorial")
+PERFIL_AUTOCOMPLETE_LIMITE = 20
+
+
+@role_required("Secpla")
+def perfil_autocomplete(request):
+    """Perfiles asignables a `rol`/`objeto` que contienen `q`, para miembros, encargados y responsable."""
+    rol = request.GET.get("rol", "")
+    if rol not in PERFIL_AUTOCOMPLETE_ROLES:
+        return JsonResponse({"results": [], "more": False}, status=400)
+    objeto = request.GET.get("objeto", "")
+    perfiles = available_profiles_queryset(rol, int(objeto) if objeto.isdigit() else None)
+
+    q = request.GET.get("q", "").strip()
+    if q:
+        perfiles = perfiles.filter(
+            Q(user__username__icontains=q)
+            | Q(user__first_name__icontains=q)
+            | Q(user__last_name__icontains=q)
+            | Q(user__email__icontains=q)
+        )
+    perfiles = list(perfiles[:PERFIL_AUTOCOMPLETE_LIMITE + 1])
+    return JsonResponse({
+        "results": [{"id": perfil.pk, "text": str(perfil)} for perfil in perfiles[:PERFIL_AUTOCOMPLETE_LIMITE]],
+        "more": len(perfiles) > PERFIL_AUTOCOMPLETE_LIMITE,
+    })
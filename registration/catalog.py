@@ -0,0 +1,123 @@
+"""
+Catálogo de roles asignables, cacheado por proceso.
+
+Las cinco tablas de roles (Secpla, Dirección, Departamento, Cuadrilla,
+Territorial) se leen una sola vez y quedan en memoria junto a la versión
+`VERSION_KEY`. En cada uso solo se consulta esa versión; si cambió (las
+señales de `registration.signals` la incrementan al guardar o borrar
+cualquiera de esos modelos) se vuelve a cargar. Los formularios y el
+endpoint de autocompletado filtran el catálogo en memoria en vez de
+construir todas las opciones en cada render.
+"""
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from core.versions import bump_version, get_version
+
+from .models import Profile
+from .utils import ROLE_CONFIG
+
+VERSION_KEY = "roles:catalogo"
+AUTOCOMPLETE_LIMIT = 20
+
+
+@dataclass(frozen=True)
+class RoleOption:
+    value: str
+    label: str
+    holder_profile_id: Optional[int] = None
+
+    def available_for(self, profile: Optional[Profile]) -> bool:
+        """Libre, o tomado precisamente por `profile`."""
+        return self.holder_profile_id is None or (
+            profile is not None and self.holder_profile_id == profile.pk
+        )
+
+
+@dataclass(frozen=True)
+class _Snapshot:
+    version: int
+    options: Tuple[RoleOption, ...]
+    by_value: Dict[str, RoleOption]
+
+
+_snapshot: Optional[_Snapshot] = None
+_lock = threading.Lock()
+
+
+def _load() -> Tuple[RoleOption, ...]:
+    options: List[RoleOption] = []
+    for config in ROLE_CONFIG:
+        queryset = config.model.objects.all()
+        if hasattr(config.model, "estado"):
+            queryset = queryset.filter(estado=True)
+        fields = ["pk", "nombre"]
+        if hasattr(config.model, "profile"):
+            fields.append("profile_id")
+        for row in queryset.order_by("nombre").values(*fields):
+            options.append(RoleOption(
+                value=f"{config.key}:{row['pk']}",
+                label=f"{config.label}: {row['nombre']}",
+                holder_profile_id=row.get("profile_id"),
+            ))
+    return tuple(options)
+
+
+def get_catalog() -> Tuple[RoleOption, ...]:
+    """Todas las opciones de rol activas, en el orden de `ROLE_CONFIG` y por nombre."""
+    global _snapshot
+    version = get_version(VERSION_KEY)
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.version == version:
+        return snapshot.options
+    with _lock:
+        if _snapshot is None or _snapshot.version != version:
+            options = _load()
+            _snapshot = _Snapshot(version, options, {option.value: option for option in options})
+        return _snapshot.options
+
+
+def get_option(value: str) -> Optional[RoleOption]:
+    get_catalog()
+    return _snapshot.by_value.get(value)
+
+
+def role_choices(
+    profile: Optional[Profile] = None,
+    term: str = "",
+    limit: Optional[int] = None,
+) -> Tuple[List[Tuple[str, str]], bool]:
+    """
+    Opciones disponibles para `profile` cuyo texto contiene `term`.
+    Devuelve `(choices, hay_mas)`; `hay_mas` indica que `limit` las truncó.
+    """
+    term = term.strip().casefold()
+    choices: List[Tuple[str, str]] = []
+    for option in get_catalog():
+        if not option.available_for(profile):
+            continue
+        if term and term not in option.label.casefold():
+            continue
+        if limit is not None and len(choices) >= limit:
+            return choices, True
+        choices.append((option.value, option.label))
+    return choices, False
+
+
+def has_available(profile: Optional[Profile] = None) -> bool:
+    return any(option.available_for(profile) for option in get_catalog())
+
+
+def available_label(value: str, profile: Optional[Profile] = None) -> Optional[str]:
+    """Etiqueta de `value` si es una opción activa y disponible para `profile`."""
+    option = get_option(value)
+    if option is None or not option.available_for(profile):
+        return None
+    return option.label
+
+
+def invalidate() -> None:
+    bump_version(VERSION_KEY)
@@ -1,8 +1,11 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
+from django.urls import reverse
+from core.widgets import AutocompleteSelect
+from . import catalog
 from .models import Profile
-from .utils import assign_role_to_profile, build_role_choices, parse_role_value
+from .utils import assign_role_to_profile, parse_role_value
 
 class UserCreationFormWithEmail(UserCreationForm):
     email = forms.EmailField(required=True, help_text="Requerido, 254 caracteres como máximo y debe ser válido")
@@ -31,8 +34,43 @@ class EmailForm(forms.ModelForm):
                 raise forms.ValidationError("Correo existe, prueba con otro")
         return email
 
-class AdminUserCreateForm(forms.ModelForm):
-    role = forms.ChoiceField(label="Rol", required=False, choices=())
+class RoleChoiceField(forms.ChoiceField):
+    """
+    `choices` solo lleva la opción seleccionada (el resto llega por
+    autocompletado), así que se valida contra el catálogo de roles.
+    """
+    widget = AutocompleteSelect
+    profile = None
+
+    def valid_value(self, value):
+        return catalog.available_label(value, self.profile) is not None
+
+
+class RoleFieldMixin:
+    def _init_role_field(self, profile=None):
+        field = self.fields['role']
+        field.profile = profile
+        field.widget.url = reverse('role_autocomplete') + (f'?perfil={profile.pk}' if profile else '')
+        if not catalog.has_available(profile):
+            field.choices = [('', 'No hay roles disponibles')]
+            field.disabled = True
+            return
+
+        if profile and profile.role_type and profile.role_object_id:
+            field.initial = f"{profile.role_type}:{profile.role_object_id}"
+        selected = [field.initial]
+        if self.is_bound:
+            selected.append(self.data.get(self.add_prefix('role')))
+        choices = [('', 'Seleccione un rol')]
+        for value in dict.fromkeys(value for value in selected if value):
+            label = catalog.available_label(value, profile)
+            if label:
+                choices.append((value, label))
+        field.choices = choices
+
+
+class AdminUserCreateForm(RoleFieldMixin, forms.ModelForm):
+    role = RoleChoiceField(label="Rol", required=False, choices=())
     password1 = forms.CharField(widget=forms.PasswordInput, label="Contraseña")
     password2 = forms.CharField(widget=forms.PasswordInput, label="Confirmar contraseña")
     phone = forms.CharField(required=False, label="Teléfono fijo", max_length=30)
@@ -83,17 +121,9 @@ class AdminUserCreateForm(forms.ModelForm):
             assign_role_to_profile(profile, role_key, object_id)
         return user
 
-    def _init_role_field(self, profile=None):
-        choices = build_role_choices(profile)
-        if choices:
-            self.fields['role'].choices = [('', 'Seleccione un rol')] + choices
-        else:
-            self.fields['role'].choices = [('', 'No hay roles disponibles')]
-            self.fields['role'].disabled = True
-
 
-class AdminUserUpdateForm(forms.ModelForm):
-    role = forms.ChoiceField(label="Rol", required=True, choices=())
+class AdminUserUpdateForm(RoleFieldMixin, forms.ModelForm):
+    role = RoleChoiceField(label="Rol", required=True, choices=())
     phone = forms.CharField(required=False, label="Teléfono fijo", max_length=30)
     mobile = forms.CharField(required=False, label="Teléfono móvil", max_length=30)
 
@@ -140,13 +170,3 @@ class AdminUserUpdateForm(forms.ModelForm):
             role_key, object_id = parse_role_value(self.cleaned_data['role'])
             assign_role_to_profile(profile, role_key, object_id)
         return user
-
-    def _init_role_field(self, profile=None):
-        choices = build_role_choices(profile)
-        if choices:
-            self.fields['role'].choices = [('', 'Seleccione un rol')] + choices
-        else:
-            self.fields['role'].choices = [('', 'No hay roles disponibles')]
-            self.fields['role'].disabled = True
-        if profile and profile.role_type and profile.role_object_id:
-            self.fields['role'].initial = f"{profile.role_type}:{profile.role_object_id}"
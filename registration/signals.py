@@ -0,0 +1,23 @@
+"""
+Señales que invalidan el catálogo de roles (`registration.catalog`) cuando
+cambia alguno de los modelos que lo alimentan.
+"""
+from django.db.models.signals import post_delete, post_save
+
+from . import catalog
+from .models import Profile
+from .utils import ROLE_CONFIG
+
+
+def invalidar_catalogo_roles(sender, raw=False, **kwargs):
+    if raw:
+        return
+    catalog.invalidate()
+
+
+for _config in ROLE_CONFIG:
+    post_save.connect(invalidar_catalogo_roles, sender=_config.model, dispatch_uid=f"catalogo_roles_save_{_config.key}")
+    post_delete.connect(invalidar_catalogo_roles, sender=_config.model, dispatch_uid=f"catalogo_roles_delete_{_config.key}")
+# El catálogo guarda el perfil que ocupa cada rol: al borrar un perfil (o
+# su usuario) se vuelve a cargar para no seguir mostrándolo como titular.
+post_delete.connect(invalidar_catalogo_roles, sender=Profile, dispatch_uid="catalogo_roles_delete_profile")
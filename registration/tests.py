@@ -1,3 +1,146 @@
-from django.test import TestCase
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
 
-# Create your tests here.
+from core import directorio, synthetic
+from core.instrumentation import QueryBudgetTestMixin
+from orgs.models import Direccion, Territorial
+
+from . import catalog
+from .models import Profile
+from .utils import get_role_displays
+from .views import USER_LIST_SIN_ROL
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class PresupuestoConsultasTests(QueryBudgetTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Group.objects.create(name='Usuarios')
+        cls.generador = synthetic.Generador(synthetic.Escala(
+            direcciones=2, departamentos_por_direccion=2, cuadrillas_por_departamento=2,
+            territoriales=10, solicitudes=20, dias=30,
+        ))
+        cls.generador.generar(indexar_busqueda=False)
+
+    def setUp(self):
+        cache.clear()
+        directorio._directorio = None
+        catalog._snapshot = None
+        self.client.force_login(User.objects.get(username=f'{self.generador.slug}_secpla_1'))
+
+    def test_user_list(self):
+        respuesta = self.assertQueryBudget(reverse('user_list'))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertContains(respuesta, '[Secpla]')
+
+    def test_user_list_filtrada(self):
+        url = f"{reverse('user_list')}?rol=territorial&activo=1"
+        self.assertEqual(self.assertQueryBudget(url).status_code, 200)
+
+    def test_user_list_filtra_por_rol_y_estado(self):
+        User.objects.create_user('sin_rol_activo')
+        User.objects.create_user('sin_rol_bloqueado', is_active=False)
+
+        respuesta = self.client.get(reverse('user_list'), {'rol': USER_LIST_SIN_ROL, 'activo': '1'})
+        self.assertEqual([item['user'].username for item in respuesta.context['users']], ['sin_rol_activo'])
+        self.assertEqual(respuesta.context['users'][0]['role_label'], '-')
+
+        respuesta = self.client.get(reverse('user_list'), {'rol': Profile.Role.TERRITORIAL})
+        etiquetas = [item['role_label'] for item in respuesta.context['users']]
+        self.assertEqual(len(etiquetas), 10)
+        self.assertTrue(all(etiqueta.startswith('Territorial: ') for etiqueta in etiquetas))
+
+
+class EtiquetasRolTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Group.objects.create(name='Usuarios')
+        obras = Direccion.objects.create(nombre='Obras')
+        aseo = Direccion.objects.create(nombre='Aseo')
+        norte = Territorial.objects.create(nombre='Norte')
+        asignaciones = (
+            (Profile.Role.DIRECCION, obras.pk),
+            (Profile.Role.DIRECCION, aseo.pk),
+            (Profile.Role.TERRITORIAL, norte.pk),
+            (Profile.Role.CUADRILLA, 999),
+            (None, None),
+        )
+        cls.perfiles = []
+        for numero, (rol, objeto_id) in enumerate(asignaciones):
+            perfil = User.objects.create_user(f'usuario{numero}').profile
+            perfil.role_type, perfil.role_object_id = rol, objeto_id
+            perfil.save(update_fields=['role_type', 'role_object_id'])
+            cls.perfiles.append(perfil)
+
+    def test_una_consulta_por_tipo_de_rol(self):
+        # Dirección, Territorial y Cuadrilla; el perfil sin rol no consulta.
+        with self.assertNumQueries(3):
+            etiquetas = get_role_displays(self.perfiles)
+
+        self.assertEqual(
+            [etiquetas[perfil.pk] for perfil in self.perfiles],
+            ['Dirección: Obras', 'Dirección: Aseo', 'Territorial: Norte', 'Cuadrilla', '-'],
+        )
+
+    def test_sin_perfiles_no_consulta(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(get_role_displays([]), {})
+
+
+class CatalogoRolesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Group.objects.create(name='Usuarios')
+        cls.usuario = User.objects.create_user('admin')
+        cls.obras = Direccion.objects.create(nombre='Obras')
+        Direccion.objects.create(nombre='Aseo')
+        Direccion.objects.create(nombre='Tránsito', estado=False)
+        cls.norte = Territorial.objects.create(nombre='Norte', profile=cls.usuario.profile)
+
+    def setUp(self):
+        catalog._snapshot = None
+
+    def test_solo_consulta_la_version_si_no_cambio(self):
+        catalog.get_catalog()
+        with self.assertNumQueries(1):
+            opciones = catalog.get_catalog()
+
+        self.assertEqual(
+            [opcion.label for opcion in opciones],
+            ['Dirección: Aseo', 'Dirección: Obras', 'Territorial: Norte'],
+        )
+
+    def test_guardar_o_borrar_un_rol_recarga_el_catalogo(self):
+        catalog.get_catalog()
+
+        self.obras.nombre = 'Obras Municipales'
+        self.obras.save()
+        self.assertEqual(catalog.get_option(f'direccion:{self.obras.pk}').label, 'Dirección: Obras Municipales')
+
+        self.obras.delete()
+        self.assertIsNone(catalog.get_option(f'direccion:{self.obras.pk}'))
+
+    def test_rol_tomado_solo_disponible_para_su_titular(self):
+        valor = f'territorial:{self.norte.pk}'
+        otro = User.objects.create_user('otro').profile
+
+        self.assertIsNone(catalog.available_label(valor, otro))
+        self.assertEqual(catalog.available_label(valor, self.usuario.profile), 'Territorial: Norte')
+        self.assertNotIn(valor, dict(catalog.role_choices(otro)[0]))
+
+    def test_autocompletado_filtra_y_trunca(self):
+        Direccion.objects.bulk_create(
+            Direccion(nombre=f'Dirección {numero:02}') for numero in range(catalog.AUTOCOMPLETE_LIMIT + 5)
+        )
+        catalog.invalidate()
+        self.client.force_login(self.usuario)
+
+        datos = self.client.get(reverse('role_autocomplete'), {'q': 'dirección 0'}).json()
+        self.assertEqual(len(datos['results']), 10)
+        self.assertFalse(datos['more'])
+
+        datos = self.client.get(reverse('role_autocomplete'), {'q': 'DIRECCIÓN'}).json()
+        self.assertEqual(len(datos['results']), catalog.AUTOCOMPLETE_LIMIT)
+        self.assertTrue(datos['more'])
@@ -8,6 +8,7 @@ from .views import (
     user_edit,
     user_toggle_active,
     user_delete,
+    role_autocomplete,
 )
 from django.contrib import admin
 from registration import views
@@ -25,6 +26,7 @@ urlpatterns = [
     path('users/<int:pk>/edit/', user_edit, name='user_edit'),
     path('users/<int:pk>/toggle/', user_toggle_active, name='user_toggle_active'),
     path('users/<int:pk>/delete/', user_delete, name='user_delete'),
+    path('users/roles/autocomplete/', role_autocomplete, name='role_autocomplete'),
 
     # Restablecer contraseña
     path(
@@ -4,12 +4,12 @@ Utilities for managing profile roles that map to organizational entities.
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import List, Optional, Tuple, Type
+from typing import Dict, Iterable, List, Optional, Tuple, Type
 
 from django.contrib.auth.models import Group
 from django.db import models, transaction
-from django.db.models import Q
 
+from core.roles import invalidate_role_context
 from orgs.models import (
     Cuadrilla,
     CuadrillaMembership,
@@ -65,27 +65,12 @@ def _default_group() -> Group:
 def build_role_choices(current_profile: Optional[Profile] = None) -> List[Tuple[str, str]]:
     """
     Return a list of role choices in the format expected by Django's ChoiceField.
-    Roles con estado inactivo quedan excluidos automáticamente.
+    Roles con estado inactivo quedan excluidos automáticamente; la lista sale
+    del catálogo cacheado de `registration.catalog`.
     """
-    choices: List[Tuple[str, str]] = []
-    for config in ROLE_CONFIG:
-        queryset = config.model.objects.all()
-
-        # Mostrar únicamente los objetos disponibles cuando hay columna profile.
-        if hasattr(config.model, "profile"):
-            queryset = queryset.filter(
-                Q(profile__isnull=True) | Q(profile=current_profile)
-            )
-
-        if hasattr(config.model, "estado"):
-            queryset = queryset.filter(estado=True)
+    from .catalog import role_choices
 
-        order_field = "nombre" if hasattr(config.model, "nombre") else "pk"
-        queryset = queryset.order_by(order_field)
-
-        for obj in queryset:
-            nombre = getattr(obj, "nombre", str(obj))
-            choices.append((f"{config.key}:{obj.pk}", f"{config.label}: {nombre}"))
+    choices, _ = role_choices(current_profile)
     return choices
 
 
@@ -93,15 +78,40 @@ def get_role_display(profile: Optional[Profile]) -> str:
     """
     Human readable representation of the current role for display purposes.
     """
-    if not profile or not profile.role_type or not profile.role_object_id:
+    if not profile:
         return "-"
+    return get_role_displays([profile])[profile.pk]
+
+
+def get_role_displays(profiles: Iterable[Profile]) -> Dict[int, str]:
+    """
+    Same labels as `get_role_display` for many profiles at once, keyed by
+    profile pk: profiles are grouped by `role_type` and each role model is
+    queried once for all its `role_object_id`s.
+    """
+    profiles = list(profiles)
+    ids_por_rol: Dict[str, set] = {}
+    for profile in profiles:
+        if profile.role_type and profile.role_object_id:
+            ids_por_rol.setdefault(profile.role_type, set()).add(profile.role_object_id)
+
+    nombres: Dict[Tuple[str, int], str] = {}
     for config in ROLE_CONFIG:
-        if config.key != profile.role_type:
+        ids = ids_por_rol.get(config.key)
+        if not ids:
             continue
-        obj = config.model.objects.filter(pk=profile.role_object_id).only("nombre").first()
-        if obj:
-            return f"{config.label}: {obj.nombre}"
-    return profile.get_role_type_display() or "-"
+        for pk, nombre in config.model.objects.filter(pk__in=ids).values_list("pk", "nombre"):
+            nombres[(config.key, pk)] = f"{config.label}: {nombre}"
+
+    labels: Dict[int, str] = {}
+    for profile in profiles:
+        if not profile.role_type or not profile.role_object_id:
+            labels[profile.pk] = "-"
+        else:
+            labels[profile.pk] = nombres.get(
+                (profile.role_type, profile.role_object_id)
+            ) or profile.get_role_type_display() or "-"
+    return labels
 
 
 def _get_role_config(role_key: str) -> RoleConfig:
@@ -115,9 +125,13 @@ def _reset_profile_role(profile: Profile) -> None:
     """
     Limpia cualquier referencia (profile FK o memberships) para permitir reasignar el rol.
     """
+    from . import catalog
+
     for config in ROLE_CONFIG:
         if hasattr(config.model, "profile"):
             config.model.objects.filter(profile=profile).update(profile=None)
+    # update() no emite post_save: el rol liberado debe volver a ofrecerse.
+    catalog.invalidate()
 
     DireccionMembership.objects.filter(usuario_id=profile).delete()
     DepartamentoMembership.objects.filter(usuario_id=profile).delete()
@@ -159,6 +173,7 @@ def assign_role_to_profile(profile: Profile, role_key: str, object_id: int) -> N
             previous_profile.group = default_group
             previous_profile.save(update_fields=["role_type", "role_object_id", "group"])
             previous_profile.user.groups.set([default_group])
+            invalidate_role_context(previous_profile.user_id)
 
         target.profile = profile
         target.save(update_fields=["profile"])
@@ -170,6 +185,7 @@ def assign_role_to_profile(profile: Profile, role_key: str, object_id: int) -> N
     profile.group = group
     profile.save(update_fields=["role_type", "role_object_id", "group"])
     profile.user.groups.set([group])
+    invalidate_role_context(profile.user_id)
 
 
 def parse_role_value(raw_value: str) -> Tuple[str, int]:
@@ -195,3 +211,4 @@ def clear_profile_role(profile: Optional[Profile]) -> None:
     profile.group = default_group
     profile.save(update_fields=['role_type', 'role_object_id', 'group'])
     profile.user.groups.set([default_group])
+    invalidate_role_context(profile.user_id)
@@ -15,9 +15,14 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django import forms
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import ensure_csrf_cookie
+from . import catalog
 from .models import Profile
-from .utils import clear_profile_role, get_role_display, has_admin_role
+from .utils import clear_profile_role, get_role_displays, has_admin_role
 from django.contrib.auth.views import LoginView
+from django.db.models import Q
+from django.http import JsonResponse
+from core.pagination import paginate_request, query_string_without_cursor
+from core.roles import get_role_context
 
 class SignUpView(CreateView):
     form_class = UserCreationFormWithEmail
@@ -89,13 +94,16 @@ from django.contrib.auth import logout
 
 
 def _admin_gate(request):
-    """Devuelve el perfil del usuario si pertenece al rol administrativo (Secpla)."""
-    profile = Profile.objects.filter(user_id=request.user.id).first()
-    if not profile:
+    """Devuelve el id del perfil del usuario, tomado de su contexto de roles."""
+    profile_id = get_role_context(request).profile_id
+    if not profile_id:
         messages.info(request, 'Hubo un error con tu perfil.')
         return None, redirect('login')
 
-    return profile, None
+    return profile_id, None
+
+
+USER_LIST_SIN_ROL = 'sin_rol'
 
 
 @login_required
@@ -104,15 +112,55 @@ def user_list(request):
     if response:
         return response
 
-    users = User.objects.select_related('profile__group').order_by('username')
-    user_entries = []
-    for user in users:
-        try:
-            profile = user.profile
-        except Profile.DoesNotExist:  # pragma: no cover - señal debería crearlo
-            profile = None
-        user_entries.append({'user': user, 'role_label': get_role_display(profile)})
-    return render(request, 'registration/user_list.html', {'users': user_entries})
+    users = User.objects.select_related('profile').order_by('username', 'id')
+
+    rol = request.GET.get('rol', '')
+    if rol == USER_LIST_SIN_ROL:
+        users = users.filter(Q(profile__role_type__isnull=True) | Q(profile__role_type=''))
+    elif rol in Profile.Role.values:
+        users = users.filter(profile__role_type=rol)
+
+    activo = request.GET.get('activo', '')
+    if activo in ('1', '0'):
+        users = users.filter(is_active=activo == '1')
+
+    users_page = paginate_request(request, users, ('username', 'id'), per_page=25)
+
+    # Una consulta por modelo de rol para toda la página, no una por usuario.
+    profiles = {user.pk: getattr(user, 'profile', None) for user in users_page}
+    role_labels = get_role_displays(profile for profile in profiles.values() if profile)
+    user_entries = [
+        {
+            'user': user,
+            'role_label': role_labels[profiles[user.pk].pk] if profiles[user.pk] else '-',
+        }
+        for user in users_page
+    ]
+    return render(request, 'registration/user_list.html', {
+        'users': user_entries,
+        'page_obj': users_page,
+        'query_string': query_string_without_cursor(request),
+        'roles': Profile.Role.choices,
+        'rol': rol,
+        'activo': activo,
+        'sin_rol': USER_LIST_SIN_ROL,
+    })
+
+
+@login_required
+def role_autocomplete(request):
+    """Opciones de rol disponibles que contienen `q`, para el campo `role`."""
+    _, response = _admin_gate(request)
+    if response:
+        return response
+
+    perfil_id = request.GET.get('perfil', '')
+    profile = Profile.objects.filter(pk=perfil_id).first() if perfil_id.isdigit() else None
+    choices, more = catalog.role_choices(profile, request.GET.get('q', ''), catalog.AUTOCOMPLETE_LIMIT)
+    return JsonResponse({
+        'results': [{'id': value, 'text': label} for value, label in choices],
+        'more': more,
+    })
 
 
 @login_required
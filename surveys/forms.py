@@ -1,4 +1,5 @@
 from django import forms
+from core import directorio
 from .models import Encuesta, Pregunta
 from django.forms.models import inlineformset_factory
 
@@ -38,6 +39,7 @@ class PreguntaForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.fields['encuesta'].queryset = Encuesta.objects.filter(estado=True)
+        directorio.usar_opciones(self.fields['encuesta'], directorio.actual().choices('encuesta'))
 
 class PreguntaFormEncuesta(forms.ModelForm):
     #Formulario para crear preguntas al crear la encuesta
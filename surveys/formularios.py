@@ -0,0 +1,121 @@
+"""
+Formularios de encuesta compilados y cacheados por proceso.
+
+`compilar(encuesta_id, base)` arma una subclase de `base` con un campo
+`pregunta_<id>` por cada pregunta activa (`fue_borrado=False`) de la
+encuesta. La clase queda en memoria junto a la versión de la encuesta en
+`core.versions`, que las señales de `surveys.signals` incrementan al
+guardar o borrar la encuesta o alguna de sus preguntas (`encuesta_editar`,
+`pregunta_editar`, admin). Mientras la versión no cambie, construir el
+formulario solo consulta esa versión: ni la encuesta ni sus preguntas.
+
+    FormularioConPreguntas = compilar(encuesta_id, SolicitudIncidenciaForm)
+    form = FormularioConPreguntas(request.POST)
+"""
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Tuple, Type
+
+from django import forms
+
+from core.versions import bump_versions, get_version
+
+from .models import Pregunta
+
+PREFIJO_CAMPO = 'pregunta_'
+PREFIJO_VERSION = 'encuesta:formulario:'
+
+
+def clave_version(encuesta_id: int) -> str:
+    return f'{PREFIJO_VERSION}{encuesta_id}'
+
+
+def nombre_campo(pregunta_id: int) -> str:
+    return f'{PREFIJO_CAMPO}{pregunta_id}'
+
+
+def campo_pregunta(nombre: str) -> forms.Field:
+    return forms.CharField(
+        label=nombre,
+        widget=forms.Textarea(attrs={
+            'class': 'form-control',
+            'rows': 2,
+            'placeholder': 'Respuesta...',
+        }),
+        required=True,
+    )
+
+
+@dataclass(frozen=True)
+class _Compilado:
+    version: int
+    preguntas: Tuple[Tuple[int, str], ...]
+    clases: Dict[type, type]
+
+
+_compilados: Dict[int, _Compilado] = {}
+_lock = threading.Lock()
+
+
+def _cargar(encuesta_id: int, version: int) -> _Compilado:
+    preguntas = tuple(
+        Pregunta.objects.filter(encuesta_id=encuesta_id, fue_borrado=False)
+        .order_by('pregunta_id')
+        .values_list('pregunta_id', 'nombre')
+    )
+    return _Compilado(version, preguntas, {})
+
+
+def _vigente(encuesta_id: int) -> _Compilado:
+    version = get_version(clave_version(encuesta_id))
+    compilado = _compilados.get(encuesta_id)
+    if compilado is not None and compilado.version == version:
+        return compilado
+    with _lock:
+        compilado = _compilados.get(encuesta_id)
+        if compilado is None or compilado.version != version:
+            compilado = _compilados[encuesta_id] = _cargar(encuesta_id, version)
+        return compilado
+
+
+def _encuesta_id(encuesta_id) -> Optional[int]:
+    try:
+        return int(encuesta_id)
+    except (TypeError, ValueError):
+        return None
+
+
+def preguntas(encuesta_id) -> Tuple[Tuple[int, str], ...]:
+    """`(pregunta_id, nombre)` de las preguntas activas de la encuesta, en orden."""
+    encuesta_id = _encuesta_id(encuesta_id)
+    return () if encuesta_id is None else _vigente(encuesta_id).preguntas
+
+
+def compilar(encuesta_id, base: Type[forms.BaseForm]) -> Type[forms.BaseForm]:
+    """
+    Subclase de `base` con los campos de las preguntas activas de la
+    encuesta; `base` tal cual si `encuesta_id` no es un id válido.
+    """
+    encuesta_id = _encuesta_id(encuesta_id)
+    if encuesta_id is None:
+        return base
+    compilado = _vigente(encuesta_id)
+    clase = compilado.clases.get(base)
+    if clase is None:
+        atributos = {
+            nombre_campo(pregunta_id): campo_pregunta(nombre)
+            for pregunta_id, nombre in compilado.preguntas
+        }
+        atributos['__module__'] = base.__module__
+        atributos['encuesta_id'] = encuesta_id
+        atributos['pregunta_ids'] = tuple(pregunta_id for pregunta_id, _ in compilado.preguntas)
+        clase = type(f'{base.__name__}Encuesta{encuesta_id}', (base,), atributos)
+        compilado.clases[base] = clase
+    return clase
+
+
+def invalidar(encuesta_ids: Iterable[Optional[int]]) -> None:
+    """Para escrituras en bloque sobre encuestas o preguntas, que no emiten señales."""
+    bump_versions([clave_version(encuesta_id) for encuesta_id in set(encuesta_ids) if encuesta_id])
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2025-11-24 20:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('surveys', '0009_pregunta_fue_borrado'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pregunta',
+            index=models.Index(condition=models.Q(('fue_borrado', False)), fields=['encuesta'], name='pregunta_activa_idx'),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.4 on 2026-10-18 20:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+TABLA = 'surveys_hojarespuestas'
+# jsonb_path_ops: índice más chico, cubre las búsquedas por contención (@>)
+# que arma surveys.respuestas.con_respuesta.
+POSTGRESQL_CREAR = (
+    f'CREATE INDEX {TABLA}_respuestas_gin ON {TABLA} USING GIN ("Respuestas" jsonb_path_ops)'
+)
+POSTGRESQL_BORRAR = f'DROP INDEX IF EXISTS {TABLA}_respuestas_gin'
+
+
+def crear_indice(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(POSTGRESQL_CREAR)
+
+
+def borrar_indice(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(POSTGRESQL_BORRAR)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('surveys', '0010_indices_acceso'),
+        ('tickets', '0021_solicitudincidencia_punto'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersionEncuesta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('numero', models.PositiveIntegerField(db_column='Numero')),
+                ('preguntas', models.JSONField(db_column='Preguntas', default=list)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, db_column='Fecha_creacion')),
+                ('encuesta', models.ForeignKey(db_column='Encuesta_id', on_delete=django.db.models.deletion.PROTECT, related_name='versiones', to='surveys.encuesta')),
+            ],
+            options={
+                'verbose_name': 'Versión de Encuesta',
+                'verbose_name_plural': 'Versiones de Encuesta',
+            },
+        ),
+        migrations.CreateModel(
+            name='HojaRespuestas',
+            fields=[
+                ('solicitud_incidencia', models.OneToOneField(db_column='Solicitud_Incidencia_ID', on_delete=django.db.models.deletion.PROTECT, primary_key=True, related_name='hoja_respuestas', serialize=False, to='tickets.solicitudincidencia')),
+                ('respuestas', models.JSONField(db_column='Respuestas', default=dict)),
+                ('version', models.ForeignKey(db_column='Version_id', on_delete=django.db.models.deletion.PROTECT, related_name='hojas', to='surveys.versionencuesta')),
+            ],
+            options={
+                'verbose_name': 'Hoja de Respuestas',
+                'verbose_name_plural': 'Hojas de Respuestas',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='versionencuesta',
+            constraint=models.UniqueConstraint(fields=('encuesta', 'numero'), name='unique_version_por_encuesta'),
+        ),
+        migrations.RunPython(crear_indice, borrar_indice),
+    ]
@@ -0,0 +1,112 @@
+# Generated by Django 5.2.4 on 2026-10-18 20:50
+
+from collections import defaultdict
+
+from django.db import migrations
+
+LOTE = 500
+
+
+def _documento(texto, valor):
+    respuesta = {'texto': texto or ''}
+    if valor is not None:
+        respuesta['valor'] = valor
+    return respuesta
+
+
+def convertir_respuestas(apps, schema_editor):
+    """
+    Pasa las filas de `Respuesta` a una `HojaRespuestas` por solicitud, de a
+    `LOTE` solicitudes. Cada conjunto distinto de preguntas respondidas de
+    una encuesta pasa a ser una versión, numerada en orden de solicitud.
+    """
+    Pregunta = apps.get_model('surveys', 'Pregunta')
+    Respuesta = apps.get_model('surveys', 'Respuesta')
+    VersionEncuesta = apps.get_model('surveys', 'VersionEncuesta')
+    HojaRespuestas = apps.get_model('surveys', 'HojaRespuestas')
+
+    nombres = dict(Pregunta.objects.values_list('pregunta_id', 'nombre'))
+    versiones = {}
+    numeros = defaultdict(int)
+    ultimo = 0
+    while True:
+        ids = list(
+            Respuesta.objects.filter(solicitud_incidencia_id__gt=ultimo)
+            .order_by('solicitud_incidencia_id')
+            .values_list('solicitud_incidencia_id', flat=True)
+            .distinct()[:LOTE]
+        )
+        if not ids:
+            return
+        ultimo = ids[-1]
+
+        filas = (
+            Respuesta.objects.filter(solicitud_incidencia_id__in=ids)
+            .order_by('solicitud_incidencia_id', 'pregunta_id')
+            .values_list('solicitud_incidencia_id', 'solicitud_incidencia__encuesta_id',
+                         'pregunta_id', 'respuesta_texto', 'valor')
+        )
+        encuestas, documentos = {}, defaultdict(dict)
+        for solicitud_id, encuesta_id, pregunta_id, texto, valor in filas:
+            encuestas[solicitud_id] = encuesta_id
+            documentos[solicitud_id][str(pregunta_id)] = _documento(texto, valor)
+
+        hojas = []
+        for solicitud_id in ids:
+            encuesta_id = encuestas[solicitud_id]
+            preguntas = tuple(int(pregunta_id) for pregunta_id in documentos[solicitud_id])
+            clave = (encuesta_id, preguntas)
+            if clave not in versiones:
+                numeros[encuesta_id] += 1
+                versiones[clave] = VersionEncuesta.objects.create(
+                    encuesta_id=encuesta_id,
+                    numero=numeros[encuesta_id],
+                    preguntas=[[pregunta_id, nombres.get(pregunta_id, '')] for pregunta_id in preguntas],
+                ).pk
+            hojas.append(HojaRespuestas(
+                solicitud_incidencia_id=solicitud_id,
+                version_id=versiones[clave],
+                respuestas=documentos[solicitud_id],
+            ))
+        HojaRespuestas.objects.bulk_create(hojas)
+        Respuesta.objects.filter(solicitud_incidencia_id__in=ids).delete()
+
+
+def restaurar_filas(apps, schema_editor):
+    Respuesta = apps.get_model('surveys', 'Respuesta')
+    VersionEncuesta = apps.get_model('surveys', 'VersionEncuesta')
+    HojaRespuestas = apps.get_model('surveys', 'HojaRespuestas')
+
+    ultimo = 0
+    while True:
+        hojas = list(
+            HojaRespuestas.objects.filter(solicitud_incidencia_id__gt=ultimo)
+            .order_by('solicitud_incidencia_id')
+            .values_list('solicitud_incidencia_id', 'respuestas')[:LOTE]
+        )
+        if not hojas:
+            break
+        ultimo = hojas[-1][0]
+        Respuesta.objects.bulk_create(
+            Respuesta(
+                solicitud_incidencia_id=solicitud_id,
+                pregunta_id=int(pregunta_id),
+                respuesta_texto=respuesta.get('texto'),
+                valor=respuesta.get('valor'),
+            )
+            for solicitud_id, respuestas in hojas
+            for pregunta_id, respuesta in respuestas.items()
+        )
+        HojaRespuestas.objects.filter(solicitud_incidencia_id__in=[fila[0] for fila in hojas]).delete()
+    VersionEncuesta.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('surveys', '0011_hojarespuestas'),
+    ]
+
+    operations = [
+        migrations.RunPython(convertir_respuestas, restaurar_filas),
+    ]
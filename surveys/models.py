@@ -39,6 +39,14 @@ class Pregunta(models.Model):
     class Meta:
         verbose_name = 'Pregunta'
         verbose_name_plural = 'Preguntas'
+        indexes = [
+            # Las preguntas siempre se leen filtrando fue_borrado=False.
+            models.Index(
+                fields=['encuesta'],
+                condition=models.Q(fue_borrado=False),
+                name='pregunta_activa_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.nombre
@@ -73,3 +81,60 @@ class Respuesta(models.Model):
     def __str__(self):
         return f"{self.solicitud_incidencia} - {self.pregunta}"
 
+
+
+class VersionEncuesta(models.Model):
+    """
+    Foto inmutable de las preguntas de una encuesta (`[[pregunta_id,
+    nombre], ...]`). Cada hoja de respuestas queda fijada a la versión con
+    que se respondió, aunque después se editen o borren preguntas.
+    """
+    encuesta = models.ForeignKey(
+        Encuesta,
+        on_delete=models.PROTECT,
+        db_column='Encuesta_id',
+        related_name='versiones'
+    )
+    numero = models.PositiveIntegerField(db_column='Numero')
+    preguntas = models.JSONField(db_column='Preguntas', default=list)
+    fecha_creacion = models.DateTimeField(auto_now_add=True, db_column='Fecha_creacion')
+
+    class Meta:
+        verbose_name = 'Versión de Encuesta'
+        verbose_name_plural = 'Versiones de Encuesta'
+        constraints = [
+            models.UniqueConstraint(fields=['encuesta', 'numero'], name='unique_version_por_encuesta'),
+        ]
+
+    def __str__(self):
+        return f"{self.encuesta_id} v{self.numero}"
+
+
+class HojaRespuestas(models.Model):
+    """
+    Todas las respuestas de una solicitud en un solo documento JSON:
+    `{"<pregunta_id>": {"texto": ..., "valor": ...}}` (`valor` solo si
+    tiene). En PostgreSQL la columna es `jsonb` con índice GIN (ver
+    `surveys.respuestas`).
+    """
+    solicitud_incidencia = models.OneToOneField(
+        'tickets.SolicitudIncidencia',
+        on_delete=models.PROTECT,
+        primary_key=True,
+        db_column='Solicitud_Incidencia_ID',
+        related_name='hoja_respuestas'
+    )
+    version = models.ForeignKey(
+        VersionEncuesta,
+        on_delete=models.PROTECT,
+        db_column='Version_id',
+        related_name='hojas'
+    )
+    respuestas = models.JSONField(db_column='Respuestas', default=dict)
+
+    class Meta:
+        verbose_name = 'Hoja de Respuestas'
+        verbose_name_plural = 'Hojas de Respuestas'
+
+    def __str__(self):
+        return f"{self.solicitud_incidencia_id} - {self.version}"
@@ -0,0 +1,210 @@
+"""
+Almacenamiento de las respuestas de encuesta de cada solicitud.
+
+Con `RESPUESTAS_ALMACENAMIENTO = 'json'` (por defecto) todas las respuestas
+de una solicitud se guardan en una sola `HojaRespuestas`: un documento
+JSON `{"<pregunta_id>": {"texto": ..., "valor": ...}}` fijado a una
+`VersionEncuesta`, la foto inmutable de las preguntas con que se
+respondió. Con `'filas'` se sigue escribiendo una fila de `Respuesta` por
+pregunta, como antes.
+
+La lectura entiende los dos formatos, así que pueden convivir (por
+ejemplo, durante la migración que pasa las filas existentes a hojas):
+
+    respuestas.de_solicitudes(ids)      # {solicitud_id: [RespuestaGuardada, ...]}
+    solicitud.respuestas_encuesta       # en plantillas: r.pregunta.nombre, r.respuesta_texto
+
+En PostgreSQL la columna es `jsonb` con un índice GIN (`jsonb_path_ops`)
+que atiende `con_respuesta`.
+"""
+from __future__ import annotations
+
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Mapping, Optional
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Func, TextField, Value
+
+from . import formularios
+from .models import HojaRespuestas, Respuesta, VersionEncuesta
+
+JSON = 'json'
+FILAS = 'filas'
+
+
+def modo() -> str:
+    return getattr(settings, 'RESPUESTAS_ALMACENAMIENTO', JSON)
+
+
+@dataclass(frozen=True, slots=True)
+class PreguntaGuardada:
+    pk: int
+    nombre: str
+
+    @property
+    def pregunta_id(self) -> int:
+        return self.pk
+
+    def __str__(self):
+        return self.nombre
+
+
+@dataclass(frozen=True, slots=True)
+class RespuestaGuardada:
+    """Con los mismos atributos que usan las plantillas de `Respuesta`."""
+
+    solicitud_incidencia_id: int
+    pregunta: PreguntaGuardada
+    respuesta_texto: Optional[str]
+    valor: Optional[int] = None
+
+    @property
+    def pregunta_id(self) -> int:
+        return self.pregunta.pk
+
+    def __str__(self):
+        return f"{self.solicitud_incidencia_id} - {self.pregunta}"
+
+
+# ---------------------------------------------------------------------------
+# Escritura
+# ---------------------------------------------------------------------------
+
+def documento(textos: Mapping[int, str], valores: Optional[Mapping[int, int]] = None) -> dict:
+    """Documento JSON de una hoja a partir de `{pregunta_id: texto}` (y `{pregunta_id: valor}`)."""
+    valores = valores or {}
+    contenido = {}
+    for pregunta_id, texto in textos.items():
+        respuesta = {'texto': texto or ''}
+        if valores.get(pregunta_id) is not None:
+            respuesta['valor'] = valores[pregunta_id]
+        contenido[str(pregunta_id)] = respuesta
+    return contenido
+
+
+def version_vigente(encuesta_id: int) -> int:
+    """
+    Id de la versión que corresponde a las preguntas activas de la encuesta
+    (las de su formulario compilado); crea una nueva si cambiaron desde la
+    última.
+    """
+    preguntas = [[pregunta_id, nombre] for pregunta_id, nombre in formularios.preguntas(encuesta_id)]
+    ultima = (
+        VersionEncuesta.objects.filter(encuesta_id=encuesta_id)
+        .order_by('-numero')
+        .values_list('pk', 'numero', 'preguntas')
+        .first()
+    )
+    if ultima is not None and ultima[2] == preguntas:
+        return ultima[0]
+    try:
+        with transaction.atomic():
+            return VersionEncuesta.objects.create(
+                encuesta_id=encuesta_id,
+                numero=ultima[1] + 1 if ultima else 1,
+                preguntas=preguntas,
+            ).pk
+    except IntegrityError:
+        # Otro proceso creó ese número de versión al mismo tiempo.
+        return version_vigente(encuesta_id)
+
+
+def guardar(solicitud, respuestas: Mapping[int, str]) -> None:
+    """
+    Guarda `{pregunta_id: texto}` de una solicitud recién creada, según
+    `modo()`. Con `bulk_create` en los dos modos: no emite señales.
+    """
+    if modo() == FILAS:
+        Respuesta.objects.bulk_create(
+            Respuesta(pregunta_id=pregunta_id, solicitud_incidencia=solicitud, respuesta_texto=texto)
+            for pregunta_id, texto in respuestas.items()
+        )
+        return
+    HojaRespuestas.objects.bulk_create([HojaRespuestas(
+        solicitud_incidencia=solicitud,
+        version_id=version_vigente(solicitud.encuesta_id),
+        respuestas=documento(respuestas),
+    )])
+
+
+# ---------------------------------------------------------------------------
+# Lectura
+# ---------------------------------------------------------------------------
+
+def _de_hoja(solicitud_id: int, preguntas: List[list], contenido: dict) -> List[RespuestaGuardada]:
+    nombres = {str(pregunta_id): nombre for pregunta_id, nombre in preguntas}
+    orden = [str(pregunta_id) for pregunta_id, _ in preguntas]
+    orden += sorted((clave for clave in contenido if clave not in nombres), key=int)
+    return [
+        RespuestaGuardada(
+            solicitud_id,
+            PreguntaGuardada(int(clave), nombres.get(clave, '')),
+            contenido[clave].get('texto'),
+            contenido[clave].get('valor'),
+        )
+        for clave in orden
+        if clave in contenido
+    ]
+
+
+def de_solicitudes(ids: Iterable[int]) -> Dict[int, List[RespuestaGuardada]]:
+    """
+    Respuestas de cada solicitud en el orden de su encuesta: una consulta
+    para las hojas, otra para sus versiones y otra, solo para las que no
+    tienen hoja, sobre las filas de `Respuesta`.
+    """
+    ids = {pk for pk in ids if pk}
+    if not ids:
+        return {}
+    hojas = list(
+        HojaRespuestas.objects.filter(solicitud_incidencia_id__in=ids)
+        .values_list('solicitud_incidencia_id', 'version_id', 'respuestas')
+    )
+    versiones = dict(
+        VersionEncuesta.objects.filter(pk__in={version_id for _, version_id, _ in hojas})
+        .values_list('pk', 'preguntas')
+    ) if hojas else {}
+    resultado = {
+        solicitud_id: _de_hoja(solicitud_id, versiones.get(version_id, []), contenido)
+        for solicitud_id, version_id, contenido in hojas
+    }
+
+    sin_hoja = ids - set(resultado)
+    if sin_hoja:
+        filas = defaultdict(list)
+        for solicitud_id, pregunta_id, nombre, texto, valor in (
+            Respuesta.objects.filter(solicitud_incidencia_id__in=sin_hoja)
+            .order_by('pregunta_id')
+            .values_list('solicitud_incidencia_id', 'pregunta_id', 'pregunta__nombre', 'respuesta_texto', 'valor')
+        ):
+            filas[solicitud_id].append(
+                RespuestaGuardada(solicitud_id, PreguntaGuardada(pregunta_id, nombre), texto, valor)
+            )
+        resultado.update(filas)
+    return resultado
+
+
+def de_solicitud(solicitud_id: int) -> List[RespuestaGuardada]:
+    return de_solicitudes([solicitud_id]).get(solicitud_id, [])
+
+
+def adjuntar(solicitudes: Iterable) -> None:
+    """Precarga `respuestas_encuesta` de una lista de solicitudes con `de_solicitudes`."""
+    solicitudes = list(solicitudes)
+    respuestas = de_solicitudes(solicitud.pk for solicitud in solicitudes)
+    for solicitud in solicitudes:
+        solicitud.__dict__['respuestas_encuesta'] = respuestas.get(solicitud.pk, [])
+
+
+def con_respuesta(pregunta_id: int, texto: str):
+    """
+    Hojas cuya respuesta a `pregunta_id` es exactamente `texto`. En
+    PostgreSQL se expresa como contención (`@>`) para usar el índice GIN.
+    """
+    if connection.vendor == 'postgresql':
+        return HojaRespuestas.objects.filter(respuestas__contains={str(pregunta_id): {'texto': texto}})
+    # `respuestas__<id>__texto` no sirve: Django toma las claves numéricas como índices de arreglo.
+    extraido = Func(F('respuestas'), Value(f'$."{int(pregunta_id)}".texto'), function='JSON_EXTRACT', output_field=TextField())
+    return HojaRespuestas.objects.alias(texto_pregunta=extraido).filter(texto_pregunta=texto)
@@ -0,0 +1,32 @@
+"""
+Señales que invalidan los formularios de encuesta compilados
+(`surveys.formularios`) cuando cambia una encuesta o alguna de sus preguntas.
+"""
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from . import formularios
+from .models import Encuesta, Pregunta
+
+
+@receiver(post_init, sender=Pregunta)
+def recordar_encuesta_original(sender, instance, **kwargs):
+    # Una pregunta puede moverse de encuesta: hay que invalidar las dos.
+    instance._encuesta_original = instance.__dict__.get('encuesta_id')
+
+
+@receiver(post_save, sender=Pregunta)
+@receiver(post_delete, sender=Pregunta)
+def invalidar_formulario_de_pregunta(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    formularios.invalidar([getattr(instance, '_encuesta_original', None), instance.encuesta_id])
+    instance._encuesta_original = instance.encuesta_id
+
+
+@receiver(post_save, sender=Encuesta)
+@receiver(post_delete, sender=Encuesta)
+def invalidar_formulario_de_encuesta(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    formularios.invalidar([instance.pk])
@@ -1,3 +1,121 @@
-from django.test import TestCase
+from django import forms
+from django.contrib.auth.models import Group
+from django.test import TestCase, override_settings
 
-# Create your tests here.
+from tickets.models import SolicitudIncidencia
+
+from . import formularios, respuestas
+from .models import Encuesta, HojaRespuestas, Pregunta, Respuesta, VersionEncuesta
+
+
+class FormularioBase(forms.Form):
+    comentario = forms.CharField(required=False)
+
+
+class FormulariosCompiladosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.encuesta = Encuesta.objects.create(titulo='Encuesta', descripcion='')
+        cls.preguntas = [
+            Pregunta.objects.create(nombre=f'Pregunta {numero}', encuesta=cls.encuesta) for numero in range(3)
+        ]
+
+    def setUp(self):
+        formularios._compilados.clear()
+
+    def test_arma_un_campo_por_pregunta_activa(self):
+        self.preguntas[1].fue_borrado = True
+        self.preguntas[1].save()
+
+        clase = formularios.compilar(self.encuesta.pk, FormularioBase)
+
+        campos = [formularios.nombre_campo(pregunta.pk) for pregunta in (self.preguntas[0], self.preguntas[2])]
+        self.assertEqual(list(clase.base_fields), ['comentario', *campos])
+        self.assertEqual(clase.pregunta_ids, (self.preguntas[0].pk, self.preguntas[2].pk))
+        form = clase({campos[0]: 'Sí'})
+        self.assertFalse(form.is_valid())
+        self.assertIn(campos[1], form.errors)
+
+    def test_reutiliza_la_clase_mientras_no_cambie_la_version(self):
+        clase = formularios.compilar(self.encuesta.pk, FormularioBase)
+
+        with self.assertNumQueries(1):
+            self.assertIs(formularios.compilar(str(self.encuesta.pk), FormularioBase), clase)
+        self.assertIs(formularios.compilar('no-es-id', FormularioBase), FormularioBase)
+
+    def test_editar_una_pregunta_recompila(self):
+        clase = formularios.compilar(self.encuesta.pk, FormularioBase)
+
+        self.preguntas[0].nombre = '¿Dónde?'
+        self.preguntas[0].save()
+
+        nueva = formularios.compilar(self.encuesta.pk, FormularioBase)
+        self.assertIsNot(nueva, clase)
+        self.assertEqual(nueva.base_fields[formularios.nombre_campo(self.preguntas[0].pk)].label, '¿Dónde?')
+
+    def test_escritura_en_bloque_requiere_invalidar(self):
+        formularios.compilar(self.encuesta.pk, FormularioBase)
+        Pregunta.objects.filter(pk=self.preguntas[0].pk).update(fue_borrado=True)
+        self.assertEqual(len(formularios.preguntas(self.encuesta.pk)), 3)
+
+        formularios.invalidar([self.encuesta.pk, None])
+
+        self.assertEqual(len(formularios.preguntas(self.encuesta.pk)), 2)
+
+
+class RespuestasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Group.objects.create(name='Usuarios')
+        cls.encuesta = Encuesta.objects.create(titulo='Encuesta', descripcion='')
+        cls.preguntas = [
+            Pregunta.objects.create(nombre=f'Pregunta {numero}', encuesta=cls.encuesta) for numero in range(2)
+        ]
+
+    def setUp(self):
+        formularios._compilados.clear()
+
+    def responder(self, *textos):
+        solicitud = SolicitudIncidencia.objects.create(encuesta=self.encuesta, vecino='Vecino', otro='')
+        respuestas.guardar(solicitud, {pregunta.pk: texto for pregunta, texto in zip(self.preguntas, textos)})
+        return solicitud
+
+    def textos(self, solicitud_id, leidas):
+        return [(r.pregunta.nombre, r.respuesta_texto) for r in leidas[solicitud_id]]
+
+    def test_una_hoja_por_solicitud_fijada_a_su_version(self):
+        primera = self.responder('Sí', 'Poste')
+        segunda = self.responder('No', 'Cable')
+        self.assertEqual(HojaRespuestas.objects.count(), 2)
+        self.assertEqual(VersionEncuesta.objects.count(), 1)
+        self.assertFalse(Respuesta.objects.exists())
+
+        self.preguntas[0].nombre = '¿Hay luz?'
+        self.preguntas[0].save()
+        tercera = self.responder('Sí', 'Foco')
+
+        self.assertEqual(VersionEncuesta.objects.count(), 2)
+        leidas = respuestas.de_solicitudes([primera.pk, segunda.pk, tercera.pk])
+        self.assertEqual(self.textos(primera.pk, leidas), [('Pregunta 0', 'Sí'), ('Pregunta 1', 'Poste')])
+        self.assertEqual(self.textos(tercera.pk, leidas), [('¿Hay luz?', 'Sí'), ('Pregunta 1', 'Foco')])
+
+    def test_lee_hojas_y_filas_juntas(self):
+        hoja = self.responder('Sí', 'Poste')
+        with override_settings(RESPUESTAS_ALMACENAMIENTO=respuestas.FILAS):
+            filas = self.responder('No', 'Cable')
+        self.assertEqual(Respuesta.objects.filter(solicitud_incidencia=filas).count(), 2)
+
+        with self.assertNumQueries(3):
+            leidas = respuestas.de_solicitudes([hoja.pk, filas.pk, None])
+
+        self.assertEqual(self.textos(hoja.pk, leidas), [('Pregunta 0', 'Sí'), ('Pregunta 1', 'Poste')])
+        self.assertEqual(self.textos(filas.pk, leidas), [('Pregunta 0', 'No'), ('Pregunta 1', 'Cable')])
+        self.assertEqual(respuestas.de_solicitudes([]), {})
+
+    def test_con_respuesta(self):
+        buscada = self.responder('Sí', 'Poste')
+        self.responder('No', 'Poste')
+
+        hojas = respuestas.con_respuesta(self.preguntas[0].pk, 'Sí')
+
+        self.assertEqual(list(hojas.values_list('solicitud_incidencia_id', flat=True)), [buscada.pk])
@@ -1,7 +1,6 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
 from django.db.models.deletion import ProtectedError
 from django.db.models import Q
 from registration.models import Profile
@@ -9,6 +8,8 @@ from registration.utils import has_admin_role
 from .models import Encuesta, Pregunta
 from .forms import EncuestaForm,PreguntaForm, PreguntaFormSet
 from core.decorators import role_required
+from core.roles import get_role_context
+from core.pagination import paginate_request, query_string_without_cursor
 from django.db import transaction
 
 @role_required("Secpla","Territoriales","Direcciones","Departamentos")
@@ -33,24 +34,20 @@ def encuesta_listar(request):
 
     encuestas = encuestas.filter(filtros)
 
-    # Paginación
-    paginator = Paginator(encuestas, 10)
-    page_number = request.GET.get('page')
-    encuestas_page = paginator.get_page(page_number)
+    # Paginación por cursor
+    encuestas_page = paginate_request(request, encuestas, ('-id',))
 
     # Verificar si no hay resultados
-    sin_resultados = not encuestas.exists()
+    sin_resultados = not encuestas_page and not encuestas_page.has_previous()
     if sin_resultados:
         messages.info(request, 'No se encontraron resultados con los filtros seleccionados.')
 
     # Mantener filtros en la URL para paginación
-    query_params = request.GET.copy()
-    if 'page' in query_params:
-        del query_params['page']
-    query_string = query_params.urlencode()
+    query_string = query_string_without_cursor(request)
 
     return render(request, 'surveys/encuesta_listar.html', {
         'encuestas': encuestas_page,
+        'page_obj': encuestas_page,
         'sin_resultados': sin_resultados,
         'query_string': query_string,  # se usa para paginación
         'request': request,  # para mantener valores en inputs
@@ -188,9 +185,7 @@ def encuesta_eliminar(request, encuesta_id):
 
 @role_required("Secpla","Cuadrillas")
 def pregunta_listar(request):
-    try:
-        profile = Profile.objects.get(user_id=request.user.id)
-    except Profile.DoesNotExist:
+    if not get_role_context(request).profile_id:
         messages.error(request, 'Hubo un error con su perfil.')
         return redirect('logout')
     
@@ -228,9 +223,7 @@ def pregunta_listar(request):
 
 @role_required("Secpla")
 def pregunta_crear(request):
-    try:
-        profile = Profile.objects.get(user_id=request.user.id)
-    except Profile.DoesNotExist:
+    if not get_role_context(request).profile_id:
         messages.error(request, 'Hubo un error con su perfil.')
         return redirect('logout')
     if request.method == 'POST':
@@ -248,9 +241,7 @@ def pregunta_crear(request):
 
 @role_required("Secpla")
 def pregunta_editar(request, pregunta_id):
-    try:
-        profile = Profile.objects.get(user_id=request.user.id)
-    except Profile.DoesNotExist:
+    if not get_role_context(request).profile_id:
         messages.error(request, 'Hubo un error con su perfil.')
         return redirect('logout')
     pregunta = get_object_or_404(Pregunta, pk=pregunta_id)
@@ -0,0 +1,257 @@
+"""
+Búsqueda de texto completo sobre solicitudes.
+
+Cada `SolicitudIncidencia` tiene un `DocumentoBusqueda` con su texto
+(título de encuesta, tipo de incidencia, descripción, ubicación, vecino y
+respuestas) ya normalizado: minúsculas y sin tildes. Las señales de
+`tickets.signals` lo regeneran cuando cambia alguna de esas fuentes.
+
+El índice depende del motor de base de datos:
+
+* PostgreSQL: columna `tsvector` generada con pesos A/B/C e índice GIN;
+  el ranking usa `ts_rank`.
+* SQLite: tabla virtual FTS5 sincronizada por triggers; el ranking usa
+  `bm25`. Pensado para desarrollo local.
+* Otro motor (o SQLite sin FTS5): `icontains` sobre el documento, sin ranking.
+
+En los dos primeros, `buscar` une las solicitudes a una tabla derivada
+`(id, rango)` con las coincidencias: el índice se consulta una sola vez
+por búsqueda, no una vez por fila candidata.
+"""
+from __future__ import annotations
+
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Iterable, List
+
+from django.db import connection
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import Col
+from django.db.models.sql.constants import INNER
+
+from surveys import respuestas as respuestas_encuesta
+
+from .models import DocumentoBusqueda, SolicitudIncidencia
+
+POSTGRESQL = 'postgresql'
+FTS5 = 'fts5'
+BASICO = 'basico'
+
+TABLA = DocumentoBusqueda._meta.db_table
+TABLA_FTS = f'{TABLA}_fts'
+CONFIGURACION_PG = 'spanish'
+# Pesos bm25 de las columnas encabezado, cuerpo y respuestas.
+PESOS_FTS5 = (10.0, 4.0, 1.0)
+MAX_TERMINOS = 10
+LOTE = 500
+
+CAMPOS_DOCUMENTO = ('encabezado', 'cuerpo', 'respuestas')
+# Campos de `SolicitudIncidencia` que alimentan su documento.
+CAMPOS_INDEXADOS = frozenset({
+    'encuesta', 'encuesta_id', 'incidencia', 'incidencia_id', 'descripcion', 'ubicacion', 'vecino',
+})
+
+
+def normalizar(texto) -> str:
+    """Minúsculas y sin diacríticos, igual para documentos y consultas."""
+    if not texto:
+        return ''
+    descompuesto = unicodedata.normalize('NFKD', str(texto))
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c)).lower()
+
+
+def terminos(consulta: str) -> List[str]:
+    return re.findall(r'\w+', normalizar(consulta))[:MAX_TERMINOS]
+
+
+def _unir(*partes) -> str:
+    return normalizar(' '.join(str(parte) for parte in partes if parte))
+
+
+# ---------------------------------------------------------------------------
+# Indexado
+# ---------------------------------------------------------------------------
+
+def documentos(ids: Iterable[int]) -> List[DocumentoBusqueda]:
+    """Construye (sin guardar) los documentos de las solicitudes `ids`."""
+    ids = list(ids)
+    respuestas = {
+        solicitud_id: [guardada.respuesta_texto for guardada in guardadas if guardada.respuesta_texto]
+        for solicitud_id, guardadas in respuestas_encuesta.de_solicitudes(ids).items()
+    }
+
+    filas = SolicitudIncidencia.objects.filter(pk__in=ids).values_list(
+        'pk', 'encuesta__titulo', 'incidencia__nombre', 'descripcion', 'ubicacion', 'vecino'
+    )
+    return [
+        DocumentoBusqueda(
+            solicitud_id=pk,
+            encabezado=_unir(titulo, incidencia),
+            cuerpo=_unir(descripcion, ubicacion, vecino),
+            respuestas=_unir(*respuestas.get(pk, ())),
+        )
+        for pk, titulo, incidencia, descripcion, ubicacion, vecino in filas
+    ]
+
+
+def indexar(ids: Iterable[int]) -> int:
+    """Crea o actualiza los documentos de `ids`. Devuelve cuántos se escribieron."""
+    ids = sorted({pk for pk in ids if pk})
+    escritos = 0
+    for inicio in range(0, len(ids), LOTE):
+        lote = documentos(ids[inicio:inicio + LOTE])
+        DocumentoBusqueda.objects.bulk_create(
+            lote,
+            update_conflicts=True,
+            unique_fields=['solicitud'],
+            update_fields=[*CAMPOS_DOCUMENTO, 'actualizado'],
+        )
+        escritos += len(lote)
+    return escritos
+
+
+def indexar_todo() -> int:
+    """Regenera los documentos de todas las solicitudes, por lotes de PK."""
+    escritos, ultimo = 0, 0
+    while True:
+        ids = list(
+            SolicitudIncidencia.objects.filter(pk__gt=ultimo)
+            .order_by('pk')
+            .values_list('pk', flat=True)[:LOTE]
+        )
+        if not ids:
+            return escritos
+        escritos += indexar(ids)
+        ultimo = ids[-1]
+
+
+# ---------------------------------------------------------------------------
+# Consultas
+# ---------------------------------------------------------------------------
+
+@lru_cache(maxsize=None)
+def _existe_tabla_fts(alias: str) -> bool:
+    return TABLA_FTS in connection.introspection.table_names()
+
+
+def motor() -> str:
+    if connection.vendor == 'postgresql':
+        return POSTGRESQL
+    if connection.vendor == 'sqlite' and _existe_tabla_fts(connection.alias):
+        return FTS5
+    return BASICO
+
+
+class _UnionCoincidencias:
+    """
+    `INNER JOIN (sql) AS alias ON alias.id = <pk de la solicitud>`, donde
+    `sql` devuelve las columnas `id` y `rango` de las coincidencias.
+
+    Cumple la interfaz que `Query.alias_map` espera de un `Join` (ver
+    `django.db.models.sql.datastructures.Join`).
+    """
+
+    table_name = 'coincidencias_busqueda'
+    filtered_relation = None
+    nullable = False
+
+    def __init__(self, sql, params, parent_alias, table_alias=None, join_type=INNER):
+        self.sql = sql
+        self.params = tuple(params)
+        self.parent_alias = parent_alias
+        self.table_alias = table_alias
+        self.join_type = join_type
+
+    def as_sql(self, compiler, connection):
+        qn = compiler.quote_name_unless_alias
+        pk = connection.ops.quote_name(SolicitudIncidencia._meta.pk.column)
+        alias = qn(self.table_alias)
+        return (
+            f'{self.join_type} ({self.sql}) {alias} ON ({alias}."id" = {qn(self.parent_alias)}.{pk})',
+            list(self.params),
+        )
+
+    def relabeled_clone(self, change_map):
+        return self.__class__(
+            self.sql, self.params,
+            change_map.get(self.parent_alias, self.parent_alias),
+            change_map.get(self.table_alias, self.table_alias),
+            self.join_type,
+        )
+
+    @property
+    def identity(self):
+        return self.__class__, self.sql, self.params, self.parent_alias
+
+    def __eq__(self, other):
+        if not isinstance(other, _UnionCoincidencias):
+            return NotImplemented
+        return self.identity == other.identity
+
+    def __hash__(self):
+        return hash(self.identity)
+
+    def demote(self):
+        return self.relabeled_clone({})
+
+    def promote(self):
+        # Las solicitudes sin coincidencia deben quedar fuera: siempre INNER.
+        return self.relabeled_clone({})
+
+
+def _columna_rango() -> FloatField:
+    # Campo no registrado en el modelo: `Col` sólo necesita `column` y una
+    # etiqueta de modelo para su identidad.
+    campo = FloatField()
+    campo.set_attributes_from_name('rango')
+    campo.model = DocumentoBusqueda
+    return campo
+
+
+def _unir_coincidencias(queryset, sql: str, params):
+    queryset = queryset.all()
+    consulta = queryset.query
+    alias = consulta.join(_UnionCoincidencias(sql, params, consulta.get_initial_alias()))
+    return queryset.annotate(rango=Col(alias, _columna_rango()))
+
+
+def buscar(queryset, consulta: str):
+    """
+    Filtra `queryset` (de `SolicitudIncidencia`) por `consulta` y anota
+    `rango` (mayor = más relevante). Cada término se busca como prefijo y
+    todos deben aparecer.
+    """
+    palabras = terminos(consulta)
+    if not palabras:
+        return queryset.annotate(rango=Value(0.0, output_field=FloatField()))
+
+    qn = connection.ops.quote_name
+    tabla, clave = qn(TABLA), qn(DocumentoBusqueda._meta.pk.column)
+    actual = motor()
+
+    if actual == POSTGRESQL:
+        tsquery = ' & '.join(f'{palabra}:*' for palabra in palabras)
+        return _unir_coincidencias(
+            queryset,
+            f'SELECT {clave} AS "id", ts_rank("Vector", consulta)::float8 AS "rango" '
+            f'FROM {tabla}, to_tsquery(%s, %s) AS consulta WHERE "Vector" @@ consulta',
+            [CONFIGURACION_PG, tsquery],
+        )
+    if actual == FTS5:
+        fts = qn(TABLA_FTS)
+        match = ' '.join(f'"{palabra}"*' for palabra in palabras)
+        pesos = ', '.join(str(peso) for peso in PESOS_FTS5)
+        return _unir_coincidencias(
+            queryset,
+            f'SELECT rowid AS "id", -bm25({fts}, {pesos}) AS "rango" FROM {fts} WHERE {fts} MATCH %s',
+            [match],
+        )
+
+    filtros = Q()
+    for palabra in palabras:
+        alguno = Q()
+        for campo in CAMPOS_DOCUMENTO:
+            alguno |= Q(**{f'documento_busqueda__{campo}__icontains': palabra})
+        filtros &= alguno
+    return queryset.filter(filtros).annotate(rango=Value(0.0, output_field=FloatField()))
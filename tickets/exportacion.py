@@ -0,0 +1,233 @@
+"""
+Exportación de solicitudes a CSV y XLSX con memoria constante.
+
+Las filas se leen con `.iterator(chunk_size=...)` (cursor del lado del
+servidor en PostgreSQL) y se escriben a medida que llegan; las respuestas
+de encuesta se cargan con una consulta por bloque y los nombres de
+encuesta, tipo, territorial y cuadrilla salen de `core.directorio` en
+lugar de joins. Ni el queryset ni el
+archivo completo se mantienen en memoria, así que los generadores sirven
+tanto para `StreamingHttpResponse` como para escribir a disco.
+"""
+from __future__ import annotations
+
+import csv
+import re
+import zipfile
+from collections import defaultdict
+from itertools import islice
+from typing import Iterable, Iterator, List
+from xml.sax.saxutils import escape
+
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from core import directorio
+from surveys import respuestas as respuestas_encuesta
+
+from .filtros import filtrar_solicitudes
+from .models import IncidenciaLog
+
+CSV = 'csv'
+XLSX = 'xlsx'
+FORMATOS = {
+    CSV: 'text/csv; charset=utf-8',
+    XLSX: 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+TAMANO_BLOQUE = 2000
+
+ENCABEZADOS = [
+    'ID', 'Fecha', 'Estado', 'Encuesta', 'Incidencia', 'Territorial', 'Cuadrilla',
+    'Ubicación', 'Vecino', 'Descripción', 'Último cambio desde', 'Último cambio hasta',
+    'Fecha último cambio', 'Respuestas',
+]
+
+CAMPOS = (
+    'pk', 'fecha', 'estado', 'encuesta_id', 'incidencia_id', 'territorial_id',
+    'cuadrilla_id', 'ubicacion', 'vecino', 'descripcion',
+    'ultimo_desde', 'ultimo_hasta', 'ultima_fecha',
+)
+# Posición en `CAMPOS` → tabla del directorio con la que se traduce el id a nombre.
+NOMBRES = {3: 'encuesta', 4: 'incidencia', 5: 'territorial', 6: 'cuadrilla'}
+
+
+def solicitudes_para_exportar(params):
+    """Queryset de `values_list` con los filtros de `solicitud_listar` y el último log."""
+    queryset, orden, _ = filtrar_solicitudes(params)
+    ultimo_log = IncidenciaLog.objects.filter(solicitud=OuterRef('pk')).order_by('-fecha', '-pk')
+    return (
+        queryset.annotate(
+            ultimo_desde=Subquery(ultimo_log.values('from_estado')[:1]),
+            ultimo_hasta=Subquery(ultimo_log.values('to_estado')[:1]),
+            ultima_fecha=Subquery(ultimo_log.values('fecha')[:1]),
+        )
+        .order_by(*orden)
+        .values_list(*CAMPOS)
+    )
+
+
+def _respuestas_de(ids: List[int]):
+    respuestas = defaultdict(list)
+    for solicitud_id, guardadas in respuestas_encuesta.de_solicitudes(ids).items():
+        for guardada in guardadas:
+            texto, valor = guardada.respuesta_texto, guardada.valor
+            respuesta = texto if texto not in (None, '') else valor
+            respuestas[solicitud_id].append(f"{guardada.pregunta}: {'' if respuesta is None else respuesta}")
+    return respuestas
+
+
+def _formatear(valor):
+    if valor is None:
+        return ''
+    if hasattr(valor, 'strftime'):
+        if timezone.is_aware(valor):
+            valor = timezone.localtime(valor)
+        return valor.strftime('%Y-%m-%d %H:%M')
+    return str(valor)
+
+
+def filas(params, tamano_bloque: int = TAMANO_BLOQUE) -> Iterator[List[str]]:
+    """Filas (sin encabezado) ya formateadas como texto."""
+    registros = directorio.actual()
+    iterador = solicitudes_para_exportar(params).iterator(chunk_size=tamano_bloque)
+    while True:
+        bloque = list(islice(iterador, tamano_bloque))
+        if not bloque:
+            return
+        respuestas = _respuestas_de([fila[0] for fila in bloque])
+        for fila in bloque:
+            fila = list(fila)
+            for posicion, tabla in NOMBRES.items():
+                fila[posicion] = registros.nombre(tabla, fila[posicion])
+            yield [_formatear(valor) for valor in fila] + ['; '.join(respuestas.get(fila[0], ()))]
+
+
+# ---------------------------------------------------------------------------
+# CSV
+# ---------------------------------------------------------------------------
+
+class _Eco:
+    """Pseudo-archivo: `write` devuelve lo escrito en vez de guardarlo."""
+
+    def write(self, valor):
+        return valor
+
+
+def generar_csv(filas_exportadas: Iterable[List[str]]) -> Iterator[str]:
+    escritor = csv.writer(_Eco())
+    # BOM para que Excel reconozca UTF-8.
+    yield '\ufeff' + escritor.writerow(ENCABEZADOS)
+    for fila in filas_exportadas:
+        yield escritor.writerow(fila)
+
+
+# ---------------------------------------------------------------------------
+# XLSX
+# ---------------------------------------------------------------------------
+
+_CONTROL = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="Solicitudes" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+_HOJA_INICIO = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+_HOJA_FIN = '</sheetData></worksheet>'
+
+
+class _Sumidero:
+    """Destino no buscable para `ZipFile`: acumula bytes hasta que se vacía."""
+
+    def __init__(self):
+        self._partes = []
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def vaciar(self) -> bytes:
+        datos = b''.join(self._partes)
+        self._partes.clear()
+        return datos
+
+
+def _fila_xml(valores: Iterable[str]) -> str:
+    celdas = ''.join(
+        f'<c t="inlineStr"><is><t xml:space="preserve">{escape(_CONTROL.sub("", valor))}</t></is></c>'
+        for valor in valores
+    )
+    return f'<row>{celdas}</row>'
+
+
+def generar_xlsx(filas_exportadas: Iterable[List[str]], filas_por_envio: int = 500) -> Iterator[bytes]:
+    """
+    Libro XLSX mínimo (una hoja, celdas de texto en línea) escrito como ZIP
+    en streaming: cada `filas_por_envio` filas se entrega lo comprimido.
+    """
+    sumidero = _Sumidero()
+    with zipfile.ZipFile(sumidero, 'w', compression=zipfile.ZIP_DEFLATED) as libro:
+        libro.writestr('[Content_Types].xml', _CONTENT_TYPES)
+        libro.writestr('_rels/.rels', _RELS)
+        libro.writestr('xl/workbook.xml', _WORKBOOK)
+        libro.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS)
+        yield sumidero.vaciar()
+
+        with libro.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as hoja:
+            hoja.write((_HOJA_INICIO + _fila_xml(ENCABEZADOS)).encode())
+            pendientes = []
+            for fila in filas_exportadas:
+                pendientes.append(_fila_xml(fila))
+                if len(pendientes) >= filas_por_envio:
+                    hoja.write(''.join(pendientes).encode())
+                    pendientes.clear()
+                    yield sumidero.vaciar()
+            hoja.write((''.join(pendientes) + _HOJA_FIN).encode())
+    yield sumidero.vaciar()
+
+
+def generar(formato: str, params, tamano_bloque: int = TAMANO_BLOQUE):
+    contenido = filas(params, tamano_bloque)
+    if formato == XLSX:
+        return generar_xlsx(contenido)
+    return generar_csv(contenido)
+
+
+def nombre_archivo(formato: str) -> str:
+    return f"solicitudes_{timezone.localtime():%Y%m%d_%H%M}.{formato}"
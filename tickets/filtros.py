@@ -0,0 +1,52 @@
+"""
+Filtros GET del listado de solicitudes, compartidos con la exportación.
+"""
+from __future__ import annotations
+
+from datetime import datetime
+from typing import List, Tuple
+
+from django.db.models import Q
+
+from core import directorio
+
+from . import busqueda
+from .models import SolicitudIncidencia
+
+PARAMETROS = ('q', 'estado', 'cuadrilla', 'fecha')
+ORDEN = ('-fecha', '-solicitud_incidencia_id')
+
+
+def filtrar_solicitudes(params, queryset=None) -> Tuple[object, Tuple[str, ...], List[str]]:
+    """
+    Aplica `q`, `estado`, `cuadrilla` y `fecha` de `params` (un `QueryDict`
+    o `dict`). Devuelve `(queryset, orden, avisos)`; `orden` antepone el
+    ranking de búsqueda cuando hay `q`.
+    """
+    if queryset is None:
+        queryset = SolicitudIncidencia.objects.all()
+    avisos = []
+
+    q = (params.get('q') or '').strip()
+    estado = (params.get('estado') or '').strip()
+    cuadrilla = (params.get('cuadrilla') or '').strip()
+    fecha = (params.get('fecha') or '').strip()
+
+    filtros = Q()
+    if estado:
+        filtros &= Q(estado__iexact=estado)
+    if cuadrilla:
+        filtros &= Q(cuadrilla_id__in=directorio.actual().buscar('cuadrilla', cuadrilla))
+    if fecha:
+        try:
+            fecha_dt = datetime.strptime(fecha, "%Y-%m-%d")
+            filtros &= Q(fecha__date=fecha_dt.date())
+        except ValueError:
+            avisos.append("Formato de fecha desde inválido. Usa YYYY-MM-DD.")
+
+    queryset = queryset.filter(filtros)
+    orden = ORDEN
+    if q:
+        queryset = busqueda.buscar(queryset, q)
+        orden = ('-rango',) + orden
+    return queryset, orden, avisos
@@ -1,7 +1,8 @@
 from django import forms 
+from core import directorio
 from .models import SolicitudIncidencia, RespuestaCuadrilla
 from orgs.models import Cuadrilla 
-from surveys.models import Pregunta  
+from surveys import formularios
 
 class SolicitudIncidenciaForm(forms.ModelForm):
     class Meta:
@@ -24,29 +25,23 @@ class SolicitudIncidenciaForm(forms.ModelForm):
             'descripcion': forms.Textarea(attrs={'class': 'form-control', 'rows': 3, 'placeholder': 'Detalle la naturaleza de la incidencia'}),
         }
         
+    # Ids de las preguntas con campo en el formulario; lo completa
+    # `para_encuesta` en la clase compilada.
+    pregunta_ids = ()
+
+    @classmethod
+    def para_encuesta(cls, encuesta_id):
+        """Clase del formulario con un campo por pregunta activa de la encuesta (ver surveys.formularios)."""
+        return formularios.compilar(encuesta_id, cls)
+
     def __init__(self, *args, **kwargs):
-        encuesta_id = kwargs.pop('encuesta_id', None)
         super().__init__(*args, **kwargs)
+        directorio.usar_opciones(self.fields['encuesta'], directorio.actual().choices('encuesta', activos=False))
 
         if not self.instance.pk:
             self.initial['estado'] = 'Pendiente'
 
 
-        if encuesta_id:
-            preguntas = Pregunta.objects.filter(encuesta_id=encuesta_id)
-            for pregunta in preguntas:
-                
-                self.fields[f'pregunta_{pregunta.pregunta_id}'] = forms.CharField(
-                    label=pregunta.nombre,
-                    widget=forms.Textarea(attrs={
-                        'class': 'form-control',
-                        'rows': 2,
-                        'placeholder': 'Respuesta...'
-                    }),
-                    required=True
-                )
-
-
 class RespuestaCuadrillaForm(forms.ModelForm):
     class Meta:
         model = RespuestaCuadrilla
@@ -0,0 +1,46 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tickets import exportacion
+
+
+class Command(BaseCommand):
+    help = (
+        "Exporta solicitudes a CSV o XLSX en streaming, con los mismos filtros "
+        "que el listado (q, estado, cuadrilla, fecha)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--formato", choices=sorted(exportacion.FORMATOS), default=exportacion.CSV)
+        parser.add_argument("--salida", help="Archivo de destino. Por defecto, la salida estándar.")
+        parser.add_argument("--q", default="")
+        parser.add_argument("--estado", default="")
+        parser.add_argument("--cuadrilla", default="")
+        parser.add_argument("--fecha", default="", help="YYYY-MM-DD")
+        parser.add_argument("--tamano-bloque", type=int, default=exportacion.TAMANO_BLOQUE)
+
+    def handle(self, *args, **options):
+        formato = options["formato"]
+        params = {campo: options[campo] for campo in ("q", "estado", "cuadrilla", "fecha")}
+        partes = exportacion.generar(formato, params, options["tamano_bloque"])
+
+        if formato == exportacion.XLSX:
+            if not options["salida"] and sys.stdout.isatty():
+                raise CommandError("XLSX es binario: usa --salida o redirige la salida estándar.")
+            destino = open(options["salida"], "wb") if options["salida"] else sys.stdout.buffer
+        else:
+            destino = (
+                open(options["salida"], "w", encoding="utf-8", newline="")
+                if options["salida"] else self.stdout
+            )
+
+        try:
+            for parte in partes:
+                destino.write(parte)
+        finally:
+            if options["salida"]:
+                destino.close()
+
+        if options["salida"]:
+            self.stderr.write(self.style.SUCCESS(f"Exportación escrita en {options['salida']}."))
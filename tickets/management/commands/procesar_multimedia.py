@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from tickets import medios, subidas
+
+
+class Command(BaseCommand):
+    help = (
+        "Worker de procesamiento de archivos subidos: genera miniaturas y "
+        "versiones web, quita metadatos y calcula hashes para deduplicar. "
+        "También descarta las subidas por fragmentos abandonadas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--una-vez",
+            action="store_true",
+            help="Procesa los trabajos pendientes y termina, en vez de quedar esperando nuevos.",
+        )
+        parser.add_argument(
+            "--intervalo",
+            type=float,
+            default=5.0,
+            help="Segundos de espera entre revisiones de la cola cuando está vacía.",
+        )
+        parser.add_argument("--limite", type=int, help="Máximo de trabajos por revisión.")
+
+    def handle(self, *args, **options):
+        while True:
+            exitosos, fallidos = medios.procesar_pendientes(options["limite"])
+            vencidas = subidas.limpiar_vencidas()
+            if vencidas:
+                self.stdout.write(f"Subidas abandonadas descartadas: {vencidas}.")
+            if exitosos or fallidos:
+                self.stdout.write(f"Trabajos procesados: {exitosos} exitosos, {fallidos} con error.")
+            if options["una_vez"]:
+                return
+            if not exitosos and not fallidos:
+                time.sleep(options["intervalo"])
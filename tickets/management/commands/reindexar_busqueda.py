@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from tickets import busqueda
+
+
+class Command(BaseCommand):
+    help = "Regenera los documentos de búsqueda de texto completo de todas las solicitudes."
+
+    def handle(self, *args, **options):
+        escritos = busqueda.indexar_todo()
+        self.stdout.write(self.style.SUCCESS(
+            f"Documentos de búsqueda regenerados: {escritos} (motor: {busqueda.motor()})."
+        ))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from tickets import planes
+
+
+class Command(BaseCommand):
+    help = (
+        "Ejecuta EXPLAIN sobre las consultas de dashboards y listados y falla si "
+        "alguna recorre completa una tabla grande en vez de usar un índice."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--analizar",
+            action="store_true",
+            help="Ejecuta ANALYZE antes, para que el planificador tenga estadísticas al día.",
+        )
+
+    def handle(self, *args, **options):
+        if not planes.SolicitudIncidencia.objects.exists():
+            raise CommandError("No hay solicitudes: siembra datos primero (p. ej. generar_municipio).")
+        if options["analizar"]:
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+
+        avisar = self.stdout.write if options["verbosity"] > 1 else (lambda mensaje: None)
+        fallas = planes.verificar(avisar)
+        total = len(planes.consultas())
+        if fallas:
+            for nombre, tablas in sorted(fallas.items()):
+                self.stdout.write(self.style.ERROR(f"  {nombre}: scan secuencial en {', '.join(tablas)}"))
+            raise CommandError(f"{len(fallas)} de {total} consultas no usan índice.")
+        self.stdout.write(self.style.SUCCESS(f"Las {total} consultas usan índices ({connection.vendor})."))
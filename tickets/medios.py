@@ -0,0 +1,303 @@
+"""
+Procesamiento en segundo plano de archivos subidos (`Multimedia` y
+`MultimediaCuadrilla`).
+
+La request solo guarda el original y encola un `TrabajoMultimedia` (ver
+`tickets.signals`). El worker (`manage.py procesar_multimedia`) toma los
+trabajos de la tabla y, por cada archivo:
+
+* calcula el SHA-256 del contenido; si otro archivo ya procesado tiene el
+  mismo hash, reutiliza sus archivos y descarta la copia nueva;
+* imágenes (requiere Pillow): aplica la orientación EXIF, reescribe el
+  original sin metadatos y genera miniatura y versión web;
+* videos (requiere `ffmpeg` en el PATH): quita los metadatos del original
+  y genera miniatura y versión web H.264.
+
+Sin Pillow o sin ffmpeg el archivo queda procesado solo con su hash, y las
+plantillas siguen mostrando el original.
+"""
+from __future__ import annotations
+
+import hashlib
+import io
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import Optional, Tuple
+
+from django.core.files.base import ContentFile, File
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import ArchivoProcesado, Multimedia, MultimediaCuadrilla, TrabajoMultimedia
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow es opcional: sin él las imágenes solo se hashean.
+    Image = ImageOps = None
+
+logger = logging.getLogger(__name__)
+
+Tipo = TrabajoMultimedia.Tipo
+Estado = TrabajoMultimedia.Estado
+Procesamiento = ArchivoProcesado.EstadoProcesamiento
+
+MODELOS = {
+    Tipo.MULTIMEDIA: Multimedia,
+    Tipo.MULTIMEDIA_CUADRILLA: MultimediaCuadrilla,
+}
+TIPOS = {modelo: tipo for tipo, modelo in MODELOS.items()}
+
+TAMANO_MINIATURA = (320, 320)
+TAMANO_WEB = (1280, 1280)
+CALIDAD_JPEG = 85
+MAX_INTENTOS = 3
+# Un trabajo "en proceso" más antiguo que esto se considera abandonado.
+TIEMPO_BLOQUEO = timedelta(minutes=10)
+# Espera antes de reintentar un trabajo que falló.
+ESPERA_REINTENTO = timedelta(minutes=1)
+TIEMPO_MAX_FFMPEG = 600
+BLOQUE_LECTURA = 1024 * 1024
+
+CAMPOS_PROCESADOS = [
+    'archivo', 'miniatura', 'version_web', 'hash_contenido', 'estado_procesamiento', 'procesado_en',
+]
+
+
+# ---------------------------------------------------------------------------
+# Cola
+# ---------------------------------------------------------------------------
+
+def encolar(objeto) -> TrabajoMultimedia:
+    return TrabajoMultimedia.objects.create(tipo=TIPOS[type(objeto)], objeto_id=objeto.pk)
+
+
+def liberar_bloqueados() -> int:
+    """Devuelve a la cola los trabajos de workers que murieron a mitad de camino."""
+    limite = timezone.now() - TIEMPO_BLOQUEO
+    return TrabajoMultimedia.objects.filter(
+        estado=Estado.EN_PROCESO, tomado_en__lt=limite
+    ).update(estado=Estado.PENDIENTE)
+
+
+def tomar_siguiente() -> Optional[TrabajoMultimedia]:
+    """
+    Reserva el trabajo pendiente más antiguo con un UPDATE condicional, de
+    modo que varios workers pueden compartir la tabla sin tomar el mismo.
+    """
+    reintentables = Q(tomado_en__isnull=True) | Q(tomado_en__lt=timezone.now() - ESPERA_REINTENTO)
+    candidatos = (
+        TrabajoMultimedia.objects.filter(reintentables, estado=Estado.PENDIENTE)
+        .order_by('trabajo_id')
+        .values_list('pk', flat=True)[:10]
+    )
+    for pk in candidatos:
+        tomados = TrabajoMultimedia.objects.filter(pk=pk, estado=Estado.PENDIENTE).update(
+            estado=Estado.EN_PROCESO,
+            tomado_en=timezone.now(),
+            intentos=F('intentos') + 1,
+        )
+        if tomados:
+            return TrabajoMultimedia.objects.get(pk=pk)
+    return None
+
+
+def ejecutar(trabajo: TrabajoMultimedia) -> bool:
+    """Procesa un trabajo ya reservado. Devuelve True si terminó bien."""
+    try:
+        procesar_objeto(trabajo.tipo, trabajo.objeto_id)
+    except Exception as error:
+        logger.exception("Error procesando %s", trabajo)
+        agotado = trabajo.intentos >= MAX_INTENTOS
+        trabajo.estado = Estado.FALLIDO if agotado else Estado.PENDIENTE
+        trabajo.error = f"{type(error).__name__}: {error}"
+        trabajo.terminado_en = timezone.now() if agotado else None
+        trabajo.save(update_fields=['estado', 'error', 'terminado_en'])
+        if agotado:
+            MODELOS[trabajo.tipo].objects.filter(pk=trabajo.objeto_id).update(
+                estado_procesamiento=Procesamiento.FALLIDO
+            )
+        return False
+
+    trabajo.estado = Estado.COMPLETADO
+    trabajo.error = ''
+    trabajo.terminado_en = timezone.now()
+    trabajo.save(update_fields=['estado', 'error', 'terminado_en'])
+    return True
+
+
+def procesar_pendientes(limite: Optional[int] = None) -> Tuple[int, int]:
+    """Atiende la cola hasta vaciarla (o hasta `limite`). Devuelve (exitosos, fallidos)."""
+    liberar_bloqueados()
+    exitosos = fallidos = 0
+    while limite is None or exitosos + fallidos < limite:
+        trabajo = tomar_siguiente()
+        if trabajo is None:
+            break
+        if ejecutar(trabajo):
+            exitosos += 1
+        else:
+            fallidos += 1
+    return exitosos, fallidos
+
+
+# ---------------------------------------------------------------------------
+# Procesamiento de un archivo
+# ---------------------------------------------------------------------------
+
+def procesar_objeto(tipo: str, objeto_id: int) -> None:
+    objeto = MODELOS[tipo].objects.filter(pk=objeto_id).first()
+    if objeto is None or not objeto.archivo:
+        return
+
+    contenido_hash = hash_archivo(objeto.archivo)
+    duplicado = buscar_duplicado(objeto, contenido_hash)
+    if duplicado is not None:
+        _reutilizar(objeto, duplicado)
+    elif objeto.tipo == 'imagen':
+        _procesar_imagen(objeto, contenido_hash)
+    elif objeto.tipo == 'video':
+        _procesar_video(objeto, contenido_hash)
+
+    objeto.hash_contenido = contenido_hash
+    objeto.estado_procesamiento = Procesamiento.PROCESADO
+    objeto.procesado_en = timezone.now()
+    objeto.save(update_fields=CAMPOS_PROCESADOS)
+
+
+def hash_archivo(archivo) -> str:
+    digest = hashlib.sha256()
+    with archivo.open('rb') as contenido:
+        for bloque in contenido.chunks(BLOQUE_LECTURA):
+            digest.update(bloque)
+    return digest.hexdigest()
+
+
+def buscar_duplicado(objeto, contenido_hash: str):
+    """Otro archivo ya procesado con el mismo contenido, en cualquiera de los dos modelos."""
+    for modelo in MODELOS.values():
+        candidatos = modelo.objects.filter(
+            hash_contenido=contenido_hash, estado_procesamiento=Procesamiento.PROCESADO
+        )
+        if modelo is type(objeto):
+            candidatos = candidatos.exclude(pk=objeto.pk)
+        for candidato in candidatos.order_by('pk')[:5]:
+            if candidato.archivo and candidato.archivo.storage.exists(candidato.archivo.name):
+                return candidato
+    return None
+
+
+def _reutilizar(objeto, duplicado) -> None:
+    repetido = objeto.archivo.name
+    objeto.archivo.name = duplicado.archivo.name
+    objeto.miniatura.name = duplicado.miniatura.name
+    objeto.version_web.name = duplicado.version_web.name
+    if repetido != duplicado.archivo.name:
+        objeto.archivo.storage.delete(repetido)
+
+
+def _reemplazar(archivo, contenido: File) -> None:
+    """Sobrescribe el contenido de `archivo` manteniendo (en lo posible) su nombre."""
+    storage, nombre = archivo.storage, archivo.name
+    storage.delete(nombre)
+    archivo.name = storage.save(nombre, contenido)
+
+
+def _guardar(campo, nombre: str, contenido: File) -> None:
+    """Guarda una versión derivada; el nombre sale del hash, así que se reutiliza si ya existe."""
+    storage = campo.storage
+    campo.name = nombre if storage.exists(nombre) else storage.save(nombre, contenido)
+
+
+# ----------------------------------------------------------------- imágenes
+
+def _codificar(imagen, formato: str) -> ContentFile:
+    salida = io.BytesIO()
+    if formato == 'JPEG':
+        if imagen.mode != 'RGB':
+            imagen = imagen.convert('RGB')
+        imagen.save(salida, 'JPEG', quality=CALIDAD_JPEG, optimize=True)
+    else:
+        imagen.save(salida, formato, optimize=True)
+    return ContentFile(salida.getvalue())
+
+
+def _reducida(imagen, tamano):
+    copia = imagen.copy()
+    copia.thumbnail(tamano)
+    return copia
+
+
+def _procesar_imagen(objeto, contenido_hash: str) -> None:
+    if Image is None:
+        return
+    with objeto.archivo.open('rb') as contenido:
+        datos = contenido.read()
+    with Image.open(io.BytesIO(datos)) as original:
+        imagen = ImageOps.exif_transpose(original)
+        imagen.load()
+
+    formato = 'PNG' if os.path.splitext(objeto.archivo.name)[1].lower() == '.png' else 'JPEG'
+    # Re-codificar sin pasar `exif` descarta EXIF/GPS del original.
+    _reemplazar(objeto.archivo, _codificar(imagen, formato))
+    _guardar(objeto.miniatura, f'miniaturas/{contenido_hash}.jpg',
+             _codificar(_reducida(imagen, TAMANO_MINIATURA), 'JPEG'))
+    _guardar(objeto.version_web, f'web/{contenido_hash}.jpg',
+             _codificar(_reducida(imagen, TAMANO_WEB), 'JPEG'))
+
+
+# ------------------------------------------------------------------- videos
+
+@contextmanager
+def _ruta_local(archivo):
+    """Ruta en disco del archivo; si el storage no la tiene, una copia temporal."""
+    try:
+        ruta = archivo.storage.path(archivo.name)
+    except NotImplementedError:
+        ruta = None
+    if ruta:
+        yield ruta
+        return
+    sufijo = os.path.splitext(archivo.name)[1]
+    with tempfile.NamedTemporaryFile(suffix=sufijo) as temporal:
+        with archivo.open('rb') as contenido:
+            for bloque in contenido.chunks(BLOQUE_LECTURA):
+                temporal.write(bloque)
+        temporal.flush()
+        yield temporal.name
+
+
+def _ffmpeg(*argumentos: str) -> None:
+    subprocess.run(
+        ['ffmpeg', '-y', '-loglevel', 'error', *argumentos],
+        check=True, capture_output=True, timeout=TIEMPO_MAX_FFMPEG,
+    )
+
+
+def _procesar_video(objeto, contenido_hash: str) -> None:
+    if shutil.which('ffmpeg') is None:
+        return
+    sufijo = os.path.splitext(objeto.archivo.name)[1].lower() or '.mp4'
+    with tempfile.TemporaryDirectory() as carpeta, _ruta_local(objeto.archivo) as entrada:
+        limpio = os.path.join(carpeta, f'limpio{sufijo}')
+        miniatura = os.path.join(carpeta, 'miniatura.jpg')
+        web = os.path.join(carpeta, 'web.mp4')
+
+        _ffmpeg('-i', entrada, '-map', '0', '-c', 'copy', '-map_metadata', '-1', limpio)
+        _ffmpeg('-i', entrada, '-vf', f"thumbnail,scale='min({TAMANO_MINIATURA[0]},iw)':-2",
+                '-frames:v', '1', miniatura)
+        _ffmpeg('-i', entrada, '-vf', f"scale='min({TAMANO_WEB[0]},iw)':-2",
+                '-c:v', 'libx264', '-preset', 'veryfast', '-crf', '28',
+                '-c:a', 'aac', '-b:a', '128k', '-map_metadata', '-1',
+                '-movflags', '+faststart', web)
+
+        with open(miniatura, 'rb') as contenido:
+            _guardar(objeto.miniatura, f'miniaturas/{contenido_hash}.jpg', File(contenido))
+        with open(web, 'rb') as contenido:
+            _guardar(objeto.version_web, f'web/{contenido_hash}.mp4', File(contenido))
+        with open(limpio, 'rb') as contenido:
+            _reemplazar(objeto.archivo, File(contenido))
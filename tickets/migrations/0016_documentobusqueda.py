@@ -0,0 +1,109 @@
+# Generated by Django 5.2.4 on 2025-11-24 10:05
+
+import django.db.models.deletion
+from django.db import OperationalError, migrations, models, transaction
+
+TABLA = 'tickets_documentobusqueda'
+TABLA_FTS = 'tickets_documentobusqueda_fts'
+
+POSTGRESQL_CREAR = [
+    f"""
+    ALTER TABLE {TABLA} ADD COLUMN "Vector" tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('spanish', coalesce("Encabezado", '')), 'A') ||
+        setweight(to_tsvector('spanish', coalesce("Cuerpo", '')), 'B') ||
+        setweight(to_tsvector('spanish', coalesce("Respuestas", '')), 'C')
+    ) STORED
+    """,
+    f'CREATE INDEX {TABLA}_vector_gin ON {TABLA} USING GIN ("Vector")',
+]
+POSTGRESQL_BORRAR = [
+    f'DROP INDEX IF EXISTS {TABLA}_vector_gin',
+    f'ALTER TABLE {TABLA} DROP COLUMN IF EXISTS "Vector"',
+]
+
+SQLITE_CREAR = [
+    f"""
+    CREATE VIRTUAL TABLE {TABLA_FTS} USING fts5(
+        "Encabezado", "Cuerpo", "Respuestas",
+        content='{TABLA}', content_rowid='Solicitud_id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER {TABLA_FTS}_ai AFTER INSERT ON {TABLA} BEGIN
+        INSERT INTO {TABLA_FTS}(rowid, "Encabezado", "Cuerpo", "Respuestas")
+        VALUES (new."Solicitud_id", new."Encabezado", new."Cuerpo", new."Respuestas");
+    END
+    """,
+    f"""
+    CREATE TRIGGER {TABLA_FTS}_ad AFTER DELETE ON {TABLA} BEGIN
+        INSERT INTO {TABLA_FTS}({TABLA_FTS}, rowid, "Encabezado", "Cuerpo", "Respuestas")
+        VALUES ('delete', old."Solicitud_id", old."Encabezado", old."Cuerpo", old."Respuestas");
+    END
+    """,
+    f"""
+    CREATE TRIGGER {TABLA_FTS}_au AFTER UPDATE ON {TABLA} BEGIN
+        INSERT INTO {TABLA_FTS}({TABLA_FTS}, rowid, "Encabezado", "Cuerpo", "Respuestas")
+        VALUES ('delete', old."Solicitud_id", old."Encabezado", old."Cuerpo", old."Respuestas");
+        INSERT INTO {TABLA_FTS}(rowid, "Encabezado", "Cuerpo", "Respuestas")
+        VALUES (new."Solicitud_id", new."Encabezado", new."Cuerpo", new."Respuestas");
+    END
+    """,
+]
+SQLITE_BORRAR = [
+    f'DROP TRIGGER IF EXISTS {TABLA_FTS}_ai',
+    f'DROP TRIGGER IF EXISTS {TABLA_FTS}_ad',
+    f'DROP TRIGGER IF EXISTS {TABLA_FTS}_au',
+    f'DROP TABLE IF EXISTS {TABLA_FTS}',
+]
+
+
+def _ejecutar(schema_editor, sentencias):
+    for sentencia in sentencias:
+        schema_editor.execute(sentencia)
+
+
+def crear_indice(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        _ejecutar(schema_editor, POSTGRESQL_CREAR)
+    elif vendor == 'sqlite':
+        # Si SQLite no trae FTS5 la búsqueda cae a icontains (ver tickets.busqueda).
+        try:
+            with transaction.atomic(using=schema_editor.connection.alias):
+                _ejecutar(schema_editor, SQLITE_CREAR)
+        except OperationalError:
+            pass
+
+
+def borrar_indice(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        _ejecutar(schema_editor, POSTGRESQL_BORRAR)
+    elif vendor == 'sqlite':
+        _ejecutar(schema_editor, SQLITE_BORRAR)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0015_merge_20251123_0030'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentoBusqueda',
+            fields=[
+                ('solicitud', models.OneToOneField(db_column='Solicitud_id', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='documento_busqueda', serialize=False, to='tickets.solicitudincidencia')),
+                ('encabezado', models.TextField(blank=True, db_column='Encabezado', default='')),
+                ('cuerpo', models.TextField(blank=True, db_column='Cuerpo', default='')),
+                ('respuestas', models.TextField(blank=True, db_column='Respuestas', default='')),
+                ('actualizado', models.DateTimeField(auto_now=True, db_column='Actualizado')),
+            ],
+            options={
+                'verbose_name': 'Documento de Búsqueda',
+                'verbose_name_plural': 'Documentos de Búsqueda',
+            },
+        ),
+        migrations.RunPython(crear_indice, borrar_indice),
+    ]
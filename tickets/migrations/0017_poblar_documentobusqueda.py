@@ -0,0 +1,70 @@
+# Generated by Django 5.2.4 on 2025-11-24 10:06
+
+import unicodedata
+from collections import defaultdict
+
+from django.db import migrations
+
+
+def _normalizar(*partes):
+    texto = ' '.join(str(parte) for parte in partes if parte)
+    descompuesto = unicodedata.normalize('NFKD', texto)
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c)).lower()
+
+
+LOTE = 500
+
+
+def poblar_documentos(apps, schema_editor):
+    SolicitudIncidencia = apps.get_model('tickets', 'SolicitudIncidencia')
+    DocumentoBusqueda = apps.get_model('tickets', 'DocumentoBusqueda')
+    Respuesta = apps.get_model('surveys', 'Respuesta')
+
+    DocumentoBusqueda.objects.all().delete()
+    filas = SolicitudIncidencia.objects.order_by('pk').values_list(
+        'pk', 'encuesta__titulo', 'incidencia__nombre', 'descripcion', 'ubicacion', 'vecino'
+    )
+    ultimo = None
+    while True:
+        lote = list((filas if ultimo is None else filas.filter(pk__gt=ultimo))[:LOTE])
+        if not lote:
+            break
+        ultimo = lote[-1][0]
+
+        respuestas = defaultdict(list)
+        filas_respuestas = (
+            Respuesta.objects.filter(solicitud_incidencia_id__in=[fila[0] for fila in lote])
+            .exclude(respuesta_texto__isnull=True)
+            .exclude(respuesta_texto='')
+            .order_by('pk')
+            .values_list('solicitud_incidencia_id', 'respuesta_texto')
+        )
+        for solicitud_id, texto in filas_respuestas.iterator(chunk_size=LOTE):
+            respuestas[solicitud_id].append(texto)
+
+        DocumentoBusqueda.objects.bulk_create(
+            DocumentoBusqueda(
+                solicitud_id=pk,
+                encabezado=_normalizar(titulo, incidencia),
+                cuerpo=_normalizar(descripcion, ubicacion, vecino),
+                respuestas=_normalizar(*respuestas[pk]),
+            )
+            for pk, titulo, incidencia, descripcion, ubicacion, vecino in lote
+        )
+
+
+def vaciar_documentos(apps, schema_editor):
+    apps.get_model('tickets', 'DocumentoBusqueda').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0016_documentobusqueda'),
+        ('surveys', '0009_pregunta_fue_borrado'),
+        ('catalogs', '0006_incidencia_estado'),
+    ]
+
+    operations = [
+        migrations.RunPython(poblar_documentos, vaciar_documentos),
+    ]
@@ -0,0 +1,100 @@
+# Generated by Django 5.2.4 on 2025-11-24 11:20
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def encolar_existentes(apps, schema_editor):
+    TrabajoMultimedia = apps.get_model('tickets', 'TrabajoMultimedia')
+    modelos = (
+        ('multimedia', apps.get_model('tickets', 'Multimedia')),
+        ('multimedia_cuadrilla', apps.get_model('tickets', 'MultimediaCuadrilla')),
+    )
+    for tipo, modelo in modelos:
+        TrabajoMultimedia.objects.bulk_create(
+            (
+                TrabajoMultimedia(tipo=tipo, objeto_id=pk)
+                for pk in modelo.objects.order_by('pk').values_list('pk', flat=True).iterator()
+            ),
+            batch_size=500,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0017_poblar_documentobusqueda'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='multimedia',
+            name='estado_procesamiento',
+            field=models.CharField(choices=[('pendiente', 'Pendiente'), ('procesado', 'Procesado'), ('fallido', 'Fallido')], default='pendiente', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='multimedia',
+            name='hash_contenido',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='multimedia',
+            name='miniatura',
+            field=models.FileField(blank=True, null=True, upload_to='miniaturas/'),
+        ),
+        migrations.AddField(
+            model_name='multimedia',
+            name='procesado_en',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='multimedia',
+            name='version_web',
+            field=models.FileField(blank=True, null=True, upload_to='web/'),
+        ),
+        migrations.AddField(
+            model_name='multimediacuadrilla',
+            name='estado_procesamiento',
+            field=models.CharField(choices=[('pendiente', 'Pendiente'), ('procesado', 'Procesado'), ('fallido', 'Fallido')], default='pendiente', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='multimediacuadrilla',
+            name='hash_contenido',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='multimediacuadrilla',
+            name='miniatura',
+            field=models.FileField(blank=True, null=True, upload_to='miniaturas/'),
+        ),
+        migrations.AddField(
+            model_name='multimediacuadrilla',
+            name='procesado_en',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='multimediacuadrilla',
+            name='version_web',
+            field=models.FileField(blank=True, null=True, upload_to='web/'),
+        ),
+        migrations.CreateModel(
+            name='TrabajoMultimedia',
+            fields=[
+                ('trabajo_id', models.BigAutoField(db_column='Trabajo_ID', primary_key=True, serialize=False)),
+                ('tipo', models.CharField(choices=[('multimedia', 'Multimedia'), ('multimedia_cuadrilla', 'Multimedia Cuadrilla')], db_column='Tipo', max_length=30)),
+                ('objeto_id', models.PositiveBigIntegerField(db_column='Objeto_id')),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('en_proceso', 'En Proceso'), ('completado', 'Completado'), ('fallido', 'Fallido')], db_column='Estado', default='pendiente', max_length=20)),
+                ('intentos', models.PositiveSmallIntegerField(db_column='Intentos', default=0)),
+                ('error', models.TextField(blank=True, db_column='Error', default='')),
+                ('creado', models.DateTimeField(db_column='Creado', default=django.utils.timezone.now)),
+                ('tomado_en', models.DateTimeField(blank=True, db_column='Tomado_en', null=True)),
+                ('terminado_en', models.DateTimeField(blank=True, db_column='Terminado_en', null=True)),
+            ],
+            options={
+                'verbose_name': 'Trabajo de Multimedia',
+                'verbose_name_plural': 'Trabajos de Multimedia',
+                'indexes': [models.Index(fields=['estado', 'trabajo_id'], name='trabajo_multimedia_cola_idx')],
+            },
+        ),
+        migrations.RunPython(encolar_existentes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.4 on 2025-11-24 12:40
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registration', '0003_profile_role_object_id_profile_role_type'),
+        ('tickets', '0018_procesamiento_multimedia'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubidaFragmentada',
+            fields=[
+                ('subida_id', models.UUIDField(db_column='Subida_ID', default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('nombre', models.CharField(db_column='Nombre', max_length=255)),
+                ('tamano_total', models.PositiveBigIntegerField(db_column='Tamano_total')),
+                ('recibido', models.PositiveBigIntegerField(db_column='Recibido', default=0)),
+                ('checksum', models.CharField(blank=True, db_column='Checksum', default='', max_length=64)),
+                ('estado', models.CharField(choices=[('en_curso', 'En Curso'), ('completa', 'Completa'), ('adjuntada', 'Adjuntada')], db_column='Estado', default='en_curso', max_length=20)),
+                ('creado', models.DateTimeField(db_column='Creado', default=django.utils.timezone.now)),
+                ('actualizado', models.DateTimeField(auto_now=True, db_column='Actualizado')),
+                ('multimedia', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='subida', to='tickets.multimediacuadrilla')),
+                ('profile', models.ForeignKey(db_column='Usuario_id', on_delete=django.db.models.deletion.CASCADE, related_name='subidas_fragmentadas', to='registration.profile')),
+                ('respuesta', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='subidas_fragmentadas', to='tickets.respuestacuadrilla')),
+                ('solicitud', models.ForeignKey(db_column='Solicitud_Incidencia_ID', on_delete=django.db.models.deletion.CASCADE, related_name='subidas_fragmentadas', to='tickets.solicitudincidencia')),
+            ],
+            options={
+                'verbose_name': 'Subida Fragmentada',
+                'verbose_name_plural': 'Subidas Fragmentadas',
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.4 on 2025-11-24 20:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogs', '0006_incidencia_estado'),
+        ('orgs', '0011_remove_cuadrilla_profile_remove_departamento_profile_and_more'),
+        ('registration', '0003_profile_role_object_id_profile_role_type'),
+        ('surveys', '0010_indices_acceso'),
+        ('tickets', '0019_subidafragmentada'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='incidencialog',
+            index=models.Index(fields=['solicitud', '-fecha'], name='incidencia_log_solicitud_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='solicitudincidencia',
+            index=models.Index(fields=['-fecha', '-solicitud_incidencia_id'], name='solicitud_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='solicitudincidencia',
+            index=models.Index(fields=['estado', '-fecha', '-solicitud_incidencia_id'], name='solicitud_estado_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='solicitudincidencia',
+            index=models.Index(fields=['cuadrilla', 'estado', '-fecha'], name='solicitud_cuadrilla_estado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='solicitudincidencia',
+            index=models.Index(fields=['territorial', 'estado', '-fecha'], name='solicitud_territorial_est_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='solicitudincidencia',
+            index=models.Index(condition=models.Q(('estado__in', ['Pendiente', 'Derivada', 'En Proceso'])), fields=['cuadrilla', '-fecha'], name='solicitud_abierta_idx'),
+        ),
+    ]
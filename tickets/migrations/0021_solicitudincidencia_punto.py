@@ -0,0 +1,20 @@
+# Generated by Django 5.2.4 on 2026-10-18 20:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0003_ubicacion_geohash'),
+        ('tickets', '0020_indices_acceso'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='solicitudincidencia',
+            name='punto',
+            field=models.ForeignKey(blank=True, db_column='Punto_id', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='solicitudes', to='locations.ubicacion'),
+        ),
+    ]
@@ -1,10 +1,15 @@
 from django.utils import timezone
-from django.db import models
+from django.utils.functional import cached_property
+from django.db import models, transaction
 from django.core.exceptions import ValidationError
 import os
+import uuid
 from registration.models import Profile
 # Create your models here.
 
+# Estados de solicitudes aún no resueltas (índice parcial `solicitud_abierta_idx`).
+ESTADOS_ABIERTOS = ['Pendiente', 'Derivada', 'En Proceso']
+
 
 class SolicitudIncidencia(models.Model):
     # PK
@@ -51,6 +56,15 @@ class SolicitudIncidencia(models.Model):
         null=True,
         blank=True
     )
+    # Punto geocodificado de `ubicacion`, si se pudo vincular (locations/espacial.py).
+    punto = models.ForeignKey(
+        'locations.Ubicacion',
+        on_delete=models.SET_NULL,
+        db_column='Punto_id',
+        related_name='solicitudes',
+        null=True,
+        blank=True
+    )
 
     # Campos simples
     Estados = [
@@ -83,9 +97,43 @@ class SolicitudIncidencia(models.Model):
     class Meta:
         verbose_name = 'Solicitud de Incidencia'
         verbose_name_plural = 'Solicitudes de Incidencia'
+        # Un índice por camino de acceso de dashboards y listados: filtro por
+        # FK/estado y orden por fecha descendente.
+        indexes = [
+            models.Index(fields=['-fecha', '-solicitud_incidencia_id'], name='solicitud_fecha_idx'),
+            models.Index(fields=['estado', '-fecha', '-solicitud_incidencia_id'], name='solicitud_estado_fecha_idx'),
+            models.Index(fields=['cuadrilla', 'estado', '-fecha'], name='solicitud_cuadrilla_estado_idx'),
+            models.Index(fields=['territorial', 'estado', '-fecha'], name='solicitud_territorial_est_idx'),
+            models.Index(
+                fields=['cuadrilla', '-fecha'],
+                condition=models.Q(estado__in=ESTADOS_ABIERTOS),
+                name='solicitud_abierta_idx',
+            ),
+        ]
 
     def __str__(self):
         return f'Solicitud #{self.pk} - {self.estado}'
+
+    # Atómicos junto con sus señales: los contadores, el mapa y el índice de
+    # búsqueda se ajustan en `post_save`/`post_delete` dentro de la misma
+    # transacción que la fila.
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
+
+    @cached_property
+    def respuestas_encuesta(self):
+        """
+        Respuestas de la encuesta, estén en una hoja JSON o en filas de
+        `Respuesta`; cada una con `pregunta.nombre`, `respuesta_texto` y
+        `valor`. Para listas, precargar con `surveys.respuestas.adjuntar`.
+        """
+        from surveys import respuestas
+        return respuestas.de_solicitud(self.pk)
     
     def registrar_log(solicitud, profile, from_estado,to_estado,fecha, comentario = None):
         nota = f"El estado cambió de {from_estado} a {to_estado}."
@@ -129,6 +177,9 @@ class IncidenciaLog(models.Model):
         verbose_name = 'Log de Incidencia'
         verbose_name_plural = 'Logs de Incidencias'
         ordering = ['-fecha']
+        indexes = [
+            models.Index(fields=['solicitud', '-fecha'], name='incidencia_log_solicitud_idx'),
+        ]
 
     def __str__(self):
         return f"{self.solicitud} | {self.estado_anterior} → {self.estado_actual} ({self.fecha:%d-%m-%Y %H:%M})"
@@ -140,7 +191,40 @@ def validar_tipo_archivo(valor):
     if ext not in valid_extensions:
         raise ValidationError("Formato de archivo que no permitido (usa jpg, png, mp4 o mov).")
 
-class Multimedia(models.Model):
+class ArchivoProcesado(models.Model):
+    """
+    Campos que completa el procesamiento en segundo plano de un archivo
+    subido (ver `tickets.medios`): hasta entonces solo existe el original.
+    """
+
+    class EstadoProcesamiento(models.TextChoices):
+        PENDIENTE = 'pendiente', 'Pendiente'
+        PROCESADO = 'procesado', 'Procesado'
+        FALLIDO = 'fallido', 'Fallido'
+
+    estado_procesamiento = models.CharField(
+        max_length=20,
+        choices=EstadoProcesamiento.choices,
+        default=EstadoProcesamiento.PENDIENTE
+    )
+    miniatura = models.FileField(upload_to='miniaturas/', null=True, blank=True)
+    version_web = models.FileField(upload_to='web/', null=True, blank=True)
+    hash_contenido = models.CharField(max_length=64, blank=True, default='', db_index=True)
+    procesado_en = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        abstract = True
+
+    @property
+    def url_miniatura(self):
+        return (self.miniatura or self.version_web or self.archivo).url
+
+    @property
+    def url_web(self):
+        return (self.version_web or self.archivo).url
+
+
+class Multimedia(ArchivoProcesado):
     # PK
     multimedia_id = models.BigAutoField(
         primary_key=True,
@@ -189,7 +273,7 @@ class RespuestaCuadrilla(models.Model):
         return f"Respuesta Cuadrilla #{self.pk} - Solicitud {self.solicitud_id}"
         
 
-class MultimediaCuadrilla(models.Model):
+class MultimediaCuadrilla(ArchivoProcesado):
 
     TIPOS = (
     ('imagen', 'Imagen'),
@@ -204,3 +288,128 @@ class MultimediaCuadrilla(models.Model):
         on_delete=models.CASCADE,
         related_name='multimedia'
         )
+
+
+class DocumentoBusqueda(models.Model):
+    """
+    Texto desnormalizado de una solicitud para la búsqueda de texto completo.
+
+    Se mantiene desde las señales de `tickets` (ver `tickets.busqueda`). En
+    PostgreSQL la tabla lleva además una columna `tsvector` generada con
+    índice GIN; en SQLite se sincroniza con una tabla virtual FTS5.
+    """
+
+    solicitud = models.OneToOneField(
+        SolicitudIncidencia,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        db_column='Solicitud_id',
+        related_name='documento_busqueda'
+    )
+    # Título de la encuesta y tipo de incidencia (mayor peso en el ranking).
+    encabezado = models.TextField(blank=True, default='', db_column='Encabezado')
+    # Descripción, ubicación y vecino.
+    cuerpo = models.TextField(blank=True, default='', db_column='Cuerpo')
+    # Respuestas de texto de la encuesta.
+    respuestas = models.TextField(blank=True, default='', db_column='Respuestas')
+    actualizado = models.DateTimeField(auto_now=True, db_column='Actualizado')
+
+    class Meta:
+        verbose_name = 'Documento de Búsqueda'
+        verbose_name_plural = 'Documentos de Búsqueda'
+
+    def __str__(self):
+        return f"Documento de búsqueda - Solicitud {self.solicitud_id}"
+
+
+class TrabajoMultimedia(models.Model):
+    """
+    Cola de procesamiento de archivos subidos, atendida por
+    `manage.py procesar_multimedia` (sin broker externo).
+    """
+
+    class Tipo(models.TextChoices):
+        MULTIMEDIA = 'multimedia', 'Multimedia'
+        MULTIMEDIA_CUADRILLA = 'multimedia_cuadrilla', 'Multimedia Cuadrilla'
+
+    class Estado(models.TextChoices):
+        PENDIENTE = 'pendiente', 'Pendiente'
+        EN_PROCESO = 'en_proceso', 'En Proceso'
+        COMPLETADO = 'completado', 'Completado'
+        FALLIDO = 'fallido', 'Fallido'
+
+    trabajo_id = models.BigAutoField(primary_key=True, db_column='Trabajo_ID')
+    tipo = models.CharField(max_length=30, choices=Tipo.choices, db_column='Tipo')
+    objeto_id = models.PositiveBigIntegerField(db_column='Objeto_id')
+    estado = models.CharField(max_length=20, choices=Estado.choices, default=Estado.PENDIENTE, db_column='Estado')
+    intentos = models.PositiveSmallIntegerField(default=0, db_column='Intentos')
+    error = models.TextField(blank=True, default='', db_column='Error')
+    creado = models.DateTimeField(default=timezone.now, db_column='Creado')
+    tomado_en = models.DateTimeField(null=True, blank=True, db_column='Tomado_en')
+    terminado_en = models.DateTimeField(null=True, blank=True, db_column='Terminado_en')
+
+    class Meta:
+        verbose_name = 'Trabajo de Multimedia'
+        verbose_name_plural = 'Trabajos de Multimedia'
+        indexes = [
+            models.Index(fields=['estado', 'trabajo_id'], name='trabajo_multimedia_cola_idx'),
+        ]
+
+    def __str__(self):
+        return f"Trabajo #{self.pk} - {self.tipo}:{self.objeto_id} ({self.estado})"
+
+
+class SubidaFragmentada(models.Model):
+    """
+    Subida reanudable por fragmentos (ver `tickets.subidas`). El archivo se
+    arma en disco fuera de MEDIA_ROOT y, al completarse y verificarse, se
+    adjunta como `MultimediaCuadrilla` a la respuesta de la cuadrilla.
+    """
+
+    class Estado(models.TextChoices):
+        EN_CURSO = 'en_curso', 'En Curso'
+        COMPLETA = 'completa', 'Completa'
+        ADJUNTADA = 'adjuntada', 'Adjuntada'
+
+    subida_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False, db_column='Subida_ID')
+    solicitud = models.ForeignKey(
+        SolicitudIncidencia,
+        on_delete=models.CASCADE,
+        db_column='Solicitud_Incidencia_ID',
+        related_name='subidas_fragmentadas'
+    )
+    respuesta = models.ForeignKey(
+        'tickets.RespuestaCuadrilla',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='subidas_fragmentadas'
+    )
+    profile = models.ForeignKey(
+        Profile,
+        on_delete=models.CASCADE,
+        db_column='Usuario_id',
+        related_name='subidas_fragmentadas'
+    )
+    nombre = models.CharField(max_length=255, db_column='Nombre')
+    tamano_total = models.PositiveBigIntegerField(db_column='Tamano_total')
+    recibido = models.PositiveBigIntegerField(default=0, db_column='Recibido')
+    # SHA-256 (hex) esperado del archivo completo; vacío si el cliente no lo envió.
+    checksum = models.CharField(max_length=64, blank=True, default='', db_column='Checksum')
+    estado = models.CharField(max_length=20, choices=Estado.choices, default=Estado.EN_CURSO, db_column='Estado')
+    multimedia = models.OneToOneField(
+        MultimediaCuadrilla,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='subida'
+    )
+    creado = models.DateTimeField(default=timezone.now, db_column='Creado')
+    actualizado = models.DateTimeField(auto_now=True, db_column='Actualizado')
+
+    class Meta:
+        verbose_name = 'Subida Fragmentada'
+        verbose_name_plural = 'Subidas Fragmentadas'
+
+    def __str__(self):
+        return f"Subida {self.pk} - {self.nombre} ({self.recibido}/{self.tamano_total})"
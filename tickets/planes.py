@@ -0,0 +1,126 @@
+"""
+Verificación de planes de consulta para los caminos de acceso de
+dashboards y listados.
+
+Cada consulta de `consultas()` replica un filtro/orden real de las vistas
+con ids tomados de la propia base. `verificar()` ejecuta EXPLAIN sobre
+cada una y reporta las que recorren completa alguna de las tablas grandes
+(`TABLAS_VIGILADAS`) en vez de usar un índice. Conviene correrlo sobre un
+dataset sembrado (`generar_municipio`) y, en PostgreSQL, tras `ANALYZE`:
+con tablas casi vacías el planificador prefiere el scan secuencial aunque
+el índice exista.
+"""
+from __future__ import annotations
+
+import re
+from typing import Callable, Dict, List, Tuple
+
+from django.db import connection
+from django.db.models import QuerySet
+
+from dashboards import mapa
+from dashboards.models import CeldaMapa
+from locations import espacial
+from locations.models import Ubicacion
+from surveys.models import HojaRespuestas, Pregunta, Respuesta
+
+from .models import ESTADOS_ABIERTOS, IncidenciaLog, SolicitudIncidencia
+
+TAMANO_PAGINA = 25
+ORDEN_LISTADO = ('-fecha', '-solicitud_incidencia_id')
+
+TABLAS_VIGILADAS = (
+    SolicitudIncidencia._meta.db_table,
+    IncidenciaLog._meta.db_table,
+    Pregunta._meta.db_table,
+    Respuesta._meta.db_table,
+    HojaRespuestas._meta.db_table,
+    Ubicacion._meta.db_table,
+    CeldaMapa._meta.db_table,
+)
+
+# PostgreSQL: "Seq Scan on tabla"; SQLite: "SCAN tabla" sin "USING ... INDEX".
+_SEQ_SCAN = {
+    'postgresql': re.compile(r'Seq Scan on "?(\w+)"?'),
+    'sqlite': re.compile(r'\bSCAN "?(\w+)"?(?!.*\bUSING\b.*\bINDEX\b)'),
+}
+
+
+def _muestras() -> Dict[str, object]:
+    """Ids representativos: los del registro más reciente con cada relación."""
+    reciente = SolicitudIncidencia.objects.order_by('-fecha')
+    con_cuadrilla = (
+        reciente.filter(cuadrilla__isnull=False)
+        .values('pk', 'cuadrilla_id', 'cuadrilla__departamento_id', 'cuadrilla__departamento__direccion_id')
+        .first()
+    ) or {}
+    con_territorial = reciente.filter(territorial__isnull=False).values('territorial_id').first() or {}
+    encuesta_id = Pregunta.objects.order_by('-pk').values_list('encuesta_id', flat=True).first()
+    punto = Ubicacion.objects.exclude(geohash='').order_by('-pk').values_list('latitud', 'longitud').first()
+    return {
+        'solicitud': con_cuadrilla.get('pk') or reciente.values_list('pk', flat=True).first(),
+        'cuadrilla': con_cuadrilla.get('cuadrilla_id'),
+        'departamento': con_cuadrilla.get('cuadrilla__departamento_id'),
+        'direccion': con_cuadrilla.get('cuadrilla__departamento__direccion_id'),
+        'territorial': con_territorial.get('territorial_id'),
+        'encuesta': encuesta_id,
+        'punto': punto or (0.0, 0.0),
+    }
+
+
+def consultas() -> List[Tuple[str, QuerySet]]:
+    m = _muestras()
+    solicitudes = SolicitudIncidencia.objects.all()
+    pagina = slice(0, TAMANO_PAGINA)
+    return [
+        ('listado', solicitudes.order_by(*ORDEN_LISTADO)[pagina]),
+        ('listado_por_estado', solicitudes.filter(estado='Finalizada').order_by(*ORDEN_LISTADO)[pagina]),
+        ('dashboard_direccion', solicitudes.filter(
+            cuadrilla__departamento__direccion_id=m['direccion']).order_by('-fecha')[pagina]),
+        ('dashboard_departamento_pendientes', solicitudes.filter(
+            cuadrilla__isnull=True).exclude(estado='Rechazada').order_by('-fecha')[pagina]),
+        ('dashboard_departamento_abiertas', solicitudes.filter(
+            cuadrilla__departamento_id=m['departamento'], estado__in=ESTADOS_ABIERTOS).order_by('-fecha')[pagina]),
+        ('dashboard_departamento_completadas', solicitudes.filter(
+            cuadrilla__departamento_id=m['departamento'], estado__in=['Finalizada', 'Aprobada']
+        ).order_by('-fecha')[pagina]),
+        ('dashboard_cuadrilla', solicitudes.filter(cuadrilla_id=m['cuadrilla']).order_by('-fecha')[pagina]),
+        ('dashboard_cuadrilla_por_estado', solicitudes.filter(
+            cuadrilla_id=m['cuadrilla'], estado='En Proceso').order_by('-fecha')[pagina]),
+        ('dashboard_territorial', solicitudes.filter(territorial_id=m['territorial']).order_by('-fecha')[pagina]),
+        ('dashboard_territorial_por_estado', solicitudes.filter(
+            territorial_id=m['territorial'], estado='Derivada').order_by('-fecha')[pagina]),
+        ('historial_solicitud', IncidenciaLog.objects.filter(solicitud_id=m['solicitud']).order_by('-fecha')),
+        ('respuestas_solicitud', Respuesta.objects.filter(solicitud_incidencia_id=m['solicitud'])),
+        ('hoja_respuestas_solicitud', HojaRespuestas.objects.filter(solicitud_incidencia_id=m['solicitud'])),
+        ('preguntas_activas', Pregunta.objects.filter(encuesta_id=m['encuesta'], fue_borrado=False)),
+        ('ubicaciones_en_radio', espacial.en_caja(
+            Ubicacion.objects.all(), espacial.caja_de_radio(*m['punto'], 300))),
+        ('celdas_mapa_tesela', mapa.celdas_en(espacial.caja_de_radio(*m['punto'], 2000), 6)),
+    ]
+
+
+def escaneos_secuenciales(plan: str, vendor: str = '') -> List[str]:
+    patron = _SEQ_SCAN.get(vendor or connection.vendor)
+    if patron is None:
+        return []
+    tablas = set()
+    for linea in plan.splitlines():
+        for tabla in patron.findall(linea):
+            if tabla in TABLAS_VIGILADAS:
+                tablas.add(tabla)
+    return sorted(tablas)
+
+
+def verificar(avisar: Callable[[str], None] = lambda mensaje: None) -> Dict[str, List[str]]:
+    """EXPLAIN de cada consulta; devuelve `{nombre: [tablas con scan secuencial]}` de las que fallan."""
+    fallas = {}
+    for nombre, queryset in consultas():
+        plan = queryset.explain()
+        tablas = escaneos_secuenciales(plan)
+        if tablas:
+            fallas[nombre] = tablas
+        avisar(f"{'FALLA' if tablas else 'ok':<6} {nombre}" + (f"  ({', '.join(tablas)})" if tablas else ''))
+        for linea in plan.splitlines():
+            avisar(f"         {linea}")
+    return fallas
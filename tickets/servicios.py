@@ -0,0 +1,81 @@
+"""
+Operaciones de escritura sobre solicitudes que involucran varias tablas.
+"""
+from __future__ import annotations
+
+from typing import Dict, Mapping, Optional
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils.timezone import now
+
+from locations import geocodificar
+from orgs.models import Territorial
+from surveys import formularios, respuestas as respuestas_encuesta
+
+from . import busqueda
+from .models import SolicitudIncidencia
+
+PREFIJO_PREGUNTA = formularios.PREFIJO_CAMPO
+
+
+def respuestas_enviadas(datos: Mapping[str, str]) -> Dict[int, str]:
+    """Extrae `{pregunta_id: texto}` de las claves `pregunta_<id>` de un POST."""
+    respuestas = {}
+    for clave, valor in datos.items():
+        if not clave.startswith(PREFIJO_PREGUNTA):
+            continue
+        try:
+            pregunta_id = int(clave[len(PREFIJO_PREGUNTA):])
+        except ValueError:
+            raise ValidationError(f"Pregunta inválida: {clave}.")
+        respuestas[pregunta_id] = (valor or '').strip()
+    return respuestas
+
+
+def validar_respuestas(encuesta_id, respuestas: Mapping[int, str]) -> None:
+    """
+    Comprueba que las respuestas correspondan a las preguntas activas de la
+    encuesta (las de su formulario compilado) y que ninguna quede sin responder.
+    """
+    activas = {pregunta_id for pregunta_id, _ in formularios.preguntas(encuesta_id)}
+    ajenas = set(respuestas) - activas
+    if ajenas:
+        raise ValidationError("Hay respuestas para preguntas que no pertenecen a la encuesta.")
+    faltantes = activas - {pregunta_id for pregunta_id, texto in respuestas.items() if texto}
+    if faltantes:
+        raise ValidationError("Debes responder todas las preguntas de la encuesta.")
+
+
+@transaction.atomic
+def crear_solicitud(form, profile, datos: Mapping[str, str], comentario: Optional[str] = None) -> SolicitudIncidencia:
+    """
+    Guarda la solicitud de `form` (ya validado), sus respuestas y, si quedó
+    derivada, su primer `IncidenciaLog`, todo en una transacción. Lanza
+    `ValidationError` sin escribir nada si las respuestas no son válidas.
+    """
+    solicitud = form.save(commit=False)
+    respuestas = respuestas_enviadas(datos)
+    validar_respuestas(solicitud.encuesta_id, respuestas)
+
+    solicitud.territorial = Territorial.objects.filter(profile=profile).first()
+    solicitud.punto = geocodificar.buscar(solicitud.ubicacion)
+
+    estado_anterior = solicitud.estado
+    if solicitud.cuadrilla_id:
+        solicitud.estado = 'Derivada'
+    solicitud.save()
+
+    respuestas_encuesta.guardar(solicitud, respuestas)
+    # Las respuestas se guardan sin señales: el documento de búsqueda se regenera aquí.
+    busqueda.indexar([solicitud.pk])
+
+    if solicitud.estado != estado_anterior:
+        solicitud.registrar_log(
+            profile=profile,
+            from_estado=estado_anterior,
+            to_estado=solicitud.estado,
+            fecha=now(),
+            comentario=comentario
+        )
+    return solicitud
@@ -0,0 +1,65 @@
+"""
+Señales que mantienen `DocumentoBusqueda` al día (ver `tickets.busqueda`)
+y encolan el procesamiento de archivos subidos (ver `tickets.medios`).
+"""
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from catalogs.models import Incidencia
+from surveys.models import Encuesta, HojaRespuestas, Respuesta
+
+from . import busqueda, medios
+from .models import Multimedia, MultimediaCuadrilla, SolicitudIncidencia
+
+
+@receiver(post_save, sender=SolicitudIncidencia)
+def indexar_solicitud(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and not busqueda.CAMPOS_INDEXADOS.intersection(update_fields):
+        return
+    busqueda.indexar([instance.pk])
+
+
+@receiver(post_save, sender=Respuesta)
+@receiver(post_delete, sender=Respuesta)
+@receiver(post_save, sender=HojaRespuestas)
+@receiver(post_delete, sender=HojaRespuestas)
+def indexar_respuesta(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    busqueda.indexar([instance.solicitud_incidencia_id])
+
+
+@receiver(post_init, sender=Encuesta)
+def recordar_titulo(sender, instance, **kwargs):
+    instance._titulo_indexado = instance.__dict__.get('titulo')
+
+
+@receiver(post_save, sender=Encuesta)
+def reindexar_encuesta(sender, instance, created, raw=False, **kwargs):
+    if raw or created or instance.titulo == instance._titulo_indexado:
+        return
+    busqueda.indexar(instance.solicitudes_incidencia.values_list('pk', flat=True))
+    instance._titulo_indexado = instance.titulo
+
+
+@receiver(post_init, sender=Incidencia)
+def recordar_nombre(sender, instance, **kwargs):
+    instance._nombre_indexado = instance.__dict__.get('nombre')
+
+
+@receiver(post_save, sender=Incidencia)
+def reindexar_incidencia(sender, instance, created, raw=False, **kwargs):
+    if raw or created or instance.nombre == instance._nombre_indexado:
+        return
+    busqueda.indexar(instance.solicitudes.values_list('pk', flat=True))
+    instance._nombre_indexado = instance.nombre
+
+
+@receiver(post_save, sender=Multimedia)
+@receiver(post_save, sender=MultimediaCuadrilla)
+def encolar_procesamiento(sender, instance, created, raw=False, **kwargs):
+    if raw or not created:
+        return
+    medios.encolar(instance)
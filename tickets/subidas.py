@@ -0,0 +1,234 @@
+"""
+Subidas reanudables por fragmentos (al estilo tus) para evidencias de
+cuadrilla.
+
+1. `crear` registra la subida con nombre, tamaño total y, opcionalmente,
+   el SHA-256 esperado; se validan extensión y tamaño desde el inicio.
+2. `agregar_fragmento` escribe cada fragmento directo al archivo parcial,
+   solo si su offset coincide con lo ya recibido (si no, el cliente
+   consulta el offset y reanuda desde ahí). Cada fragmento puede traer su
+   propio checksum.
+3. Al recibir el último byte se verifica el SHA-256 completo; si la subida
+   ya tiene respuesta se adjunta como `MultimediaCuadrilla`, si no queda
+   completa hasta que `responder_incidencia` la adjunte.
+"""
+from __future__ import annotations
+
+import base64
+import binascii
+import hashlib
+import os
+import re
+from datetime import timedelta
+from pathlib import Path
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from .models import MultimediaCuadrilla, SubidaFragmentada, validar_tipo_archivo
+
+Estado = SubidaFragmentada.Estado
+
+TAMANO_MAXIMO = 1024 * 1024 * 1024
+TAMANO_MAXIMO_FRAGMENTO = 16 * 1024 * 1024
+BLOQUE = 64 * 1024
+# Subidas sin actividad por más de esto se descartan (ver `limpiar_vencidas`).
+VIGENCIA = timedelta(days=2)
+EXTENSIONES_VIDEO = ('.mp4', '.mov')
+STATUS_CHECKSUM_INVALIDO = 460
+
+
+class ErrorSubida(Exception):
+    def __init__(self, mensaje: str, status: int = 400):
+        super().__init__(mensaje)
+        self.mensaje = mensaje
+        self.status = status
+
+
+def carpeta() -> Path:
+    return Path(getattr(settings, 'SUBIDAS_PARCIALES_ROOT', Path(settings.MEDIA_ROOT).parent / 'subidas_parciales'))
+
+
+def ruta(subida: SubidaFragmentada) -> Path:
+    return carpeta() / f'{subida.pk}.part'
+
+
+def tipo_de(nombre: str) -> str:
+    return 'video' if os.path.splitext(nombre)[1].lower() in EXTENSIONES_VIDEO else 'imagen'
+
+
+def leer_checksum(valor: Optional[str]) -> Optional[bytes]:
+    """Interpreta un encabezado `Upload-Checksum: sha256 <base64>`."""
+    if not valor:
+        return None
+    algoritmo, _, codificado = valor.strip().partition(' ')
+    if algoritmo.lower() != 'sha256':
+        raise ErrorSubida("Solo se acepta checksum sha256.")
+    try:
+        return base64.b64decode(codificado, validate=True)
+    except (binascii.Error, ValueError):
+        raise ErrorSubida("Checksum mal formado.")
+
+
+def crear(solicitud, profile_id: int, nombre: str, tamano_total: int,
+          checksum: str = '', respuesta=None) -> SubidaFragmentada:
+    nombre = os.path.basename(nombre or '').strip()
+    if not nombre:
+        raise ErrorSubida("Falta el nombre del archivo.")
+    try:
+        # Mismo validador que el FileField de MultimediaCuadrilla.
+        validar_tipo_archivo(File(None, name=nombre))
+    except ValidationError as error:
+        raise ErrorSubida(error.messages[0])
+    if tamano_total <= 0 or tamano_total > TAMANO_MAXIMO:
+        raise ErrorSubida("Tamaño de archivo no permitido.", status=413)
+    checksum = (checksum or '').strip().lower()
+    if checksum and not re.fullmatch(r'[0-9a-f]{64}', checksum):
+        raise ErrorSubida("El checksum debe ser un SHA-256 en hexadecimal.")
+
+    subida = SubidaFragmentada.objects.create(
+        solicitud=solicitud,
+        respuesta=respuesta,
+        profile_id=profile_id,
+        nombre=nombre,
+        tamano_total=tamano_total,
+        checksum=checksum,
+    )
+    carpeta().mkdir(parents=True, exist_ok=True)
+    ruta(subida).touch()
+    return subida
+
+
+def _hash_de(camino: Path) -> str:
+    digest = hashlib.sha256()
+    with open(camino, 'rb') as contenido:
+        for bloque in iter(lambda: contenido.read(BLOQUE), b''):
+            digest.update(bloque)
+    return digest.hexdigest()
+
+
+def agregar_fragmento(subida_id, profile_id: int, offset: int, flujo, longitud: int,
+                      checksum_fragmento: Optional[bytes] = None) -> SubidaFragmentada:
+    """
+    Escribe `longitud` bytes de `flujo` en `offset`. La fila queda bloqueada
+    mientras se escribe, así que dos fragmentos del mismo offset no se pisan.
+    """
+    if longitud <= 0 or longitud > TAMANO_MAXIMO_FRAGMENTO:
+        raise ErrorSubida("Tamaño de fragmento no permitido.", status=413)
+
+    checksum_invalido = False
+    with transaction.atomic():
+        subida = SubidaFragmentada.objects.select_for_update().filter(
+            pk=subida_id, profile_id=profile_id
+        ).first()
+        if subida is None:
+            raise ErrorSubida("Subida no encontrada.", status=404)
+        if subida.estado != Estado.EN_CURSO:
+            raise ErrorSubida("La subida ya está completa.", status=409)
+        if offset != subida.recibido:
+            raise ErrorSubida("El offset no coincide con lo recibido.", status=409)
+        if offset + longitud > subida.tamano_total:
+            raise ErrorSubida("El fragmento excede el tamaño declarado.", status=413)
+
+        camino = ruta(subida)
+        digest = hashlib.sha256()
+        restante = longitud
+        with open(camino, 'r+b') as destino:
+            destino.seek(offset)
+            destino.truncate()
+            while restante:
+                bloque = flujo.read(min(BLOQUE, restante))
+                if not bloque:
+                    break
+                destino.write(bloque)
+                digest.update(bloque)
+                restante -= len(bloque)
+            if checksum_fragmento is not None and (restante or digest.digest() != checksum_fragmento):
+                destino.seek(offset)
+                destino.truncate()
+                raise ErrorSubida("El checksum del fragmento no coincide.", status=STATUS_CHECKSUM_INVALIDO)
+
+        # Si la conexión se cortó a mitad de fragmento, lo escrito igual cuenta.
+        subida.recibido = offset + longitud - restante
+        if subida.recibido == subida.tamano_total:
+            if subida.checksum and _hash_de(camino) != subida.checksum:
+                # Se descarta todo: el cliente debe subir el archivo de nuevo.
+                camino.write_bytes(b'')
+                subida.recibido = 0
+                checksum_invalido = True
+            else:
+                subida.estado = Estado.COMPLETA
+        subida.save(update_fields=['recibido', 'estado', 'actualizado'])
+
+        if subida.estado == Estado.COMPLETA and subida.respuesta_id:
+            adjuntar(subida, subida.respuesta)
+
+    if checksum_invalido:
+        raise ErrorSubida("El checksum del archivo no coincide; vuelve a subirlo.", status=STATUS_CHECKSUM_INVALIDO)
+    return subida
+
+
+def adjuntar(subida: SubidaFragmentada, respuesta) -> MultimediaCuadrilla:
+    """Crea la `MultimediaCuadrilla` con el archivo completo y descarta el parcial."""
+    camino = ruta(subida)
+    with open(camino, 'rb') as contenido:
+        multimedia = MultimediaCuadrilla.objects.create(
+            respuesta=respuesta,
+            archivo=File(contenido, name=subida.nombre),
+            tipo=tipo_de(subida.nombre),
+        )
+    subida.respuesta = respuesta
+    subida.multimedia = multimedia
+    subida.estado = Estado.ADJUNTADA
+    subida.save(update_fields=['respuesta', 'multimedia', 'estado', 'actualizado'])
+    transaction.on_commit(lambda: camino.unlink(missing_ok=True))
+    return multimedia
+
+
+def adjuntar_completas(respuesta, ids: Iterable[str], profile_id: int) -> int:
+    """Adjunta a `respuesta` las subidas completas `ids` del usuario para esa solicitud."""
+    ids = [valor for valor in ids if valor]
+    if not ids:
+        return 0
+    try:
+        subidas = list(
+            SubidaFragmentada.objects.filter(
+                pk__in=ids,
+                profile_id=profile_id,
+                solicitud_id=respuesta.solicitud_id,
+                estado=Estado.COMPLETA,
+            )
+        )
+    except ValidationError:
+        raise ErrorSubida("Identificador de subida inválido.")
+    for subida in subidas:
+        adjuntar(subida, respuesta)
+    return len(subidas)
+
+
+def cancelar(subida_id, profile_id: int) -> bool:
+    subida = SubidaFragmentada.objects.filter(
+        pk=subida_id, profile_id=profile_id
+    ).exclude(estado=Estado.ADJUNTADA).first()
+    if subida is None:
+        return False
+    ruta(subida).unlink(missing_ok=True)
+    subida.delete()
+    return True
+
+
+def limpiar_vencidas() -> int:
+    """Borra subidas no adjuntadas sin actividad reciente y sus archivos parciales."""
+    vencidas = SubidaFragmentada.objects.exclude(estado=Estado.ADJUNTADA).filter(
+        actualizado__lt=timezone.now() - VIGENCIA
+    )
+    borradas = 0
+    for subida in vencidas.iterator():
+        ruta(subida).unlink(missing_ok=True)
+        subida.delete()
+        borradas += 1
+    return borradas
@@ -1,3 +1,518 @@
-from django.test import TestCase
+import csv
+import hashlib
+import io
+import shutil
+import tempfile
+import zipfile
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core import directorio, synthetic
+from core.instrumentation import QueryBudgetTestMixin
+from orgs.models import Cuadrilla, Departamento, Direccion, Territorial
+from surveys import formularios, respuestas as respuestas_encuesta
+from surveys.models import Encuesta, HojaRespuestas, Pregunta
+
+from . import busqueda, exportacion, medios, planes, subidas, transiciones
+from .forms import SolicitudIncidenciaForm
+from .models import (
+    DocumentoBusqueda, IncidenciaLog, Multimedia, MultimediaCuadrilla, RespuestaCuadrilla,
+    SolicitudIncidencia, SubidaFragmentada, TrabajoMultimedia,
+)
+from .servicios import crear_solicitud
+
+
+class TransicionesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Group.objects.create(name='Usuarios')
+        cls.profile = User.objects.create_user('encargado').profile
+        cls.encuesta = Encuesta.objects.create(titulo='Encuesta', descripcion='')
+        departamento = Departamento.objects.create(
+            nombre='Vialidad', direccion=Direccion.objects.create(nombre='Obras'),
+        )
+        cls.cuadrilla = Cuadrilla.objects.create(nombre='Cuadrilla 1', departamento=departamento)
+
+    def setUp(self):
+        self.solicitud = SolicitudIncidencia.objects.create(encuesta=self.encuesta, vecino='Vecino', otro='')
+
+    def test_aplica_transicion_y_registra_log(self):
+        transiciones.transicionar(
+            self.solicitud, transiciones.DERIVADA, self.profile,
+            comentario='Tomada', campos={'cuadrilla': self.cuadrilla},
+        )
+
+        self.solicitud.refresh_from_db()
+        self.assertEqual(self.solicitud.estado, transiciones.DERIVADA)
+        self.assertEqual(self.solicitud.cuadrilla_id, self.cuadrilla.pk)
+        log = IncidenciaLog.objects.get(solicitud=self.solicitud)
+        self.assertEqual((log.from_estado, log.to_estado), (transiciones.PENDIENTE, transiciones.DERIVADA))
+        self.assertIn('Tomada', log.nota)
+
+    def test_rechaza_transicion_no_declarada(self):
+        with self.assertRaises(transiciones.TransicionInvalida):
+            transiciones.transicionar(self.solicitud, transiciones.APROBADA, self.profile)
+        self.assertFalse(IncidenciaLog.objects.exists())
+
+    def test_compare_and_swap_rechaza_estado_desactualizado(self):
+        desactualizada = SolicitudIncidencia.objects.get(pk=self.solicitud.pk)
+        transiciones.transicionar(self.solicitud, transiciones.DERIVADA, self.profile)
+
+        with self.assertRaises(transiciones.ConflictoTransicion) as error:
+            transiciones.transicionar(desactualizada, transiciones.EN_PROCESO, self.profile)
+
+        self.assertEqual(error.exception.actual, transiciones.DERIVADA)
+        self.assertEqual(
+            SolicitudIncidencia.objects.values_list('estado', flat=True).get(pk=self.solicitud.pk),
+            transiciones.DERIVADA,
+        )
+        self.assertEqual(IncidenciaLog.objects.filter(solicitud=self.solicitud).count(), 1)
+
+    def test_condiciones_se_agregan_al_compare_and_swap(self):
+        SolicitudIncidencia.objects.filter(pk=self.solicitud.pk).update(cuadrilla=self.cuadrilla)
+
+        with self.assertRaises(transiciones.ConflictoTransicion):
+            transiciones.transicionar(
+                self.solicitud, transiciones.DERIVADA, self.profile,
+                campos={'cuadrilla': self.cuadrilla}, condiciones={'cuadrilla__isnull': True},
+            )
+
+    def test_envia_transicion_aplicada_con_la_fila_antes_y_despues(self):
+        recibidas = []
+
+        def recibir(sender, solicitud, anterior, actual, **kwargs):
+            recibidas.append((anterior, actual))
+
+        transiciones.transicion_aplicada.connect(recibir, sender=SolicitudIncidencia)
+        self.addCleanup(transiciones.transicion_aplicada.disconnect, recibir, sender=SolicitudIncidencia)
+
+        transiciones.transicionar(
+            self.solicitud, transiciones.DERIVADA, self.profile, campos={'cuadrilla': self.cuadrilla},
+        )
+
+        [(anterior, actual)] = recibidas
+        self.assertEqual((anterior['estado'], anterior['cuadrilla_id']), (transiciones.PENDIENTE, None))
+        self.assertEqual((actual['estado'], actual['cuadrilla_id']), (transiciones.DERIVADA, self.cuadrilla.pk))
+
+
+class BusquedaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Group.objects.create(name='Usuarios')
+        encuesta = Encuesta.objects.create(titulo='Luminarias', descripcion='')
+        otra = Encuesta.objects.create(titulo='Veredas', descripcion='')
+        cls.en_titulo = SolicitudIncidencia.objects.create(encuesta=encuesta, vecino='Ana', otro='')
+        cls.en_descripcion = SolicitudIncidencia.objects.create(
+            encuesta=otra, vecino='Luis', descripcion='Luminaria apagada frente al colegio', otro='',
+        )
+        cls.sin_coincidencia = SolicitudIncidencia.objects.create(
+            encuesta=otra, vecino='Marta', descripcion='Bache', otro='',
+        )
+
+    def test_filtra_y_ordena_por_rango(self):
+        resultado = busqueda.buscar(SolicitudIncidencia.objects.all(), 'LUMINARIA').order_by('-rango')
+
+        self.assertEqual(list(resultado), [self.en_titulo, self.en_descripcion])
+        self.assertGreater(resultado[0].rango, resultado[1].rango)
+
+    def test_todos_los_terminos_deben_aparecer(self):
+        resultado = busqueda.buscar(SolicitudIncidencia.objects.all(), 'luminaria colegio')
+
+        self.assertEqual(list(resultado), [self.en_descripcion])
+
+    def test_usable_como_subconsulta_y_para_contar(self):
+        resultado = busqueda.buscar(SolicitudIncidencia.objects.all(), 'lumin')
+
+        self.assertEqual(resultado.count(), 2)
+        self.assertEqual(
+            SolicitudIncidencia.objects.filter(pk__in=resultado.values('pk')).count(), 2,
+        )
+
+    def test_guardar_campos_no_indexados_no_reindexa(self):
+        SolicitudIncidencia.objects.filter(pk=self.sin_coincidencia.pk).update(descripcion='Semáforo')
+
+        self.sin_coincidencia.estado = transiciones.DERIVADA
+        self.sin_coincidencia.save(update_fields=['estado'])
+        documento = DocumentoBusqueda.objects.get(solicitud=self.sin_coincidencia)
+        self.assertNotIn('semaforo', documento.cuerpo)
+
+        self.sin_coincidencia.descripcion = 'Semáforo'
+        self.sin_coincidencia.save(update_fields=['descripcion'])
+        documento.refresh_from_db()
+        self.assertIn('semaforo', documento.cuerpo)
+
+
+class PlanesConsultaTests(TestCase):
+    """Los caminos de acceso de dashboards y listados no deben recorrer tablas completas."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Group.objects.create(name='Usuarios')
+        synthetic.Generador(synthetic.Escala(
+            direcciones=2, departamentos_por_direccion=2, cuadrillas_por_departamento=2,
+            territoriales=3, solicitudes=2000, dias=60,
+        )).generar(indexar_busqueda=False)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def test_consultas_usan_indices(self):
+        self.assertEqual(planes.verificar(), {})
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class PresupuestoConsultasTests(QueryBudgetTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Group.objects.create(name='Usuarios')
+        cls.generador = synthetic.Generador(synthetic.Escala(
+            direcciones=2, departamentos_por_direccion=2, cuadrillas_por_departamento=2,
+            territoriales=3, solicitudes=200, dias=30,
+        ))
+        cls.generador.generar()
+
+    def setUp(self):
+        cache.clear()
+        directorio._directorio = None
+        self.client.force_login(User.objects.get(username=f'{self.generador.slug}_secpla_1'))
+
+    def test_solicitud_listar(self):
+        self.assertEqual(self.assertQueryBudget(reverse('solicitud_listar')).status_code, 200)
+
+    def test_solicitud_listar_con_busqueda(self):
+        url = f"{reverse('solicitud_listar')}?q=calle&estado=Pendiente"
+        self.assertEqual(self.assertQueryBudget(url).status_code, 200)
+
+
+class ExportacionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Group.objects.create(name='Usuarios')
+        cls.profile = User.objects.create_user('secpla').profile
+        cls.encuesta = Encuesta.objects.create(titulo='Luminarias', descripcion='')
+        cls.pregunta = Pregunta.objects.create(nombre='Poste', encuesta=cls.encuesta)
+        cls.territorial = Territorial.objects.create(nombre='Norte')
+
+    def setUp(self):
+        directorio._directorio = None
+        formularios._compilados.clear()
+        self.solicitud = self.crear(vecino='Ana')
+        respuestas_encuesta.guardar(self.solicitud, {self.pregunta.pk: 'Número 12'})
+        transiciones.transicionar(self.solicitud, transiciones.RECHAZADA, self.profile)
+
+    def crear(self, **campos):
+        return SolicitudIncidencia.objects.create(
+            encuesta=self.encuesta, territorial=self.territorial, otro='', **campos,
+        )
+
+    def exportar_csv(self, **params):
+        contenido = ''.join(exportacion.generar(exportacion.CSV, params))
+        return list(csv.reader(io.StringIO(contenido.lstrip('\ufeff'))))
+
+    def test_csv_con_nombres_ultimo_cambio_y_respuestas(self):
+        encabezado, fila = self.exportar_csv()
+
+        self.assertEqual(encabezado, exportacion.ENCABEZADOS)
+        columnas = dict(zip(encabezado, fila))
+        self.assertEqual(columnas['ID'], str(self.solicitud.pk))
+        self.assertEqual((columnas['Encuesta'], columnas['Territorial']), ('Luminarias', 'Norte'))
+        self.assertEqual(
+            (columnas['Último cambio desde'], columnas['Último cambio hasta']),
+            (transiciones.PENDIENTE, transiciones.RECHAZADA),
+        )
+        self.assertEqual(columnas['Respuestas'], 'Poste: Número 12')
+
+    def test_aplica_los_filtros_del_listado(self):
+        self.crear(vecino='Luis')
+
+        self.assertEqual(len(self.exportar_csv()), 3)
+        self.assertEqual([fila[0] for fila in self.exportar_csv(estado='Rechazada')[1:]], [str(self.solicitud.pk)])
+
+    def test_consultas_por_bloque_y_no_por_fila(self):
+        def consultas():
+            with CaptureQueriesContext(connection) as capturadas:
+                filas = list(exportacion.filas({}, tamano_bloque=10))
+            return len(filas), len(capturadas)
+
+        self.crear(vecino='Luis')
+        list(exportacion.filas({}))  # carga el directorio
+        pocas = consultas()
+        for numero in range(5):
+            self.crear(vecino=f'Vecino {numero}')
+
+        self.assertEqual(consultas(), (7, pocas[1]))
+
+    def test_xlsx_es_un_libro_valido(self):
+        self.crear(vecino='Luis <&>')
+
+        contenido = b''.join(exportacion.generar(exportacion.XLSX, {}))
+
+        with zipfile.ZipFile(io.BytesIO(contenido)) as libro:
+            self.assertIsNone(libro.testzip())
+            hoja = libro.read('xl/worksheets/sheet1.xml').decode()
+        self.assertEqual(hoja.count('<row>'), 3)
+        self.assertIn('Luis &lt;&amp;&gt;', hoja)
+
+
+class CrearSolicitudTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Group.objects.create(name='Usuarios')
+        cls.profile = User.objects.create_user('territorial').profile
+        cls.territorial = Territorial.objects.create(nombre='Norte', profile=cls.profile)
+
+    def setUp(self):
+        directorio._directorio = None
+        formularios._compilados.clear()
+
+    def encuesta(self, preguntas):
+        encuesta = Encuesta.objects.create(titulo=f'Encuesta {preguntas}', descripcion='')
+        Pregunta.objects.bulk_create(Pregunta(nombre=f'Pregunta {numero}', encuesta=encuesta) for numero in range(preguntas))
+        formularios.invalidar([encuesta.pk])
+        return encuesta
+
+    def datos(self, encuesta, **extra):
+        datos = {'encuesta': str(encuesta.pk), 'vecino': 'Ana', 'ubicacion': 'Los Aromos 12', 'descripcion': 'Poste caído'}
+        for pregunta_id, nombre in formularios.preguntas(encuesta.pk):
+            datos[formularios.nombre_campo(pregunta_id)] = f'Respuesta a {nombre}'
+        datos.update(extra)
+        return datos
+
+    def crear(self, encuesta, datos):
+        form = SolicitudIncidenciaForm.para_encuesta(encuesta.pk)(self.datos(encuesta))
+        self.assertTrue(form.is_valid(), form.errors)
+        return crear_solicitud(form, self.profile, datos)
+
+    def test_guarda_solicitud_respuestas_y_documento(self):
+        encuesta = self.encuesta(2)
+
+        solicitud = self.crear(encuesta, self.datos(encuesta))
+
+        self.assertEqual(solicitud.territorial, self.territorial)
+        hoja = HojaRespuestas.objects.get(solicitud_incidencia=solicitud)
+        self.assertEqual(sorted(r['texto'] for r in hoja.respuestas.values()),
+                         ['Respuesta a Pregunta 0', 'Respuesta a Pregunta 1'])
+        self.assertIn('respuesta a pregunta 1', DocumentoBusqueda.objects.get(solicitud=solicitud).respuestas)
+
+    def test_respuesta_faltante_no_escribe_nada(self):
+        encuesta = self.encuesta(2)
+        pregunta_id = formularios.preguntas(encuesta.pk)[0][0]
+
+        with self.assertRaises(ValidationError):
+            self.crear(encuesta, self.datos(encuesta, **{formularios.nombre_campo(pregunta_id): ' '}))
+
+        self.assertFalse(SolicitudIncidencia.objects.exists())
+        self.assertFalse(HojaRespuestas.objects.exists())
+
+    def test_consultas_no_dependen_de_la_cantidad_de_preguntas(self):
+        def consultas(encuesta):
+            datos = self.datos(encuesta)
+            form = SolicitudIncidenciaForm.para_encuesta(encuesta.pk)(datos)
+            self.assertTrue(form.is_valid(), form.errors)
+            with CaptureQueriesContext(connection) as capturadas:
+                crear_solicitud(form, self.profile, datos)
+            return len(capturadas)
+
+        consultas(self.encuesta(1))  # carga el directorio y los contadores
+        self.assertEqual(consultas(self.encuesta(2)), consultas(self.encuesta(8)))
+
+
+def _imagen_jpeg(color, tamano=(800, 600)) -> bytes:
+    from PIL import Image
+
+    salida = io.BytesIO()
+    Image.new('RGB', tamano, color).save(salida, 'JPEG')
+    return salida.getvalue()
+
+
+@skipUnless(medios.Image is not None, 'Requiere Pillow.')
+class ProcesamientoMultimediaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Group.objects.create(name='Usuarios')
+        encuesta = Encuesta.objects.create(titulo='Encuesta', descripcion='')
+        cls.solicitud = SolicitudIncidencia.objects.create(encuesta=encuesta, vecino='Vecino', otro='')
+
+    def setUp(self):
+        carpeta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, carpeta, ignore_errors=True)
+        ajustes = override_settings(MEDIA_ROOT=carpeta)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def subir(self, contenido, nombre='foto.jpg'):
+        return Multimedia.objects.create(
+            solicitud_incidencia=self.solicitud, tipo='imagen',
+            archivo=SimpleUploadedFile(nombre, contenido, content_type='image/jpeg'),
+        )
+
+    def test_subir_encola_un_trabajo(self):
+        multimedia = self.subir(_imagen_jpeg('red'))
+
+        trabajo = TrabajoMultimedia.objects.get()
+        self.assertEqual((trabajo.tipo, trabajo.objeto_id), (TrabajoMultimedia.Tipo.MULTIMEDIA, multimedia.pk))
+        self.assertEqual(multimedia.estado_procesamiento, Multimedia.EstadoProcesamiento.PENDIENTE)
+
+    def test_procesa_imagen_con_miniatura_y_version_web(self):
+        from PIL import Image
+
+        multimedia = self.subir(_imagen_jpeg('red'))
+
+        self.assertEqual(medios.procesar_pendientes(), (1, 0))
+
+        multimedia.refresh_from_db()
+        self.assertEqual(multimedia.estado_procesamiento, Multimedia.EstadoProcesamiento.PROCESADO)
+        self.assertEqual(len(multimedia.hash_contenido), 64)
+        with multimedia.miniatura.open('rb') as miniatura:
+            self.assertLessEqual(max(Image.open(miniatura).size), 320)
+        self.assertTrue(multimedia.version_web.storage.exists(multimedia.version_web.name))
+        self.assertEqual(TrabajoMultimedia.objects.get().estado, TrabajoMultimedia.Estado.COMPLETADO)
+
+    def test_contenido_repetido_reutiliza_los_archivos(self):
+        contenido = _imagen_jpeg('blue')
+        primera = self.subir(contenido)
+        medios.procesar_pendientes()
+        segunda = self.subir(contenido, nombre='copia.jpg')
+        repetido = segunda.archivo.name
+
+        medios.procesar_pendientes()
+
+        primera.refresh_from_db()
+        segunda.refresh_from_db()
+        self.assertEqual(segunda.archivo.name, primera.archivo.name)
+        self.assertEqual(segunda.miniatura.name, primera.miniatura.name)
+        self.assertFalse(segunda.archivo.storage.exists(repetido))
+
+    def test_reintenta_y_marca_fallido_al_agotar_intentos(self):
+        multimedia = self.subir(_imagen_jpeg('green'))
+
+        with mock.patch.object(medios, 'procesar_objeto', side_effect=OSError('disco lleno')), \
+                mock.patch.object(medios, 'ESPERA_REINTENTO', timedelta(0)), \
+                self.assertLogs('tickets.medios', 'ERROR'):
+            resultados = [medios.procesar_pendientes(limite=1) for _ in range(medios.MAX_INTENTOS + 1)]
+
+        self.assertEqual(resultados, [(0, 1)] * medios.MAX_INTENTOS + [(0, 0)])
+        trabajo = TrabajoMultimedia.objects.get()
+        self.assertEqual((trabajo.estado, trabajo.intentos), (TrabajoMultimedia.Estado.FALLIDO, medios.MAX_INTENTOS))
+        self.assertIn('disco lleno', trabajo.error)
+        multimedia.refresh_from_db()
+        self.assertEqual(multimedia.estado_procesamiento, Multimedia.EstadoProcesamiento.FALLIDO)
+
+    def test_libera_trabajos_abandonados(self):
+        self.subir(_imagen_jpeg('red'))
+        TrabajoMultimedia.objects.update(
+            estado=TrabajoMultimedia.Estado.EN_PROCESO,
+            tomado_en=timezone.now() - medios.TIEMPO_BLOQUEO - timedelta(minutes=1),
+        )
+
+        self.assertEqual(medios.liberar_bloqueados(), 1)
+        self.assertIsNotNone(medios.tomar_siguiente())
+        self.assertIsNone(medios.tomar_siguiente())
+
+
+class SubidasFragmentadasTests(TestCase):
+    CONTENIDO = b'0123456789' * 10
+
+    @classmethod
+    def setUpTestData(cls):
+        Group.objects.create(name='Usuarios')
+        cls.profile = User.objects.create_user('cuadrilla').profile
+        encuesta = Encuesta.objects.create(titulo='Encuesta', descripcion='')
+        cls.solicitud = SolicitudIncidencia.objects.create(encuesta=encuesta, vecino='Vecino', otro='')
+        departamento = Departamento.objects.create(
+            nombre='Vialidad', direccion=Direccion.objects.create(nombre='Obras'),
+        )
+        cls.cuadrilla = Cuadrilla.objects.create(nombre='Cuadrilla 1', departamento=departamento)
+
+    def setUp(self):
+        carpeta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, carpeta, ignore_errors=True)
+        ajustes = override_settings(MEDIA_ROOT=f'{carpeta}/media', SUBIDAS_PARCIALES_ROOT=f'{carpeta}/parciales')
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def crear(self, **kwargs):
+        return subidas.crear(self.solicitud, self.profile.pk, 'foto.jpg', len(self.CONTENIDO), **kwargs)
+
+    def enviar(self, subida, inicio, fin, checksum=None):
+        return subidas.agregar_fragmento(
+            subida.pk, self.profile.pk, inicio, io.BytesIO(self.CONTENIDO[inicio:fin]), fin - inicio, checksum,
+        )
+
+    def test_valida_nombre_y_tamano_al_crear(self):
+        with self.assertRaises(subidas.ErrorSubida):
+            subidas.crear(self.solicitud, self.profile.pk, 'documento.pdf', 10)
+        with self.assertRaises(subidas.ErrorSubida) as error:
+            subidas.crear(self.solicitud, self.profile.pk, 'foto.jpg', subidas.TAMANO_MAXIMO + 1)
+        self.assertEqual(error.exception.status, 413)
+
+    def test_arma_el_archivo_y_rechaza_offsets_desfasados(self):
+        subida = self.crear(checksum=hashlib.sha256(self.CONTENIDO).hexdigest())
+        self.enviar(subida, 0, 40)
+
+        with self.assertRaises(subidas.ErrorSubida) as error:
+            self.enviar(subida, 60, 100)
+        self.assertEqual(error.exception.status, 409)
+
+        subida = self.enviar(subida, 40, 100)
+        self.assertEqual((subida.recibido, subida.estado), (100, SubidaFragmentada.Estado.COMPLETA))
+        self.assertEqual(subidas.ruta(subida).read_bytes(), self.CONTENIDO)
+
+    def test_descarta_fragmento_con_checksum_invalido(self):
+        subida = self.crear()
+        self.enviar(subida, 0, 50)
+
+        with self.assertRaises(subidas.ErrorSubida) as error:
+            self.enviar(subida, 50, 100, checksum=hashlib.sha256(b'otro').digest())
+
+        self.assertEqual(error.exception.status, subidas.STATUS_CHECKSUM_INVALIDO)
+        subida.refresh_from_db()
+        self.assertEqual(subida.recibido, 50)
+        self.assertEqual(subidas.ruta(subida).read_bytes(), self.CONTENIDO[:50])
+
+    def test_reinicia_si_el_archivo_completo_no_coincide(self):
+        subida = self.crear(checksum=hashlib.sha256(b'otro').hexdigest())
+
+        with self.assertRaises(subidas.ErrorSubida) as error:
+            self.enviar(subida, 0, 100)
+
+        self.assertEqual(error.exception.status, subidas.STATUS_CHECKSUM_INVALIDO)
+        subida.refresh_from_db()
+        self.assertEqual((subida.recibido, subida.estado), (0, SubidaFragmentada.Estado.EN_CURSO))
+
+    def test_adjunta_a_la_respuesta_al_completarse(self):
+        respuesta = RespuestaCuadrilla.objects.create(
+            solicitud=self.solicitud, cuadrilla=self.cuadrilla, respuesta='Listo',
+        )
+        subida = self.crear(respuesta=respuesta)
+        parcial = subidas.ruta(subida)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            subida = self.enviar(subida, 0, 100)
+
+        self.assertEqual(subida.estado, SubidaFragmentada.Estado.ADJUNTADA)
+        multimedia = MultimediaCuadrilla.objects.get(respuesta=respuesta)
+        self.assertEqual(multimedia.tipo, 'imagen')
+        with multimedia.archivo.open('rb') as archivo:
+            self.assertEqual(archivo.read(), self.CONTENIDO)
+        self.assertFalse(parcial.exists())
+
+    def test_limpia_subidas_vencidas(self):
+        vencida = self.crear()
+        vigente = self.crear()
+        SubidaFragmentada.objects.filter(pk=vencida.pk).update(
+            actualizado=timezone.now() - subidas.VIGENCIA - timedelta(hours=1),
+        )
+
+        self.assertEqual(subidas.limpiar_vencidas(), 1)
+        self.assertFalse(subidas.ruta(vencida).exists())
+        self.assertQuerySetEqual(SubidaFragmentada.objects.values_list('pk', flat=True), [vigente.pk])
@@ -0,0 +1,126 @@
+"""
+Máquina de estados de `SolicitudIncidencia`.
+
+`TRANSICIONES` declara qué cambios de `estado` están permitidos.
+`transicionar()` aplica uno como compare-and-swap: un
+`UPDATE ... WHERE pk = ? AND estado = ?` que solo escribe `estado` y los
+campos que acompañan a la transición, y en la misma transacción registra
+el `IncidenciaLog`. Si otro usuario cambió el estado entre que se cargó la
+solicitud y el UPDATE, no se sobrescribe nada y se lanza
+`ConflictoTransicion`.
+
+El UPDATE no emite `post_save`: en su lugar se envía `transicion_aplicada`
+dentro de la misma transacción, con la fila antes y después del cambio,
+para que quien mantenga datos derivados de las solicitudes (los contadores
+y el mapa de `dashboards`) se ajuste sin que `tickets` dependa de él. El
+log sí se crea con `save()` y emite sus señales de siempre.
+"""
+from __future__ import annotations
+
+from typing import Dict, FrozenSet, Mapping, Optional
+
+from django.db import transaction
+from django.dispatch import Signal
+from django.utils import timezone
+
+from registration.models import Profile
+
+from .models import SolicitudIncidencia
+
+PENDIENTE = 'Pendiente'
+DERIVADA = 'Derivada'
+EN_PROCESO = 'En Proceso'
+FINALIZADA = 'Finalizada'
+APROBADA = 'Aprobada'
+RECHAZADA = 'Rechazada'
+
+TRANSICIONES: Dict[str, FrozenSet[str]] = {
+    PENDIENTE: frozenset({DERIVADA, EN_PROCESO, RECHAZADA}),
+    DERIVADA: frozenset({PENDIENTE, EN_PROCESO, FINALIZADA, RECHAZADA}),
+    EN_PROCESO: frozenset({PENDIENTE, DERIVADA, FINALIZADA, RECHAZADA}),
+    FINALIZADA: frozenset({APROBADA, RECHAZADA}),
+    RECHAZADA: frozenset({PENDIENTE}),
+    APROBADA: frozenset(),
+}
+
+# Argumentos: `solicitud`, `anterior` y `actual` (diccionarios con todas las
+# columnas de la fila, por `attname`, antes y después del UPDATE).
+transicion_aplicada = Signal()
+
+
+class TransicionInvalida(Exception):
+    def __init__(self, solicitud_id, desde, hacia):
+        self.solicitud_id, self.desde, self.hacia = solicitud_id, desde, hacia
+        super().__init__(f"La solicitud #{solicitud_id} no puede pasar de '{desde}' a '{hacia}'.")
+
+
+class ConflictoTransicion(Exception):
+    def __init__(self, solicitud_id, esperado, actual):
+        self.solicitud_id, self.esperado, self.actual = solicitud_id, esperado, actual
+        super().__init__(
+            f"La solicitud #{solicitud_id} cambió de estado mientras la procesabas "
+            f"(ahora está '{actual}'). Recarga e inténtalo de nuevo."
+        )
+
+
+def puede(desde: Optional[str], hacia: str) -> bool:
+    return hacia in TRANSICIONES.get(desde or PENDIENTE, frozenset())
+
+
+def origenes(hacia: str) -> FrozenSet[str]:
+    """Estados desde los que se puede llegar a `hacia`."""
+    return frozenset(desde for desde, destinos in TRANSICIONES.items() if hacia in destinos)
+
+
+def _fila_actual(anterior: dict, hacia: str, campos: Mapping[str, object]) -> dict:
+    """La fila `anterior` tras escribir `hacia` y `campos` (por nombre de campo o de columna)."""
+    actual = dict(anterior, estado=hacia)
+    for nombre, valor in campos.items():
+        campo = SolicitudIncidencia._meta.get_field(nombre)
+        actual[campo.attname] = getattr(valor, 'pk', valor) if campo.is_relation else valor
+    return actual
+
+
+@transaction.atomic
+def transicionar(
+    solicitud: SolicitudIncidencia,
+    hacia: str,
+    profile: Optional[Profile],
+    comentario: Optional[str] = None,
+    campos: Optional[Mapping[str, object]] = None,
+    condiciones: Optional[Mapping[str, object]] = None,
+) -> SolicitudIncidencia:
+    """
+    Pasa `solicitud` de su estado actual (el cargado en memoria) a `hacia`,
+    escribiendo además `campos`. `condiciones` agrega filtros al WHERE del
+    compare-and-swap (p. ej. `cuadrilla__isnull=True` al tomar).
+    """
+    desde = solicitud.estado
+    if not puede(desde, hacia):
+        raise TransicionInvalida(solicitud.pk, desde, hacia)
+
+    campos = dict(campos or {})
+    fila = SolicitudIncidencia.objects.filter(pk=solicitud.pk, estado=desde, **(condiciones or {}))
+    anterior = fila.select_for_update().values().first()
+    if anterior is None or not fila.update(estado=hacia, **campos):
+        actual = SolicitudIncidencia.objects.filter(pk=solicitud.pk).values_list('estado', flat=True).first()
+        raise ConflictoTransicion(solicitud.pk, desde, actual)
+
+    solicitud.estado = hacia
+    for campo, valor in campos.items():
+        setattr(solicitud, campo, valor)
+    transicion_aplicada.send(
+        sender=SolicitudIncidencia,
+        solicitud=solicitud,
+        anterior=anterior,
+        actual=_fila_actual(anterior, hacia, campos),
+    )
+
+    solicitud.registrar_log(
+        profile=profile,
+        from_estado=desde,
+        to_estado=hacia,
+        fecha=timezone.now(),
+        comentario=comentario,
+    )
+    return solicitud
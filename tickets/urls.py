@@ -3,6 +3,7 @@ from tickets import views
 
 urlpatterns = [
     path('solicitud/', views.solicitud_listar, name='solicitud_listar'),
+    path('solicitud/exportar/', views.solicitud_exportar, name='solicitud_exportar'),
     path('solicitud/crear/', views.solicitud_crear, name='solicitud_crear'),
     path('solicitud/ver/<int:solicitud_incidencia_id>/', views.solicitud_ver, name='solicitud_ver'),
     path('solicitud/editar/<int:solicitud_incidencia_id>/', views.solicitud_editar, name='solicitud_editar'),
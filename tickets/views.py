@@ -1,4 +1,5 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import StreamingHttpResponse
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from .models import SolicitudIncidencia, Multimedia, RespuestaCuadrilla, MultimediaCuadrilla
@@ -7,76 +8,62 @@ from .forms import SolicitudIncidenciaForm
 from django.views.generic.list import ListView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.urls import reverse_lazy
-from django.core.exceptions import PermissionDenied
+from django.core.exceptions import PermissionDenied, ValidationError
 from django.views.generic.edit import CreateView
-from django.db.models import Q
-from django.core.paginator import Paginator
-from datetime import datetime
-from django.utils.timezone import now
 from core.decorators import role_required, RoleRequiredMixin
+from locations import geocodificar
+from core.roles import get_role_context
+from core.pagination import paginate_request, query_string_without_cursor
+from .filtros import filtrar_solicitudes
+from . import exportacion
+from .servicios import crear_solicitud
 
 @role_required("Secpla","Territoriales","Direcciones","Departamentos","Cuadrillas")
 def solicitud_listar(request):
-    try:
-        profile = Profile.objects.get(user_id=request.user.id)
-    except Profile.DoesNotExist:
+    roles = get_role_context(request)
+    if not roles.profile_id:
         messages.info(request, 'Hubo un error con tu perfil.')
         return redirect('login')
 
-    puede_crear_incidencia = request.user.groups.filter(id=6).exists()
-    es_cuadrilla = request.user.groups.filter(name__iexact="cuadrilla").exists() or profile.role_type == "cuadrilla"
-
-    q = request.GET.get('q', '').strip()
-    estado = request.GET.get('estado', '').strip()
-    cuadrilla = request.GET.get('cuadrilla', '').strip()
-    fecha = request.GET.get('fecha', '').strip()
-
-    solicitudes = SolicitudIncidencia.objects.select_related(
-        'incidencia', 'cuadrilla', 'territorial', 'encuesta'
-    ).all().order_by('-fecha')
-
-    filtros = Q()
-    if q:
-        filtros &= Q(encuesta__titulo__icontains=q) | Q(incidencia__nombre__icontains=q) | Q(vecino__email__icontains=q)
-    if estado:
-        filtros &= Q(estado__iexact=estado)  
-    if cuadrilla:
-        filtros &= Q(cuadrilla__nombre__icontains=cuadrilla)
-    if fecha:
-        try:
-            fecha_dt = datetime.strptime(fecha, "%Y-%m-%d")
-            filtros &= Q(fecha__date=fecha_dt.date())
-        except ValueError:
-            messages.warning(request, "Formato de fecha desde inválido. Usa YYYY-MM-DD.")
-
-    solicitudes = solicitudes.filter(filtros)
-    paginator = Paginator(solicitudes, 10)
-    page_number = request.GET.get('page')
-    solicitudes_page = paginator.get_page(page_number)
-    sin_resultados = not solicitudes.exists()
+    puede_crear_incidencia = roles.in_groups("Territoriales")
+    puede_exportar = roles.in_groups("Secpla", "Direcciones")
+    es_cuadrilla = roles.es_cuadrilla
+
+    solicitudes, orden, avisos = filtrar_solicitudes(request.GET)
+    for aviso in avisos:
+        messages.warning(request, aviso)
+    solicitudes_page = paginate_request(request, solicitudes, orden)
+    sin_resultados = not solicitudes_page and not solicitudes_page.has_previous()
     if sin_resultados:
         messages.info(request, 'No se encontraron resultados con los filtros seleccionados.')
-    query_params = request.GET.copy()
-    if 'page' in query_params:
-        del query_params['page']
-    query_string = query_params.urlencode()
+    query_string = query_string_without_cursor(request)
 
     return render(request, 'tickets/solicitud_listar.html', {
         'solicitudes': solicitudes_page,
+        'page_obj': solicitudes_page,
         'sin_resultados': sin_resultados,
         'query_string': query_string,
         'request': request,
         'puede_crear_incidencia': puede_crear_incidencia,
+        'puede_exportar': puede_exportar,
         'es_cuadrilla': es_cuadrilla,
     })
 
+@role_required("Secpla","Direcciones")
+def solicitud_exportar(request):
+    formato = request.GET.get('formato', exportacion.CSV)
+    if formato not in exportacion.FORMATOS:
+        formato = exportacion.CSV
+    response = StreamingHttpResponse(
+        exportacion.generar(formato, request.GET),
+        content_type=exportacion.FORMATOS[formato],
+    )
+    response['Content-Disposition'] = f'attachment; filename="{exportacion.nombre_archivo(formato)}"'
+    return response
+
 @role_required("Territoriales")
 def solicitud_crear(request):
-    from surveys.models import Pregunta, Respuesta  
-
-    try:
-        profile = Profile.objects.get(user_id=request.user.id)
-    except Profile.DoesNotExist:
+    if not get_role_context(request).profile_id:
         messages.error(request, 'Hubo un error con tu perfil.')
         return redirect('logout')
 
@@ -85,44 +72,16 @@ def solicitud_crear(request):
 
     if request.method == 'POST':
         
-        form = SolicitudIncidenciaForm(request.POST, encuesta_id=request.POST.get('encuesta'))
+        form = SolicitudIncidenciaForm.para_encuesta(request.POST.get('encuesta'))(request.POST)
         comentario = request.POST.get('comentario', '').strip()
 
         if form.is_valid():
-            solicitud = form.save(commit=False)
-
-            
             try:
-                solicitud.territorial = Territorial.objects.get(profile=request.user.profile)
-            except Territorial.DoesNotExist:
-                solicitud.territorial = None
-
-            
-            if solicitud.cuadrilla:
-                estado_anterior = solicitud.estado
-                solicitud.estado = 'Derivada'
-
-            solicitud.save()
-
-            
-            for key, value in request.POST.items():
-                if key.startswith('pregunta_'):
-                    pregunta_id = key.split('_')[1]
-                    Respuesta.objects.create(
-                        pregunta_id=pregunta_id,
-                        solicitud_incidencia=solicitud,
-                        respuesta_texto=value
-                    )
-
-            
-            if solicitud.cuadrilla:
-                solicitud.registrar_log(
-                    profile=request.user.profile,
-                    from_estado=estado_anterior,
-                    to_estado=solicitud.estado,
-                    fecha=now(),
-                    comentario=comentario
-                )
+                crear_solicitud(form, request.user.profile, request.POST, comentario)
+            except ValidationError as error:
+                for mensaje in error.messages:
+                    messages.error(request, mensaje)
+                return render(request, 'tickets/solicitud_crear.html', {'form': form})
 
             messages.success(request, 'Solicitud de incidencia creada correctamente con respuestas.')
             return redirect('solicitud_listar')
@@ -134,7 +93,7 @@ def solicitud_crear(request):
         if encuesta_id:
             initial['encuesta'] = encuesta_id
 
-        form = SolicitudIncidenciaForm(encuesta_id=encuesta_id, initial=initial)
+        form = SolicitudIncidenciaForm.para_encuesta(encuesta_id)(initial=initial)
 
     return render(request, 'tickets/solicitud_crear.html', {'form': form})
 
@@ -144,37 +103,19 @@ def solicitud_crear(request):
 
 @role_required("Territoriales","Direcciones")
 def solicitud_editar(request, solicitud_incidencia_id):
-    try:
-        profile = Profile.objects.filter(user_id=request.user.id).get()
-    except Profile.DoesNotExist:
+    if not get_role_context(request).profile_id:
         messages.error(request, 'Hubo un error con tu perfil.')
         return redirect('logout')
     solicitud = get_object_or_404(SolicitudIncidencia, pk=solicitud_incidencia_id)
-    cuadrilla_anterior = solicitud.cuadrilla
     if request.method == 'POST':
         form = SolicitudIncidenciaForm(request.POST, instance=solicitud)
-        comentario = request.POST.get('comentario', '').strip()
         if form.is_valid():
+            # El formulario no toca `estado` ni `cuadrilla`: solo se escriben sus
+            # campos para no pisar una transición hecha en paralelo.
             solicitud = form.save(commit=False)
-            estado_anterior = solicitud.estado
-            cuadrilla_actual = solicitud.cuadrilla
-            
-            if cuadrilla_anterior != cuadrilla_actual:
-                if cuadrilla_actual:
-                    solicitud.estado = 'Derivada'
-                else:
-                    solicitud.estado = 'Pendiente'
-                
-
-            solicitud.save()
-            if estado_anterior != solicitud.estado:
-                solicitud.registrar_log(
-                    profile=request.user.profile,
-                    from_estado=estado_anterior,
-                    to_estado=solicitud.estado,
-                    fecha=now(),
-                    comentario = comentario
-                )
+            if 'ubicacion' in form.changed_data:
+                solicitud.punto = geocodificar.buscar(solicitud.ubicacion)
+            solicitud.save(update_fields=[*form._meta.fields, 'punto'])
 
             messages.success(request, f'Solicitud #{solicitud.pk} actualizada con éxito.')
             return redirect('solicitud_listar')
@@ -189,12 +130,7 @@ def solicitud_editar(request, solicitud_incidencia_id):
 def solicitud_ver(request, solicitud_incidencia_id):
     solicitud = get_object_or_404(SolicitudIncidencia, pk=solicitud_incidencia_id)
     logs = solicitud.logs.all() 
-    es_cuadrilla = False
-    if hasattr(request.user, "profile"):
-        es_cuadrilla = (
-            request.user.groups.filter(name__iexact="cuadrilla").exists()
-            or request.user.profile.role_type == "cuadrilla"
-        )
+    es_cuadrilla = get_role_context(request).es_cuadrilla
     return render(request, 'tickets/solicitud_ver.html', {'solicitud': solicitud,'logs': logs, 'es_cuadrilla': es_cuadrilla})
 
 
@@ -216,15 +152,9 @@ class MultimediaListView(RoleRequiredMixin, ListView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         solicitud = SolicitudIncidencia.objects.get(pk=self.kwargs['solicitud_incidencia_id'])
-        es_cuadrilla = False
-        if hasattr(self.request.user, "profile"):
-            es_cuadrilla = (
-                self.request.user.groups.filter(name__iexact="cuadrilla").exists()
-                or self.request.user.profile.role_type == "cuadrilla"
-            )
 
         context['solicitud'] = solicitud
-        context['es_cuadrilla'] = es_cuadrilla
+        context['es_cuadrilla'] = get_role_context(self.request).es_cuadrilla
         return context
 
 
@@ -239,9 +169,12 @@ class MultimediaCreateView(RoleRequiredMixin, CreateView):
         return {'solicitud_incidencia': solicitud_incidencia_id}
 
     def form_valid(self, form):
-        profile = self.request.user.profile
+        roles = get_role_context(self.request)
         solicitud = SolicitudIncidencia.objects.get(pk=self.kwargs['solicitud_incidencia_id'])
-        if not Cuadrilla.objects.filter(profile=profile, estado=True, pk=solicitud.cuadrilla_id).exists():
+        if (
+            solicitud.cuadrilla_id not in roles.cuadrilla_ids
+            or not Cuadrilla.objects.filter(pk=solicitud.cuadrilla_id, estado=True).exists()
+        ):
             raise PermissionDenied("No estás asignado a la cuadrilla de esta solicitud o la cuadrilla no está activa.")
 
         multimedia = form.save(commit=False)